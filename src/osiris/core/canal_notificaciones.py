@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from uuid import uuid4
+
+from sqlalchemy import event, text
+from sqlmodel import Session
+
+
+logger = logging.getLogger(__name__)
+
+
+class CanalNotificaciones(ABC):
+    """
+    Aviso entre procesos que viaja con la transacción que lo origina.
+
+    Las escrituras marcan el session con ``marcar``. Antes del commit, en Postgres,
+    se publica un NOTIFY por cada payload de ``payloads``: es transaccional y solo
+    llega a los demás procesos si el commit procede; allí lo recibe ``escuchar`` y
+    lo aplica ``aplicar_notificacion``. Tras el commit el aviso se aplica en local
+    con ``al_confirmar``; tras un rollback, ``al_revertir``.
+
+    Solo los canales dados de alta con ``registrar_canal`` reciben los eventos del
+    session.
+    """
+
+    clave_sesion: str
+    descripcion: str
+
+    def __init__(self, *, habilitado: bool, canal: str) -> None:
+        self.habilitado = habilitado
+        self.canal = canal
+        # Identifica este proceso: sus propios NOTIFY ya se aplicaron en local.
+        self.origen = f"{os.getpid()}-{uuid4().hex[:8]}"
+
+    def marcar(self, session: Session, valores=()) -> None:
+        """Registra en el session que la transacción debe avisar, con sus valores pendientes."""
+        pendientes: set = session.info.setdefault(self.clave_sesion, set())
+        pendientes.update(valores)
+
+    def payloads(self, pendientes: set) -> list[str]:
+        return [self.origen]
+
+    @abstractmethod
+    def al_confirmar(self, pendientes: set) -> None:
+        """Aplica en este proceso el aviso de una transacción confirmada."""
+
+    def al_revertir(self, pendientes: set) -> None:
+        return None
+
+    def al_conectar(self) -> None:
+        """Se llama al (re)abrir el LISTEN: lo publicado mientras no se escuchaba se perdió."""
+        return None
+
+    @abstractmethod
+    def aplicar_notificacion(self, payload: str) -> None:
+        """Aplica un NOTIFY recibido de otro proceso."""
+
+    def escuchar(self, database_url: str, detener: threading.Event, *, timeout: float = 5.0) -> None:
+        """Bucle bloqueante (en hilo aparte) que aplica los NOTIFY de otros procesos."""
+        from sqlalchemy.engine import make_url
+
+        url = make_url(database_url)
+        if url.get_backend_name() != "postgresql":
+            return
+        try:
+            import psycopg
+        except ModuleNotFoundError:
+            logger.warning("psycopg no disponible: %s no recibirá avisos de otros procesos.", self.descripcion)
+            return
+
+        conninfo = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while not detener.is_set():
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(f'LISTEN "{self.canal}"')
+                    self.al_conectar()
+                    while not detener.is_set():
+                        for notificacion in conn.notifies(timeout=timeout):
+                            self.aplicar_notificacion(notificacion.payload)
+            except Exception as exc:  # pragma: no cover - protección operacional
+                logger.warning("Canal de notificación de %s caído, reintentando: %s", self.descripcion, exc)
+                detener.wait(timeout)
+
+
+_canales: list[CanalNotificaciones] = []
+
+
+def registrar_canal(canal: CanalNotificaciones) -> CanalNotificaciones:
+    _canales.append(canal)
+    return canal
+
+
+@event.listens_for(Session, "before_commit")
+def _publicar_notificaciones(session: Session) -> None:
+    marcados = [
+        canal
+        for canal in _canales
+        if canal.habilitado and session.info.get(canal.clave_sesion) is not None
+    ]
+    if not marcados or session.get_bind().dialect.name != "postgresql":
+        return
+    for canal in marcados:
+        for payload in canal.payloads(session.info[canal.clave_sesion]):
+            session.execute(text("SELECT pg_notify(:canal, :payload)"), {"canal": canal.canal, "payload": payload})
+
+
+@event.listens_for(Session, "after_commit")
+def _aplicar_notificaciones(session: Session) -> None:
+    for canal in _canales:
+        pendientes = session.info.pop(canal.clave_sesion, None)
+        if pendientes is not None:
+            canal.al_confirmar(pendientes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_notificaciones(session: Session) -> None:
+    for canal in _canales:
+        pendientes = session.info.pop(canal.clave_sesion, None)
+        if pendientes is not None:
+            canal.al_revertir(pendientes)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import time
+import weakref
 from typing import Generator
 
-from sqlalchemy import event, true
+from sqlalchemy import event, inspect as sa_inspect, true
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import with_loader_criteria
 from sqlmodel import Session, SQLModel, create_engine
@@ -93,10 +94,37 @@ def _apply_soft_delete_filter(execute_state):
     )
 
 
+_TABLE_PRESENCE_CACHE: "weakref.WeakKeyDictionary[Engine, dict[str, bool]]" = weakref.WeakKeyDictionary()
+
+
+def session_has_table(session: Session, table_name: str) -> bool:
+    """Indica si la tabla existe en la base del session, cacheado por engine.
+
+    Algunos tests unitarios crean solo un subconjunto de tablas; los servicios
+    usan esta verificación para omitir funcionalidades auxiliares sin lanzar
+    consultas de prueba en cada llamada.
+    """
+    bind = session.get_bind()
+    db_engine = getattr(bind, "engine", bind)
+    cache = _TABLE_PRESENCE_CACHE.setdefault(db_engine, {})
+    if table_name not in cache:
+        # Se inspecciona sobre la conexión del session para no abrir (ni cerrar) otra
+        # transacción sobre pools de conexión única.
+        cache[table_name] = sa_inspect(session.connection()).has_table(table_name)
+    return cache[table_name]
+
+
 def get_session() -> Generator[Session, None, None]:
     """Dependencia FastAPI: generador con yield (no contextmanager)."""
     with Session(engine) as session:
         yield session
 
 
-__all__ = ["get_settings", "engine", "get_session", "SQLModel", "attach_engine_observability"]
+__all__ = [
+    "get_settings",
+    "engine",
+    "get_session",
+    "SQLModel",
+    "attach_engine_observability",
+    "session_has_table",
+]
@@ -191,6 +191,44 @@ def initialize_metrics() -> None:
     METRICS.inc_counter("osiris_fe_worker_runs_total", value=0)
     METRICS.inc_counter("osiris_fe_worker_processed_documents_total", value=0)
     METRICS.inc_counter("osiris_fe_worker_errors_total", value=0)
+    for motivo in ("notificacion", "intervalo"):
+        METRICS.inc_counter("osiris_fe_worker_despertares_total", value=0, labels={"motivo": motivo})
+    METRICS.set_gauge("osiris_fe_worker_ultimo_latido_timestamp_seconds", value=0)
+    for tipo in ("FACTURA", "RETENCION"):
+        for resultado in ("AUTORIZADO", "RECHAZADO", "RECIBIDO", "ERROR_RED"):
+            METRICS.inc_counter(
+                "osiris_fe_documentos_resultado_total",
+                value=0,
+                labels={"tipo": tipo, "resultado": resultado},
+            )
+    METRICS.set_gauge("osiris_programador_tareas_pendientes", value=0)
+    record_sri_circuito_estado("CERRADO")
+    METRICS.inc_counter("osiris_sri_circuito_aperturas_total", value=0)
+    METRICS.inc_counter("osiris_fe_cola_pasadas_pausadas_total", value=0)
+    METRICS.inc_counter("osiris_sri_lotes_enviados_total", value=0)
+    METRICS.inc_counter("osiris_sri_lote_comprobantes_total", value=0)
+    for resultado in ("ok", "error"):
+        METRICS.inc_counter("osiris_programador_tareas_ejecutadas_total", value=0, labels={"resultado": resultado})
+    METRICS.inc_counter("osiris_inventario_conciliacion_runs_total", value=0)
+    METRICS.inc_counter("osiris_inventario_conciliacion_errors_total", value=0)
+    METRICS.set_gauge("osiris_inventario_conciliacion_pendientes", value=0)
+    for resultado in ("hit", "miss"):
+        METRICS.inc_counter("osiris_stock_cache_lookups_total", value=0, labels={"resultado": resultado})
+    for origen in ("local", "remota"):
+        METRICS.inc_counter("osiris_stock_cache_invalidaciones_total", value=0, labels={"origen": origen})
+    for resultado in ("memoria", "disco", "miss"):
+        METRICS.inc_counter("osiris_impresion_cache_lookups_total", value=0, labels={"resultado": resultado})
+    for resultado in ("ok", "error", "timeout", "saturado"):
+        METRICS.inc_counter("osiris_impresion_render_total", value=0, labels={"resultado": resultado})
+    METRICS.set_gauge("osiris_impresion_render_pendientes", value=0)
+    for resultado in ("ok", "omitido"):
+        METRICS.inc_counter("osiris_impresion_prerender_total", value=0, labels={"resultado": resultado})
+    for tipo in ("STOCK_VS_LEDGER", "LEDGER_VS_KARDEX", "PRODUCTO_VS_STOCK"):
+        METRICS.inc_counter(
+            "osiris_inventario_discrepancias_detectadas_total",
+            value=0,
+            labels={"tipo": tipo},
+        )
     for reason in ("missing_user", "insufficient_permissions", "endpoint_returned_403"):
         METRICS.inc_counter(
             "osiris_security_unauthorized_access_total",
@@ -339,14 +377,152 @@ def get_http_in_flight() -> int:
     return int(METRICS.get_gauge("osiris_http_in_flight_requests"))
 
 
+def _record_fe_worker_latido() -> None:
+    METRICS.set_gauge("osiris_fe_worker_ultimo_latido_timestamp_seconds", value=time.time())
+
+
 def record_fe_worker_run(*, processed: int) -> None:
     METRICS.inc_counter("osiris_fe_worker_runs_total")
     if processed > 0:
         METRICS.inc_counter("osiris_fe_worker_processed_documents_total", value=float(processed))
+    _record_fe_worker_latido()
 
 
 def record_fe_worker_error() -> None:
     METRICS.inc_counter("osiris_fe_worker_errors_total")
+    _record_fe_worker_latido()
+
+
+def record_fe_etapa(*, etapa: str, duracion_segundos: float) -> None:
+    METRICS.observe_histogram(
+        "osiris_fe_etapa_duracion_seconds",
+        value=max(duracion_segundos, 0.0),
+        labels={"etapa": etapa},
+    )
+
+
+def record_fe_documento_resultado(*, tipo: str, resultado: str) -> None:
+    METRICS.inc_counter("osiris_fe_documentos_resultado_total", labels={"tipo": tipo, "resultado": resultado})
+
+
+def record_fe_cola_profundidad(
+    *,
+    documentos_por_estado: dict[str, int],
+    tareas_por_estado: dict[str, int],
+    antiguedad_por_estado: dict[str, float],
+) -> None:
+    for estado, cantidad in documentos_por_estado.items():
+        METRICS.set_gauge("osiris_fe_documentos", value=float(cantidad), labels={"estado": estado})
+    for estado, cantidad in tareas_por_estado.items():
+        METRICS.set_gauge("osiris_fe_cola_sri_tareas", value=float(cantidad), labels={"estado": estado})
+    for estado, segundos in antiguedad_por_estado.items():
+        METRICS.set_gauge(
+            "osiris_fe_documentos_pendiente_mas_antiguo_seconds",
+            value=max(segundos, 0.0),
+            labels={"estado": estado},
+        )
+
+
+def record_fe_worker_despertar(*, motivo: str) -> None:
+    METRICS.inc_counter("osiris_fe_worker_despertares_total", labels={"motivo": motivo})
+
+
+def record_sri_circuito_estado(estado: str) -> None:
+    for valor in ("CERRADO", "ABIERTO", "SEMIABIERTO"):
+        METRICS.set_gauge("osiris_sri_circuito_estado", value=1.0 if valor == estado else 0.0, labels={"estado": valor})
+
+
+def record_sri_circuito_apertura() -> None:
+    METRICS.inc_counter("osiris_sri_circuito_aperturas_total")
+
+
+def record_fe_cola_pasada_pausada() -> None:
+    METRICS.inc_counter("osiris_fe_cola_pasadas_pausadas_total")
+
+
+def record_sri_lote_enviado(*, comprobantes: int) -> None:
+    METRICS.inc_counter("osiris_sri_lotes_enviados_total")
+    METRICS.inc_counter("osiris_sri_lote_comprobantes_total", value=float(comprobantes))
+
+
+def record_programador_tareas_pendientes(pendientes: int) -> None:
+    METRICS.set_gauge("osiris_programador_tareas_pendientes", value=float(pendientes))
+
+
+def record_programador_tarea_ejecutada(*, resultado: str, retraso_segundos: float) -> None:
+    METRICS.inc_counter("osiris_programador_tareas_ejecutadas_total", labels={"resultado": resultado})
+    METRICS.observe_histogram("osiris_programador_tareas_retraso_seconds", value=max(retraso_segundos, 0.0))
+
+
+def record_inventario_verificacion(*, modo: str, inline: bool) -> None:
+    METRICS.inc_counter(
+        "osiris_inventario_verificaciones_total",
+        labels={"modo": modo, "ejecucion": "inline" if inline else "diferida"},
+    )
+
+
+def record_inventario_conciliacion_run(
+    *,
+    verificados: int,
+    nuevas_por_tipo: dict[str, int],
+    abiertas_por_tipo: dict[str, int],
+    pendientes: int,
+    duracion_segundos: float,
+) -> None:
+    METRICS.inc_counter("osiris_inventario_conciliacion_runs_total")
+    if verificados > 0:
+        METRICS.inc_counter("osiris_inventario_conciliacion_pares_verificados_total", value=float(verificados))
+    for tipo, total in nuevas_por_tipo.items():
+        METRICS.inc_counter(
+            "osiris_inventario_discrepancias_detectadas_total",
+            value=float(total),
+            labels={"tipo": tipo},
+        )
+    for tipo, total in abiertas_por_tipo.items():
+        METRICS.set_gauge("osiris_inventario_discrepancias_abiertas", value=float(total), labels={"tipo": tipo})
+    METRICS.set_gauge("osiris_inventario_conciliacion_pendientes", value=float(pendientes))
+    METRICS.observe_histogram(
+        "osiris_inventario_conciliacion_duration_seconds",
+        value=max(duracion_segundos, 0.0),
+    )
+
+
+def record_inventario_conciliacion_error() -> None:
+    METRICS.inc_counter("osiris_inventario_conciliacion_errors_total")
+
+
+def record_stock_cache_lookup(*, hits: int, misses: int, entradas: int) -> None:
+    if hits:
+        METRICS.inc_counter("osiris_stock_cache_lookups_total", value=float(hits), labels={"resultado": "hit"})
+    if misses:
+        METRICS.inc_counter("osiris_stock_cache_lookups_total", value=float(misses), labels={"resultado": "miss"})
+    METRICS.set_gauge("osiris_stock_cache_entradas", value=float(entradas))
+
+
+def record_stock_cache_invalidacion(*, origen: str, claves: int) -> None:
+    METRICS.inc_counter(
+        "osiris_stock_cache_invalidaciones_total",
+        value=float(max(claves, 1)),
+        labels={"origen": origen},
+    )
+
+
+def record_impresion_cache_lookup(*, resultado: str) -> None:
+    METRICS.inc_counter("osiris_impresion_cache_lookups_total", labels={"resultado": resultado})
+
+
+def record_impresion_render(*, resultado: str, duracion_segundos: float | None = None) -> None:
+    METRICS.inc_counter("osiris_impresion_render_total", labels={"resultado": resultado})
+    if duracion_segundos is not None:
+        METRICS.observe_histogram("osiris_impresion_render_duracion_seconds", value=max(duracion_segundos, 0.0))
+
+
+def record_impresion_render_pendientes(pendientes: int) -> None:
+    METRICS.set_gauge("osiris_impresion_render_pendientes", value=float(pendientes))
+
+
+def record_impresion_prerender(*, resultado: str) -> None:
+    METRICS.inc_counter("osiris_impresion_prerender_total", labels={"resultado": resultado})
 
 
 def record_unauthorized_access(reason: str) -> None:
@@ -27,8 +27,70 @@ class Settings(BaseSettings):
     SRI_MODO_EMISION: str = Field(default="ELECTRONICO")
     FEEC_TIPO_EMISION: str
     FEEC_REGIMEN: str
+    # Cliente SOAP del SRI: conexiones keep-alive reutilizadas por todos los documentos.
+    FEEC_SRI_TIMEOUT_SECONDS: float = Field(default=30.0)
+    FEEC_SRI_POOL_MAXSIZE: int = Field(default=10)
+    # Circuit breaker: fallos de transporte consecutivos que pausan la cola FE y
+    # segundos de pausa antes de sondear el SRI con un solo documento.
+    FE_SRI_CIRCUITO_UMBRAL_FALLOS: int = Field(default=5)
+    FE_SRI_CIRCUITO_ENFRIAMIENTO_SECONDS: int = Field(default=60)
+    # Lote masivo SRI: facturas del mismo RUC en un solo envío de hasta FE_SRI_LOTE_TAMANO
+    # comprobantes; un lote incompleto espera hasta FE_SRI_LOTE_ESPERA_SECONDS.
+    FE_SRI_LOTE_ENABLED: bool = Field(default=False)
+    FE_SRI_LOTE_TAMANO: int = Field(default=50)
+    FE_SRI_LOTE_ESPERA_SECONDS: int = Field(default=30)
     FE_QUEUE_AUTO_PROCESS_ENABLED: bool = Field(default=True)
     FE_QUEUE_POLL_INTERVAL_SECONDS: int = Field(default=60)
+    # Cada réplica reclama lotes con SELECT ... FOR UPDATE SKIP LOCKED y un lease;
+    # la concurrencia es el tamaño del pool de hilos que procesa cada lote.
+    FE_QUEUE_CONCURRENCY: int = Field(default=4)
+    FE_QUEUE_BATCH_SIZE: int = Field(default=20)
+    FE_QUEUE_LEASE_SECONDS: int = Field(default=300)
+    FE_QUEUE_NOTIFY_ENABLED: bool = Field(default=True)
+    FE_QUEUE_CANAL_NOTIFICACION: str = Field(default="osiris_fe_cola")
+    # Cada cuánto el worker publica profundidad y antigüedad de la cola FE en /metrics.
+    FE_QUEUE_METRICAS_INTERVAL_SECONDS: int = Field(default=30)
+    # Almacén del XML autorizado y de los payloads de la cola FE, fuera de las filas calientes:
+    # BD (comprimido en tbl_blob_comprimido) | ARCHIVOS (por SHA-256 bajo FE_BLOB_DIRECTORIO,
+    # obligatorio con ARCHIVOS y fuera del árbol del código, p. ej. /var/lib/osiris/fe_blobs).
+    FE_BLOB_BACKEND: str = Field(default="BD")
+    FE_BLOB_DIRECTORIO: Path | None = Field(default=None)
+    # Hilos que ejecutan reintentos SRI y correos vencidos (un solo despachador por proceso).
+    FE_PROGRAMADOR_WORKERS: int = Field(default=4)
+    # COMPLETA: verificación inline en cada confirmación | MUESTREO: inline solo en una
+    # fracción de confirmaciones | DIFERIDA: la conciliación asíncrona verifica después.
+    INVENTARIO_VERIFICACION_MODO: str = Field(default="COMPLETA")
+    INVENTARIO_VERIFICACION_MUESTREO_RATIO: float = Field(default=0.1)
+    INVENTARIO_CONCILIACION_AUTO_ENABLED: bool = Field(default=True)
+    INVENTARIO_CONCILIACION_POLL_INTERVAL_SECONDS: int = Field(default=300)
+    INVENTARIO_CONCILIACION_LOTE: int = Field(default=500)
+    # Lotes del barrido completo por corrida; el barrido continúa en la siguiente desde su cursor.
+    INVENTARIO_CONCILIACION_LOTES_POR_CORRIDA: int = Field(default=20)
+    # Cache en proceso de stock (producto, bodega) para consultas de disponibilidad.
+    STOCK_CACHE_ENABLED: bool = Field(default=True)
+    STOCK_CACHE_MAX_ENTRIES: int = Field(default=20000)
+    STOCK_CACHE_TTL_SECONDS: int = Field(default=60)
+    STOCK_CACHE_CANAL_INVALIDACION: str = Field(default="osiris_stock_cache")
+    # Bytecode de plantillas de impresión en disco: un proceso nuevo no recompila los
+    # templates Jinja2. Sin valor solo se cachean en memoria del proceso.
+    IMPRESION_PLANTILLAS_BYTECODE_DIR: Path | None = Field(default=None)
+    # Cache de PDFs de comprobantes autorizados: LRU en memoria y nivel en disco, ambos por tamaño.
+    # Sin IMPRESION_CACHE_DIRECTORIO (p. ej. /var/cache/osiris/impresion) solo hay nivel en memoria.
+    IMPRESION_CACHE_ENABLED: bool = Field(default=True)
+    IMPRESION_CACHE_MEMORIA_MB: int = Field(default=64)
+    IMPRESION_CACHE_DIRECTORIO: Path | None = Field(default=None)
+    IMPRESION_CACHE_DISCO_MB: int = Field(default=1024)
+    # Render de PDFs (WeasyPrint) en un pool propio, fuera del threadpool de FastAPI. Con
+    # IMPRESION_RENDER_PROCESOS=false usa hilos. Admite WORKERS + MAX_COLA renders; el resto recibe 503.
+    IMPRESION_RENDER_PROCESOS: bool = Field(default=True)
+    IMPRESION_RENDER_WORKERS: int = Field(default=2)
+    IMPRESION_RENDER_MAX_COLA: int = Field(default=8)
+    IMPRESION_RENDER_TIMEOUT_SECONDS: float = Field(default=30.0)
+    # Al autorizarse una factura se renderiza su RIDE A4 en segundo plano hacia el cache de
+    # impresión: la primera descarga y el adjunto del correo ya no esperan el render.
+    IMPRESION_PRERENDER_AUTORIZADO_ENABLED: bool = Field(default=False)
+    # Máximo de documentos por impresión en lote (ZIP de RIDEs).
+    IMPRESION_LOTE_MAX_DOCUMENTOS: int = Field(default=500)
     OBSERVABILITY_JSON_LOGS_ENABLED: bool = Field(default=True)
     OBSERVABILITY_METRICS_ENABLED: bool = Field(default=True)
     OBSERVABILITY_DB_METRICS_ENABLED: bool = Field(default=True)
@@ -88,6 +150,48 @@ class Settings(BaseSettings):
             raise ValueError(f"FEEC_REGIMEN invalido. Valores permitidos: {allowed_values}")
         return normalized
 
+    @field_validator("FEEC_SRI_TIMEOUT_SECONDS")
+    @classmethod
+    def _check_feec_sri_timeout_seconds(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("FEEC_SRI_TIMEOUT_SECONDS debe ser > 0")
+        return value
+
+    @field_validator("FEEC_SRI_POOL_MAXSIZE")
+    @classmethod
+    def _check_feec_sri_pool_maxsize(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("FEEC_SRI_POOL_MAXSIZE debe ser >= 1")
+        return value
+
+    @field_validator("FE_SRI_CIRCUITO_UMBRAL_FALLOS")
+    @classmethod
+    def _check_fe_sri_circuito_umbral_fallos(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("FE_SRI_CIRCUITO_UMBRAL_FALLOS debe ser >= 1")
+        return value
+
+    @field_validator("FE_SRI_CIRCUITO_ENFRIAMIENTO_SECONDS")
+    @classmethod
+    def _check_fe_sri_circuito_enfriamiento_seconds(cls, value: int) -> int:
+        if value < 5:
+            raise ValueError("FE_SRI_CIRCUITO_ENFRIAMIENTO_SECONDS debe ser >= 5 segundos")
+        return value
+
+    @field_validator("FE_SRI_LOTE_TAMANO")
+    @classmethod
+    def _check_fe_sri_lote_tamano(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("FE_SRI_LOTE_TAMANO debe ser >= 1")
+        return value
+
+    @field_validator("FE_SRI_LOTE_ESPERA_SECONDS")
+    @classmethod
+    def _check_fe_sri_lote_espera_seconds(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("FE_SRI_LOTE_ESPERA_SECONDS debe ser >= 0")
+        return value
+
     @field_validator("FE_QUEUE_POLL_INTERVAL_SECONDS")
     @classmethod
     def _check_fe_queue_poll_interval_seconds(cls, value: int) -> int:
@@ -95,6 +199,145 @@ class Settings(BaseSettings):
             raise ValueError("FE_QUEUE_POLL_INTERVAL_SECONDS debe ser >= 5 segundos")
         return value
 
+    @field_validator("FE_QUEUE_CONCURRENCY")
+    @classmethod
+    def _check_fe_queue_concurrency(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("FE_QUEUE_CONCURRENCY debe ser >= 1")
+        return value
+
+    @field_validator("FE_QUEUE_BATCH_SIZE")
+    @classmethod
+    def _check_fe_queue_batch_size(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("FE_QUEUE_BATCH_SIZE debe ser >= 1")
+        return value
+
+    @field_validator("FE_QUEUE_LEASE_SECONDS")
+    @classmethod
+    def _check_fe_queue_lease_seconds(cls, value: int) -> int:
+        if value < 30:
+            raise ValueError("FE_QUEUE_LEASE_SECONDS debe ser >= 30 segundos")
+        return value
+
+    @field_validator("FE_QUEUE_METRICAS_INTERVAL_SECONDS")
+    @classmethod
+    def _check_fe_queue_metricas_interval_seconds(cls, value: int) -> int:
+        if value < 5:
+            raise ValueError("FE_QUEUE_METRICAS_INTERVAL_SECONDS debe ser >= 5 segundos")
+        return value
+
+    @field_validator("FE_BLOB_BACKEND")
+    @classmethod
+    def _check_fe_blob_backend(cls, value: str) -> str:
+        normalized = value.strip().upper()
+        allowed = {"BD", "ARCHIVOS"}
+        if normalized not in allowed:
+            raise ValueError(f"FE_BLOB_BACKEND invalido. Valores permitidos: {', '.join(sorted(allowed))}")
+        return normalized
+
+    @field_validator("FE_PROGRAMADOR_WORKERS")
+    @classmethod
+    def _check_fe_programador_workers(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("FE_PROGRAMADOR_WORKERS debe ser >= 1")
+        return value
+
+    @field_validator("INVENTARIO_VERIFICACION_MODO")
+    @classmethod
+    def _check_inventario_verificacion_modo(cls, value: str) -> str:
+        normalized = value.strip().upper()
+        allowed = {"COMPLETA", "MUESTREO", "DIFERIDA"}
+        if normalized not in allowed:
+            raise ValueError(
+                f"INVENTARIO_VERIFICACION_MODO invalido. Valores permitidos: {', '.join(sorted(allowed))}"
+            )
+        return normalized
+
+    @field_validator("INVENTARIO_VERIFICACION_MUESTREO_RATIO")
+    @classmethod
+    def _check_inventario_verificacion_muestreo_ratio(cls, value: float) -> float:
+        if not 0 <= value <= 1:
+            raise ValueError("INVENTARIO_VERIFICACION_MUESTREO_RATIO debe estar entre 0 y 1")
+        return value
+
+    @field_validator("INVENTARIO_CONCILIACION_POLL_INTERVAL_SECONDS")
+    @classmethod
+    def _check_inventario_conciliacion_poll_interval_seconds(cls, value: int) -> int:
+        if value < 5:
+            raise ValueError("INVENTARIO_CONCILIACION_POLL_INTERVAL_SECONDS debe ser >= 5 segundos")
+        return value
+
+    @field_validator("INVENTARIO_CONCILIACION_LOTE")
+    @classmethod
+    def _check_inventario_conciliacion_lote(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("INVENTARIO_CONCILIACION_LOTE debe ser >= 1")
+        return value
+
+    @field_validator("INVENTARIO_CONCILIACION_LOTES_POR_CORRIDA")
+    @classmethod
+    def _check_inventario_conciliacion_lotes_por_corrida(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("INVENTARIO_CONCILIACION_LOTES_POR_CORRIDA debe ser >= 1")
+        return value
+
+    @field_validator("STOCK_CACHE_MAX_ENTRIES")
+    @classmethod
+    def _check_stock_cache_max_entries(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("STOCK_CACHE_MAX_ENTRIES debe ser >= 1")
+        return value
+
+    @field_validator("STOCK_CACHE_TTL_SECONDS")
+    @classmethod
+    def _check_stock_cache_ttl_seconds(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("STOCK_CACHE_TTL_SECONDS debe ser >= 0 (0 desactiva la expiracion)")
+        return value
+
+    @field_validator("IMPRESION_CACHE_MEMORIA_MB")
+    @classmethod
+    def _check_impresion_cache_memoria_mb(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("IMPRESION_CACHE_MEMORIA_MB debe ser >= 0 (0 desactiva el nivel en memoria)")
+        return value
+
+    @field_validator("IMPRESION_CACHE_DISCO_MB")
+    @classmethod
+    def _check_impresion_cache_disco_mb(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("IMPRESION_CACHE_DISCO_MB debe ser >= 0 (0 desactiva el nivel en disco)")
+        return value
+
+    @field_validator("IMPRESION_RENDER_WORKERS")
+    @classmethod
+    def _check_impresion_render_workers(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("IMPRESION_RENDER_WORKERS debe ser >= 1")
+        return value
+
+    @field_validator("IMPRESION_RENDER_MAX_COLA")
+    @classmethod
+    def _check_impresion_render_max_cola(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("IMPRESION_RENDER_MAX_COLA debe ser >= 0")
+        return value
+
+    @field_validator("IMPRESION_RENDER_TIMEOUT_SECONDS")
+    @classmethod
+    def _check_impresion_render_timeout_seconds(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("IMPRESION_RENDER_TIMEOUT_SECONDS debe ser > 0")
+        return value
+
+    @field_validator("IMPRESION_LOTE_MAX_DOCUMENTOS")
+    @classmethod
+    def _check_impresion_lote_max_documentos(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("IMPRESION_LOTE_MAX_DOCUMENTOS debe ser >= 1")
+        return value
+
     @field_validator("LOG_LEVEL")
     @classmethod
     def _check_log_level(cls, value: str) -> str:
@@ -118,6 +361,12 @@ class Settings(BaseSettings):
             raise ValueError("SCALABILITY_MAX_IN_FLIGHT_REQUESTS debe ser >= 0")
         return value
 
+    @model_validator(mode="after")
+    def _validate_fe_blob_directorio(self):
+        if self.FE_BLOB_BACKEND == "ARCHIVOS" and self.FE_BLOB_DIRECTORIO is None:
+            raise ValueError("FE_BLOB_DIRECTORIO es obligatorio cuando FE_BLOB_BACKEND=ARCHIVOS")
+        return self
+
     @model_validator(mode="after")
     def _validate_feec_files(self):
         if self.SRI_MODO_EMISION == "ELECTRONICO":
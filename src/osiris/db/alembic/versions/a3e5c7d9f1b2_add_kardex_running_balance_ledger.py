@@ -0,0 +1,141 @@
+"""add kardex running balance ledger
+
+Revision ID: a3e5c7d9f1b2
+Revises: 9f1d3c2a7b44
+Create Date: 2026-03-02 10:15:00.000000
+
+Después de aplicar esta revisión ejecutar la reconstrucción de kardex
+(POST /api/v1/inventarios/kardex/reconstrucciones) antes de habilitar la
+conciliación: el backfill no conoce el orden de confirmación histórico.
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a3e5c7d9f1b2"
+down_revision = "9f1d3c2a7b44"
+branch_labels = None
+depends_on = None
+
+
+# Movimientos que afectaron stock: los confirmados y los anulados que tuvieron reverso.
+_MOVIMIENTOS_APLICADOS = """
+    m.estado = 'CONFIRMADO'
+    OR (
+        m.estado = 'ANULADO'
+        AND EXISTS (
+            SELECT 1
+            FROM tbl_movimiento_inventario r
+            WHERE r.referencia_documento = 'REVERSO:' || m.id::text
+        )
+    )
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "tbl_movimiento_inventario_detalle",
+        sa.Column("saldo_cantidad", sa.Numeric(14, 4), nullable=True),
+    )
+    op.add_column(
+        "tbl_movimiento_inventario_detalle",
+        sa.Column("saldo_valor", sa.Numeric(14, 4), nullable=True),
+    )
+    op.add_column(
+        "tbl_movimiento_inventario_detalle",
+        sa.Column("costo_promedio_saldo", sa.Numeric(14, 4), nullable=True),
+    )
+    op.add_column(
+        "tbl_inventario_stock",
+        sa.Column("kardex_saldo_cantidad", sa.Numeric(14, 4), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column(
+        "tbl_inventario_stock",
+        sa.Column("kardex_saldo_valor", sa.Numeric(14, 4), nullable=False, server_default=sa.text("0")),
+    )
+
+    # Backfill del saldo corrido por línea en orden cronológico del kardex (fecha, creado_en).
+    # En ejecución el saldo se encadena desde la cabecera en orden de confirmación, que no
+    # queda registrado para el histórico; con movimientos retroactivos ambos órdenes difieren.
+    # Tras esta migración se debe ejecutar POST /api/v1/inventarios/kardex/reconstrucciones
+    # para que el histórico quede calculado por el mismo motor que el kardex y la conciliación.
+    op.execute(
+        f"""
+        UPDATE tbl_movimiento_inventario_detalle d
+        SET saldo_cantidad = x.saldo_cantidad,
+            saldo_valor = x.saldo_valor,
+            costo_promedio_saldo = CASE
+                WHEN x.saldo_cantidad > 0 THEN ROUND(x.saldo_valor / x.saldo_cantidad, 4)
+                ELSE 0
+            END
+        FROM (
+            SELECT
+                d2.id,
+                SUM(
+                    CASE WHEN m.tipo_movimiento IN ('EGRESO', 'TRANSFERENCIA') THEN -d2.cantidad ELSE d2.cantidad END
+                ) OVER w AS saldo_cantidad,
+                SUM(
+                    CASE
+                        WHEN m.tipo_movimiento IN ('EGRESO', 'TRANSFERENCIA')
+                            THEN -ROUND(d2.cantidad * d2.costo_unitario, 4)
+                        ELSE ROUND(d2.cantidad * d2.costo_unitario, 4)
+                    END
+                ) OVER w AS saldo_valor
+            FROM tbl_movimiento_inventario_detalle d2
+            JOIN tbl_movimiento_inventario m ON m.id = d2.movimiento_inventario_id
+            WHERE d2.activo IS TRUE
+              AND m.activo IS TRUE
+              AND ({_MOVIMIENTOS_APLICADOS})
+            WINDOW w AS (
+                PARTITION BY m.bodega_id, d2.producto_id
+                ORDER BY m.fecha, m.creado_en, d2.id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+            )
+        ) x
+        WHERE d.id = x.id
+        """
+    )
+
+    # La cabecera del ledger en stock es el total acumulado por producto/bodega.
+    op.execute(
+        f"""
+        UPDATE tbl_inventario_stock s
+        SET kardex_saldo_cantidad = x.saldo_cantidad,
+            kardex_saldo_valor = x.saldo_valor
+        FROM (
+            SELECT
+                m.bodega_id,
+                d.producto_id,
+                SUM(
+                    CASE WHEN m.tipo_movimiento IN ('EGRESO', 'TRANSFERENCIA') THEN -d.cantidad ELSE d.cantidad END
+                ) AS saldo_cantidad,
+                SUM(
+                    CASE
+                        WHEN m.tipo_movimiento IN ('EGRESO', 'TRANSFERENCIA')
+                            THEN -ROUND(d.cantidad * d.costo_unitario, 4)
+                        ELSE ROUND(d.cantidad * d.costo_unitario, 4)
+                    END
+                ) AS saldo_valor
+            FROM tbl_movimiento_inventario_detalle d
+            JOIN tbl_movimiento_inventario m ON m.id = d.movimiento_inventario_id
+            WHERE d.activo IS TRUE
+              AND m.activo IS TRUE
+              AND ({_MOVIMIENTOS_APLICADOS})
+            GROUP BY m.bodega_id, d.producto_id
+        ) x
+        WHERE s.bodega_id = x.bodega_id
+          AND s.producto_id = x.producto_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("tbl_inventario_stock", "kardex_saldo_valor")
+    op.drop_column("tbl_inventario_stock", "kardex_saldo_cantidad")
+    op.drop_column("tbl_movimiento_inventario_detalle", "costo_promedio_saldo")
+    op.drop_column("tbl_movimiento_inventario_detalle", "saldo_valor")
+    op.drop_column("tbl_movimiento_inventario_detalle", "saldo_cantidad")
@@ -0,0 +1,37 @@
+"""add indexes for FE queue depth metrics
+
+Revision ID: a7c9e1f3b5d8
+Revises: e1a3c5f7b9d4
+Create Date: 2026-03-20 10:15:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "a7c9e1f3b5d8"
+down_revision = "e1a3c5f7b9d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_tbl_documento_electronico_activo_estado_sri_creado",
+        "tbl_documento_electronico",
+        ["activo", "estado_sri", "creado_en"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_tbl_documento_sri_cola_activo_estado",
+        "tbl_documento_sri_cola",
+        ["activo", "estado"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tbl_documento_sri_cola_activo_estado", table_name="tbl_documento_sri_cola")
+    op.drop_index("ix_tbl_documento_electronico_activo_estado_sri_creado", table_name="tbl_documento_electronico")
@@ -0,0 +1,77 @@
+"""add kardex cierre mensual table
+
+Revision ID: b5d7f9a1c3e4
+Revises: a3e5c7d9f1b2
+Create Date: 2026-03-04 09:40:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b5d7f9a1c3e4"
+down_revision = "a3e5c7d9f1b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tbl_kardex_cierre_mensual",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("creado_en", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("actualizado_en", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("created_by", sa.String(length=255), nullable=True),
+        sa.Column("updated_by", sa.String(length=255), nullable=True),
+        sa.Column("usuario_auditoria", sa.String(), nullable=True),
+        sa.Column("activo", sa.Boolean(), nullable=False, server_default=sa.text("true")),
+        sa.Column("bodega_id", sa.Uuid(), nullable=False),
+        sa.Column("producto_id", sa.Uuid(), nullable=False),
+        sa.Column("fecha_corte", sa.Date(), nullable=False),
+        sa.Column("saldo_cantidad", sa.Numeric(14, 4), nullable=False, server_default=sa.text("0")),
+        sa.Column("saldo_valor", sa.Numeric(14, 4), nullable=False, server_default=sa.text("0")),
+        sa.Column("costo_promedio", sa.Numeric(14, 4), nullable=False, server_default=sa.text("0")),
+        sa.ForeignKeyConstraint(["bodega_id"], ["tbl_bodega.id"]),
+        sa.ForeignKeyConstraint(["producto_id"], ["tbl_producto.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "bodega_id",
+            "producto_id",
+            "fecha_corte",
+            name="uq_tbl_kardex_cierre_mensual_bodega_producto_corte",
+        ),
+    )
+    op.create_index(op.f("ix_tbl_kardex_cierre_mensual_id"), "tbl_kardex_cierre_mensual", ["id"], unique=False)
+    op.create_index(op.f("ix_tbl_kardex_cierre_mensual_activo"), "tbl_kardex_cierre_mensual", ["activo"], unique=False)
+    op.create_index(
+        op.f("ix_tbl_kardex_cierre_mensual_created_by"), "tbl_kardex_cierre_mensual", ["created_by"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_kardex_cierre_mensual_updated_by"), "tbl_kardex_cierre_mensual", ["updated_by"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_kardex_cierre_mensual_bodega_id"), "tbl_kardex_cierre_mensual", ["bodega_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_kardex_cierre_mensual_fecha_corte"), "tbl_kardex_cierre_mensual", ["fecha_corte"], unique=False
+    )
+    op.create_index(
+        "ix_tbl_kardex_cierre_mensual_producto_bodega_corte",
+        "tbl_kardex_cierre_mensual",
+        ["producto_id", "bodega_id", "fecha_corte"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tbl_kardex_cierre_mensual_producto_bodega_corte", table_name="tbl_kardex_cierre_mensual")
+    op.drop_index(op.f("ix_tbl_kardex_cierre_mensual_fecha_corte"), table_name="tbl_kardex_cierre_mensual")
+    op.drop_index(op.f("ix_tbl_kardex_cierre_mensual_bodega_id"), table_name="tbl_kardex_cierre_mensual")
+    op.drop_index(op.f("ix_tbl_kardex_cierre_mensual_updated_by"), table_name="tbl_kardex_cierre_mensual")
+    op.drop_index(op.f("ix_tbl_kardex_cierre_mensual_created_by"), table_name="tbl_kardex_cierre_mensual")
+    op.drop_index(op.f("ix_tbl_kardex_cierre_mensual_activo"), table_name="tbl_kardex_cierre_mensual")
+    op.drop_index(op.f("ix_tbl_kardex_cierre_mensual_id"), table_name="tbl_kardex_cierre_mensual")
+    op.drop_table("tbl_kardex_cierre_mensual")
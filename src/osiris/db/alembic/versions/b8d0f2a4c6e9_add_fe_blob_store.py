@@ -0,0 +1,48 @@
+"""add FE blob store and blob references
+
+Revision ID: b8d0f2a4c6e9
+Revises: a7c9e1f3b5d8
+Create Date: 2026-03-24 11:30:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b8d0f2a4c6e9"
+down_revision = "a7c9e1f3b5d8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tbl_blob_comprimido",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("codec", sa.String(length=10), nullable=False),
+        sa.Column("tamano", sa.Integer(), nullable=False),
+        sa.Column("contenido", sa.LargeBinary(), nullable=False),
+        sa.Column("creado_en", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_tbl_blob_comprimido_id"), "tbl_blob_comprimido", ["id"], unique=False)
+    op.create_index(op.f("ix_tbl_blob_comprimido_sha256"), "tbl_blob_comprimido", ["sha256"], unique=True)
+
+    op.add_column("tbl_documento_electronico", sa.Column("xml_autorizado_ref", sa.String(length=80), nullable=True))
+    op.add_column("tbl_documento_sri_cola", sa.Column("payload_ref", sa.String(length=80), nullable=True))
+    op.alter_column("tbl_documento_sri_cola", "payload_json", existing_type=sa.Text(), nullable=True)
+
+
+def downgrade() -> None:
+    # Los payloads ya externalizados no se reconstruyen: esas tareas quedan con '{}'.
+    op.execute("UPDATE tbl_documento_sri_cola SET payload_json = '{}' WHERE payload_json IS NULL")
+    op.alter_column("tbl_documento_sri_cola", "payload_json", existing_type=sa.Text(), nullable=False)
+    op.drop_column("tbl_documento_sri_cola", "payload_ref")
+    op.drop_column("tbl_documento_electronico", "xml_autorizado_ref")
+    op.drop_index(op.f("ix_tbl_blob_comprimido_sha256"), table_name="tbl_blob_comprimido")
+    op.drop_index(op.f("ix_tbl_blob_comprimido_id"), table_name="tbl_blob_comprimido")
+    op.drop_table("tbl_blob_comprimido")
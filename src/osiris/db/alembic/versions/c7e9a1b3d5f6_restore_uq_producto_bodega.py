@@ -0,0 +1,55 @@
+"""restore unique producto-bodega constraint
+
+Revision ID: c7e9a1b3d5f6
+Revises: b5d7f9a1c3e4
+Create Date: 2026-03-06 10:15:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "c7e9a1b3d5f6"
+down_revision = "b5d7f9a1c3e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # fc65b5f4ec8d eliminó la restricción por autogeneración; la sincronización
+    # producto-bodega usa upsert (ON CONFLICT) y la necesita de vuelta.
+    # Antes de recrearla se conserva una sola relación por par (la más reciente).
+    op.execute(
+        """
+        DELETE FROM tbl_producto_bodega pb
+        USING (
+            SELECT
+                id,
+                ROW_NUMBER() OVER (
+                    PARTITION BY producto_id, bodega_id
+                    ORDER BY activo DESC, actualizado_en DESC, creado_en DESC, id DESC
+                ) AS rn
+            FROM tbl_producto_bodega
+        ) dup
+        WHERE pb.id = dup.id
+          AND dup.rn > 1
+        """
+    )
+    op.execute(
+        """
+        UPDATE tbl_producto_bodega pb
+        SET cantidad = s.cantidad_actual
+        FROM tbl_inventario_stock s
+        WHERE s.producto_id = pb.producto_id
+          AND s.bodega_id = pb.bodega_id
+          AND s.activo IS TRUE
+          AND pb.cantidad <> s.cantidad_actual
+        """
+    )
+    op.create_unique_constraint("uq_producto_bodega", "tbl_producto_bodega", ["producto_id", "bodega_id"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_producto_bodega", "tbl_producto_bodega", type_="unique")
@@ -0,0 +1,76 @@
+"""add inventario discrepancia table
+
+Revision ID: d9f1b3c5e7a2
+Revises: c7e9a1b3d5f6
+Create Date: 2026-03-09 11:20:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d9f1b3c5e7a2"
+down_revision = "c7e9a1b3d5f6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tbl_inventario_discrepancia",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("creado_en", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("actualizado_en", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("created_by", sa.String(length=255), nullable=True),
+        sa.Column("updated_by", sa.String(length=255), nullable=True),
+        sa.Column("usuario_auditoria", sa.String(), nullable=True),
+        sa.Column("activo", sa.Boolean(), nullable=False, server_default=sa.text("true")),
+        sa.Column("bodega_id", sa.Uuid(), nullable=True),
+        sa.Column("producto_id", sa.Uuid(), nullable=False),
+        sa.Column("tipo", sa.String(length=30), nullable=False),
+        sa.Column("valor_esperado", sa.Numeric(14, 4), nullable=False),
+        sa.Column("valor_actual", sa.Numeric(14, 4), nullable=False),
+        sa.Column("diferencia", sa.Numeric(14, 4), nullable=False),
+        sa.Column("detectada_en", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("resuelta", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+        sa.Column("resuelta_en", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["bodega_id"], ["tbl_bodega.id"]),
+        sa.ForeignKeyConstraint(["producto_id"], ["tbl_producto.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_tbl_inventario_discrepancia_id"), "tbl_inventario_discrepancia", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_tbl_inventario_discrepancia_activo"), "tbl_inventario_discrepancia", ["activo"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_discrepancia_created_by"), "tbl_inventario_discrepancia", ["created_by"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_discrepancia_updated_by"), "tbl_inventario_discrepancia", ["updated_by"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_discrepancia_bodega_id"), "tbl_inventario_discrepancia", ["bodega_id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_discrepancia_producto_id"), "tbl_inventario_discrepancia", ["producto_id"], unique=False
+    )
+    op.create_index(
+        "ix_tbl_inventario_discrepancia_abiertas",
+        "tbl_inventario_discrepancia",
+        ["resuelta", "tipo", "producto_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tbl_inventario_discrepancia_abiertas", table_name="tbl_inventario_discrepancia")
+    op.drop_index(op.f("ix_tbl_inventario_discrepancia_producto_id"), table_name="tbl_inventario_discrepancia")
+    op.drop_index(op.f("ix_tbl_inventario_discrepancia_bodega_id"), table_name="tbl_inventario_discrepancia")
+    op.drop_index(op.f("ix_tbl_inventario_discrepancia_updated_by"), table_name="tbl_inventario_discrepancia")
+    op.drop_index(op.f("ix_tbl_inventario_discrepancia_created_by"), table_name="tbl_inventario_discrepancia")
+    op.drop_index(op.f("ix_tbl_inventario_discrepancia_activo"), table_name="tbl_inventario_discrepancia")
+    op.drop_index(op.f("ix_tbl_inventario_discrepancia_id"), table_name="tbl_inventario_discrepancia")
+    op.drop_table("tbl_inventario_discrepancia")
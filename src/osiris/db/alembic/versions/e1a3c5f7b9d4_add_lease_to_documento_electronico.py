@@ -0,0 +1,35 @@
+"""add queue lease columns to documento electronico
+
+Revision ID: e1a3c5f7b9d4
+Revises: d9f1b3c5e7a2
+Create Date: 2026-03-12 09:40:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e1a3c5f7b9d4"
+down_revision = "d9f1b3c5e7a2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("tbl_documento_electronico", sa.Column("reclamado_por", sa.String(length=80), nullable=True))
+    op.add_column("tbl_documento_electronico", sa.Column("reclamado_hasta", sa.DateTime(), nullable=True))
+    op.create_index(
+        op.f("ix_tbl_documento_electronico_reclamado_hasta"),
+        "tbl_documento_electronico",
+        ["reclamado_hasta"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_tbl_documento_electronico_reclamado_hasta"), table_name="tbl_documento_electronico")
+    op.drop_column("tbl_documento_electronico", "reclamado_hasta")
+    op.drop_column("tbl_documento_electronico", "reclamado_por")
@@ -0,0 +1,91 @@
+"""add inventario conciliacion pending queue and sweep cursor
+
+Revision ID: e2f4a6b8c0d1
+Revises: b8d0f2a4c6e9
+Create Date: 2026-03-27 09:40:00.000000
+"""
+
+from __future__ import annotations
+
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e2f4a6b8c0d1"
+down_revision = "b8d0f2a4c6e9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tbl_inventario_conciliacion_pendiente",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("bodega_id", sa.Uuid(), nullable=False),
+        sa.Column("producto_id", sa.Uuid(), nullable=False),
+        sa.Column("encolado_en", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.ForeignKeyConstraint(["bodega_id"], ["tbl_bodega.id"]),
+        sa.ForeignKeyConstraint(["producto_id"], ["tbl_producto.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("bodega_id", "producto_id", name="uq_tbl_inventario_conciliacion_pendiente_par"),
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_conciliacion_pendiente_id"),
+        "tbl_inventario_conciliacion_pendiente",
+        ["id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_conciliacion_pendiente_encolado_en"),
+        "tbl_inventario_conciliacion_pendiente",
+        ["encolado_en"],
+        unique=False,
+    )
+
+    op.create_table(
+        "tbl_inventario_conciliacion_cursor",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("nombre", sa.String(length=40), nullable=False),
+        sa.Column("bodega_id", sa.Uuid(), nullable=True),
+        sa.Column("producto_id", sa.Uuid(), nullable=True),
+        sa.Column("vuelta_iniciada_en", sa.DateTime(), nullable=True),
+        sa.Column("vuelta_completada_en", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_conciliacion_cursor_id"),
+        "tbl_inventario_conciliacion_cursor",
+        ["id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_tbl_inventario_conciliacion_cursor_nombre"),
+        "tbl_inventario_conciliacion_cursor",
+        ["nombre"],
+        unique=True,
+    )
+    # La fila del barrido existe de antemano: las réplicas solo compiten por su lock.
+    cursor = sa.table(
+        "tbl_inventario_conciliacion_cursor",
+        sa.column("id", sa.Uuid()),
+        sa.column("nombre", sa.String()),
+    )
+    op.bulk_insert(cursor, [{"id": uuid.uuid4(), "nombre": "barrido"}])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_tbl_inventario_conciliacion_cursor_nombre"), table_name="tbl_inventario_conciliacion_cursor")
+    op.drop_index(op.f("ix_tbl_inventario_conciliacion_cursor_id"), table_name="tbl_inventario_conciliacion_cursor")
+    op.drop_table("tbl_inventario_conciliacion_cursor")
+    op.drop_index(
+        op.f("ix_tbl_inventario_conciliacion_pendiente_encolado_en"),
+        table_name="tbl_inventario_conciliacion_pendiente",
+    )
+    op.drop_index(
+        op.f("ix_tbl_inventario_conciliacion_pendiente_id"),
+        table_name="tbl_inventario_conciliacion_pendiente",
+    )
+    op.drop_table("tbl_inventario_conciliacion_pendiente")
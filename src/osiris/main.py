@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import threading
 import time
 from contextlib import asynccontextmanager, suppress
 
@@ -28,11 +29,13 @@ from osiris.core.observability import (
     new_request_id,
     observe_request_latency_seconds,
     record_db_request_summary,
+    record_fe_worker_despertar,
     record_fe_worker_error,
     record_fe_worker_run,
     record_http_overload_rejection,
     record_http_in_flight,
     record_http_request,
+    record_inventario_conciliacion_error,
     record_readiness_check,
     record_unauthorized_access,
     get_http_in_flight,
@@ -64,18 +67,26 @@ from osiris.modules.common.tipo_cliente.router import router as tipo_cliente_rou
 from osiris.modules.common.usuario.router import router as usuario_router
 from osiris.modules.compras.router import router as compras_router
 from osiris.modules.impresion.router import router as impresion_router
+from osiris.modules.impresion.services.pool_render import pool_render
 from osiris.modules.inventario.atributo.router import router as atributo_router
 from osiris.modules.inventario.bodega.router import router as bodega_router
 from osiris.modules.inventario.casa_comercial.router import router as casa_comercial_router
 from osiris.modules.inventario.categoria.router import router as categoria_router
 from osiris.modules.inventario.categoria_atributo.router import router as categoria_atributo_router
 from osiris.modules.inventario.movimientos.router import router as movimientos_router
+from osiris.modules.inventario.movimientos.services.conciliacion_inventario_service import (
+    ConciliacionInventarioService,
+)
+from osiris.modules.inventario.movimientos.services.stock_cache_service import stock_cache
 from osiris.modules.inventario.producto.router import router as producto_router
 from osiris.modules.inventario.producto_bodega.router import router as producto_bodega_router
 from osiris.modules.inventario.producto_impuesto.router import router as producto_impuesto_router
 from osiris.modules.reportes.router import router as reportes_router
 from osiris.modules.sri.facturacion_electronica.router import router as facturacion_electronica_router
+from osiris.modules.sri.facturacion_electronica.services.cola_fe_notificaciones import despertador_cola_fe
+from osiris.modules.sri.facturacion_electronica.services.firma_xml_service import obtener_firmador
 from osiris.modules.sri.facturacion_electronica.services.orquestador_fe_service import OrquestadorFEService
+from osiris.modules.sri.facturacion_electronica.services.programador_tareas import programador_tareas
 from osiris.modules.sri.impuesto_catalogo.router import router as impuesto_catalogo_router
 from osiris.modules.ventas.router import router as ventas_router
 
@@ -87,10 +98,62 @@ def _resolve_log_level(level_name: str) -> int:
     return getattr(logging, level_name.upper(), logging.INFO)
 
 
+_fe_queue_service: OrquestadorFEService | None = None
+
+
+def _obtener_servicio_cola_fe() -> OrquestadorFEService:
+    global _fe_queue_service
+    if _fe_queue_service is None:
+        _fe_queue_service = OrquestadorFEService()
+    return _fe_queue_service
+
+
 def _procesar_cola_fe_once() -> int:
-    service = OrquestadorFEService()
+    # Lotes consecutivos mientras vengan llenos: tras una caída del SRI el backlog
+    # se drena sin esperar un intervalo de polling por cada lote.
+    servicio = _obtener_servicio_cola_fe()
+    tamano_lote = get_settings().FE_QUEUE_BATCH_SIZE
+    total = 0
     with Session(engine) as session:
-        return service.procesar_cola(session)
+        while True:
+            procesados = servicio.procesar_cola(session)
+            total += procesados
+            if procesados < tamano_lote:
+                return total
+
+
+_ultima_medicion_cola_fe: float | None = None
+
+
+def _medir_cola_fe() -> None:
+    global _ultima_medicion_cola_fe
+    ahora = time.monotonic()
+    intervalo = get_settings().FE_QUEUE_METRICAS_INTERVAL_SECONDS
+    if _ultima_medicion_cola_fe is not None and ahora - _ultima_medicion_cola_fe < intervalo:
+        return
+    _ultima_medicion_cola_fe = ahora
+    try:
+        with Session(engine) as session:
+            _obtener_servicio_cola_fe().medir_cola(session)
+    except Exception as exc:  # pragma: no cover - protección operacional
+        logger.warning("No se pudieron medir las métricas de la cola FE: %s", exc)
+
+
+def _rehidratar_reintentos_sri() -> None:
+    servicio = _obtener_servicio_cola_fe()
+    try:
+        reprogramados = programador_tareas.rehidratar(
+            engine,
+            {
+                "VENTA": servicio.venta_sri_service.procesar_documento_sri,
+                "RETENCION": servicio.retencion_sri_service.procesar_documento_sri,
+            },
+        )
+    except Exception as exc:  # pragma: no cover - protección operacional
+        logger.warning("No se pudieron rehidratar los reintentos SRI programados: %s", exc)
+        return
+    if reprogramados:
+        logger.info("Reprogramados %s reintentos SRI pendientes tras el arranque.", reprogramados)
 
 
 def _check_db_ready_sync() -> bool:
@@ -99,33 +162,109 @@ def _check_db_ready_sync() -> bool:
     return True
 
 
+async def _esperar_despertar_fe(despertar: asyncio.Event, poll_interval_seconds: int) -> str:
+    try:
+        await asyncio.wait_for(despertar.wait(), timeout=poll_interval_seconds)
+    except asyncio.TimeoutError:
+        return "intervalo"
+    return "notificacion"
+
+
 async def _run_fe_queue_worker(poll_interval_seconds: int) -> None:
+    # Los encolados despiertan al worker de inmediato; el intervalo queda como respaldo.
+    loop = asyncio.get_running_loop()
+    despertar = asyncio.Event()
+    cancelar_suscripcion = despertador_cola_fe.suscribir(lambda: loop.call_soon_threadsafe(despertar.set))
+    try:
+        while True:
+            motivo = await _esperar_despertar_fe(despertar, poll_interval_seconds)
+            # Se limpia antes de procesar: un encolado durante la pasada provoca otra.
+            despertar.clear()
+            record_fe_worker_despertar(motivo=motivo)
+            await _procesar_cola_fe_pasada()
+    finally:
+        cancelar_suscripcion()
+
+
+async def _procesar_cola_fe_pasada() -> None:
+    try:
+        procesados = await run_in_threadpool(_procesar_cola_fe_once)
+        record_fe_worker_run(processed=procesados)
+        await run_in_threadpool(_medir_cola_fe)
+        if procesados:
+            logger.info("Worker FE procesó %s documentos de la cola.", procesados)
+    except Exception as exc:  # pragma: no cover - protección operacional
+        record_fe_worker_error()
+        logger.exception("Error en worker FE al procesar cola: %s", exc)
+
+
+def _conciliar_inventario_once(tamano_lote: int) -> dict[str, int]:
+    service = ConciliacionInventarioService(tamano_lote=tamano_lote)
+    with Session(engine) as session:
+        return service.ejecutar(session)
+
+
+async def _run_inventario_conciliacion_worker(poll_interval_seconds: int, tamano_lote: int) -> None:
     while True:
         await asyncio.sleep(poll_interval_seconds)
         try:
-            procesados = await run_in_threadpool(_procesar_cola_fe_once)
-            record_fe_worker_run(processed=procesados)
-            if procesados:
-                logger.info("Worker FE procesó %s documentos de la cola.", procesados)
+            resumen = await run_in_threadpool(_conciliar_inventario_once, tamano_lote)
+            if resumen["discrepancias_nuevas"]:
+                logger.warning(
+                    "Conciliación de inventario detectó %s discrepancias nuevas (%s abiertas).",
+                    resumen["discrepancias_nuevas"],
+                    resumen["discrepancias_abiertas"],
+                )
         except Exception as exc:  # pragma: no cover - protección operacional
-            record_fe_worker_error()
-            logger.exception("Error en worker FE al procesar cola: %s", exc)
+            record_inventario_conciliacion_error()
+            logger.exception("Error en conciliación de inventario: %s", exc)
 
 
 @asynccontextmanager
 async def lifespan(app_instance: FastAPI):
     # Fuerza validacion de settings al arranque para fail-fast con mensaje claro.
     app_settings = get_settings()
-    worker_task = None
+    if app_settings.SRI_MODO_EMISION == "ELECTRONICO":
+        # Descifra el PKCS#12 una vez al arranque; las firmas posteriores solo usan la clave en memoria.
+        obtener_firmador()
+    # Los reintentos programados antes de un reinicio siguen en la base con su vencimiento.
+    await run_in_threadpool(_rehidratar_reintentos_sri)
+    worker_tasks = []
     if app_settings.FE_QUEUE_AUTO_PROCESS_ENABLED:
         worker_task = asyncio.create_task(
             _run_fe_queue_worker(app_settings.FE_QUEUE_POLL_INTERVAL_SECONDS)
         )
         app_instance.state.fe_queue_worker_task = worker_task
+        worker_tasks.append(worker_task)
+    if app_settings.INVENTARIO_CONCILIACION_AUTO_ENABLED:
+        conciliacion_task = asyncio.create_task(
+            _run_inventario_conciliacion_worker(
+                app_settings.INVENTARIO_CONCILIACION_POLL_INTERVAL_SECONDS,
+                app_settings.INVENTARIO_CONCILIACION_LOTE,
+            )
+        )
+        app_instance.state.inventario_conciliacion_task = conciliacion_task
+        worker_tasks.append(conciliacion_task)
+    detener_listeners = threading.Event()
+    if app_settings.FE_QUEUE_AUTO_PROCESS_ENABLED and despertador_cola_fe.habilitado:
+        fe_listener_task = asyncio.create_task(
+            asyncio.to_thread(despertador_cola_fe.escuchar, app_settings.DATABASE_URL, detener_listeners)
+        )
+        app_instance.state.fe_queue_listener_task = fe_listener_task
+        worker_tasks.append(fe_listener_task)
+    if app_settings.STOCK_CACHE_ENABLED:
+        stock_cache_task = asyncio.create_task(
+            asyncio.to_thread(stock_cache.escuchar, app_settings.DATABASE_URL, detener_listeners)
+        )
+        app_instance.state.stock_cache_listener_task = stock_cache_task
+        worker_tasks.append(stock_cache_task)
     try:
         yield
     finally:
-        if worker_task is not None:
+        detener_listeners.set()
+        programador_tareas.detener()
+        pool_render.detener()
+        for worker_task in worker_tasks:
             worker_task.cancel()
             with suppress(asyncio.CancelledError):
                 await worker_task
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from pathlib import Path
+
+from osiris.core.settings import get_settings
+
+
+# Plantillas compiladas que Jinja2 conserva en memoria por entorno (RIDE, tickets, preimpresa).
+_TAMANO_CACHE_PLANTILLAS = 64
+
+_entornos: dict[str, object] = {}
+_versiones: dict[tuple[str, int | None], str] = {}
+_lock = threading.Lock()
+
+
+def _crear_entorno(templates_dir: Path):
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape  # type: ignore
+
+    settings = get_settings()
+    bytecode_cache = None
+    if settings.IMPRESION_PLANTILLAS_BYTECODE_DIR is not None:
+        settings.IMPRESION_PLANTILLAS_BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(settings.IMPRESION_PLANTILLAS_BYTECODE_DIR))
+    return Environment(
+        loader=FileSystemLoader(str(templates_dir)),
+        autoescape=select_autoescape(["html", "xml"]),
+        cache_size=_TAMANO_CACHE_PLANTILLAS,
+        # Fuera de development las plantillas no cambian en caliente: no se hace stat por render.
+        auto_reload=settings.ENVIRONMENT == "development",
+        bytecode_cache=bytecode_cache,
+    )
+
+
+def obtener_entorno(templates_dir: Path):
+    """
+    Entorno Jinja2 compartido por el proceso para un directorio de plantillas.
+
+    Lanza ModuleNotFoundError si Jinja2 no está instalado, para que cada estrategia
+    use su render de respaldo.
+    """
+    clave = str(Path(templates_dir).resolve())
+    entorno = _entornos.get(clave)
+    if entorno is None:
+        with _lock:
+            entorno = _entornos.get(clave)
+            if entorno is None:
+                entorno = _crear_entorno(Path(clave))
+                _entornos[clave] = entorno
+    return entorno
+
+
+def renderizar_plantilla(templates_dir: Path, nombre: str, context: dict) -> str:
+    """Renderiza `nombre` con la plantilla compilada en cache; FileNotFoundError si no existe."""
+    from jinja2 import TemplateNotFound  # type: ignore
+
+    try:
+        template = obtener_entorno(templates_dir).get_template(nombre)
+    except TemplateNotFound:
+        raise FileNotFoundError(f"No existe la plantilla: {nombre}") from None
+    return template.render(**context)
+
+
+def version_plantilla(templates_dir: Path, nombre: str) -> str:
+    """
+    Huella del contenido de la plantilla, para versionar lo que se renderizó con ella.
+
+    Fuera de development se calcula una vez por proceso, igual que la plantilla compilada.
+    """
+    ruta = Path(templates_dir).resolve() / nombre
+    mtime = ruta.stat().st_mtime_ns if get_settings().ENVIRONMENT == "development" else None
+    clave = (str(ruta), mtime)
+    version = _versiones.get(clave)
+    if version is None:
+        version = hashlib.sha256(ruta.read_bytes()).hexdigest()[:16]
+        with _lock:
+            _versiones[clave] = version
+    return version
+
+
+def limpiar_cache_plantillas() -> None:
+    with _lock:
+        _entornos.clear()
+        _versiones.clear()
@@ -4,12 +4,13 @@ from typing import Literal
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, Query
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from sqlmodel import Session
 
 from osiris.core.audit_context import get_current_user_id
 from osiris.core.db import get_session
-from osiris.modules.impresion.schemas import ReimpresionRequest
+from osiris.modules.impresion.schemas import ImpresionLoteRequest, ReimpresionRequest
+from osiris.modules.impresion.services.impresion_lote_service import ImpresionLoteService
 from osiris.modules.impresion.services.impresion_service import ImpresionService
 
 
@@ -21,6 +22,7 @@ COMMON_RESPONSES = {
 
 router = APIRouter(prefix="/api/v1/impresion", tags=["Impresión"])
 impresion_service = ImpresionService()
+impresion_lote_service = ImpresionLoteService(impresion_service)
 
 
 @router.get("/documento/{documento_id}/a4", summary="Generar RIDE A4", responses=COMMON_RESPONSES, response_class=Response)
@@ -78,3 +80,20 @@ def reimprimir_documento(
     if resultado["media_type"] == "application/pdf":
         return Response(content=resultado["content"], media_type="application/pdf", headers=headers)
     return HTMLResponse(content=resultado["content"], headers=headers)
+
+
+@router.post("/lote", summary="Imprimir RIDEs A4 en lote", responses=COMMON_RESPONSES, response_class=StreamingResponse)
+def imprimir_lote(payload: ImpresionLoteRequest, session: Session = Depends(get_session)):
+    documentos = impresion_lote_service.resolver_documentos(
+        session,
+        documento_ids=payload.documento_ids,
+        fecha_desde=payload.fecha_desde,
+        fecha_hasta=payload.fecha_hasta,
+        punto_emision_id=payload.punto_emision_id,
+    )
+    headers = {"Content-Disposition": 'attachment; filename="rides-lote.zip"'}
+    return StreamingResponse(
+        impresion_lote_service.generar_zip(session.get_bind(), documentos),
+        media_type="application/zip",
+        headers=headers,
+    )
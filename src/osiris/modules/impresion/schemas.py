@@ -1,11 +1,32 @@
 from __future__ import annotations
 
+from datetime import date
 from typing import Literal
+from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class ReimpresionRequest(BaseModel):
     motivo: str = Field(min_length=1, max_length=255)
     formato: Literal["A4", "TICKET_80MM", "TICKET_58MM"]
 
+
+class ImpresionLoteRequest(BaseModel):
+    documento_ids: list[UUID] | None = Field(default=None, min_length=1)
+    fecha_desde: date | None = None
+    fecha_hasta: date | None = None
+    punto_emision_id: UUID | None = None
+    formato: Literal["ZIP"] = "ZIP"
+
+    @model_validator(mode="after")
+    def validar_seleccion(self):
+        if self.documento_ids is not None:
+            if self.fecha_desde or self.fecha_hasta or self.punto_emision_id:
+                raise ValueError("Indique documento_ids o un filtro por fechas, no ambos.")
+            return self
+        if self.fecha_desde is None or self.fecha_hasta is None:
+            raise ValueError("Indique documento_ids o el rango fecha_desde/fecha_hasta.")
+        if self.fecha_desde > self.fecha_hasta:
+            raise ValueError("fecha_desde no puede ser posterior a fecha_hasta.")
+        return self
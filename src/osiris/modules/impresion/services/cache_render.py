@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from uuid import UUID
+
+from osiris.core.observability import record_impresion_cache_lookup
+from osiris.core.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+# Tras desalojar, el disco queda bajo este porcentaje del máximo para no podar en cada escritura.
+_PODA_OBJETIVO = 0.9
+_LOCKS_RENDER = 64
+
+
+class CacheRender:
+    """
+    Cache en dos niveles de documentos impresos (PDF) de comprobantes AUTORIZADOS.
+
+    La clave se deriva de (documento, formato, versión); la versión resume la
+    plantilla y la marca de la empresa, así un cambio en cualquiera produce otra
+    clave y lo anterior deja de leerse sin invalidación explícita.
+
+    Memoria: LRU acotado por bytes. Disco: un archivo por clave, compartido entre
+    workers del mismo host; al superar el máximo se desalojan los menos leídos
+    recientemente (mtime, que se actualiza en cada acierto).
+    """
+
+    def __init__(
+        self,
+        *,
+        habilitado: bool | None = None,
+        max_bytes_memoria: int | None = None,
+        directorio: Path | str | None = None,
+        max_bytes_disco: int | None = None,
+    ) -> None:
+        settings = get_settings()
+        self.habilitado = settings.IMPRESION_CACHE_ENABLED if habilitado is None else habilitado
+        self.max_bytes_memoria = (
+            settings.IMPRESION_CACHE_MEMORIA_MB * _MB if max_bytes_memoria is None else max_bytes_memoria
+        )
+        self.max_bytes_disco = settings.IMPRESION_CACHE_DISCO_MB * _MB if max_bytes_disco is None else max_bytes_disco
+        raiz = settings.IMPRESION_CACHE_DIRECTORIO if directorio is None else directorio
+        self.directorio = Path(raiz) if raiz is not None and self.max_bytes_disco > 0 else None
+        self._memoria: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes_memoria = 0
+        # Total en disco estimado por este proceso; la poda lo recalcula recorriendo el directorio.
+        self._bytes_disco: int | None = None
+        self._lock = threading.Lock()
+        # Locks por franja de clave: un mismo documento se renderiza una sola vez aunque lo
+        # pidan a la vez la descarga, el correo y el pre-render.
+        self._locks_render = [threading.Lock() for _ in range(_LOCKS_RENDER)]
+
+    @staticmethod
+    def clave(*, documento_id: UUID, formato: str, version: str) -> str:
+        return hashlib.sha256(f"{documento_id}|{formato}|{version}".encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / clave[:2] / f"{clave}.pdf"
+
+    def _buscar(self, clave: str) -> tuple[bytes | None, str]:
+        with self._lock:
+            contenido = self._memoria.get(clave)
+            if contenido is not None:
+                self._memoria.move_to_end(clave)
+        if contenido is not None:
+            return contenido, "memoria"
+
+        if self.directorio is not None:
+            ruta = self._ruta(clave)
+            try:
+                contenido = ruta.read_bytes()
+                os.utime(ruta)
+            except FileNotFoundError:
+                contenido = None
+            if contenido is not None:
+                self._guardar_memoria(clave, contenido)
+                return contenido, "disco"
+        return None, "miss"
+
+    def obtener(self, clave: str) -> bytes | None:
+        if not self.habilitado:
+            return None
+        contenido, resultado = self._buscar(clave)
+        record_impresion_cache_lookup(resultado=resultado)
+        return contenido
+
+    def obtener_o_generar(self, clave: str, generar: Callable[[], bytes]) -> bytes:
+        """Contenido cacheado de `clave`; si falta, lo genera una sola vez y lo guarda."""
+        if not self.habilitado:
+            return generar()
+        contenido, resultado = self._buscar(clave)
+        if contenido is None:
+            with self._locks_render[hash(clave) % _LOCKS_RENDER]:
+                contenido, resultado = self._buscar(clave)
+                if contenido is None:
+                    contenido = generar()
+                    self.guardar(clave, contenido)
+        record_impresion_cache_lookup(resultado=resultado)
+        return contenido
+
+    def guardar(self, clave: str, contenido: bytes) -> None:
+        if not self.habilitado:
+            return
+        self._guardar_memoria(clave, contenido)
+        if self.directorio is None or len(contenido) > self.max_bytes_disco:
+            return
+        try:
+            self._guardar_disco(clave, contenido)
+        except OSError as exc:
+            # El disco es una optimización: sin él se sigue sirviendo desde memoria.
+            logger.warning("No se pudo guardar el render %s en disco: %s", clave, exc)
+
+    def _guardar_memoria(self, clave: str, contenido: bytes) -> None:
+        if len(contenido) > self.max_bytes_memoria:
+            return
+        with self._lock:
+            anterior = self._memoria.pop(clave, None)
+            if anterior is not None:
+                self._bytes_memoria -= len(anterior)
+            self._memoria[clave] = contenido
+            self._bytes_memoria += len(contenido)
+            while self._bytes_memoria > self.max_bytes_memoria:
+                _clave, desalojado = self._memoria.popitem(last=False)
+                self._bytes_memoria -= len(desalojado)
+
+    def _guardar_disco(self, clave: str, contenido: bytes) -> None:
+        ruta = self._ruta(clave)
+        if ruta.exists():
+            return
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as archivo:
+                archivo.write(contenido)
+            os.replace(temporal, ruta)
+        except BaseException:
+            Path(temporal).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if self._bytes_disco is None:
+                self._bytes_disco = sum(tamano for _ruta, tamano, _mtime in self._archivos_disco())
+            else:
+                self._bytes_disco += len(contenido)
+            excedido = self._bytes_disco > self.max_bytes_disco
+        if excedido:
+            self._podar_disco()
+
+    def _archivos_disco(self) -> list[tuple[Path, int, float]]:
+        archivos = []
+        for ruta in self.directorio.glob("*/*.pdf"):
+            try:
+                estado = ruta.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((ruta, estado.st_size, estado.st_mtime))
+        return archivos
+
+    def _podar_disco(self) -> None:
+        archivos = sorted(self._archivos_disco(), key=lambda archivo: archivo[2])
+        total = sum(tamano for _ruta, tamano, _mtime in archivos)
+        objetivo = int(self.max_bytes_disco * _PODA_OBJETIVO)
+        for ruta, tamano, _mtime in archivos:
+            if total <= objetivo:
+                break
+            ruta.unlink(missing_ok=True)
+            total -= tamano
+        with self._lock:
+            self._bytes_disco = total
+
+    def limpiar_memoria(self) -> None:
+        with self._lock:
+            self._memoria.clear()
+            self._bytes_memoria = 0
+
+
+cache_render = CacheRender()
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import io
+import logging
+import zipfile
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from osiris.core.settings import get_settings
+from osiris.modules.impresion.services.impresion_service import ImpresionService
+from osiris.modules.sri.core_sri.models import (
+    DocumentoElectronico,
+    EstadoDocumentoElectronico,
+    TipoDocumentoElectronico,
+    Venta,
+)
+
+
+logger = logging.getLogger(__name__)
+
+DocumentoLote = tuple[UUID, str]  # (documento_id, nombre de archivo)
+
+
+class _SalidaZip(io.RawIOBase):
+    """Destino no buscable de ZipFile: acumula lo escrito hasta que el stream lo entrega."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._bloques: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, datos) -> int:
+        self._bloques.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._bloques)
+        self._bloques.clear()
+        return datos
+
+
+class ImpresionLoteService:
+    """
+    Impresión en lote de RIDEs A4 (cierre del día, fin de mes) como ZIP.
+
+    Cada RIDE sale del cache de impresión o del pool de render. Los renders corren
+    en una ventana de hilos del tamaño del pool, así el lote no acapara los cupos
+    de las descargas individuales ni acumula en memoria más PDFs que la ventana.
+    """
+
+    def __init__(self, impresion_service: ImpresionService | None = None) -> None:
+        self.impresion_service = impresion_service or ImpresionService()
+
+    @staticmethod
+    def _nombre_archivo(documento: DocumentoElectronico) -> str:
+        return f"ride-{documento.clave_acceso or documento.id}.pdf"
+
+    def resolver_documentos(
+        self,
+        session: Session,
+        *,
+        documento_ids: list[UUID] | None = None,
+        fecha_desde: date | None = None,
+        fecha_hasta: date | None = None,
+        punto_emision_id: UUID | None = None,
+    ) -> list[DocumentoLote]:
+        max_documentos = get_settings().IMPRESION_LOTE_MAX_DOCUMENTOS
+        if documento_ids is not None:
+            ids = list(dict.fromkeys(documento_ids))
+            if len(ids) > max_documentos:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El lote excede el máximo de {max_documentos} documentos.",
+                )
+            encontrados = {
+                documento.id: documento
+                for documento in session.exec(
+                    select(DocumentoElectronico).where(
+                        DocumentoElectronico.id.in_(ids),
+                        DocumentoElectronico.activo.is_(True),
+                    )
+                ).all()
+            }
+            faltantes = [str(documento_id) for documento_id in ids if documento_id not in encontrados]
+            if faltantes:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Documentos electrónicos no encontrados: {', '.join(faltantes)}",
+                )
+            no_autorizados = [
+                str(documento_id)
+                for documento_id in ids
+                if encontrados[documento_id].estado_sri != EstadoDocumentoElectronico.AUTORIZADO
+            ]
+            if no_autorizados:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Solo se pueden imprimir documentos AUTORIZADOS: {', '.join(no_autorizados)}",
+                )
+            return [(documento_id, self._nombre_archivo(encontrados[documento_id])) for documento_id in ids]
+
+        stmt = (
+            select(DocumentoElectronico)
+            .join(Venta, Venta.id == DocumentoElectronico.venta_id)
+            .where(
+                DocumentoElectronico.activo.is_(True),
+                DocumentoElectronico.tipo_documento == TipoDocumentoElectronico.FACTURA,
+                DocumentoElectronico.estado_sri == EstadoDocumentoElectronico.AUTORIZADO,
+                Venta.fecha_emision >= fecha_desde,
+                Venta.fecha_emision <= fecha_hasta,
+            )
+            .order_by(Venta.fecha_emision.asc(), DocumentoElectronico.creado_en.asc())
+            .limit(max_documentos + 1)
+        )
+        if punto_emision_id is not None:
+            stmt = stmt.where(Venta.punto_emision_id == punto_emision_id)
+        documentos = list(session.exec(stmt).all())
+        if not documentos:
+            raise HTTPException(status_code=404, detail="No hay documentos AUTORIZADOS para el filtro indicado.")
+        if len(documentos) > max_documentos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El lote excede el máximo de {max_documentos} documentos; acote el filtro.",
+            )
+        return [(documento.id, self._nombre_archivo(documento)) for documento in documentos]
+
+    def _renderizar(self, db_engine, documento_id: UUID) -> bytes:
+        # Una sesión por hilo: la del request no puede compartirse entre hilos.
+        with Session(db_engine) as session:
+            return self.impresion_service.generar_ride_a4(session, documento_id=documento_id, esperar_cupo=True)
+
+    def _renders(
+        self,
+        db_engine,
+        documentos: list[DocumentoLote],
+    ) -> Iterator[tuple[str, bytes | None, str | None]]:
+        """(nombre, pdf, error) de cada documento, en el orden en que terminan sus renders."""
+        ventana = self.impresion_service.pool.workers
+        executor = ThreadPoolExecutor(max_workers=ventana, thread_name_prefix="impresion-lote")
+        pendientes: deque[tuple[str, Future]] = deque()
+        restantes = iter(documentos)
+
+        def _llenar_ventana() -> None:
+            while len(pendientes) < ventana:
+                siguiente = next(restantes, None)
+                if siguiente is None:
+                    return
+                documento_id, nombre = siguiente
+                pendientes.append((nombre, executor.submit(self._renderizar, db_engine, documento_id)))
+
+        def _resultado(nombre: str, future: Future) -> tuple[str, bytes | None, str | None]:
+            try:
+                return nombre, future.result(), None
+            except HTTPException as exc:
+                return nombre, None, str(exc.detail)
+            except Exception as exc:
+                logger.exception("Error renderizando %s en lote: %s", nombre, exc)
+                return nombre, None, "Error interno al renderizar el RIDE."
+
+        try:
+            _llenar_ventana()
+            while pendientes:
+                wait([future for _nombre, future in pendientes], return_when=FIRST_COMPLETED)
+                nombre, future = next(item for item in pendientes if item[1].done())
+                pendientes.remove((nombre, future))
+                resultado = _resultado(nombre, future)
+                _llenar_ventana()
+                yield resultado
+        finally:
+            # Cliente desconectado a mitad del lote: no se renderiza lo que falta.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def generar_zip(self, db_engine, documentos: list[DocumentoLote]) -> Iterator[bytes]:
+        """ZIP transmitido por partes: cada RIDE se escribe en cuanto termina su render."""
+        salida = _SalidaZip()
+        errores: list[str] = []
+        # Los PDFs ya vienen comprimidos: se guardan sin volver a comprimir.
+        with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_STORED) as archivo_zip:
+            for nombre, pdf, error in self._renders(db_engine, documentos):
+                if pdf is None:
+                    errores.append(f"{nombre}: {error}")
+                    continue
+                archivo_zip.writestr(nombre, pdf)
+                yield salida.vaciar()
+            if errores:
+                archivo_zip.writestr("errores.txt", "\n".join(errores) + "\n")
+        yield salida.vaciar()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 from datetime import datetime
 from pathlib import Path
 from uuid import UUID
@@ -23,6 +24,9 @@ from osiris.modules.sri.core_sri.models import (
 )
 from osiris.modules.sri.core_sri.types import FormaPagoSRI
 from osiris.modules.ventas.models import CuentaPorCobrar, PagoCxC
+from osiris.modules.impresion.plantillas import renderizar_plantilla, version_plantilla
+from osiris.modules.impresion.services.cache_render import CacheRender, cache_render
+from osiris.modules.impresion.services.pool_render import PoolRender, pool_render
 from osiris.modules.impresion.strategies.plantilla_preimpresa_strategy import (
     PlantillaPreimpresaStrategy,
 )
@@ -32,8 +36,15 @@ from osiris.modules.impresion.strategies.ticket_termico_strategy import TicketTe
 
 
 class ImpresionService:
-    def __init__(self, strategy: RenderStrategy | None = None) -> None:
+    def __init__(
+        self,
+        strategy: RenderStrategy | None = None,
+        cache: CacheRender | None = None,
+        pool: PoolRender | None = None,
+    ) -> None:
         self.strategy = strategy or RideA4Strategy()
+        self.cache = cache or cache_render
+        self.pool = pool or pool_render
         self.ticket_strategy = TicketTermicoStrategy(Path(__file__).resolve().parents[1] / "templates")
         self.preimpresa_strategy = PlantillaPreimpresaStrategy(Path(__file__).resolve().parents[1] / "templates")
         self.templates_dir = Path(__file__).resolve().parents[1] / "templates"
@@ -65,21 +76,15 @@ class ImpresionService:
         return f"data:image/svg+xml;base64,{encoded}"
 
     def _render_html(self, context: dict) -> str:
-        template_path = self.templates_dir / "ride_a4.html"
-        if not template_path.exists():
-            raise HTTPException(status_code=500, detail="Plantilla RIDE A4 no encontrada.")
-
         try:
-            from jinja2 import Environment, FileSystemLoader, select_autoescape  # type: ignore
-
-            env = Environment(
-                loader=FileSystemLoader(str(self.templates_dir)),
-                autoescape=select_autoescape(["html", "xml"]),
-            )
-            template = env.get_template("ride_a4.html")
-            return template.render(**context)
+            return renderizar_plantilla(self.templates_dir, "ride_a4.html", context)
+        except FileNotFoundError:
+            raise HTTPException(status_code=500, detail="Plantilla RIDE A4 no encontrada.") from None
         except ModuleNotFoundError:
             # Fallback para entornos sin Jinja2 instalado.
+            template_path = self.templates_dir / "ride_a4.html"
+            if not template_path.exists():
+                raise HTTPException(status_code=500, detail="Plantilla RIDE A4 no encontrada.") from None
             template = template_path.read_text(encoding="utf-8")
             html = template
             html = html.replace("{{ razon_social }}", str(context["razon_social"]))
@@ -94,7 +99,8 @@ class ImpresionService:
             html = html.replace("{{ logo_url }}", str(context["logo_url"]))
             return html
 
-    def _payload_from_documento(self, session: Session, documento: DocumentoElectronico) -> dict:
+    @staticmethod
+    def _venta_empresa(session: Session, documento: DocumentoElectronico) -> tuple[Venta | None, Empresa | None]:
         venta = None
         if documento.tipo_documento == TipoDocumentoElectronico.FACTURA:
             venta_id = documento.referencia_id or documento.venta_id
@@ -102,6 +108,38 @@ class ImpresionService:
                 venta = session.get(Venta, venta_id)
 
         empresa = session.get(Empresa, venta.empresa_id) if venta and venta.empresa_id else None
+        return venta, empresa
+
+    def _version_ride_a4(self, empresa: Empresa | None) -> str:
+        # Un documento AUTORIZADO no cambia: el PDF solo varía con la plantilla, el motor y la marca.
+        try:
+            version = version_plantilla(self.templates_dir, "ride_a4.html")
+        except FileNotFoundError:
+            raise HTTPException(status_code=500, detail="Plantilla RIDE A4 no encontrada.") from None
+        partes = [
+            version,
+            type(self.strategy).__name__,
+            get_settings().FEEC_AMBIENTE,
+        ]
+        if empresa is not None:
+            partes.extend(
+                str(valor or "")
+                for valor in (
+                    empresa.razon_social,
+                    empresa.nombre_comercial,
+                    empresa.ruc,
+                    empresa.direccion_matriz,
+                    empresa.logo,
+                )
+            )
+        return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()[:16]
+
+    def _payload_from_documento(
+        self,
+        documento: DocumentoElectronico,
+        venta: Venta | None,
+        empresa: Empresa | None,
+    ) -> dict:
         settings = get_settings()
         ambiente = "Pruebas" if settings.FEEC_AMBIENTE.lower() == "pruebas" else "Produccion"
 
@@ -129,16 +167,32 @@ class ImpresionService:
             "barcode_data_uri": self._barcode_data_uri(clave),
         }
 
-    def generar_ride_a4(self, session: Session, *, documento_id: UUID) -> bytes:
+    def _documento_autorizado(self, session: Session, documento_id: UUID) -> DocumentoElectronico:
         documento = session.get(DocumentoElectronico, documento_id)
         if not documento or not documento.activo:
             raise HTTPException(status_code=404, detail="Documento electrónico no encontrado.")
         if documento.estado_sri != EstadoDocumentoElectronico.AUTORIZADO:
             raise HTTPException(status_code=400, detail="Solo se puede imprimir RIDE de documentos AUTORIZADOS.")
+        return documento
+
+    def obtener_ride_a4_cacheado(self, session: Session, *, documento_id: UUID) -> bytes | None:
+        """RIDE A4 ya generado (p. ej. por el pre-render); None si no está en cache. Nunca renderiza."""
+        documento = self._documento_autorizado(session, documento_id)
+        _venta, empresa = self._venta_empresa(session, documento)
+        return self.cache.obtener(
+            self.cache.clave(documento_id=documento.id, formato="A4", version=self._version_ride_a4(empresa))
+        )
+
+    def generar_ride_a4(self, session: Session, *, documento_id: UUID, esperar_cupo: bool = False) -> bytes:
+        documento = self._documento_autorizado(session, documento_id)
+        venta, empresa = self._venta_empresa(session, documento)
+        clave = self.cache.clave(documento_id=documento.id, formato="A4", version=self._version_ride_a4(empresa))
+
+        def _renderizar() -> bytes:
+            payload = self._payload_from_documento(documento, venta, empresa)
+            return self.pool.render_pdf(self.strategy, self._render_html(payload), esperar=esperar_cupo)
 
-        payload = self._payload_from_documento(session, documento)
-        html = self._render_html(payload)
-        return self.strategy.render_pdf(html)
+        return self.cache.obtener_o_generar(clave, _renderizar)
 
     def generar_ticket_termico_html(
         self,
@@ -313,7 +367,7 @@ class ImpresionService:
     ) -> dict[str, bytes | str | None]:
         resultado_html = self.generar_preimpresa_html(session, documento_id=documento_id)
         return {
-            "pdf": self.preimpresa_strategy.render_pdf(str(resultado_html["html"])),
+            "pdf": self.pool.render_pdf(self.preimpresa_strategy, str(resultado_html["html"])),
             "warning": resultado_html["warning"],
         }
 
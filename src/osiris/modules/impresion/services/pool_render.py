@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+from osiris.core.observability import record_impresion_render, record_impresion_render_pendientes
+from osiris.core.settings import get_settings
+from osiris.modules.impresion.strategies.render_strategy import RenderStrategy
+
+
+logger = logging.getLogger(__name__)
+
+_RETRY_AFTER_SEGUNDOS = 5
+
+
+def _render_pdf(strategy: RenderStrategy, html_content: str) -> bytes:
+    return strategy.render_pdf(html_content)
+
+
+class PoolRender:
+    """
+    Render de PDFs fuera del threadpool de FastAPI.
+
+    WeasyPrint es CPU intensivo: en un pool de procesos no compite por el GIL con
+    los endpoints CRUD. La admisión está acotada a `workers + max_cola` renders;
+    el siguiente se rechaza de inmediato con 503 y Retry-After, así una ráfaga de
+    descargas A4 nunca retiene más de ese número de hilos del servidor esperando.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int | None = None,
+        max_cola: int | None = None,
+        timeout_segundos: float | None = None,
+        procesos: bool | None = None,
+    ) -> None:
+        settings = get_settings()
+        self.workers = workers or settings.IMPRESION_RENDER_WORKERS
+        self.max_cola = settings.IMPRESION_RENDER_MAX_COLA if max_cola is None else max_cola
+        self.timeout_segundos = timeout_segundos or settings.IMPRESION_RENDER_TIMEOUT_SECONDS
+        self.procesos = settings.IMPRESION_RENDER_PROCESOS if procesos is None else procesos
+        self._cupos = threading.BoundedSemaphore(self.workers + self.max_cola)
+        self._lock = threading.Lock()
+        self._executor: Executor | None = None
+        self._pid: int | None = None
+        self._pendientes = 0
+
+    def _obtener_executor(self) -> Executor:
+        with self._lock:
+            # Tras un fork (workers de gunicorn) el pool del padre no es utilizable en el hijo.
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                if self.procesos:
+                    # spawn: el proceso de la API tiene hilos vivos y un fork podría heredar locks tomados.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render-pdf")
+            return self._executor
+
+    def _cambiar_pendientes(self, delta: int) -> None:
+        with self._lock:
+            self._pendientes += delta
+            pendientes = self._pendientes
+        record_impresion_render_pendientes(pendientes)
+
+    def _liberar(self, _future: Future) -> None:
+        self._cambiar_pendientes(-1)
+        self._cupos.release()
+
+    @staticmethod
+    def _no_disponible(detalle: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=detalle,
+            headers={"Retry-After": str(_RETRY_AFTER_SEGUNDOS)},
+        )
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return self._pendientes
+
+    def render_pdf(self, strategy: RenderStrategy, html_content: str, *, esperar: bool = False) -> bytes:
+        """
+        Renderiza en el pool. Sin cupo responde 503 de inmediato, salvo con `esperar`
+        (lotes), que aguarda un cupo hasta el timeout del render.
+        """
+        if esperar:
+            admitido = self._cupos.acquire(timeout=self.timeout_segundos)
+        else:
+            admitido = self._cupos.acquire(blocking=False)
+        if not admitido:
+            record_impresion_render(resultado="saturado")
+            raise self._no_disponible("Servicio de impresión saturado. Reintente en breve.")
+
+        inicio = time.monotonic()
+        self._cambiar_pendientes(+1)
+        try:
+            future = self._obtener_executor().submit(_render_pdf, strategy, html_content)
+        except BaseException:
+            self._liberar(None)
+            raise
+        future.add_done_callback(self._liberar)
+
+        try:
+            pdf = future.result(timeout=self.timeout_segundos)
+        except FuturesTimeoutError:
+            # Si aún no empezó se descarta; si ya corre, su cupo se libera al terminar.
+            future.cancel()
+            record_impresion_render(resultado="timeout", duracion_segundos=time.monotonic() - inicio)
+            raise self._no_disponible("El render del PDF excedió el tiempo máximo. Reintente en breve.") from None
+        except BrokenProcessPool:
+            logger.error("Pool de render PDF caído; se recreará en el siguiente render.")
+            with self._lock:
+                self._executor = None
+            record_impresion_render(resultado="error", duracion_segundos=time.monotonic() - inicio)
+            raise self._no_disponible("Servicio de impresión no disponible. Reintente en breve.") from None
+        except Exception:
+            record_impresion_render(resultado="error", duracion_segundos=time.monotonic() - inicio)
+            raise
+        record_impresion_render(resultado="ok", duracion_segundos=time.monotonic() - inicio)
+        return pdf
+
+    def detener(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+pool_render = PoolRender()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import logging
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from osiris.core.db import engine as default_engine
+from osiris.core.observability import record_impresion_prerender
+from osiris.core.settings import get_settings
+from osiris.modules.impresion.services.impresion_service import ImpresionService
+from osiris.modules.sri.facturacion_electronica.services.programador_tareas import programador_tareas
+
+
+logger = logging.getLogger(__name__)
+
+
+def prerenderizar_ride_a4(documento_id: UUID, *, db_engine=None) -> None:
+    """Renderiza el RIDE A4 de un documento recién AUTORIZADO y lo deja en el cache de impresión."""
+    with Session(db_engine or default_engine) as session:
+        try:
+            ImpresionService().generar_ride_a4(session, documento_id=documento_id)
+        except HTTPException as exc:
+            # Pool saturado o documento no imprimible: la descarga lo renderizará bajo demanda.
+            record_impresion_prerender(resultado="omitido")
+            logger.info("Pre-render del RIDE %s omitido: %s", documento_id, exc.detail)
+            return
+    record_impresion_prerender(resultado="ok")
+
+
+def programar_prerender_ride_a4(documento_id: UUID, *, db_engine=None) -> None:
+    if not get_settings().IMPRESION_PRERENDER_AUTORIZADO_ENABLED:
+        return
+    programador_tareas.programar(
+        f"prerender-ride:{documento_id}",
+        0,
+        prerenderizar_ride_a4,
+        documento_id=documento_id,
+        db_engine=db_engine,
+    )
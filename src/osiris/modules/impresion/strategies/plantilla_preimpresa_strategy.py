@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 
+from osiris.modules.impresion.plantillas import renderizar_plantilla
 from osiris.modules.impresion.strategies.render_strategy import RenderStrategy
 from osiris.modules.impresion.strategies.ride_a4_strategy import _build_minimal_pdf
 
@@ -12,21 +13,14 @@ class PlantillaPreimpresaStrategy(RenderStrategy):
 
     def render_html(self, context: dict) -> str:
         template_name = "nota_venta_preimpresa.html"
-        template_path = self.templates_dir / template_name
-        if not template_path.exists():
-            raise FileNotFoundError(f"No existe la plantilla preimpresa: {template_name}")
-
         try:
-            from jinja2 import Environment, FileSystemLoader, select_autoescape  # type: ignore
-
-            env = Environment(
-                loader=FileSystemLoader(str(self.templates_dir)),
-                autoescape=select_autoescape(["html", "xml"]),
-            )
-            template = env.get_template(template_name)
-            return template.render(**context)
+            return renderizar_plantilla(self.templates_dir, template_name, context)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No existe la plantilla preimpresa: {template_name}") from None
         except ModuleNotFoundError:
             # Fallback para entornos sin Jinja2.
+            if not (self.templates_dir / template_name).exists():
+                raise FileNotFoundError(f"No existe la plantilla preimpresa: {template_name}") from None
             return self._render_html_fallback(context)
 
     @staticmethod
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 
+from osiris.modules.impresion.plantillas import renderizar_plantilla
 from osiris.modules.impresion.strategies.render_strategy import RenderStrategy
 from osiris.modules.impresion.strategies.ride_a4_strategy import _build_minimal_pdf
 
@@ -16,21 +17,15 @@ class TicketTermicoStrategy(RenderStrategy):
 
     def render_ticket_html(self, context: dict, *, ancho: str = "80mm") -> str:
         template_name = self._template_name(ancho)
-        template_path = self.templates_dir / template_name
-        if not template_path.exists():
-            raise FileNotFoundError(f"No existe la plantilla térmica: {template_name}")
-
         try:
-            from jinja2 import Environment, FileSystemLoader, select_autoescape  # type: ignore
-
-            env = Environment(
-                loader=FileSystemLoader(str(self.templates_dir)),
-                autoescape=select_autoescape(["html", "xml"]),
-            )
-            template = env.get_template(template_name)
-            return template.render(**context)
+            return renderizar_plantilla(self.templates_dir, template_name, context)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"No existe la plantilla térmica: {template_name}") from None
         except ModuleNotFoundError:
             # Fallback simple para entornos sin Jinja2.
+            template_path = self.templates_dir / template_name
+            if not template_path.exists():
+                raise FileNotFoundError(f"No existe la plantilla térmica: {template_name}") from None
             html = template_path.read_text(encoding="utf-8")
             for key, value in context.items():
                 html = html.replace(f"{{{{ {key} }}}}", str(value))
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 from uuid import UUID
 
-from sqlalchemy import Column, Numeric, UniqueConstraint
+from sqlalchemy import Column, Index, Numeric, UniqueConstraint
 from sqlmodel import Field
 
 from osiris.domain.base_models import AuditMixin, BaseTable, SoftDeleteMixin
@@ -50,6 +50,11 @@ class MovimientoInventarioDetalle(BaseTable, AuditMixin, SoftDeleteMixin, table=
     producto_id: UUID = Field(foreign_key="tbl_producto.id", nullable=False, index=True)
     cantidad: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False))
     costo_unitario: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False))
+    # Saldo corrido del kardex (producto/bodega) inmediatamente después de esta línea.
+    # Se materializa al confirmar; queda en NULL mientras el movimiento está en BORRADOR.
+    saldo_cantidad: Decimal | None = Field(default=None, sa_column=Column(Numeric(14, 4), nullable=True))
+    saldo_valor: Decimal | None = Field(default=None, sa_column=Column(Numeric(14, 4), nullable=True))
+    costo_promedio_saldo: Decimal | None = Field(default=None, sa_column=Column(Numeric(14, 4), nullable=True))
 
 
 class InventarioStock(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
@@ -68,3 +73,100 @@ class InventarioStock(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
     costo_promedio_vigente: Decimal = Field(
         sa_column=Column(Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
     )
+    # Cabecera del ledger: saldo de la última línea de kardex confirmada para el par.
+    kardex_saldo_cantidad: Decimal = Field(
+        sa_column=Column(Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    )
+    kardex_saldo_valor: Decimal = Field(
+        sa_column=Column(Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    )
+
+
+class KardexCierreMensual(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
+    """Saldo de kardex por producto/bodega al cierre de un mes (fecha_corte inclusive)."""
+
+    __tablename__ = "tbl_kardex_cierre_mensual"
+    __table_args__ = (
+        UniqueConstraint(
+            "bodega_id",
+            "producto_id",
+            "fecha_corte",
+            name="uq_tbl_kardex_cierre_mensual_bodega_producto_corte",
+        ),
+        Index(
+            "ix_tbl_kardex_cierre_mensual_producto_bodega_corte",
+            "producto_id",
+            "bodega_id",
+            "fecha_corte",
+        ),
+    )
+
+    bodega_id: UUID = Field(foreign_key="tbl_bodega.id", nullable=False, index=True)
+    producto_id: UUID = Field(foreign_key="tbl_producto.id", nullable=False)
+    fecha_corte: date = Field(nullable=False, index=True)
+    saldo_cantidad: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False, default=Decimal("0.0000")))
+    saldo_valor: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False, default=Decimal("0.0000")))
+    costo_promedio: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False, default=Decimal("0.0000")))
+
+
+class TipoDiscrepanciaInventario(str, Enum):
+    # Cantidad materializada en stock distinta de la cabecera del ledger de kardex.
+    STOCK_VS_LEDGER = "STOCK_VS_LEDGER"
+    # Cabecera del ledger distinta de la suma de líneas aplicadas del kardex.
+    LEDGER_VS_KARDEX = "LEDGER_VS_KARDEX"
+    # Producto.cantidad distinta del stock agregado en todas las bodegas.
+    PRODUCTO_VS_STOCK = "PRODUCTO_VS_STOCK"
+
+
+class InventarioDiscrepancia(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
+    """Descuadre detectado por la conciliación asíncrona de inventario."""
+
+    __tablename__ = "tbl_inventario_discrepancia"
+    __table_args__ = (
+        Index(
+            "ix_tbl_inventario_discrepancia_abiertas",
+            "resuelta",
+            "tipo",
+            "producto_id",
+        ),
+    )
+
+    bodega_id: UUID | None = Field(default=None, foreign_key="tbl_bodega.id", nullable=True, index=True)
+    producto_id: UUID = Field(foreign_key="tbl_producto.id", nullable=False, index=True)
+    tipo: TipoDiscrepanciaInventario = Field(nullable=False, max_length=30)
+    valor_esperado: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False))
+    valor_actual: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False))
+    diferencia: Decimal = Field(sa_column=Column(Numeric(14, 4), nullable=False))
+    detectada_en: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    resuelta: bool = Field(default=False, nullable=False)
+    resuelta_en: datetime | None = Field(default=None, nullable=True)
+
+
+class InventarioConciliacionPendiente(BaseTable, table=True):
+    """Par producto/bodega confirmado sin verificación inline, pendiente de conciliar."""
+
+    __tablename__ = "tbl_inventario_conciliacion_pendiente"
+    __table_args__ = (
+        UniqueConstraint(
+            "bodega_id",
+            "producto_id",
+            name="uq_tbl_inventario_conciliacion_pendiente_par",
+        ),
+    )
+
+    bodega_id: UUID = Field(foreign_key="tbl_bodega.id", nullable=False)
+    producto_id: UUID = Field(foreign_key="tbl_producto.id", nullable=False)
+    encolado_en: datetime = Field(default_factory=datetime.utcnow, nullable=False, index=True)
+
+
+class InventarioConciliacionCursor(BaseTable, table=True):
+    """Posición del barrido completo de conciliación: cada corrida retoma donde quedó la anterior."""
+
+    __tablename__ = "tbl_inventario_conciliacion_cursor"
+
+    nombre: str = Field(nullable=False, max_length=40, unique=True)
+    # Último par verificado (bodega_id, producto_id); NULL al iniciar una vuelta.
+    bodega_id: UUID | None = Field(default=None, nullable=True)
+    producto_id: UUID | None = Field(default=None, nullable=True)
+    vuelta_iniciada_en: datetime | None = Field(default=None, nullable=True)
+    vuelta_completada_en: datetime | None = Field(default=None, nullable=True)
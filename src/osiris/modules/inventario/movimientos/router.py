@@ -1,23 +1,41 @@
 from __future__ import annotations
 
 from datetime import date
+from typing import Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+import json
+import tempfile
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
 
 from osiris.core.db import get_session
 from osiris.modules.inventario.movimientos.schemas import (
+    CierreKardexRead,
+    CierreKardexRequest,
+    ConciliacionInventarioRead,
+    InventarioDiscrepanciaRead,
     KardexResponse,
     MovimientoInventarioAnularRequest,
     MovimientoInventarioConfirmRequest,
     MovimientoInventarioCreate,
     MovimientoInventarioRead,
+    ReconstruccionKardexRead,
+    ReconstruccionKardexRequest,
     TransferenciaInventarioCreate,
+    TransferenciaInventarioLoteCreate,
+    TransferenciaInventarioLoteRead,
     TransferenciaInventarioRead,
     ValoracionResponse,
 )
+from osiris.modules.inventario.movimientos.services.cierre_kardex_service import CierreKardexService
+from osiris.modules.inventario.movimientos.services.conciliacion_inventario_service import ConciliacionInventarioService
 from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.movimientos.services.recalculo_kardex_service import RecalculoKardexService
+from osiris.modules.inventario.movimientos.services.toma_fisica_service import TomaFisicaService
 
 
 COMMON_RESPONSES = {
@@ -27,6 +45,10 @@ COMMON_RESPONSES = {
 
 router = APIRouter(prefix="/api/v1/inventarios", tags=["Movimientos de Inventario"])
 service = MovimientoInventarioService()
+cierre_service = CierreKardexService()
+conciliacion_service = ConciliacionInventarioService()
+recalculo_kardex_service = RecalculoKardexService()
+toma_fisica_service = TomaFisicaService(service)
 
 
 @router.post(
@@ -99,21 +121,107 @@ def transferir_entre_bodegas(
     return service.transferir_entre_bodegas(session, payload)
 
 
+@router.post(
+    "/transferencias/lote",
+    response_model=TransferenciaInventarioLoteRead,
+    status_code=status.HTTP_201_CREATED,
+    summary="Transferir inventario de una bodega a varias",
+    responses=COMMON_RESPONSES,
+)
+def transferir_en_lote(
+    payload: TransferenciaInventarioLoteCreate,
+    session: Session = Depends(get_session),
+):
+    """Un egreso en origen y un ingreso por destino, todo en una sola transacción."""
+    return service.transferir_en_lote(session, payload)
+
+
+TOMA_FISICA_FORMATOS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+}
+TOMA_FISICA_BUFFER_MEMORIA = 8 * 1024 * 1024
+
+KARDEX_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
 @router.get("/kardex", response_model=KardexResponse, summary="Consultar kardex operativo", responses=COMMON_RESPONSES)
 def obtener_kardex(
     producto_id: UUID = Query(...),
     bodega_id: UUID = Query(...),
     fecha_inicio: date | None = Query(default=None),
     fecha_fin: date | None = Query(default=None),
+    formato: Literal["json", "ndjson", "csv"] = Query(default="json"),
     session: Session = Depends(get_session),
 ):
-    """Retorna movimientos cronológicos del producto en bodega con saldos acumulados."""
-    return service.obtener_kardex(
+    """Retorna movimientos cronológicos del producto en bodega con saldos acumulados.
+
+    Con `formato=ndjson|csv` la respuesta se transmite por filas desde un cursor de servidor.
+    """
+    if formato == "json":
+        return service.obtener_kardex(
+            session,
+            producto_id=producto_id,
+            bodega_id=bodega_id,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+        )
+
+    contenido = service.exportar_kardex(
         session,
         producto_id=producto_id,
         bodega_id=bodega_id,
         fecha_inicio=fecha_inicio,
         fecha_fin=fecha_fin,
+        formato=formato,
+    )
+    headers = {}
+    if formato == "csv":
+        headers["Content-Disposition"] = f'attachment; filename="kardex-{producto_id}-{bodega_id}.csv"'
+    return StreamingResponse(contenido, media_type=KARDEX_MEDIA_TYPES[formato], headers=headers)
+
+
+@router.post(
+    "/kardex/cierres",
+    response_model=CierreKardexRead,
+    summary="Cerrar periodo de kardex",
+    responses=COMMON_RESPONSES,
+)
+def cerrar_periodo_kardex(payload: CierreKardexRequest, session: Session = Depends(get_session)):
+    """Materializa saldos de kardex a fin de mes; sin periodo cierra todos los meses pendientes."""
+    if payload.anio is not None and payload.mes is not None:
+        fechas_corte = cierre_service.cerrar_periodo(
+            session,
+            anio=payload.anio,
+            mes=payload.mes,
+            bodega_id=payload.bodega_id,
+            usuario_auditoria=payload.usuario_auditoria,
+        )
+    else:
+        fechas_corte = cierre_service.cerrar_periodos_pendientes(
+            session,
+            bodega_id=payload.bodega_id,
+            usuario_auditoria=payload.usuario_auditoria,
+        )
+    return CierreKardexRead(fechas_corte=fechas_corte)
+
+
+@router.post(
+    "/kardex/reconstrucciones",
+    response_model=ReconstruccionKardexRead,
+    summary="Reconstruir saldos históricos de kardex",
+    responses=COMMON_RESPONSES,
+)
+def reconstruir_kardex(payload: ReconstruccionKardexRequest, session: Session = Depends(get_session)):
+    """Recalcula en punto fijo los saldos por línea y del ledger desde el primer movimiento aplicado."""
+    return recalculo_kardex_service.reconstruir(
+        session,
+        bodega_id=payload.bodega_id,
+        producto_ids=payload.producto_ids,
     )
 
 
@@ -121,3 +229,82 @@ def obtener_kardex(
 def obtener_valoracion(session: Session = Depends(get_session)):
     """Devuelve la valoración de inventario por bodega y total global a costo promedio vigente."""
     return service.obtener_valoracion(session)
+
+
+@router.post(
+    "/conciliaciones",
+    response_model=ConciliacionInventarioRead,
+    summary="Ejecutar conciliación de inventario",
+    responses=COMMON_RESPONSES,
+)
+def ejecutar_conciliacion(session: Session = Depends(get_session)):
+    """Verifica stock vs. kardex vs. cantidad de producto y registra los descuadres."""
+    return conciliacion_service.ejecutar(session)
+
+
+@router.get(
+    "/conciliaciones/discrepancias",
+    response_model=list[InventarioDiscrepanciaRead],
+    summary="Listar discrepancias de inventario abiertas",
+    responses=COMMON_RESPONSES,
+)
+def listar_discrepancias(
+    bodega_id: UUID | None = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    session: Session = Depends(get_session),
+):
+    """Retorna los descuadres aún no resueltos detectados por la conciliación."""
+    return conciliacion_service.listar_abiertas(session, bodega_id=bodega_id, limit=limit, offset=offset)
+
+
+@router.post(
+    "/bodegas/{bodega_id}/tomas-fisicas",
+    summary="Importar toma física de bodega",
+    responses={
+        **COMMON_RESPONSES,
+        200: {"description": "Progreso por lote y resultado por línea en NDJSON.", "content": {"application/x-ndjson": {}}},
+        415: {"description": "Formato de archivo no soportado."},
+    },
+)
+async def importar_toma_fisica(
+    bodega_id: UUID,
+    request: Request,
+    motivo: str = Query(..., min_length=1, max_length=200),
+    tamano_lote: int = Query(default=TomaFisicaService.DEFAULT_TAMANO_LOTE, ge=1, le=5000),
+    usuario_auditoria: str | None = Query(default=None),
+    session: Session = Depends(get_session),
+):
+    """Aplica un conteo físico (CSV o NDJSON en el cuerpo) como ajustes por lotes.
+
+    La respuesta se transmite en NDJSON: un evento `progreso` por lote aplicado,
+    un evento `linea` por cada línea del archivo y un `resumen` final.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    formato = TOMA_FISICA_FORMATOS.get(content_type)
+    if formato is None:
+        raise HTTPException(status_code=415, detail="Envíe la toma física como text/csv o application/x-ndjson.")
+
+    # El cuerpo se recibe en streaming; archivos grandes pasan a disco en lugar de memoria.
+    archivo = tempfile.SpooledTemporaryFile(max_size=TOMA_FISICA_BUFFER_MEMORIA)
+    try:
+        async for bloque in request.stream():
+            archivo.write(bloque)
+        archivo.seek(0)
+        preparada = await run_in_threadpool(
+            toma_fisica_service.preparar,
+            session,
+            bodega_id=bodega_id,
+            archivo=archivo,
+            formato=formato,
+            motivo=motivo,
+            usuario_auditoria=usuario_auditoria,
+        )
+    finally:
+        archivo.close()
+
+    eventos = (
+        json.dumps(evento) + "\n"
+        for evento in toma_fisica_service.aplicar(session, preparada, tamano_lote=tamano_lote)
+    )
+    return StreamingResponse(eventos, media_type="application/x-ndjson")
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
 from uuid import UUID
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 from osiris.modules.inventario.movimientos.models import (
     EstadoMovimientoInventario,
+    TipoDiscrepanciaInventario,
     TipoMovimientoInventario,
 )
 
@@ -42,6 +43,9 @@ class MovimientoInventarioDetalleRead(BaseModel):
     producto_id: UUID
     cantidad: Decimal
     costo_unitario: Decimal
+    saldo_cantidad: Decimal | None = None
+    saldo_valor: Decimal | None = None
+    costo_promedio_saldo: Decimal | None = None
 
 
 class MovimientoInventarioRead(BaseModel):
@@ -87,6 +91,33 @@ class TransferenciaInventarioRead(BaseModel):
     referencia_documento: str
 
 
+class TransferenciaInventarioLoteDestinoCreate(BaseModel):
+    bodega_destino_id: UUID
+    detalles: list[TransferenciaInventarioDetalleCreate] = Field(..., min_length=1)
+
+
+class TransferenciaInventarioLoteCreate(BaseModel):
+    fecha: date = Field(default_factory=date.today)
+    bodega_origen_id: UUID
+    # Deja espacio para el sufijo ":DESTINO:n" de las referencias de ingreso.
+    referencia_documento: str | None = Field(default=None, max_length=100)
+    usuario_auditoria: str | None = None
+    destinos: list[TransferenciaInventarioLoteDestinoCreate] = Field(..., min_length=1, max_length=200)
+
+
+class TransferenciaInventarioLoteDestinoRead(BaseModel):
+    bodega_destino_id: UUID
+    movimiento_ingreso_id: UUID
+    referencia_documento: str
+
+
+class TransferenciaInventarioLoteRead(BaseModel):
+    movimiento_egreso_id: UUID
+    bodega_origen_id: UUID
+    referencia_documento: str
+    destinos: list[TransferenciaInventarioLoteDestinoRead]
+
+
 class KardexMovimientoRead(BaseModel):
     fecha: date
     movimiento_id: UUID
@@ -124,3 +155,57 @@ class ValoracionBodegaRead(BaseModel):
 class ValoracionResponse(BaseModel):
     bodegas: list[ValoracionBodegaRead]
     total_global: Decimal
+
+
+class CierreKardexRequest(BaseModel):
+    anio: int | None = Field(default=None, ge=2000, le=2100)
+    mes: int | None = Field(default=None, ge=1, le=12)
+    bodega_id: UUID | None = None
+    usuario_auditoria: str | None = None
+
+    @model_validator(mode="after")
+    def validar_periodo(self) -> "CierreKardexRequest":
+        if (self.anio is None) != (self.mes is None):
+            raise ValueError("anio y mes deben enviarse juntos.")
+        return self
+
+
+class CierreKardexRead(BaseModel):
+    fechas_corte: list[date]
+
+
+class InventarioDiscrepanciaRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    bodega_id: UUID | None = None
+    producto_id: UUID
+    tipo: TipoDiscrepanciaInventario
+    valor_esperado: Decimal
+    valor_actual: Decimal
+    diferencia: Decimal
+    detectada_en: datetime
+
+
+class ConciliacionInventarioRead(BaseModel):
+    verificados: int
+    discrepancias_nuevas: int
+    discrepancias_abiertas: int
+
+
+class ReconstruccionKardexRequest(BaseModel):
+    bodega_id: UUID | None = None
+    producto_ids: list[UUID] | None = None
+
+
+class ParKardexInconsistenteRead(BaseModel):
+    bodega_id: UUID
+    producto_id: UUID
+    motivo: str
+
+
+class ReconstruccionKardexRead(BaseModel):
+    lineas_recalculadas: int
+    pares_recalculados: int
+    egresos_con_costo_divergente: int
+    pares_inconsistentes: list[ParKardexInconsistenteRead]
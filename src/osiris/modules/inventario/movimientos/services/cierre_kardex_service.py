@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, or_
+from sqlmodel import Session, select
+
+from osiris.core.db import session_has_table
+from osiris.modules.inventario.movimientos.models import (
+    EstadoMovimientoInventario,
+    KardexCierreMensual,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.strategies.calculo_kardex_strategy import q4
+
+
+ParProductoBodega = tuple[UUID, UUID]
+
+
+class CierreKardexService:
+    """
+    Cierres mensuales del kardex: materializa el saldo por producto/bodega a fin
+    de mes para que las consultas partan del cierre más cercano y solo recorran
+    los movimientos posteriores.
+    """
+
+    @staticmethod
+    def fecha_corte(anio: int, mes: int) -> date:
+        return date(anio, mes, calendar.monthrange(anio, mes)[1])
+
+    @staticmethod
+    def disponible(session: Session) -> bool:
+        return session_has_table(session, KardexCierreMensual.__tablename__)
+
+    @staticmethod
+    def _es_egreso():
+        return MovimientoInventario.tipo_movimiento.in_(
+            [TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA]
+        )
+
+    def _saldos_por_par(
+        self,
+        session: Session,
+        *,
+        hasta: date,
+        base_antes_de: date,
+        bodega_ids: list[UUID] | None = None,
+        producto_ids: list[UUID] | None = None,
+    ) -> dict[ParProductoBodega, tuple[Decimal, Decimal]]:
+        """Saldo (cantidad, valor) por par con movimientos de fecha <= ``hasta``.
+
+        Parte del último cierre anterior a ``base_antes_de`` de cada par y suma
+        solo los movimientos confirmados posteriores a ese cierre.
+        """
+        saldos: dict[ParProductoBodega, tuple[Decimal, Decimal]] = {}
+
+        ultimo_cierre = None
+        if self.disponible(session):
+            filtros_cierre = [KardexCierreMensual.fecha_corte < base_antes_de]
+            if bodega_ids is not None:
+                filtros_cierre.append(KardexCierreMensual.bodega_id.in_(bodega_ids))
+            if producto_ids is not None:
+                filtros_cierre.append(KardexCierreMensual.producto_id.in_(producto_ids))
+            ultimo_cierre = (
+                select(
+                    KardexCierreMensual.bodega_id,
+                    KardexCierreMensual.producto_id,
+                    func.max(KardexCierreMensual.fecha_corte).label("fecha_corte"),
+                )
+                .where(*filtros_cierre)
+                .group_by(KardexCierreMensual.bodega_id, KardexCierreMensual.producto_id)
+                .subquery()
+            )
+            filas_cierre = session.exec(
+                select(
+                    KardexCierreMensual.bodega_id,
+                    KardexCierreMensual.producto_id,
+                    KardexCierreMensual.saldo_cantidad,
+                    KardexCierreMensual.saldo_valor,
+                ).join(
+                    ultimo_cierre,
+                    and_(
+                        ultimo_cierre.c.bodega_id == KardexCierreMensual.bodega_id,
+                        ultimo_cierre.c.producto_id == KardexCierreMensual.producto_id,
+                        ultimo_cierre.c.fecha_corte == KardexCierreMensual.fecha_corte,
+                    ),
+                )
+            ).all()
+            for bodega_id, producto_id, cantidad, valor in filas_cierre:
+                saldos[(bodega_id, producto_id)] = (q4(cantidad), q4(valor))
+
+        es_egreso = self._es_egreso()
+        cantidad_firmada = case(
+            (es_egreso, -MovimientoInventarioDetalle.cantidad),
+            else_=MovimientoInventarioDetalle.cantidad,
+        )
+        valor_linea = func.round(MovimientoInventarioDetalle.cantidad * MovimientoInventarioDetalle.costo_unitario, 4)
+        valor_firmado = case((es_egreso, -valor_linea), else_=valor_linea)
+
+        stmt = (
+            select(
+                MovimientoInventario.bodega_id,
+                MovimientoInventarioDetalle.producto_id,
+                func.coalesce(func.sum(cantidad_firmada), Decimal("0.0000")),
+                func.coalesce(func.sum(valor_firmado), Decimal("0.0000")),
+            )
+            .select_from(MovimientoInventario)
+            .join(
+                MovimientoInventarioDetalle,
+                MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id,
+            )
+            .where(
+                MovimientoInventario.estado == EstadoMovimientoInventario.CONFIRMADO,
+                MovimientoInventario.activo.is_(True),
+                MovimientoInventarioDetalle.activo.is_(True),
+                MovimientoInventario.fecha <= hasta,
+            )
+            .group_by(MovimientoInventario.bodega_id, MovimientoInventarioDetalle.producto_id)
+        )
+        if bodega_ids is not None:
+            stmt = stmt.where(MovimientoInventario.bodega_id.in_(bodega_ids))
+        if producto_ids is not None:
+            stmt = stmt.where(MovimientoInventarioDetalle.producto_id.in_(producto_ids))
+        if ultimo_cierre is not None:
+            stmt = stmt.outerjoin(
+                ultimo_cierre,
+                and_(
+                    ultimo_cierre.c.bodega_id == MovimientoInventario.bodega_id,
+                    ultimo_cierre.c.producto_id == MovimientoInventarioDetalle.producto_id,
+                ),
+            ).where(
+                or_(
+                    ultimo_cierre.c.fecha_corte.is_(None),
+                    MovimientoInventario.fecha > ultimo_cierre.c.fecha_corte,
+                )
+            )
+
+        for bodega_id, producto_id, cantidad, valor in session.exec(stmt).all():
+            cantidad_base, valor_base = saldos.get((bodega_id, producto_id), (Decimal("0.0000"), Decimal("0.0000")))
+            saldos[(bodega_id, producto_id)] = (q4(cantidad_base + q4(cantidad)), q4(valor_base + q4(valor)))
+        return saldos
+
+    def saldo_a_fecha(
+        self,
+        session: Session,
+        *,
+        producto_id: UUID,
+        antes_de: date,
+        bodega_ids: list[UUID] | None = None,
+    ) -> tuple[Decimal, Decimal]:
+        """Saldo (cantidad, valor) de un producto con movimientos de fecha < ``antes_de``."""
+        if bodega_ids is not None and not bodega_ids:
+            return Decimal("0.0000"), Decimal("0.0000")
+
+        saldos = self._saldos_por_par(
+            session,
+            hasta=antes_de - timedelta(days=1),
+            base_antes_de=antes_de,
+            bodega_ids=bodega_ids,
+            producto_ids=[producto_id],
+        )
+        cantidad = Decimal("0.0000")
+        valor = Decimal("0.0000")
+        for cantidad_par, valor_par in saldos.values():
+            cantidad = q4(cantidad + cantidad_par)
+            valor = q4(valor + valor_par)
+        return cantidad, valor
+
+    def _materializar_corte(
+        self,
+        session: Session,
+        *,
+        fecha_corte: date,
+        bodega_ids: list[UUID] | None = None,
+        producto_ids: list[UUID] | None = None,
+        usuario_auditoria: str | None = None,
+    ) -> int:
+        saldos = self._saldos_por_par(
+            session,
+            hasta=fecha_corte,
+            base_antes_de=fecha_corte,
+            bodega_ids=bodega_ids,
+            producto_ids=producto_ids,
+        )
+
+        stmt_existentes = select(KardexCierreMensual).where(KardexCierreMensual.fecha_corte == fecha_corte)
+        if bodega_ids is not None:
+            stmt_existentes = stmt_existentes.where(KardexCierreMensual.bodega_id.in_(bodega_ids))
+        if producto_ids is not None:
+            stmt_existentes = stmt_existentes.where(KardexCierreMensual.producto_id.in_(producto_ids))
+        existentes = {
+            (cierre.bodega_id, cierre.producto_id): cierre for cierre in session.exec(stmt_existentes).all()
+        }
+
+        for par in set(saldos) | set(existentes):
+            cantidad, valor = saldos.get(par, (Decimal("0.0000"), Decimal("0.0000")))
+            costo = q4(valor / cantidad) if cantidad > Decimal("0") else Decimal("0.0000")
+            cierre = existentes.get(par)
+            if cierre is None:
+                cierre = KardexCierreMensual(
+                    bodega_id=par[0],
+                    producto_id=par[1],
+                    fecha_corte=fecha_corte,
+                    usuario_auditoria=usuario_auditoria,
+                    activo=True,
+                )
+            cierre.saldo_cantidad = cantidad
+            cierre.saldo_valor = valor
+            cierre.costo_promedio = costo
+            session.add(cierre)
+
+        session.flush()
+        return len(set(saldos) | set(existentes))
+
+    def _cortes_desde(
+        self,
+        session: Session,
+        *,
+        fecha: date,
+        bodega_ids: list[UUID] | None = None,
+    ) -> list[date]:
+        stmt = select(KardexCierreMensual.fecha_corte).where(KardexCierreMensual.fecha_corte >= fecha)
+        if bodega_ids is not None:
+            stmt = stmt.where(KardexCierreMensual.bodega_id.in_(bodega_ids))
+        return list(session.exec(stmt.distinct().order_by(KardexCierreMensual.fecha_corte.asc())).all())
+
+    def cerrar_periodo(
+        self,
+        session: Session,
+        *,
+        anio: int,
+        mes: int,
+        bodega_id: UUID | None = None,
+        usuario_auditoria: str | None = None,
+        commit: bool = True,
+    ) -> list[date]:
+        fecha_corte = self.fecha_corte(anio, mes)
+        if fecha_corte >= date.today():
+            raise HTTPException(status_code=400, detail="Solo se pueden cerrar meses concluidos.")
+
+        bodega_ids = [bodega_id] if bodega_id is not None else None
+        # Cerrar un mes anterior a cierres existentes obliga a recalcular los siguientes.
+        cortes = sorted({fecha_corte, *self._cortes_desde(session, fecha=fecha_corte, bodega_ids=bodega_ids)})
+        for corte in cortes:
+            self._materializar_corte(
+                session,
+                fecha_corte=corte,
+                bodega_ids=bodega_ids,
+                usuario_auditoria=usuario_auditoria,
+            )
+
+        if commit:
+            session.commit()
+        return cortes
+
+    def cerrar_periodos_pendientes(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID | None = None,
+        usuario_auditoria: str | None = None,
+        commit: bool = True,
+    ) -> list[date]:
+        """Cierra cada mes concluido posterior al último cierre (o al primer movimiento)."""
+        stmt_ultimo = select(func.max(KardexCierreMensual.fecha_corte))
+        stmt_primero = select(func.min(MovimientoInventario.fecha)).where(
+            MovimientoInventario.estado == EstadoMovimientoInventario.CONFIRMADO,
+        )
+        if bodega_id is not None:
+            stmt_ultimo = stmt_ultimo.where(KardexCierreMensual.bodega_id == bodega_id)
+            stmt_primero = stmt_primero.where(MovimientoInventario.bodega_id == bodega_id)
+
+        ultimo_corte = session.exec(stmt_ultimo).one()
+        if ultimo_corte is not None:
+            inicio = ultimo_corte + timedelta(days=1)
+        else:
+            inicio = session.exec(stmt_primero).one()
+            if inicio is None:
+                return []
+
+        bodega_ids = [bodega_id] if bodega_id is not None else None
+        hoy = date.today()
+        cortes: list[date] = []
+        anio, mes = inicio.year, inicio.month
+        while self.fecha_corte(anio, mes) < hoy:
+            corte = self.fecha_corte(anio, mes)
+            self._materializar_corte(
+                session,
+                fecha_corte=corte,
+                bodega_ids=bodega_ids,
+                usuario_auditoria=usuario_auditoria,
+            )
+            cortes.append(corte)
+            anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+        if commit:
+            session.commit()
+        return cortes
+
+    def recerrar_desde(
+        self,
+        session: Session,
+        *,
+        fecha: date,
+        bodega_id: UUID,
+        producto_ids: set[UUID],
+    ) -> list[date]:
+        """Recalcula incrementalmente los cierres afectados por un movimiento en un periodo cerrado."""
+        if not producto_ids or not self.disponible(session):
+            return []
+
+        ultimo_corte = session.exec(
+            select(func.max(KardexCierreMensual.fecha_corte)).where(KardexCierreMensual.bodega_id == bodega_id)
+        ).one()
+        if ultimo_corte is None or ultimo_corte < fecha:
+            return []
+
+        cortes = self._cortes_desde(session, fecha=fecha, bodega_ids=[bodega_id])
+        for corte in cortes:
+            self._materializar_corte(
+                session,
+                fecha_corte=corte,
+                bodega_ids=[bodega_id],
+                producto_ids=sorted(producto_ids),
+            )
+        return cortes
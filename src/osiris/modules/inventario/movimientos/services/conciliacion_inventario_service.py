@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID, uuid4
+
+from sqlalchemy import and_, bindparam, case, delete, func, or_
+from sqlmodel import Session, select
+
+from osiris.core.db import session_has_table
+from osiris.core.observability import record_inventario_conciliacion_run
+from osiris.core.settings import get_settings
+from osiris.modules.inventario.movimientos.models import (
+    InventarioConciliacionCursor,
+    InventarioConciliacionPendiente,
+    InventarioDiscrepancia,
+    InventarioStock,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoDiscrepanciaInventario,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.strategies.calculo_kardex_strategy import q4
+from osiris.modules.inventario.producto.entity import Producto
+
+
+ClaveDiscrepancia = tuple[UUID | None, UUID, TipoDiscrepanciaInventario]
+
+
+class ConciliacionInventarioService:
+    """
+    Conciliación asíncrona stock vs. kardex vs. Producto.cantidad.
+
+    Las confirmaciones con verificación diferida dejan sus pares producto/bodega
+    en tbl_inventario_conciliacion_pendiente, en la misma transacción: sobreviven
+    a reinicios y cualquier réplica los procesa. Después, cada corrida avanza el
+    barrido completo unos lotes desde el cursor persistido, así ninguna corrida
+    recorre todo el inventario. Los descuadres se registran en
+    tbl_inventario_discrepancia y los que desaparecen se marcan como resueltos.
+    """
+
+    DEFAULT_TAMANO_LOTE = 500
+    CURSOR_BARRIDO = "barrido"
+
+    def __init__(self, tamano_lote: int | None = None, lotes_por_corrida: int | None = None):
+        self.tamano_lote = tamano_lote or self.DEFAULT_TAMANO_LOTE
+        self.lotes_por_corrida = lotes_por_corrida or get_settings().INVENTARIO_CONCILIACION_LOTES_POR_CORRIDA
+
+    @staticmethod
+    def disponible(session: Session) -> bool:
+        return session_has_table(session, InventarioDiscrepancia.__tablename__)
+
+    @staticmethod
+    def _cola_disponible(session: Session) -> bool:
+        return session_has_table(session, InventarioConciliacionPendiente.__tablename__)
+
+    def encolar(self, session: Session, *, bodega_id: UUID, producto_ids: set[UUID]) -> None:
+        """Registra los pares en la transacción de la confirmación; se verifican en la próxima corrida."""
+        if not producto_ids or not self._cola_disponible(session):
+            return
+
+        ahora = datetime.utcnow()
+        dialect_name = session.get_bind().dialect.name
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            existentes = {
+                pendiente.producto_id: pendiente
+                for pendiente in session.exec(
+                    select(InventarioConciliacionPendiente).where(
+                        InventarioConciliacionPendiente.bodega_id == bodega_id,
+                        InventarioConciliacionPendiente.producto_id.in_(producto_ids),
+                    )
+                ).all()
+            }
+            for producto_id in sorted(producto_ids, key=str):
+                pendiente = existentes.get(producto_id) or InventarioConciliacionPendiente(
+                    bodega_id=bodega_id,
+                    producto_id=producto_id,
+                )
+                pendiente.encolado_en = ahora
+                session.add(pendiente)
+            session.flush()
+            return
+
+        tabla = InventarioConciliacionPendiente.__table__
+        stmt = dialect_insert(tabla).values(
+            [
+                {"id": uuid4(), "bodega_id": bodega_id, "producto_id": producto_id, "encolado_en": ahora}
+                for producto_id in sorted(producto_ids, key=str)
+            ]
+        )
+        # Un par ya pendiente se re-marca: la corrida que lo esté verificando no lo borrará.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.bodega_id, tabla.c.producto_id],
+            set_={"encolado_en": stmt.excluded.encolado_en},
+        )
+        session.execute(stmt)
+
+    def contar_pendientes(self, session: Session) -> int:
+        if not self._cola_disponible(session):
+            return 0
+        return int(session.exec(select(func.count()).select_from(InventarioConciliacionPendiente)).one())
+
+    def _procesar_pendientes(self, session: Session) -> tuple[int, list[InventarioDiscrepancia]]:
+        if not self._cola_disponible(session):
+            return 0, []
+
+        verificados = 0
+        nuevas: list[InventarioDiscrepancia] = []
+        tabla = InventarioConciliacionPendiente.__table__
+        while True:
+            # SKIP LOCKED: otra réplica procesando la cola toma otros pares.
+            lote = session.exec(
+                select(
+                    InventarioConciliacionPendiente.id,
+                    InventarioConciliacionPendiente.bodega_id,
+                    InventarioConciliacionPendiente.producto_id,
+                    InventarioConciliacionPendiente.encolado_en,
+                )
+                .order_by(InventarioConciliacionPendiente.encolado_en.asc())
+                .limit(self.tamano_lote)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not lote:
+                break
+
+            por_bodega: dict[UUID, set[UUID]] = {}
+            for _id, bodega_id, producto_id, _encolado_en in lote:
+                por_bodega.setdefault(bodega_id, set()).add(producto_id)
+            for bodega_id, producto_ids in por_bodega.items():
+                nuevas.extend(self.conciliar_productos(session, bodega_id=bodega_id, producto_ids=producto_ids))
+            verificados += len(lote)
+
+            # Solo se borra lo verificado: un par re-encolado mientras tanto cambió su encolado_en.
+            session.execute(
+                delete(tabla).where(
+                    tabla.c.id == bindparam("b_id"),
+                    tabla.c.encolado_en == bindparam("b_encolado_en"),
+                ),
+                [{"b_id": pendiente_id, "b_encolado_en": encolado_en} for pendiente_id, _b, _p, encolado_en in lote],
+            )
+            session.commit()
+            if len(lote) < self.tamano_lote:
+                break
+        return verificados, nuevas
+
+    def conciliar_productos(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID,
+        producto_ids: set[UUID],
+    ) -> list[InventarioDiscrepancia]:
+        """Verifica un lote de productos de una bodega y retorna los descuadres nuevos."""
+        if not producto_ids:
+            return []
+
+        hallazgos: dict[ClaveDiscrepancia, tuple[Decimal, Decimal]] = {}
+
+        stocks = session.exec(
+            select(
+                InventarioStock.producto_id,
+                InventarioStock.cantidad_actual,
+                InventarioStock.kardex_saldo_cantidad,
+            ).where(
+                InventarioStock.bodega_id == bodega_id,
+                InventarioStock.producto_id.in_(producto_ids),
+                InventarioStock.activo.is_(True),
+            )
+        ).all()
+
+        # Líneas aplicadas al stock: las que materializaron saldo al confirmarse,
+        # incluidas las de movimientos anulados con reverso.
+        signo = case(
+            (
+                MovimientoInventario.tipo_movimiento.in_(
+                    [TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA]
+                ),
+                -MovimientoInventarioDetalle.cantidad,
+            ),
+            else_=MovimientoInventarioDetalle.cantidad,
+        )
+        kardex = {
+            producto_id: q4(total or 0)
+            for producto_id, total in session.exec(
+                select(MovimientoInventarioDetalle.producto_id, func.sum(signo))
+                .select_from(MovimientoInventario)
+                .join(
+                    MovimientoInventarioDetalle,
+                    MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id,
+                )
+                .where(
+                    MovimientoInventario.bodega_id == bodega_id,
+                    MovimientoInventario.activo.is_(True),
+                    MovimientoInventarioDetalle.activo.is_(True),
+                    MovimientoInventarioDetalle.producto_id.in_(producto_ids),
+                    MovimientoInventarioDetalle.saldo_cantidad.is_not(None),
+                )
+                .group_by(MovimientoInventarioDetalle.producto_id)
+            ).all()
+        }
+
+        for producto_id, cantidad_actual, kardex_saldo_cantidad in stocks:
+            stock = q4(cantidad_actual)
+            ledger = q4(kardex_saldo_cantidad)
+            if stock != ledger:
+                hallazgos[(bodega_id, producto_id, TipoDiscrepanciaInventario.STOCK_VS_LEDGER)] = (ledger, stock)
+            esperado_kardex = kardex.get(producto_id, Decimal("0.0000"))
+            if ledger != esperado_kardex:
+                hallazgos[(bodega_id, producto_id, TipoDiscrepanciaInventario.LEDGER_VS_KARDEX)] = (
+                    esperado_kardex,
+                    ledger,
+                )
+
+        productos = session.exec(
+            select(
+                Producto.id,
+                Producto.cantidad,
+                func.coalesce(func.sum(InventarioStock.cantidad_actual), 0),
+            )
+            .select_from(Producto)
+            .join(
+                InventarioStock,
+                (InventarioStock.producto_id == Producto.id) & InventarioStock.activo.is_(True),
+            )
+            .where(Producto.id.in_(producto_ids))
+            .group_by(Producto.id, Producto.cantidad)
+        ).all()
+        for producto_id, cantidad_producto, total_stock in productos:
+            esperado = q4(total_stock)
+            actual = q4(cantidad_producto)
+            if esperado != actual:
+                hallazgos[(None, producto_id, TipoDiscrepanciaInventario.PRODUCTO_VS_STOCK)] = (esperado, actual)
+
+        return self._registrar_hallazgos(
+            session,
+            bodega_id=bodega_id,
+            producto_ids=producto_ids,
+            hallazgos=hallazgos,
+        )
+
+    def _registrar_hallazgos(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID,
+        producto_ids: set[UUID],
+        hallazgos: dict[ClaveDiscrepancia, tuple[Decimal, Decimal]],
+    ) -> list[InventarioDiscrepancia]:
+        abiertas = session.exec(
+            select(InventarioDiscrepancia).where(
+                InventarioDiscrepancia.resuelta.is_(False),
+                InventarioDiscrepancia.producto_id.in_(producto_ids),
+                or_(
+                    InventarioDiscrepancia.bodega_id == bodega_id,
+                    InventarioDiscrepancia.tipo == TipoDiscrepanciaInventario.PRODUCTO_VS_STOCK,
+                ),
+            )
+        ).all()
+
+        ahora = datetime.utcnow()
+        pendientes = dict(hallazgos)
+        for discrepancia in abiertas:
+            clave = (discrepancia.bodega_id, discrepancia.producto_id, discrepancia.tipo)
+            valores = pendientes.pop(clave, None)
+            if valores is None:
+                discrepancia.resuelta = True
+                discrepancia.resuelta_en = ahora
+            else:
+                esperado, actual = valores
+                discrepancia.valor_esperado = esperado
+                discrepancia.valor_actual = actual
+                discrepancia.diferencia = q4(actual - esperado)
+            session.add(discrepancia)
+
+        nuevas = [
+            InventarioDiscrepancia(
+                bodega_id=clave_bodega_id,
+                producto_id=producto_id,
+                tipo=tipo,
+                valor_esperado=esperado,
+                valor_actual=actual,
+                diferencia=q4(actual - esperado),
+                detectada_en=ahora,
+            )
+            for (clave_bodega_id, producto_id, tipo), (esperado, actual) in pendientes.items()
+        ]
+        session.add_all(nuevas)
+        session.flush()
+        return nuevas
+
+    def _cursor_barrido(self, session: Session) -> InventarioConciliacionCursor | None:
+        """Cursor del barrido bloqueado para esta corrida; None si otra réplica lo tiene."""
+        if not session_has_table(session, InventarioConciliacionCursor.__tablename__):
+            return None
+        cursor = session.exec(
+            select(InventarioConciliacionCursor)
+            .where(InventarioConciliacionCursor.nombre == self.CURSOR_BARRIDO)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if cursor is None:
+            existe = session.exec(
+                select(InventarioConciliacionCursor.id).where(
+                    InventarioConciliacionCursor.nombre == self.CURSOR_BARRIDO
+                )
+            ).first()
+            if existe is not None:
+                return None
+            # Normalmente la crea la migración; en esquemas creados sin Alembic se crea aquí.
+            cursor = InventarioConciliacionCursor(nombre=self.CURSOR_BARRIDO)
+            session.add(cursor)
+            session.flush()
+        return cursor
+
+    def avanzar_barrido(self, session: Session) -> tuple[int, list[InventarioDiscrepancia]]:
+        """Verifica hasta `lotes_por_corrida` lotes del inventario desde el cursor (keyset bodega/producto)."""
+        cursor = self._cursor_barrido(session)
+        if cursor is None:
+            return 0, []
+
+        verificados = 0
+        nuevas: list[InventarioDiscrepancia] = []
+        ahora = datetime.utcnow()
+        for _ in range(self.lotes_por_corrida):
+            if cursor.bodega_id is None:
+                cursor.vuelta_iniciada_en = ahora
+            filtros = [InventarioStock.activo.is_(True)]
+            if cursor.bodega_id is not None:
+                filtros.append(
+                    or_(
+                        InventarioStock.bodega_id > cursor.bodega_id,
+                        and_(
+                            InventarioStock.bodega_id == cursor.bodega_id,
+                            InventarioStock.producto_id > cursor.producto_id,
+                        ),
+                    )
+                )
+            lote = session.exec(
+                select(InventarioStock.bodega_id, InventarioStock.producto_id)
+                .where(*filtros)
+                .order_by(InventarioStock.bodega_id.asc(), InventarioStock.producto_id.asc())
+                .limit(self.tamano_lote)
+            ).all()
+
+            por_bodega: dict[UUID, set[UUID]] = {}
+            for bodega_id, producto_id in lote:
+                por_bodega.setdefault(bodega_id, set()).add(producto_id)
+            for bodega_id, producto_ids in por_bodega.items():
+                nuevas.extend(self.conciliar_productos(session, bodega_id=bodega_id, producto_ids=producto_ids))
+            verificados += len(lote)
+
+            if len(lote) < self.tamano_lote:
+                # Fin de la vuelta: la siguiente corrida empieza de nuevo desde el inicio.
+                cursor.bodega_id = None
+                cursor.producto_id = None
+                cursor.vuelta_completada_en = ahora
+                break
+            cursor.bodega_id, cursor.producto_id = lote[-1]
+
+        session.add(cursor)
+        session.commit()
+        return verificados, nuevas
+
+    def ejecutar(self, session: Session) -> dict[str, int]:
+        """Procesa los pares diferidos y luego avanza el barrido completo desde su cursor."""
+        if not self.disponible(session):
+            return {"verificados": 0, "discrepancias_nuevas": 0, "discrepancias_abiertas": 0}
+
+        inicio = time.monotonic()
+        verificados, nuevas = self._procesar_pendientes(session)
+        verificados_barrido, nuevas_barrido = self.avanzar_barrido(session)
+        verificados += verificados_barrido
+        nuevas.extend(nuevas_barrido)
+
+        abiertas = self.contar_abiertas(session)
+        record_inventario_conciliacion_run(
+            verificados=verificados,
+            nuevas_por_tipo=_contar_por_tipo(nuevas),
+            abiertas_por_tipo=abiertas,
+            pendientes=self.contar_pendientes(session),
+            duracion_segundos=time.monotonic() - inicio,
+        )
+        return {
+            "verificados": verificados,
+            "discrepancias_nuevas": len(nuevas),
+            "discrepancias_abiertas": sum(abiertas.values()),
+        }
+
+    def contar_abiertas(self, session: Session) -> dict[str, int]:
+        conteos = {tipo.value: 0 for tipo in TipoDiscrepanciaInventario}
+        for tipo, total in session.exec(
+            select(InventarioDiscrepancia.tipo, func.count())
+            .where(InventarioDiscrepancia.resuelta.is_(False))
+            .group_by(InventarioDiscrepancia.tipo)
+        ).all():
+            conteos[TipoDiscrepanciaInventario(tipo).value] = int(total)
+        return conteos
+
+    def listar_abiertas(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID | None = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> list[InventarioDiscrepancia]:
+        filtros = [InventarioDiscrepancia.resuelta.is_(False)]
+        if bodega_id is not None:
+            filtros.append(InventarioDiscrepancia.bodega_id == bodega_id)
+        return list(
+            session.exec(
+                select(InventarioDiscrepancia)
+                .where(*filtros)
+                .order_by(InventarioDiscrepancia.detectada_en.desc())
+                .offset(offset)
+                .limit(limit)
+            ).all()
+        )
+
+
+def _contar_por_tipo(discrepancias: list[InventarioDiscrepancia]) -> dict[str, int]:
+    conteos: dict[str, int] = {}
+    for discrepancia in discrepancias:
+        tipo = TipoDiscrepanciaInventario(discrepancia.tipo).value
+        conteos[tipo] = conteos.get(tipo, 0) + 1
+    return conteos
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
-from datetime import datetime
+import csv
+import io
+import json
+import random
+from collections.abc import Iterator
+from datetime import date, datetime
 from decimal import Decimal, ROUND_HALF_UP
 from uuid import UUID, uuid4
 
 from fastapi import HTTPException
-from sqlalchemy import func, update
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy import Numeric, bindparam, case, cast, func, literal, update
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel import Session, select
 
+from osiris.core.audit_context import get_current_user_id
+from osiris.core.db import session_has_table
+from osiris.core.observability import record_inventario_verificacion
+from osiris.core.settings import get_settings
 from osiris.modules.sri.core_sri.services.template_method import TemplateMethodService
+from osiris.modules.inventario.movimientos.services.cierre_kardex_service import CierreKardexService
+from osiris.modules.inventario.movimientos.services.conciliacion_inventario_service import ConciliacionInventarioService
+from osiris.modules.inventario.movimientos.services.stock_cache_service import stock_cache
 from osiris.modules.inventario.movimientos.strategies.calculo_kardex_strategy import CalculoKardexStrategy
 from osiris.modules.inventario.movimientos.models import (
     EstadoMovimientoInventario,
@@ -22,6 +34,9 @@ from osiris.modules.inventario.movimientos.schemas import (
     MovimientoInventarioCreate,
     TransferenciaInventarioCreate,
     MovimientoInventarioDetalleRead,
+    TransferenciaInventarioLoteCreate,
+    TransferenciaInventarioLoteDestinoRead,
+    TransferenciaInventarioLoteRead,
     TransferenciaInventarioRead,
     MovimientoInventarioRead,
 )
@@ -37,9 +52,54 @@ def q4(value: Decimal | int | str) -> Decimal:
     return Decimal(str(value)).quantize(Q4, rounding=ROUND_HALF_UP)
 
 
+def _kardex_valor_texto(value):
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return str(q4(value))
+    if isinstance(value, (date, UUID)):
+        return str(value)
+    if isinstance(value, TipoMovimientoInventario):
+        return value.value
+    return value
+
+
 class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCreate, MovimientoInventario]):
-    def __init__(self, calculo_kardex_strategy: CalculoKardexStrategy | None = None) -> None:
+    def __init__(
+        self,
+        calculo_kardex_strategy: CalculoKardexStrategy | None = None,
+        cierre_kardex_service: CierreKardexService | None = None,
+        conciliacion_service: ConciliacionInventarioService | None = None,
+        modo_verificacion: str | None = None,
+        ratio_muestreo: float | None = None,
+    ) -> None:
         self.calculo_kardex_strategy = calculo_kardex_strategy or CalculoKardexStrategy()
+        self.cierre_kardex_service = cierre_kardex_service or CierreKardexService()
+        self.conciliacion_service = conciliacion_service or ConciliacionInventarioService()
+        self.modo_verificacion = modo_verificacion
+        self.ratio_muestreo = ratio_muestreo
+
+    def _verificar_inline(self) -> tuple[str, bool]:
+        """
+        Resuelve el modo de verificación vigente y si esta confirmación se verifica inline.
+
+        La verificación inline no es una fuente independiente: el saldo de kardex con el
+        que compara se escribió en esta misma transacción a partir de los mismos detalles.
+        Solo detecta que la fila de stock no quedó como se calculó (un UPDATE parcial o
+        perdido, u otro escritor sobre la fila dentro de la transacción). Un ledger que ya
+        venía descuadrado lo detecta la conciliación, que lo compara con la suma de las
+        líneas aplicadas.
+        """
+        settings = get_settings()
+        modo = (self.modo_verificacion or settings.INVENTARIO_VERIFICACION_MODO).upper()
+        if modo == "DIFERIDA":
+            return modo, False
+        if modo == "MUESTREO":
+            ratio = self.ratio_muestreo
+            if ratio is None:
+                ratio = settings.INVENTARIO_VERIFICACION_MUESTREO_RATIO
+            return modo, random.random() < ratio
+        return modo, True
 
     def crear_movimiento_borrador(
         self,
@@ -60,6 +120,27 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
     ) -> MovimientoInventario:
         commit = kwargs.get("commit", True)
         _ = context
+        movimiento, _detalles = self._construir_borrador(session, payload)
+        session.flush()
+
+        # Regla de la card E3-1: BORRADOR no altera stock.
+        if commit:
+            session.commit()
+            session.refresh(movimiento)
+        else:
+            session.flush()
+        return movimiento
+
+    @staticmethod
+    def _construir_borrador(
+        session: Session,
+        payload: MovimientoInventarioCreate,
+    ) -> tuple[MovimientoInventario, list[MovimientoInventarioDetalle]]:
+        """Agrega al session un movimiento BORRADOR con sus detalles, sin flush.
+
+        Los ids se generan en el cliente, de modo que varios borradores pueden
+        insertarse en un único flush y confirmarse con los detalles en memoria.
+        """
         movimiento = MovimientoInventario(
             fecha=payload.fecha,
             bodega_id=payload.bodega_id,
@@ -70,11 +151,8 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
             usuario_auditoria=payload.usuario_auditoria,
             activo=True,
         )
-        session.add(movimiento)
-        session.flush()
-
-        for detalle in payload.detalles:
-            movimiento_detalle = MovimientoInventarioDetalle(
+        detalles = [
+            MovimientoInventarioDetalle(
                 movimiento_inventario_id=movimiento.id,
                 producto_id=detalle.producto_id,
                 cantidad=detalle.cantidad,
@@ -82,15 +160,11 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
                 usuario_auditoria=payload.usuario_auditoria,
                 activo=True,
             )
-            session.add(movimiento_detalle)
-
-        # Regla de la card E3-1: BORRADOR no altera stock.
-        if commit:
-            session.commit()
-            session.refresh(movimiento)
-        else:
-            session.flush()
-        return movimiento
+            for detalle in payload.detalles
+        ]
+        session.add(movimiento)
+        session.add_all(detalles)
+        return movimiento, detalles
 
     def confirmar_movimiento(
         self,
@@ -133,32 +207,50 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
         if not detalles:
             raise ValueError("No se puede confirmar un movimiento sin detalles")
 
-        estado_anterior = movimiento.estado.value
         try:
-            producto_ids = {detalle.producto_id for detalle in detalles}
-            stock_before = {
-                producto_id: self._obtener_stock_producto_bodega(
-                    session,
-                    bodega_id=movimiento.bodega_id,
-                    producto_id=producto_id,
-                )
-                for producto_id in producto_ids
-            }
-            kardex_before = {
-                producto_id: self._obtener_saldo_kardex_producto_bodega(
-                    session,
-                    bodega_id=movimiento.bodega_id,
-                    producto_id=producto_id,
-                )
-                for producto_id in producto_ids
-            }
+            self._aplicar_confirmacion(session, movimiento, detalles)
+            if commit:
+                session.commit()
+                session.refresh(movimiento)
+            else:
+                session.flush()
+            return movimiento
+        except Exception:
+            if rollback_on_error:
+                session.rollback()
+            raise
 
-            for detalle in detalles:
-                if movimiento.tipo_movimiento in {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}:
-                    self._aplicar_egreso_con_lock(session, movimiento, detalle)
-                else:
-                    self._aplicar_ingreso(session, movimiento, detalle)
+    def _aplicar_confirmacion(
+        self,
+        session: Session,
+        movimiento: MovimientoInventario,
+        detalles: list[MovimientoInventarioDetalle],
+        *,
+        sincronizar_productos: bool = True,
+    ) -> set[UUID]:
+        """Aplica un BORRADOR ya cargado al stock y al kardex y lo deja CONFIRMADO (sin commit)."""
+        estado_anterior = movimiento.estado.value
+        producto_ids = {detalle.producto_id for detalle in detalles}
+        stocks = self._bloquear_stocks_en_lote(
+            session,
+            bodega_id=movimiento.bodega_id,
+            producto_ids=producto_ids,
+        )
+        stock_before = {
+            producto_id: q4(stocks[producto_id].cantidad_actual) if producto_id in stocks else Decimal("0.0000")
+            for producto_id in producto_ids
+        }
+        # El saldo de kardex previo es la cabecera del ledger en la fila ya bloqueada:
+        # no requiere recorrer el historial de movimientos confirmados.
+        kardex_before = {
+            producto_id: q4(stocks[producto_id].kardex_saldo_cantidad) if producto_id in stocks else Decimal("0.0000")
+            for producto_id in producto_ids
+        }
+
+        self._aplicar_detalles_en_lote(session, movimiento, detalles, stocks)
 
+        modo_verificacion, verificar_inline = self._verificar_inline()
+        if verificar_inline:
             self._validar_integridad_operacion_kardex_stock(
                 session,
                 movimiento=movimiento,
@@ -166,36 +258,41 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
                 stock_before=stock_before,
                 kardex_before=kardex_before,
             )
+        else:
+            # Quedan en la cola persistente de la conciliación, dentro de esta misma transacción.
+            self.conciliacion_service.encolar(session, bodega_id=movimiento.bodega_id, producto_ids=producto_ids)
+        record_inventario_verificacion(modo=modo_verificacion, inline=verificar_inline)
 
+        if sincronizar_productos:
             self._sincronizar_cantidad_producto_desde_stock(
                 session,
                 producto_ids=producto_ids,
             )
-            self._sincronizar_producto_bodega_desde_stock(
+        self._sincronizar_producto_bodega_desde_stock(
+            session,
+            bodega_id=movimiento.bodega_id,
+            stocks=stocks,
+            usuario_auditoria=movimiento.usuario_auditoria,
+        )
+
+        movimiento.estado = EstadoMovimientoInventario.CONFIRMADO
+        session.add(movimiento)
+        # Un movimiento con fecha en un periodo cerrado recalcula los cierres afectados.
+        # Los reversos de anulación los recalcula anular_movimiento tras marcar el original.
+        if not (movimiento.referencia_documento or "").startswith("REVERSO:"):
+            self.cierre_kardex_service.recerrar_desde(
                 session,
+                fecha=movimiento.fecha,
                 bodega_id=movimiento.bodega_id,
                 producto_ids=producto_ids,
             )
-            self._validar_producto_vs_stock(session, producto_ids=producto_ids)
-
-            movimiento.estado = EstadoMovimientoInventario.CONFIRMADO
-            session.add(movimiento)
-            if movimiento.tipo_movimiento == TipoMovimientoInventario.AJUSTE:
-                self._registrar_auditoria_ajuste(
-                    session,
-                    movimiento=movimiento,
-                    estado_anterior=estado_anterior,
-                )
-            if commit:
-                session.commit()
-                session.refresh(movimiento)
-            else:
-                session.flush()
-            return movimiento
-        except Exception:
-            if rollback_on_error:
-                session.rollback()
-            raise
+        if movimiento.tipo_movimiento == TipoMovimientoInventario.AJUSTE:
+            self._registrar_auditoria_ajuste(
+                session,
+                movimiento=movimiento,
+                estado_anterior=estado_anterior,
+            )
+        return producto_ids
 
     def transferir_entre_bodegas(
         self,
@@ -215,74 +312,161 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
             raise HTTPException(status_code=409, detail="La bodega destino no existe o está inactiva.")
 
         referencia_base = payload.referencia_documento or f"TRANSFERENCIA:{uuid4()}"
-
-        egreso_payload = MovimientoInventarioCreate(
+        movimiento_egreso, ingresos = self._ejecutar_transferencia(
+            session,
             fecha=payload.fecha,
-            bodega_id=payload.bodega_origen_id,
-            tipo_movimiento=TipoMovimientoInventario.TRANSFERENCIA,
-            referencia_documento=referencia_base,
+            bodega_origen_id=payload.bodega_origen_id,
+            referencia_base=referencia_base,
             usuario_auditoria=payload.usuario_auditoria,
-            detalles=[
-                {
-                    "producto_id": detalle.producto_id,
-                    "cantidad": detalle.cantidad,
-                    "costo_unitario": Decimal("0.0000"),
-                }
-                for detalle in payload.detalles
-            ],
+            destinos=[(payload.bodega_destino_id, f"{referencia_base}:DESTINO", payload.detalles)],
         )
+        movimiento_ingreso = ingresos[payload.bodega_destino_id]
 
-        movimiento_egreso = self.crear_movimiento_borrador(session, egreso_payload, commit=False)
-        self.confirmar_movimiento(
-            session,
-            movimiento_egreso.id,
-            commit=False,
-            rollback_on_error=False,
+        if commit:
+            session.commit()
+
+        return TransferenciaInventarioRead(
+            movimiento_egreso_id=movimiento_egreso.id,
+            movimiento_ingreso_id=movimiento_ingreso.id,
+            bodega_origen_id=payload.bodega_origen_id,
+            bodega_destino_id=payload.bodega_destino_id,
+            referencia_documento=referencia_base,
         )
 
-        costos_egreso = {
-            d.producto_id: q4(d.costo_unitario)
-            for d in session.exec(
-                select(MovimientoInventarioDetalle).where(
-                    MovimientoInventarioDetalle.movimiento_inventario_id == movimiento_egreso.id,
-                    MovimientoInventarioDetalle.activo.is_(True),
+    def transferir_en_lote(
+        self,
+        session: Session,
+        payload: TransferenciaInventarioLoteCreate,
+        *,
+        commit: bool = True,
+    ) -> TransferenciaInventarioLoteRead:
+        destino_ids = [destino.bodega_destino_id for destino in payload.destinos]
+        if len(set(destino_ids)) != len(destino_ids):
+            raise HTTPException(status_code=400, detail="Cada bodega destino debe aparecer una sola vez en el lote.")
+        if payload.bodega_origen_id in destino_ids:
+            raise HTTPException(status_code=400, detail="La bodega origen y destino deben ser diferentes.")
+
+        bodegas_activas = set(
+            session.exec(
+                select(Bodega.id).where(
+                    Bodega.id.in_([payload.bodega_origen_id, *destino_ids]),
+                    Bodega.activo.is_(True),
                 )
             ).all()
-        }
+        )
+        if payload.bodega_origen_id not in bodegas_activas:
+            raise HTTPException(status_code=409, detail="La bodega origen no existe o está inactiva.")
+        inactivas = [str(bodega_id) for bodega_id in destino_ids if bodega_id not in bodegas_activas]
+        if inactivas:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Bodegas destino inexistentes o inactivas: {', '.join(inactivas)}.",
+            )
 
-        ingreso_payload = MovimientoInventarioCreate(
+        referencia_base = payload.referencia_documento or f"TRANSFERENCIA:{uuid4()}"
+        referencias = {
+            destino.bodega_destino_id: f"{referencia_base}:DESTINO:{indice}"
+            for indice, destino in enumerate(payload.destinos, start=1)
+        }
+        movimiento_egreso, ingresos = self._ejecutar_transferencia(
+            session,
             fecha=payload.fecha,
-            bodega_id=payload.bodega_destino_id,
-            tipo_movimiento=TipoMovimientoInventario.INGRESO,
-            referencia_documento=f"{referencia_base}:DESTINO",
+            bodega_origen_id=payload.bodega_origen_id,
+            referencia_base=referencia_base,
             usuario_auditoria=payload.usuario_auditoria,
-            detalles=[
-                {
-                    "producto_id": detalle.producto_id,
-                    "cantidad": detalle.cantidad,
-                    "costo_unitario": costos_egreso.get(detalle.producto_id, Decimal("0.0000")),
-                }
-                for detalle in payload.detalles
+            destinos=[
+                (destino.bodega_destino_id, referencias[destino.bodega_destino_id], destino.detalles)
+                for destino in payload.destinos
             ],
         )
-        movimiento_ingreso = self.crear_movimiento_borrador(session, ingreso_payload, commit=False)
-        self.confirmar_movimiento(
-            session,
-            movimiento_ingreso.id,
-            commit=False,
-            rollback_on_error=False,
-        )
 
         if commit:
             session.commit()
 
-        return TransferenciaInventarioRead(
+        return TransferenciaInventarioLoteRead(
             movimiento_egreso_id=movimiento_egreso.id,
-            movimiento_ingreso_id=movimiento_ingreso.id,
             bodega_origen_id=payload.bodega_origen_id,
-            bodega_destino_id=payload.bodega_destino_id,
             referencia_documento=referencia_base,
+            destinos=[
+                TransferenciaInventarioLoteDestinoRead(
+                    bodega_destino_id=bodega_destino_id,
+                    movimiento_ingreso_id=ingresos[bodega_destino_id].id,
+                    referencia_documento=referencias[bodega_destino_id],
+                )
+                for bodega_destino_id in destino_ids
+            ],
+        )
+
+    def _ejecutar_transferencia(
+        self,
+        session: Session,
+        *,
+        fecha: date,
+        bodega_origen_id: UUID,
+        referencia_base: str,
+        usuario_auditoria: str | None,
+        destinos: list[tuple[UUID, str, list]],
+    ) -> tuple[MovimientoInventario, dict[UUID, MovimientoInventario]]:
+        """
+        Un egreso TRANSFERENCIA en origen (una línea por producto con el total del
+        lote) y un ingreso por destino. Todos los borradores se insertan en un
+        solo flush; el stock de origen se bloquea una vez al confirmar el egreso y
+        los costos congelados pasan a los ingresos en memoria.
+        """
+        totales: dict[UUID, Decimal] = {}
+        for _, _, detalles in destinos:
+            for detalle in detalles:
+                totales[detalle.producto_id] = q4(totales.get(detalle.producto_id, Decimal("0")) + detalle.cantidad)
+
+        movimiento_egreso, detalles_egreso = self._construir_borrador(
+            session,
+            MovimientoInventarioCreate(
+                fecha=fecha,
+                bodega_id=bodega_origen_id,
+                tipo_movimiento=TipoMovimientoInventario.TRANSFERENCIA,
+                referencia_documento=referencia_base,
+                usuario_auditoria=usuario_auditoria,
+                detalles=[
+                    {"producto_id": producto_id, "cantidad": cantidad, "costo_unitario": Decimal("0.0000")}
+                    for producto_id, cantidad in totales.items()
+                ],
+            ),
         )
+        # Destinos en orden de id: los locks de stock se toman siempre en el mismo orden.
+        ingresos = [
+            (
+                bodega_destino_id,
+                *self._construir_borrador(
+                    session,
+                    MovimientoInventarioCreate(
+                        fecha=fecha,
+                        bodega_id=bodega_destino_id,
+                        tipo_movimiento=TipoMovimientoInventario.INGRESO,
+                        referencia_documento=referencia_ingreso,
+                        usuario_auditoria=usuario_auditoria,
+                        detalles=[
+                            {"producto_id": detalle.producto_id, "cantidad": detalle.cantidad, "costo_unitario": Decimal("0.0000")}
+                            for detalle in detalles
+                        ],
+                    ),
+                ),
+            )
+            for bodega_destino_id, referencia_ingreso, detalles in sorted(destinos, key=lambda destino: destino[0])
+        ]
+        session.flush()
+
+        self._aplicar_confirmacion(session, movimiento_egreso, detalles_egreso, sincronizar_productos=False)
+        costos_egreso = {detalle.producto_id: q4(detalle.costo_unitario) for detalle in detalles_egreso}
+
+        for _, movimiento_ingreso, detalles_ingreso in ingresos:
+            for detalle in detalles_ingreso:
+                detalle.costo_unitario = costos_egreso[detalle.producto_id]
+            self._aplicar_confirmacion(session, movimiento_ingreso, detalles_ingreso, sincronizar_productos=False)
+
+        # El total por producto no cambia con una transferencia; se sincroniza una vez.
+        self._sincronizar_cantidad_producto_desde_stock(session, producto_ids=set(totales))
+        session.flush()
+        return movimiento_egreso, {bodega_destino_id: movimiento for bodega_destino_id, movimiento, _ in ingresos}
 
     @staticmethod
     def _tipo_reverso(tipo_movimiento: TipoMovimientoInventario) -> TipoMovimientoInventario:
@@ -373,6 +557,12 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
         if usuario_autorizador:
             movimiento.usuario_auditoria = usuario_autorizador
         session.add(movimiento)
+        self.cierre_kardex_service.recerrar_desde(
+            session,
+            fecha=movimiento.fecha,
+            bodega_id=movimiento.bodega_id,
+            producto_ids={detalle.producto_id for detalle in detalles},
+        )
         if commit:
             session.commit()
             session.refresh(movimiento)
@@ -386,73 +576,127 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
         *,
         producto_ids: set[UUID],
     ) -> None:
+        """Actualiza Producto.cantidad con un único UPDATE ... FROM sobre el stock agregado."""
         if not producto_ids:
             return
 
-        for producto_id in producto_ids:
-            total_stock = session.exec(
-                select(func.coalesce(func.sum(InventarioStock.cantidad_actual), Decimal("0.0000"))).where(
-                    InventarioStock.producto_id == producto_id,
-                    InventarioStock.activo.is_(True),
-                )
-            ).one()
-
-            producto = session.get(Producto, producto_id)
-            if producto is None:
-                continue
+        totales = (
+            select(
+                InventarioStock.producto_id.label("producto_id"),
+                func.sum(InventarioStock.cantidad_actual).label("total"),
+            )
+            .where(
+                InventarioStock.producto_id.in_(producto_ids),
+                InventarioStock.activo.is_(True),
+            )
+            .group_by(InventarioStock.producto_id)
+            .subquery()
+        )
+        filas = session.execute(
+            update(Producto)
+            .where(Producto.id == totales.c.producto_id)
+            .values(cantidad=totales.c.total)
+            .returning(Producto.id, Producto.cantidad, Producto.permite_fracciones)
+            .execution_options(synchronize_session="fetch")
+        ).all()
 
-            cantidad_decimal = q4(total_stock)
-            if not producto.permite_fracciones and cantidad_decimal != cantidad_decimal.to_integral_value():
+        # La cantidad del producto queda igual al stock agregado por construcción;
+        # solo resta validar la regla de fracciones sobre los valores retornados.
+        for producto_id, cantidad, permite_fracciones in filas:
+            cantidad_decimal = q4(cantidad)
+            if not permite_fracciones and cantidad_decimal != cantidad_decimal.to_integral_value():
                 raise ValueError(
                     f"Inconsistencia de fracciones: el producto {producto_id} no permite fracciones y su stock agregado es {cantidad_decimal}."
                 )
-            producto.cantidad = cantidad_decimal
-            session.add(producto)
 
     def _sincronizar_producto_bodega_desde_stock(
         self,
         session: Session,
         *,
         bodega_id: UUID,
-        producto_ids: set[UUID],
+        stocks: dict[UUID, InventarioStock],
+        usuario_auditoria: str | None = None,
     ) -> None:
-        if not producto_ids:
+        """Replica el stock de la bodega en ProductoBodega con un único upsert."""
+        if not stocks:
             return
 
         # Algunos tests unitarios crean un subconjunto de tablas; en ese escenario
         # se omite la sincronización referencial producto-bodega.
-        try:
-            session.exec(select(ProductoBodega.id).limit(1)).first()
-        except Exception:
+        if not session_has_table(session, ProductoBodega.__tablename__):
             return
 
-        for producto_id in producto_ids:
-            stock = session.exec(
-                select(InventarioStock).where(
-                    InventarioStock.bodega_id == bodega_id,
-                    InventarioStock.producto_id == producto_id,
-                    InventarioStock.activo.is_(True),
-                )
-            ).one_or_none()
-            cantidad = q4(stock.cantidad_actual) if stock is not None else Decimal("0.0000")
+        dialect_name = session.get_bind().dialect.name
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            # Sin INSERT ... ON CONFLICT en el dialecto: upsert por la unidad de trabajo.
+            self._sincronizar_producto_bodega_orm(session, bodega_id=bodega_id, stocks=stocks)
+            return
+
+        ahora = datetime.utcnow()
+        actor = get_current_user_id() or usuario_auditoria
+        tabla = ProductoBodega.__table__
+        stmt = dialect_insert(tabla).values(
+            [
+                {
+                    "id": uuid4(),
+                    "producto_id": producto_id,
+                    "bodega_id": bodega_id,
+                    "cantidad": q4(stock.cantidad_actual),
+                    "activo": True,
+                    "creado_en": ahora,
+                    "actualizado_en": ahora,
+                    "created_by": actor,
+                    "updated_by": actor,
+                    "usuario_auditoria": actor,
+                }
+                for producto_id, stock in sorted(stocks.items(), key=lambda item: str(item[0]))
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.producto_id, tabla.c.bodega_id],
+            set_={
+                "cantidad": stmt.excluded.cantidad,
+                "activo": True,
+                "actualizado_en": stmt.excluded.actualizado_en,
+                "updated_by": func.coalesce(stmt.excluded.updated_by, tabla.c.updated_by),
+            },
+        )
+        session.execute(stmt)
+
+        # El upsert no pasa por la unidad de trabajo: las relaciones ya cargadas se refrescan.
+        for relacion in list(session.identity_map.values()):
+            if isinstance(relacion, ProductoBodega) and relacion.bodega_id == bodega_id and relacion.producto_id in stocks:
+                session.expire(relacion)
 
-            relacion = session.exec(
+    @staticmethod
+    def _sincronizar_producto_bodega_orm(
+        session: Session,
+        *,
+        bodega_id: UUID,
+        stocks: dict[UUID, InventarioStock],
+    ) -> None:
+        relaciones = {
+            relacion.producto_id: relacion
+            for relacion in session.exec(
                 select(ProductoBodega).where(
                     ProductoBodega.bodega_id == bodega_id,
-                    ProductoBodega.producto_id == producto_id,
+                    ProductoBodega.producto_id.in_(stocks.keys()),
                 )
-            ).one_or_none()
+                .execution_options(include_inactive=True)
+            ).all()
+        }
+        for producto_id, stock in sorted(stocks.items(), key=lambda item: str(item[0])):
+            relacion = relaciones.get(producto_id)
             if relacion is None:
-                relacion = ProductoBodega(
-                    bodega_id=bodega_id,
-                    producto_id=producto_id,
-                    cantidad=cantidad,
-                    activo=True,
-                )
-            else:
-                relacion.cantidad = cantidad
-                relacion.activo = True
+                relacion = ProductoBodega(bodega_id=bodega_id, producto_id=producto_id, activo=True)
+            relacion.cantidad = q4(stock.cantidad_actual)
+            relacion.activo = True
             session.add(relacion)
+        session.flush()
 
     def _registrar_auditoria_ajuste(
         self,
@@ -486,192 +730,347 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
             )
         )
 
-    def _aplicar_egreso_con_lock(
+    @staticmethod
+    def _bloquear_stocks_en_lote(
+        session: Session,
+        *,
+        bodega_id: UUID,
+        producto_ids: set[UUID],
+    ) -> dict[UUID, InventarioStock]:
+        # Un único SELECT ... FOR UPDATE ordenado por producto: todos los movimientos
+        # toman los locks en el mismo orden y no pueden bloquearse mutuamente.
+        stocks = session.exec(
+            select(InventarioStock)
+            .where(
+                InventarioStock.bodega_id == bodega_id,
+                InventarioStock.producto_id.in_(producto_ids),
+                InventarioStock.activo.is_(True),
+            )
+            .order_by(InventarioStock.producto_id.asc())
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).all()
+        return {stock.producto_id: stock for stock in stocks}
+
+    def _aplicar_detalles_en_lote(
         self,
         session: Session,
         movimiento: MovimientoInventario,
-        detalle: MovimientoInventarioDetalle,
+        detalles: list[MovimientoInventarioDetalle],
+        stocks: dict[UUID, InventarioStock],
     ) -> None:
-        try:
-            stock = session.exec(
-                select(InventarioStock)
-                .where(
-                    InventarioStock.bodega_id == movimiento.bodega_id,
-                    InventarioStock.producto_id == detalle.producto_id,
-                    InventarioStock.activo.is_(True),
+        es_egreso = self._es_movimiento_egreso(movimiento.tipo_movimiento)
+        saldos: dict[UUID, tuple[Decimal, Decimal]] = {
+            producto_id: (q4(stock.cantidad_actual), q4(stock.costo_promedio_vigente))
+            for producto_id, stock in stocks.items()
+        }
+        ledger: dict[UUID, tuple[Decimal, Decimal]] = {
+            producto_id: (q4(stock.kardex_saldo_cantidad), q4(stock.kardex_saldo_valor))
+            for producto_id, stock in stocks.items()
+        }
+
+        # Los detalles se aplican en memoria en el mismo orden que antes se aplicaban
+        # contra la base, de modo que productos repetidos acumulan igual.
+        for detalle in detalles:
+            cantidad_detalle = q4(detalle.cantidad)
+            if es_egreso:
+                if detalle.producto_id not in saldos:
+                    raise ValueError("No existe stock materializado para el producto/bodega.")
+                cantidad_actual, costo_actual = saldos[detalle.producto_id]
+                if cantidad_actual - cantidad_detalle < Decimal("0"):
+                    raise ValueError("Inventario insuficiente: no se permite stock negativo.")
+
+                # E3-3: congelar costo histórico del egreso al costo promedio vigente.
+                detalle.costo_unitario = self.calculo_kardex_strategy.congelar_costo_egreso(costo_actual)
+                saldos[detalle.producto_id] = (q4(cantidad_actual - cantidad_detalle), costo_actual)
+            else:
+                cantidad_actual, costo_actual = saldos.get(
+                    detalle.producto_id,
+                    (Decimal("0.0000"), Decimal("0.0000")),
                 )
-                .with_for_update()
-            ).one()
-        except NoResultFound as exc:
-            raise ValueError("No existe stock materializado para el producto/bodega.") from exc
-
-        cantidad_actual = q4(stock.cantidad_actual)
-        cantidad_detalle = q4(detalle.cantidad)
-        if cantidad_actual - cantidad_detalle < Decimal("0"):
-            raise ValueError("Inventario insuficiente: no se permite stock negativo.")
-
-        # E3-3: congelar costo histórico del egreso al costo promedio vigente.
-        detalle.costo_unitario = self.calculo_kardex_strategy.congelar_costo_egreso(stock.costo_promedio_vigente)
-        session.add(detalle)
-
-        result = session.exec(
-            update(InventarioStock)
-            .where(
-                InventarioStock.id == stock.id,
-                InventarioStock.activo.is_(True),
-                InventarioStock.cantidad_actual >= cantidad_detalle,
+                nueva_cantidad = q4(cantidad_actual + cantidad_detalle)
+                if nueva_cantidad <= Decimal("0"):
+                    raise ValueError("Cantidad resultante invalida para ingreso.")
+
+                nuevo_costo = self.calculo_kardex_strategy.calcular_nuevo_costo_promedio(
+                    cantidad_actual=cantidad_actual,
+                    costo_promedio_actual=costo_actual,
+                    cantidad_ingresada=cantidad_detalle,
+                    costo_nuevo=q4(detalle.costo_unitario),
+                )
+                saldos[detalle.producto_id] = (nueva_cantidad, nuevo_costo)
+
+            factor = Decimal("-1") if es_egreso else Decimal("1")
+            kardex_cantidad, kardex_valor = ledger.get(
+                detalle.producto_id,
+                (Decimal("0.0000"), Decimal("0.0000")),
             )
-            .values(cantidad_actual=InventarioStock.cantidad_actual - cantidad_detalle)
+            valor_linea = q4(cantidad_detalle * q4(detalle.costo_unitario))
+            ledger[detalle.producto_id] = (
+                q4(kardex_cantidad + (cantidad_detalle * factor)),
+                q4(kardex_valor + (valor_linea * factor)),
+            )
+            detalle.saldo_cantidad, detalle.saldo_valor = ledger[detalle.producto_id]
+            detalle.costo_promedio_saldo = saldos[detalle.producto_id][1]
+            session.add(detalle)
+
+        self._escribir_stocks_en_lote(
+            session,
+            movimiento=movimiento,
+            stocks=stocks,
+            saldos=saldos,
+            ledger=ledger,
         )
-        if (getattr(result, "rowcount", 0) or 0) != 1:
-            raise ValueError("Inventario insuficiente: no se permite stock negativo.")
 
-    def _aplicar_ingreso(
-        self,
+    @staticmethod
+    def _escribir_stocks_en_lote(
         session: Session,
+        *,
         movimiento: MovimientoInventario,
-        detalle: MovimientoInventarioDetalle,
+        stocks: dict[UUID, InventarioStock],
+        saldos: dict[UUID, tuple[Decimal, Decimal]],
+        ledger: dict[UUID, tuple[Decimal, Decimal]],
     ) -> None:
-        stock = session.exec(
-            select(InventarioStock)
-            .where(
-                InventarioStock.bodega_id == movimiento.bodega_id,
-                InventarioStock.producto_id == detalle.producto_id,
-                InventarioStock.activo.is_(True),
+        stock_cache.marcar_invalidacion(session, bodega_id=movimiento.bodega_id, producto_ids=saldos.keys())
+        stock_table = InventarioStock.__table__
+        filas = [
+            {
+                "b_id": stock.id,
+                "b_cantidad_anterior": stock.cantidad_actual,
+                "b_cantidad": saldos[producto_id][0],
+                "b_costo": saldos[producto_id][1],
+                "b_kardex_cantidad": ledger[producto_id][0],
+                "b_kardex_valor": ledger[producto_id][1],
+            }
+            for producto_id, stock in stocks.items()
+        ]
+        if filas:
+            # La condición sobre la cantidad leída actúa como lock optimista en motores
+            # sin FOR UPDATE (SQLite): si otra transacción alteró el saldo, no se aplica.
+            result = session.exec(
+                update(stock_table)
+                .where(
+                    stock_table.c.id == bindparam("b_id"),
+                    stock_table.c.activo.is_(True),
+                    stock_table.c.cantidad_actual == bindparam("b_cantidad_anterior"),
+                )
+                .values(
+                    cantidad_actual=bindparam("b_cantidad"),
+                    costo_promedio_vigente=bindparam("b_costo"),
+                    kardex_saldo_cantidad=bindparam("b_kardex_cantidad"),
+                    kardex_saldo_valor=bindparam("b_kardex_valor"),
+                ),
+                params=filas,
             )
-            .with_for_update()
-        ).one_or_none()
-        if stock is None:
-            stock = InventarioStock(
+            if (getattr(result, "rowcount", 0) or 0) != len(filas):
+                raise ValueError(
+                    "Conflicto de concurrencia: el stock cambió durante la confirmación del movimiento."
+                )
+            for producto_id, stock in stocks.items():
+                set_committed_value(stock, "cantidad_actual", saldos[producto_id][0])
+                set_committed_value(stock, "costo_promedio_vigente", saldos[producto_id][1])
+                set_committed_value(stock, "kardex_saldo_cantidad", ledger[producto_id][0])
+                set_committed_value(stock, "kardex_saldo_valor", ledger[producto_id][1])
+
+        nuevos = [
+            InventarioStock(
                 bodega_id=movimiento.bodega_id,
-                producto_id=detalle.producto_id,
-                cantidad_actual=Decimal("0.0000"),
-                costo_promedio_vigente=Decimal("0.0000"),
+                producto_id=producto_id,
+                cantidad_actual=cantidad,
+                costo_promedio_vigente=costo,
+                kardex_saldo_cantidad=ledger[producto_id][0],
+                kardex_saldo_valor=ledger[producto_id][1],
                 usuario_auditoria=movimiento.usuario_auditoria,
                 activo=True,
             )
-            session.add(stock)
+            for producto_id, (cantidad, costo) in saldos.items()
+            if producto_id not in stocks
+        ]
+        if nuevos:
+            session.add_all(nuevos)
             session.flush()
-
-        cantidad_actual = q4(stock.cantidad_actual)
-        costo_actual = q4(stock.costo_promedio_vigente)
-        cantidad_ingreso = q4(detalle.cantidad)
-        costo_ingreso = q4(detalle.costo_unitario)
-
-        nueva_cantidad = q4(cantidad_actual + cantidad_ingreso)
-        if nueva_cantidad <= Decimal("0"):
-            raise ValueError("Cantidad resultante invalida para ingreso.")
-
-        nuevo_costo = self.calculo_kardex_strategy.calcular_nuevo_costo_promedio(
-            cantidad_actual=cantidad_actual,
-            costo_promedio_actual=costo_actual,
-            cantidad_ingresada=cantidad_ingreso,
-            costo_nuevo=costo_ingreso,
-        )
-
-        stock.cantidad_actual = nueva_cantidad
-        stock.costo_promedio_vigente = nuevo_costo
-        session.add(stock)
-
-    def obtener_kardex(
-        self,
-        session: Session,
-        *,
-        producto_id: UUID,
-        bodega_id: UUID,
-        fecha_inicio=None,
-        fecha_fin=None,
-    ) -> dict:
-        filtros_base = [
+            stocks.update({stock.producto_id: stock for stock in nuevos})
+
+    KARDEX_COLUMNAS = (
+        "fecha",
+        "movimiento_id",
+        "tipo_movimiento",
+        "referencia_documento",
+        "cantidad_entrada",
+        "cantidad_salida",
+        "saldo_cantidad",
+        "costo_unitario_aplicado",
+        "valor_movimiento",
+    )
+    KARDEX_LOTE_FILAS = 1000
+
+    def _kardex_stmt(self, *, producto_id: UUID, bodega_id: UUID, fecha_inicio=None, fecha_fin=None):
+        filtros = [
             MovimientoInventario.bodega_id == bodega_id,
             MovimientoInventario.estado == EstadoMovimientoInventario.CONFIRMADO,
             MovimientoInventarioDetalle.producto_id == producto_id,
             MovimientoInventario.activo.is_(True),
             MovimientoInventarioDetalle.activo.is_(True),
         ]
-
-        saldo_inicial = Decimal("0.0000")
         if fecha_inicio is not None:
-            filas_saldo = session.exec(
-                select(
-                    MovimientoInventario.tipo_movimiento,
-                    MovimientoInventarioDetalle.cantidad,
-                )
-                .join(
-                    MovimientoInventarioDetalle,
-                    MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id,
-                )
-                .where(
-                    *filtros_base,
-                    MovimientoInventario.fecha < fecha_inicio,
-                )
-            ).all()
-            for tipo_movimiento, cantidad in filas_saldo:
-                cantidad_q = q4(cantidad)
-                if tipo_movimiento in {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}:
-                    saldo_inicial = q4(saldo_inicial - cantidad_q)
-                else:
-                    saldo_inicial = q4(saldo_inicial + cantidad_q)
-
-        filtros_movimientos = list(filtros_base)
-        if fecha_inicio is not None:
-            filtros_movimientos.append(MovimientoInventario.fecha >= fecha_inicio)
+            filtros.append(MovimientoInventario.fecha >= fecha_inicio)
         if fecha_fin is not None:
-            filtros_movimientos.append(MovimientoInventario.fecha <= fecha_fin)
+            filtros.append(MovimientoInventario.fecha <= fecha_fin)
 
-        filas = session.exec(
-            select(MovimientoInventario, MovimientoInventarioDetalle)
+        numerico = Numeric(14, 4)
+        es_salida = MovimientoInventario.tipo_movimiento.in_(
+            [TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA]
+        )
+        cero = literal(0, numerico)
+        entrada = case((es_salida, cero), else_=MovimientoInventarioDetalle.cantidad)
+        salida = case((es_salida, MovimientoInventarioDetalle.cantidad), else_=cero)
+        saldo_acumulado = func.sum(entrada - salida).over(
+            order_by=(
+                MovimientoInventario.fecha.asc(),
+                MovimientoInventario.creado_en.asc(),
+                MovimientoInventarioDetalle.id.asc(),
+            ),
+            rows=(None, 0),
+        )
+
+        return (
+            select(
+                MovimientoInventario.fecha,
+                MovimientoInventario.id.label("movimiento_id"),
+                MovimientoInventario.tipo_movimiento,
+                MovimientoInventario.referencia_documento,
+                cast(entrada, numerico).label("cantidad_entrada"),
+                cast(salida, numerico).label("cantidad_salida"),
+                cast(saldo_acumulado, numerico).label("saldo_acumulado"),
+                cast(MovimientoInventarioDetalle.costo_unitario, numerico).label("costo_unitario_aplicado"),
+                cast(
+                    func.round(MovimientoInventarioDetalle.cantidad * MovimientoInventarioDetalle.costo_unitario, 4),
+                    numerico,
+                ).label("valor_movimiento"),
+            )
+            .select_from(MovimientoInventario)
             .join(
                 MovimientoInventarioDetalle,
                 MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id,
             )
-            .where(*filtros_movimientos)
+            .where(*filtros)
             .order_by(
                 MovimientoInventario.fecha.asc(),
                 MovimientoInventario.creado_en.asc(),
                 MovimientoInventarioDetalle.id.asc(),
             )
-        ).all()
+        )
 
-        saldo = q4(saldo_inicial)
-        movimientos = []
-        for movimiento, detalle in filas:
-            cantidad = q4(detalle.cantidad)
-            costo = q4(detalle.costo_unitario)
-            if movimiento.tipo_movimiento in {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}:
-                entrada = Decimal("0.0000")
-                salida = cantidad
-                saldo = q4(saldo - cantidad)
-                valor = q4(salida * costo)
-            else:
-                entrada = cantidad
-                salida = Decimal("0.0000")
-                saldo = q4(saldo + cantidad)
-                valor = q4(entrada * costo)
+    def _saldo_inicial_kardex(self, session: Session, *, producto_id: UUID, bodega_id: UUID, fecha_inicio=None) -> Decimal:
+        if fecha_inicio is None:
+            return Decimal("0.0000")
+        saldo_inicial, _ = self.cierre_kardex_service.saldo_a_fecha(
+            session,
+            producto_id=producto_id,
+            antes_de=fecha_inicio,
+            bodega_ids=[bodega_id],
+        )
+        return q4(saldo_inicial)
 
-            movimientos.append(
-                {
-                    "fecha": movimiento.fecha,
-                    "movimiento_id": movimiento.id,
-                    "tipo_movimiento": movimiento.tipo_movimiento,
-                    "referencia_documento": movimiento.referencia_documento,
-                    "cantidad_entrada": entrada,
-                    "cantidad_salida": salida,
-                    "saldo_cantidad": saldo,
-                    "costo_unitario_aplicado": costo,
-                    "valor_movimiento": valor,
-                }
+    def iterar_kardex(
+        self,
+        session: Session,
+        *,
+        producto_id: UUID,
+        bodega_id: UUID,
+        fecha_inicio=None,
+        fecha_fin=None,
+        saldo_inicial: Decimal | None = None,
+    ) -> Iterator[dict]:
+        """Recorre el kardex con cursor de servidor; saldos y valores se calculan en la base."""
+        if saldo_inicial is None:
+            saldo_inicial = self._saldo_inicial_kardex(
+                session, producto_id=producto_id, bodega_id=bodega_id, fecha_inicio=fecha_inicio
             )
+        stmt = self._kardex_stmt(
+            producto_id=producto_id,
+            bodega_id=bodega_id,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+        ).execution_options(stream_results=True, yield_per=self.KARDEX_LOTE_FILAS)
+
+        for fila in session.execute(stmt):
+            yield {
+                "fecha": fila.fecha,
+                "movimiento_id": fila.movimiento_id,
+                "tipo_movimiento": fila.tipo_movimiento,
+                "referencia_documento": fila.referencia_documento,
+                "cantidad_entrada": fila.cantidad_entrada,
+                "cantidad_salida": fila.cantidad_salida,
+                "saldo_cantidad": saldo_inicial + fila.saldo_acumulado,
+                "costo_unitario_aplicado": fila.costo_unitario_aplicado,
+                "valor_movimiento": fila.valor_movimiento,
+            }
 
+    def obtener_kardex(
+        self,
+        session: Session,
+        *,
+        producto_id: UUID,
+        bodega_id: UUID,
+        fecha_inicio=None,
+        fecha_fin=None,
+    ) -> dict:
+        saldo_inicial = self._saldo_inicial_kardex(
+            session, producto_id=producto_id, bodega_id=bodega_id, fecha_inicio=fecha_inicio
+        )
         return {
             "producto_id": producto_id,
             "bodega_id": bodega_id,
             "fecha_inicio": fecha_inicio,
             "fecha_fin": fecha_fin,
             "saldo_inicial": saldo_inicial,
-            "movimientos": movimientos,
+            "movimientos": list(
+                self.iterar_kardex(
+                    session,
+                    producto_id=producto_id,
+                    bodega_id=bodega_id,
+                    fecha_inicio=fecha_inicio,
+                    fecha_fin=fecha_fin,
+                    saldo_inicial=saldo_inicial,
+                )
+            ),
         }
 
+    def exportar_kardex(
+        self,
+        session: Session,
+        *,
+        producto_id: UUID,
+        bodega_id: UUID,
+        fecha_inicio=None,
+        fecha_fin=None,
+        formato: str = "ndjson",
+    ) -> Iterator[str]:
+        """Serializa el kardex fila a fila en NDJSON o CSV sin materializar el historial."""
+        filas = self.iterar_kardex(
+            session,
+            producto_id=producto_id,
+            bodega_id=bodega_id,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+        )
+        if formato == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(self.KARDEX_COLUMNAS)
+            for indice, fila in enumerate(filas, start=1):
+                writer.writerow([_kardex_valor_texto(fila[columna]) for columna in self.KARDEX_COLUMNAS])
+                if indice % self.KARDEX_LOTE_FILAS == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+            yield buffer.getvalue()
+            return
+
+        for fila in filas:
+            yield json.dumps({columna: _kardex_valor_texto(fila[columna]) for columna in self.KARDEX_COLUMNAS}) + "\n"
+
     def obtener_valoracion(
         self,
         session: Session,
@@ -732,6 +1131,9 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
                 producto_id=detalle.producto_id,
                 cantidad=detalle.cantidad,
                 costo_unitario=detalle.costo_unitario,
+                saldo_cantidad=detalle.saldo_cantidad,
+                saldo_valor=detalle.saldo_valor,
+                costo_promedio_saldo=detalle.costo_promedio_saldo,
             )
             for detalle in detalles
         ]
@@ -751,56 +1153,20 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
         return tipo_movimiento in {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}
 
     @staticmethod
-    def _obtener_stock_producto_bodega(session: Session, *, bodega_id: UUID, producto_id: UUID) -> Decimal:
-        stock = session.exec(
-            select(InventarioStock).where(
-                InventarioStock.bodega_id == bodega_id,
-                InventarioStock.producto_id == producto_id,
-                InventarioStock.activo.is_(True),
-            )
-        ).one_or_none()
-        if stock is None:
-            return Decimal("0.0000")
-        return q4(stock.cantidad_actual)
-
-    def _obtener_saldo_kardex_producto_bodega(
-        self,
+    def _obtener_stocks_en_lote(
         session: Session,
         *,
         bodega_id: UUID,
-        producto_id: UUID,
-    ) -> Decimal:
+        producto_ids: set[UUID],
+    ) -> dict[UUID, Decimal]:
         filas = session.exec(
-            select(
-                MovimientoInventario.tipo_movimiento,
-                MovimientoInventarioDetalle.cantidad,
-            )
-            .join(
-                MovimientoInventarioDetalle,
-                MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id,
-            )
-            .where(
-                MovimientoInventario.bodega_id == bodega_id,
-                MovimientoInventario.estado == EstadoMovimientoInventario.CONFIRMADO,
-                MovimientoInventario.activo.is_(True),
-                MovimientoInventarioDetalle.producto_id == producto_id,
-                MovimientoInventarioDetalle.activo.is_(True),
-            )
-            .order_by(
-                MovimientoInventario.fecha.asc(),
-                MovimientoInventario.creado_en.asc(),
-                MovimientoInventarioDetalle.id.asc(),
+            select(InventarioStock.producto_id, InventarioStock.cantidad_actual).where(
+                InventarioStock.bodega_id == bodega_id,
+                InventarioStock.producto_id.in_(producto_ids),
+                InventarioStock.activo.is_(True),
             )
         ).all()
-
-        saldo = Decimal("0.0000")
-        for tipo_movimiento, cantidad in filas:
-            cantidad_q = q4(cantidad)
-            if self._es_movimiento_egreso(tipo_movimiento):
-                saldo = q4(saldo - cantidad_q)
-            else:
-                saldo = q4(saldo + cantidad_q)
-        return saldo
+        return {producto_id: q4(cantidad) for producto_id, cantidad in filas}
 
     def _validar_integridad_operacion_kardex_stock(
         self,
@@ -811,6 +1177,7 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
         stock_before: dict[UUID, Decimal],
         kardex_before: dict[UUID, Decimal],
     ) -> None:
+        """Relee el stock escrito y exige delta = suma de detalles y el mismo desfase stock/kardex que antes."""
         factor = Decimal("-1.0000") if self._es_movimiento_egreso(movimiento.tipo_movimiento) else Decimal("1.0000")
         esperado_delta_por_producto: dict[UUID, Decimal] = {}
         for detalle in detalles:
@@ -819,14 +1186,15 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
                 esperado_delta_por_producto[detalle.producto_id] + (q4(detalle.cantidad) * factor)
             )
 
+        stocks_after = self._obtener_stocks_en_lote(
+            session,
+            bodega_id=movimiento.bodega_id,
+            producto_ids=set(esperado_delta_por_producto),
+        )
         for producto_id, esperado_delta in esperado_delta_por_producto.items():
             stock_before_producto = stock_before.get(producto_id, Decimal("0.0000"))
             kardex_before_producto = kardex_before.get(producto_id, Decimal("0.0000"))
-            stock_after = self._obtener_stock_producto_bodega(
-                session,
-                bodega_id=movimiento.bodega_id,
-                producto_id=producto_id,
-            )
+            stock_after = stocks_after.get(producto_id, Decimal("0.0000"))
             delta_stock = q4(stock_after - stock_before_producto)
             kardex_proyectado = q4(kardex_before_producto + esperado_delta)
             desfase_before = q4(stock_before_producto - kardex_before_producto)
@@ -840,26 +1208,3 @@ class MovimientoInventarioService(TemplateMethodService[MovimientoInventarioCrea
                 raise ValueError(
                     f"Inconsistencia de kardex: desfase antes={desfase_before} y despues={desfase_after} para producto {producto_id}."
                 )
-
-    def _validar_producto_vs_stock(self, session: Session, *, producto_ids: set[UUID]) -> None:
-        for producto_id in producto_ids:
-            total_stock = session.exec(
-                select(func.coalesce(func.sum(InventarioStock.cantidad_actual), Decimal("0.0000"))).where(
-                    InventarioStock.producto_id == producto_id,
-                    InventarioStock.activo.is_(True),
-                )
-            ).one()
-
-            producto = session.get(Producto, producto_id)
-            if producto is None:
-                continue
-
-            esperado = q4(total_stock)
-            if not producto.permite_fracciones and esperado != esperado.to_integral_value():
-                raise ValueError(
-                    f"Inconsistencia de fracciones: el producto {producto_id} no permite fracciones y su stock agregado es {esperado}."
-                )
-            if q4(producto.cantidad) != esperado:
-                raise ValueError(
-                    f"Inconsistencia de producto: cantidad={producto.cantidad} difiere de stock agregado={esperado} para producto {producto_id}."
-                )
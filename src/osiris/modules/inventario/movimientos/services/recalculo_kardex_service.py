@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from uuid import UUID
+
+from sqlalchemy import BigInteger, bindparam, cast, func, update
+from sqlmodel import Session, select
+
+from osiris.modules.inventario.movimientos.models import (
+    EstadoMovimientoInventario,
+    InventarioStock,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.strategies.kardex_punto_fijo import (
+    ESCALA,
+    LineaKardexPuntoFijo,
+    RecalculoKardexPuntoFijo,
+    desde_punto_fijo,
+)
+
+
+def columna_punto_fijo(columna):
+    """Expresión SQL que entrega la columna Numeric(14, 4) como entero en unidades de 0.0001."""
+    return cast(func.round(columna * ESCALA), BigInteger)
+
+
+class RecalculoKardexService:
+    """
+    Reconstrucción del kardex histórico con el motor de punto fijo.
+
+    Vuelve a calcular, desde el primer movimiento aplicado, el saldo corrido por
+    línea (saldo_cantidad, saldo_valor, costo_promedio_saldo) y la cabecera del
+    ledger en stock, escribiendo todo con sentencias executemany. Los egresos
+    conservan su costo congelado; solo se informa cuántos difieren del promedio
+    recalculado.
+    """
+
+    LOTE_ESCRITURA = 1000
+
+    def __init__(self, motor: RecalculoKardexPuntoFijo | None = None) -> None:
+        self.motor = motor or RecalculoKardexPuntoFijo(respetar_costo_egreso=True)
+
+    @staticmethod
+    def _movimientos_reversados(session: Session, *, bodega_id: UUID | None) -> set[UUID]:
+        filtros = [MovimientoInventario.referencia_documento.like("REVERSO:%")]
+        if bodega_id is not None:
+            filtros.append(MovimientoInventario.bodega_id == bodega_id)
+        reversados: set[UUID] = set()
+        for referencia in session.exec(select(MovimientoInventario.referencia_documento).where(*filtros)).all():
+            try:
+                reversados.add(UUID(referencia.split(":", 1)[1]))
+            except ValueError:
+                continue
+        return reversados
+
+    def reconstruir(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID | None = None,
+        producto_ids: list[UUID] | None = None,
+        commit: bool = True,
+    ) -> dict:
+        # Aplicados al stock: confirmados y anulados que tuvieron reverso.
+        reversados = self._movimientos_reversados(session, bodega_id=bodega_id)
+        filtros = [
+            MovimientoInventario.activo.is_(True),
+            MovimientoInventarioDetalle.activo.is_(True),
+            MovimientoInventario.estado.in_([EstadoMovimientoInventario.CONFIRMADO, EstadoMovimientoInventario.ANULADO]),
+        ]
+        if bodega_id is not None:
+            filtros.append(MovimientoInventario.bodega_id == bodega_id)
+        if producto_ids:
+            filtros.append(MovimientoInventarioDetalle.producto_id.in_(producto_ids))
+
+        filas = session.exec(
+            select(
+                MovimientoInventarioDetalle.id,
+                MovimientoInventario.id,
+                MovimientoInventario.estado,
+                MovimientoInventario.bodega_id,
+                MovimientoInventarioDetalle.producto_id,
+                MovimientoInventario.tipo_movimiento,
+                columna_punto_fijo(MovimientoInventarioDetalle.cantidad),
+                columna_punto_fijo(MovimientoInventarioDetalle.costo_unitario),
+            )
+            .select_from(MovimientoInventario)
+            .join(
+                MovimientoInventarioDetalle,
+                MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id,
+            )
+            .where(*filtros)
+            .order_by(
+                MovimientoInventario.bodega_id.asc(),
+                MovimientoInventarioDetalle.producto_id.asc(),
+                MovimientoInventario.fecha.asc(),
+                MovimientoInventario.creado_en.asc(),
+                MovimientoInventarioDetalle.id.asc(),
+            )
+        ).all()
+
+        egresos = {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}
+        detalle_ids = []
+        lineas = []
+        for detalle_id, movimiento_id, estado, fila_bodega_id, producto_id, tipo, cantidad, costo in filas:
+            if estado == EstadoMovimientoInventario.ANULADO and movimiento_id not in reversados:
+                continue
+            detalle_ids.append(detalle_id)
+            lineas.append(
+                LineaKardexPuntoFijo(
+                    grupo=(fila_bodega_id, producto_id),
+                    es_egreso=tipo in egresos,
+                    cantidad=int(cantidad),
+                    costo_unitario=int(costo),
+                )
+            )
+
+        resultado = self.motor.recalcular(lineas)
+        inconsistentes = resultado.grupos_inconsistentes
+
+        detalle_table = MovimientoInventarioDetalle.__table__
+        filas_detalle = [
+            {
+                "b_id": detalle_id,
+                "b_saldo_cantidad": desde_punto_fijo(resultado.saldo_cantidad[indice]),
+                "b_saldo_valor": desde_punto_fijo(resultado.saldo_valor[indice]),
+                "b_costo_promedio": desde_punto_fijo(resultado.costo_promedio[indice]),
+            }
+            for indice, detalle_id in enumerate(detalle_ids)
+            if lineas[indice].grupo not in inconsistentes
+        ]
+        stmt_detalle = (
+            update(detalle_table)
+            .where(detalle_table.c.id == bindparam("b_id"))
+            .values(
+                saldo_cantidad=bindparam("b_saldo_cantidad"),
+                saldo_valor=bindparam("b_saldo_valor"),
+                costo_promedio_saldo=bindparam("b_costo_promedio"),
+            )
+        )
+        for inicio in range(0, len(filas_detalle), self.LOTE_ESCRITURA):
+            session.execute(stmt_detalle, filas_detalle[inicio : inicio + self.LOTE_ESCRITURA])
+
+        stock_table = InventarioStock.__table__
+        filas_stock = [
+            {
+                "b_bodega_id": grupo[0],
+                "b_producto_id": grupo[1],
+                "b_kardex_cantidad": desde_punto_fijo(saldo.cantidad),
+                "b_kardex_valor": desde_punto_fijo(saldo.valor),
+            }
+            for grupo, saldo in resultado.saldos.items()
+            if grupo not in inconsistentes
+        ]
+        if filas_stock:
+            session.execute(
+                update(stock_table)
+                .where(
+                    stock_table.c.bodega_id == bindparam("b_bodega_id"),
+                    stock_table.c.producto_id == bindparam("b_producto_id"),
+                    stock_table.c.activo.is_(True),
+                )
+                .values(
+                    kardex_saldo_cantidad=bindparam("b_kardex_cantidad"),
+                    kardex_saldo_valor=bindparam("b_kardex_valor"),
+                ),
+                filas_stock,
+            )
+
+        # Un egreso no mueve el promedio: el promedio tras la línea es el vigente al egresar.
+        costos_divergentes = sum(
+            1
+            for indice, linea in enumerate(lineas)
+            if linea.es_egreso and resultado.costo_promedio[indice] != linea.costo_unitario
+        )
+        if commit:
+            session.commit()
+        else:
+            session.flush()
+        # Los objetos ya cargados no pasan por la unidad de trabajo: se releen al usarse.
+        session.expire_all()
+        return {
+            "lineas_recalculadas": len(filas_detalle),
+            "pares_recalculados": len(filas_stock),
+            "egresos_con_costo_divergente": costos_divergentes,
+            "pares_inconsistentes": [
+                {"bodega_id": grupo[0], "producto_id": grupo[1], "motivo": motivo}
+                for grupo, motivo in inconsistentes.items()
+            ],
+        }
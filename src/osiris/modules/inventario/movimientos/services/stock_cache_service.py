@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from osiris.core.canal_notificaciones import CanalNotificaciones, registrar_canal
+from osiris.core.observability import record_stock_cache_invalidacion, record_stock_cache_lookup
+from osiris.core.settings import get_settings
+from osiris.modules.inventario.movimientos.models import InventarioStock
+
+
+ClaveStock = tuple[UUID, UUID]  # (bodega_id, producto_id)
+
+# NOTIFY admite hasta 8000 bytes por mensaje; cada clave ocupa 65.
+_CLAVES_POR_NOTIFICACION = 100
+_MAX_NOTIFICACIONES = 10
+_INVALIDAR_TODO = "*"
+
+
+@dataclass(frozen=True)
+class StockCacheado:
+    cantidad_actual: Decimal
+    costo_promedio_vigente: Decimal
+
+
+class StockCache(CanalNotificaciones):
+    """
+    Cache read-through en proceso de (bodega, producto) -> stock vigente.
+
+    Tamaño acotado con desalojo LRU. Las escrituras de stock marcan sus claves en
+    el session y se invalidan al terminar la transacción (commit o rollback). En
+    Postgres la invalidación también se publica con NOTIFY dentro de la misma
+    transacción para que los demás workers la apliquen; el TTL acota cualquier
+    notificación perdida.
+    """
+
+    clave_sesion = "osiris_stock_cache_invalidar"
+    descripcion = "el cache de stock"
+
+    def __init__(
+        self,
+        *,
+        max_entradas: int | None = None,
+        ttl_segundos: int | None = None,
+        habilitado: bool | None = None,
+        canal: str | None = None,
+    ) -> None:
+        settings = get_settings()
+        self.max_entradas = max_entradas or settings.STOCK_CACHE_MAX_ENTRIES
+        self.ttl_segundos = settings.STOCK_CACHE_TTL_SECONDS if ttl_segundos is None else ttl_segundos
+        super().__init__(
+            habilitado=settings.STOCK_CACHE_ENABLED if habilitado is None else habilitado,
+            canal=canal or settings.STOCK_CACHE_CANAL_INVALIDACION,
+        )
+        self._entradas: OrderedDict[ClaveStock, tuple[StockCacheado | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Se incrementa en cada invalidación; una carga iniciada antes no se guarda.
+        self._generacion = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+    def obtener(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID,
+        producto_ids: list[UUID] | set[UUID],
+    ) -> dict[UUID, StockCacheado]:
+        """Stock vigente por producto en la bodega; los pares sin stock se omiten."""
+        if not self.habilitado:
+            return self._cargar(session, bodega_id=bodega_id, producto_ids=set(producto_ids))
+
+        ahora = time.monotonic()
+        encontrados: dict[UUID, StockCacheado] = {}
+        faltantes: set[UUID] = set()
+        with self._lock:
+            generacion = self._generacion
+            for producto_id in producto_ids:
+                clave = (bodega_id, producto_id)
+                entrada = self._entradas.get(clave)
+                if entrada is None or (self.ttl_segundos and ahora - entrada[1] > self.ttl_segundos):
+                    faltantes.add(producto_id)
+                    continue
+                self._entradas.move_to_end(clave)
+                if entrada[0] is not None:
+                    encontrados[producto_id] = entrada[0]
+        hits = len(set(producto_ids)) - len(faltantes)
+
+        if faltantes:
+            cargados = self._cargar(session, bodega_id=bodega_id, producto_ids=faltantes)
+            encontrados.update(cargados)
+            with self._lock:
+                if generacion == self._generacion:
+                    for producto_id in faltantes:
+                        # Las ausencias también se guardan: el stock nuevo se crea en
+                        # la misma escritura que invalida la clave.
+                        self._entradas[(bodega_id, producto_id)] = (cargados.get(producto_id), ahora)
+                        self._entradas.move_to_end((bodega_id, producto_id))
+                    while len(self._entradas) > self.max_entradas:
+                        self._entradas.popitem(last=False)
+        record_stock_cache_lookup(hits=hits, misses=len(faltantes), entradas=len(self._entradas))
+        return encontrados
+
+    @staticmethod
+    def _cargar(session: Session, *, bodega_id: UUID, producto_ids: set[UUID]) -> dict[UUID, StockCacheado]:
+        if not producto_ids:
+            return {}
+        filas = session.exec(
+            select(
+                InventarioStock.producto_id,
+                InventarioStock.cantidad_actual,
+                InventarioStock.costo_promedio_vigente,
+            ).where(
+                InventarioStock.bodega_id == bodega_id,
+                InventarioStock.producto_id.in_(producto_ids),
+                InventarioStock.activo.is_(True),
+            )
+        ).all()
+        return {
+            producto_id: StockCacheado(
+                cantidad_actual=Decimal(str(cantidad)),
+                costo_promedio_vigente=Decimal(str(costo)),
+            )
+            for producto_id, cantidad, costo in filas
+        }
+
+    def invalidar(self, claves: set[ClaveStock], *, origen: str = "local") -> None:
+        with self._lock:
+            self._generacion += 1
+            for clave in claves:
+                self._entradas.pop(clave, None)
+        record_stock_cache_invalidacion(origen=origen, claves=len(claves))
+
+    def limpiar(self, *, origen: str = "local") -> None:
+        with self._lock:
+            self._generacion += 1
+            self._entradas.clear()
+        record_stock_cache_invalidacion(origen=origen, claves=0)
+
+    def marcar_invalidacion(self, session: Session, *, bodega_id: UUID, producto_ids) -> None:
+        """Registra claves escritas en la transacción; se invalidan al hacer commit."""
+        self.marcar(session, ((bodega_id, producto_id) for producto_id in producto_ids))
+
+    # --- Canal entre workers (Postgres LISTEN/NOTIFY) ---
+
+    def al_confirmar(self, pendientes: set[ClaveStock]) -> None:
+        if pendientes:
+            self.invalidar(pendientes)
+
+    def al_revertir(self, pendientes: set[ClaveStock]) -> None:
+        # Una lectura dentro de la transacción revertida pudo cachear saldos no confirmados.
+        if pendientes:
+            self.invalidar(pendientes)
+
+    def al_conectar(self) -> None:
+        # Lo ocurrido mientras no se escuchaba se desconoce: se vacía el cache.
+        self.limpiar(origen="remota")
+
+    def payloads(self, claves: set[ClaveStock]) -> list[str]:
+        if len(claves) > _CLAVES_POR_NOTIFICACION * _MAX_NOTIFICACIONES:
+            return [f"{self.origen}|{_INVALIDAR_TODO}"]
+        ordenadas = sorted(f"{bodega_id.hex}:{producto_id.hex}" for bodega_id, producto_id in claves)
+        return [
+            f"{self.origen}|{','.join(ordenadas[inicio : inicio + _CLAVES_POR_NOTIFICACION])}"
+            for inicio in range(0, len(ordenadas), _CLAVES_POR_NOTIFICACION)
+        ]
+
+    def aplicar_notificacion(self, payload: str) -> None:
+        origen, _, cuerpo = payload.partition("|")
+        if origen == self.origen:
+            return
+        if cuerpo == _INVALIDAR_TODO:
+            self.limpiar(origen="remota")
+            return
+        claves: set[ClaveStock] = set()
+        for item in cuerpo.split(","):
+            bodega_hex, _, producto_hex = item.partition(":")
+            try:
+                claves.add((UUID(bodega_hex), UUID(producto_hex)))
+            except ValueError:
+                continue
+        if claves:
+            self.invalidar(claves, origen="remota")
+
+
+stock_cache = registrar_canal(StockCache())
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from osiris.modules.inventario.bodega.entity import Bodega
+from osiris.modules.inventario.movimientos.models import TipoMovimientoInventario
+from osiris.modules.inventario.movimientos.schemas import MovimientoInventarioCreate
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import (
+    MovimientoInventarioService,
+    q4,
+)
+from osiris.modules.inventario.producto.entity import Producto, TipoProducto
+
+
+@dataclass
+class LineaTomaFisica:
+    numero: int
+    producto_id: UUID | None = None
+    codigo_barras: str | None = None
+    cantidad_contada: Decimal | None = None
+    costo_unitario: Decimal | None = None
+    cantidad_sistema: Decimal | None = None
+    diferencia: Decimal | None = None
+    estado: str = "PENDIENTE"
+    movimiento_id: UUID | None = None
+    mensaje: str | None = None
+
+    def marcar_error(self, mensaje: str) -> None:
+        self.estado = "ERROR"
+        self.mensaje = mensaje
+
+    def to_dict(self) -> dict:
+        return {
+            "linea": self.numero,
+            "producto_id": str(self.producto_id) if self.producto_id else None,
+            "codigo_barras": self.codigo_barras,
+            "cantidad_contada": str(self.cantidad_contada) if self.cantidad_contada is not None else None,
+            "cantidad_sistema": str(self.cantidad_sistema) if self.cantidad_sistema is not None else None,
+            "diferencia": str(self.diferencia) if self.diferencia is not None else None,
+            "estado": self.estado,
+            "movimiento_id": str(self.movimiento_id) if self.movimiento_id else None,
+            "mensaje": self.mensaje,
+        }
+
+
+@dataclass
+class TomaFisicaPreparada:
+    bodega_id: UUID
+    motivo: str
+    usuario_auditoria: str | None
+    lineas: list[LineaTomaFisica] = field(default_factory=list)
+
+    @property
+    def lineas_validas(self) -> list[LineaTomaFisica]:
+        return [linea for linea in self.lineas if linea.estado == "PENDIENTE"]
+
+
+class TomaFisicaService:
+    """
+    Importación masiva de toma física por bodega.
+
+    El archivo (CSV o NDJSON) se valida completo antes de tocar stock; luego las
+    diferencias se aplican por lotes: cada lote bloquea su stock en una sola
+    sentencia, calcula los deltas contra el saldo bloqueado y confirma un AJUSTE
+    (sobrantes) y un EGRESO (faltantes), de modo que los locks se liberan al
+    cerrar cada lote y no durante toda la importación.
+    """
+
+    DEFAULT_TAMANO_LOTE = 500
+    CONSULTA_LOTE = 1000
+
+    def __init__(self, movimiento_service: MovimientoInventarioService | None = None):
+        self.movimiento_service = movimiento_service or MovimientoInventarioService()
+
+    def preparar(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID,
+        archivo: BinaryIO,
+        formato: str,
+        motivo: str,
+        usuario_auditoria: str | None = None,
+    ) -> TomaFisicaPreparada:
+        bodega = session.get(Bodega, bodega_id)
+        if not bodega or not bodega.activo:
+            raise HTTPException(status_code=404, detail="Bodega no encontrada o inactiva.")
+        if not motivo or not motivo.strip():
+            raise HTTPException(status_code=400, detail="motivo es obligatorio para registrar una toma física.")
+
+        preparada = TomaFisicaPreparada(
+            bodega_id=bodega_id,
+            motivo=motivo.strip(),
+            usuario_auditoria=usuario_auditoria,
+            lineas=list(self._leer_lineas(archivo, formato)),
+        )
+        if not preparada.lineas:
+            raise HTTPException(status_code=400, detail="El archivo de toma física no contiene líneas.")
+        self._resolver_productos(session, preparada.lineas)
+        return preparada
+
+    def _leer_lineas(self, archivo: BinaryIO, formato: str) -> Iterator[LineaTomaFisica]:
+        texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+        try:
+            if formato == "csv":
+                lector = csv.DictReader(texto)
+                columnas = set(lector.fieldnames or [])
+                if not columnas & {"producto_id", "codigo_barras"} or not columnas & {"cantidad_contada", "cantidad"}:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="El CSV debe incluir producto_id o codigo_barras y cantidad_contada.",
+                    )
+                for numero, fila in enumerate(lector, start=2):
+                    yield self._linea_desde_registro(numero, fila)
+            elif formato == "ndjson":
+                for numero, contenido in enumerate(texto, start=1):
+                    if not contenido.strip():
+                        continue
+                    try:
+                        registro = json.loads(contenido)
+                    except json.JSONDecodeError:
+                        linea = LineaTomaFisica(numero=numero)
+                        linea.marcar_error("JSON inválido.")
+                        yield linea
+                        continue
+                    if not isinstance(registro, dict):
+                        linea = LineaTomaFisica(numero=numero)
+                        linea.marcar_error("Cada línea debe ser un objeto JSON.")
+                        yield linea
+                        continue
+                    yield self._linea_desde_registro(numero, registro)
+            else:
+                raise HTTPException(status_code=415, detail="Formato de toma física no soportado; use CSV o NDJSON.")
+        finally:
+            texto.detach()
+
+    @staticmethod
+    def _linea_desde_registro(numero: int, registro: dict) -> LineaTomaFisica:
+        linea = LineaTomaFisica(numero=numero)
+        producto_id = str(registro.get("producto_id") or "").strip()
+        linea.codigo_barras = str(registro.get("codigo_barras") or "").strip() or None
+        if producto_id:
+            try:
+                linea.producto_id = UUID(producto_id)
+            except ValueError:
+                linea.marcar_error("producto_id inválido.")
+                return linea
+        elif not linea.codigo_barras:
+            linea.marcar_error("La línea debe indicar producto_id o codigo_barras.")
+            return linea
+
+        cantidad = registro.get("cantidad_contada", registro.get("cantidad"))
+        try:
+            linea.cantidad_contada = q4(cantidad)
+        except (InvalidOperation, TypeError, ValueError):
+            linea.marcar_error("cantidad_contada inválida.")
+            return linea
+        if linea.cantidad_contada < 0:
+            linea.marcar_error("cantidad_contada no puede ser negativa.")
+            return linea
+
+        costo = registro.get("costo_unitario")
+        if costo not in (None, ""):
+            try:
+                linea.costo_unitario = q4(costo)
+            except (InvalidOperation, TypeError, ValueError):
+                linea.marcar_error("costo_unitario inválido.")
+                return linea
+            if linea.costo_unitario < 0:
+                linea.marcar_error("costo_unitario no puede ser negativo.")
+        return linea
+
+    def _resolver_productos(self, session: Session, lineas: list[LineaTomaFisica]) -> None:
+        pendientes = [linea for linea in lineas if linea.estado == "PENDIENTE"]
+        ids = list({linea.producto_id for linea in pendientes if linea.producto_id})
+        codigos = list({linea.codigo_barras for linea in pendientes if not linea.producto_id})
+
+        productos: dict[UUID, Producto] = {}
+        for inicio in range(0, len(ids), self.CONSULTA_LOTE):
+            for producto in session.exec(
+                select(Producto).where(Producto.id.in_(ids[inicio : inicio + self.CONSULTA_LOTE]))
+            ).all():
+                productos[producto.id] = producto
+        por_codigo: dict[str, list[Producto]] = {}
+        for inicio in range(0, len(codigos), self.CONSULTA_LOTE):
+            for producto in session.exec(
+                select(Producto).where(Producto.codigo_barras.in_(codigos[inicio : inicio + self.CONSULTA_LOTE]))
+            ).all():
+                por_codigo.setdefault(producto.codigo_barras, []).append(producto)
+                productos[producto.id] = producto
+
+        vistos: set[UUID] = set()
+        for linea in pendientes:
+            if linea.producto_id is None:
+                candidatos = por_codigo.get(linea.codigo_barras, [])
+                if len(candidatos) != 1:
+                    linea.marcar_error(
+                        "codigo_barras no encontrado." if not candidatos else "codigo_barras ambiguo."
+                    )
+                    continue
+                linea.producto_id = candidatos[0].id
+
+            producto = productos.get(linea.producto_id)
+            if producto is None:
+                linea.marcar_error("Producto no encontrado o inactivo.")
+                continue
+            if producto.tipo != TipoProducto.BIEN:
+                linea.marcar_error("Solo productos de tipo BIEN manejan inventario.")
+                continue
+            if (
+                not producto.permite_fracciones
+                and linea.cantidad_contada != linea.cantidad_contada.to_integral_value()
+            ):
+                linea.marcar_error("El producto no permite cantidades fraccionarias.")
+                continue
+            if linea.producto_id in vistos:
+                linea.marcar_error("Producto repetido en la toma física.")
+                continue
+            vistos.add(linea.producto_id)
+
+    def aplicar(
+        self,
+        session: Session,
+        preparada: TomaFisicaPreparada,
+        *,
+        tamano_lote: int | None = None,
+    ) -> Iterator[dict]:
+        """Aplica la toma por lotes; emite un evento de progreso por lote."""
+        tamano_lote = tamano_lote or self.DEFAULT_TAMANO_LOTE
+        validas = preparada.lineas_validas
+        lotes = [validas[inicio : inicio + tamano_lote] for inicio in range(0, len(validas), tamano_lote)]
+        movimiento_ids: list[UUID] = []
+
+        for indice, lote in enumerate(lotes, start=1):
+            try:
+                movimiento_ids.extend(self._aplicar_lote(session, preparada, lote, indice))
+                session.commit()
+            except Exception as exc:
+                session.rollback()
+                mensaje = getattr(exc, "detail", None) or str(exc)
+                for linea in lote:
+                    if linea.estado == "SIN_CAMBIO":
+                        continue
+                    linea.movimiento_id = None
+                    linea.marcar_error(f"Lote {indice} no aplicado: {mensaje}")
+            yield {
+                "evento": "progreso",
+                "lote": indice,
+                "lotes": len(lotes),
+                **self._resumen(preparada.lineas),
+            }
+
+        resumen = {"evento": "resumen", **self._resumen(preparada.lineas), "movimientos": [str(m) for m in movimiento_ids]}
+        for linea in preparada.lineas:
+            yield {"evento": "linea", **linea.to_dict()}
+        yield resumen
+
+    def _aplicar_lote(
+        self,
+        session: Session,
+        preparada: TomaFisicaPreparada,
+        lote: list[LineaTomaFisica],
+        indice: int,
+    ) -> list[UUID]:
+        # Los deltas se calculan contra el stock bloqueado del lote: una venta
+        # concurrente no puede colarse entre el cálculo y la confirmación.
+        stocks = self.movimiento_service._bloquear_stocks_en_lote(
+            session,
+            bodega_id=preparada.bodega_id,
+            producto_ids={linea.producto_id for linea in lote},
+        )
+        sobrantes: list[LineaTomaFisica] = []
+        faltantes: list[LineaTomaFisica] = []
+        for linea in lote:
+            stock = stocks.get(linea.producto_id)
+            linea.cantidad_sistema = q4(stock.cantidad_actual) if stock is not None else Decimal("0.0000")
+            linea.diferencia = q4(linea.cantidad_contada - linea.cantidad_sistema)
+            if linea.diferencia > 0:
+                if linea.costo_unitario is None:
+                    linea.costo_unitario = q4(stock.costo_promedio_vigente) if stock is not None else Decimal("0.0000")
+                sobrantes.append(linea)
+            elif linea.diferencia < 0:
+                faltantes.append(linea)
+            else:
+                linea.estado = "SIN_CAMBIO"
+
+        movimiento_ids: list[UUID] = []
+        for tipo, lineas in (
+            (TipoMovimientoInventario.AJUSTE, sobrantes),
+            (TipoMovimientoInventario.EGRESO, faltantes),
+        ):
+            if not lineas:
+                continue
+            movimiento = self.movimiento_service.crear_movimiento_borrador(
+                session,
+                MovimientoInventarioCreate(
+                    bodega_id=preparada.bodega_id,
+                    tipo_movimiento=tipo,
+                    referencia_documento=f"TOMA_FISICA:{indice}",
+                    motivo_ajuste=f"Toma física: {preparada.motivo}"[:255],
+                    usuario_auditoria=preparada.usuario_auditoria,
+                    detalles=[
+                        {
+                            "producto_id": linea.producto_id,
+                            "cantidad": abs(linea.diferencia),
+                            "costo_unitario": linea.costo_unitario or Decimal("0.0000"),
+                        }
+                        for linea in lineas
+                    ],
+                ),
+                commit=False,
+            )
+            self.movimiento_service.confirmar_movimiento(
+                session,
+                movimiento.id,
+                commit=False,
+                rollback_on_error=False,
+            )
+            for linea in lineas:
+                linea.estado = "AJUSTADO"
+                linea.movimiento_id = movimiento.id
+            movimiento_ids.append(movimiento.id)
+        return movimiento_ids
+
+    @staticmethod
+    def _resumen(lineas: list[LineaTomaFisica]) -> dict[str, int]:
+        conteo = {"PENDIENTE": 0, "AJUSTADO": 0, "SIN_CAMBIO": 0, "ERROR": 0}
+        for linea in lineas:
+            conteo[linea.estado] += 1
+        return {
+            "lineas_totales": len(lineas),
+            "lineas_procesadas": len(lineas) - conteo["PENDIENTE"],
+            "ajustadas": conteo["AJUSTADO"],
+            "sin_cambio": conteo["SIN_CAMBIO"],
+            "errores": conteo["ERROR"],
+        }
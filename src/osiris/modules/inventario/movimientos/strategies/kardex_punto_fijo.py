@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from collections.abc import Hashable, Sequence
+
+
+# Cantidades, costos y valores del kardex usan 4 decimales: se representan como
+# enteros en unidades de 0.0001 para evitar cuantizar Decimal fila por fila.
+ESCALA = 10_000
+
+
+def a_punto_fijo(value: Decimal | int | str) -> int:
+    return int((Decimal(str(value)) * ESCALA).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def desde_punto_fijo(value: int) -> Decimal:
+    return Decimal(value).scaleb(-4)
+
+
+def dividir_half_up(numerador: int, denominador: int) -> int:
+    """División entera con ROUND_HALF_UP (mitades se alejan de cero), igual que Decimal."""
+    if denominador == 0:
+        raise ZeroDivisionError("denominador cero")
+    signo = -1 if (numerador < 0) != (denominador < 0) else 1
+    numerador, denominador = abs(numerador), abs(denominador)
+    return signo * ((2 * numerador + denominador) // (2 * denominador))
+
+
+def multiplicar(cantidad: int, costo: int) -> int:
+    """q4(cantidad * costo) en punto fijo."""
+    return dividir_half_up(cantidad * costo, ESCALA)
+
+
+@dataclass(frozen=True)
+class LineaKardexPuntoFijo:
+    grupo: Hashable
+    es_egreso: bool
+    cantidad: int
+    costo_unitario: int
+
+
+@dataclass
+class SaldoGrupoPuntoFijo:
+    cantidad: int = 0
+    costo_promedio: int = 0
+    valor: int = 0
+
+
+@dataclass
+class ResultadoRecalculoKardex:
+    costo_aplicado: list[int] = field(default_factory=list)
+    costo_promedio: list[int] = field(default_factory=list)
+    saldo_cantidad: list[int] = field(default_factory=list)
+    saldo_valor: list[int] = field(default_factory=list)
+    saldos: dict[Hashable, SaldoGrupoPuntoFijo] = field(default_factory=dict)
+    grupos_inconsistentes: dict[Hashable, str] = field(default_factory=dict)
+
+
+class RecalculoKardexPuntoFijo:
+    """
+    Recalcula kardex completos en punto fijo con la misma semántica que
+    CalculoKardexStrategy: promedio ponderado con ROUND_HALF_UP en ingresos,
+    costo congelado al promedio vigente en egresos y valor de línea q4(cantidad * costo).
+
+    El promedio ponderado es una recurrencia: se resuelve con enteros en una
+    sola pasada que lleva también los saldos corridos de cantidad y valor.
+
+    Con ``respetar_costo_egreso`` los egresos se valoran con el costo ya
+    congelado en la línea (E3-3) en lugar del promedio recalculado.
+    """
+
+    def __init__(self, *, respetar_costo_egreso: bool = False) -> None:
+        self.respetar_costo_egreso = respetar_costo_egreso
+
+    def recalcular(self, lineas: Sequence[LineaKardexPuntoFijo]) -> ResultadoRecalculoKardex:
+        resultado = ResultadoRecalculoKardex()
+
+        for linea in lineas:
+            saldo = resultado.saldos.setdefault(linea.grupo, SaldoGrupoPuntoFijo())
+            if linea.es_egreso:
+                costo_aplicado = linea.costo_unitario if self.respetar_costo_egreso else saldo.costo_promedio
+                saldo.cantidad -= linea.cantidad
+                if saldo.cantidad < 0:
+                    resultado.grupos_inconsistentes.setdefault(linea.grupo, "Saldo negativo en el historial.")
+            else:
+                costo_aplicado = linea.costo_unitario
+                denominador = saldo.cantidad + linea.cantidad
+                if denominador <= 0:
+                    resultado.grupos_inconsistentes.setdefault(
+                        linea.grupo, "Cantidad resultante invalida para ingreso."
+                    )
+                else:
+                    # (q4(a) * q4(b) + q4(c) * q4(d)) / q4(a + c) en unidades de 0.0001:
+                    # el numerador queda en 1e-8 y el cociente exacto ya está en 1e-4.
+                    saldo.costo_promedio = dividir_half_up(
+                        saldo.cantidad * saldo.costo_promedio + linea.cantidad * linea.costo_unitario,
+                        denominador,
+                    )
+                saldo.cantidad = denominador
+
+            valor_linea = multiplicar(linea.cantidad, costo_aplicado)
+            saldo.valor += -valor_linea if linea.es_egreso else valor_linea
+            resultado.costo_aplicado.append(costo_aplicado)
+            resultado.costo_promedio.append(saldo.costo_promedio)
+            resultado.saldo_cantidad.append(saldo.cantidad)
+            resultado.saldo_valor.append(saldo.valor)
+        return resultado
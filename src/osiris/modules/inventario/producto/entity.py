@@ -5,6 +5,7 @@ from enum import Enum
 from uuid import UUID
 from decimal import Decimal
 from sqlmodel import Field, Column, Numeric, Relationship
+from sqlalchemy import UniqueConstraint
 from sqlalchemy.orm import relationship
 from osiris.domain.base_models import BaseTable, AuditMixin, SoftDeleteMixin
 from osiris.modules.inventario.categoria.entity import Categoria  # noqa: F401
@@ -96,6 +97,7 @@ class ProductoImpuesto(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
 # Puente: Producto-Bodega
 class ProductoBodega(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
     __tablename__ = "tbl_producto_bodega"
+    __table_args__ = (UniqueConstraint("producto_id", "bodega_id", name="uq_producto_bodega"),)
 
     producto_id: UUID = Field(foreign_key="tbl_producto.id", index=True, nullable=False)
     bodega_id: UUID = Field(foreign_key="tbl_bodega.id", index=True, nullable=False)
@@ -104,5 +106,3 @@ class ProductoBodega(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
         default=Decimal("0.0000"),
     )  # Cantidad referencial del producto en esta bodega
 
-    # Restricción única: un producto solo puede estar una vez en una bodega
-    # Se implementará en la migración como UNIQUE(producto_id, bodega_id)
@@ -42,3 +42,15 @@ class StockDisponibleRead(BaseOSModel):
     codigo_bodega: str
     nombre_bodega: str
     cantidad_disponible: Decimal
+
+
+class StockDisponibleLoteRequest(BaseOSModel):
+    bodega_id: UUID
+    producto_ids: list[UUID] = Field(min_length=1, max_length=500)
+
+
+class StockDisponibleLoteRead(BaseOSModel):
+    producto_id: UUID
+    bodega_id: UUID
+    cantidad_disponible: Decimal
+    costo_promedio_vigente: Decimal
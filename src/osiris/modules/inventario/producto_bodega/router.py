@@ -10,6 +10,8 @@ from osiris.modules.inventario.producto_bodega.models import (
     ProductoBodegaAsignarRequest,
     ProductoBodegaRead,
     ProductoBodegaUpdate,
+    StockDisponibleLoteRead,
+    StockDisponibleLoteRequest,
     StockDisponibleRead,
 )
 from osiris.modules.inventario.producto_bodega.service import ProductoBodegaService
@@ -116,3 +118,21 @@ def consultar_stock_disponible(
         bodega_id=bodega_id,
     )
 
+
+
+@router.post(
+    "/api/v1/inventarios/stock-disponible/lote",
+    response_model=list[StockDisponibleLoteRead],
+    summary="Consultar stock disponible de varios productos (cache)",
+    responses=COMMON_RESPONSES,
+)
+def consultar_stock_disponible_lote(
+    payload: StockDisponibleLoteRequest,
+    session: Session = Depends(get_session),
+):
+    """Disponibilidad de hasta 500 productos en una bodega, servida desde el cache de stock del proceso."""
+    return service.get_stock_disponible_lote(
+        session,
+        bodega_id=payload.bodega_id,
+        producto_ids=payload.producto_ids,
+    )
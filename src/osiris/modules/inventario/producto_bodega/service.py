@@ -8,6 +8,7 @@ from fastapi import HTTPException
 
 from osiris.domain.service import BaseService
 from osiris.modules.inventario.movimientos.models import InventarioStock
+from osiris.modules.inventario.movimientos.services.stock_cache_service import stock_cache
 from osiris.modules.inventario.producto.entity import Producto, ProductoBodega
 from osiris.modules.inventario.bodega.entity import Bodega
 from .repository import ProductoBodegaRepository
@@ -195,6 +196,26 @@ class ProductoBodegaService(BaseService):
             for rel, producto, bodega in relaciones
         ]
 
+    def get_stock_disponible_lote(
+        self,
+        session: Session,
+        *,
+        bodega_id: UUID,
+        producto_ids: list[UUID],
+    ) -> list[dict]:
+        """Stock de varios productos en una bodega servido desde el cache en proceso."""
+        stocks = stock_cache.obtener(session, bodega_id=bodega_id, producto_ids=set(producto_ids))
+        cero = Decimal("0.0000")
+        return [
+            {
+                "producto_id": producto_id,
+                "bodega_id": bodega_id,
+                "cantidad_disponible": stocks[producto_id].cantidad_actual if producto_id in stocks else cero,
+                "costo_promedio_vigente": stocks[producto_id].costo_promedio_vigente if producto_id in stocks else cero,
+            }
+            for producto_id in dict.fromkeys(producto_ids)
+        ]
+
     def get_bodegas_by_producto(self, session: Session, producto_id: UUID):
         """Obtiene todas las bodegas donde está un producto"""
         relaciones = session.exec(
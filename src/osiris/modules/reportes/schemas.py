@@ -135,6 +135,7 @@ class ReporteInventarioKardexRead(BaseModel):
     producto_id: UUID
     fecha_inicio: date
     fecha_fin: date
+    saldo_inicial: Decimal = Decimal("0.0000")
     movimientos: list[ReporteInventarioKardexMovimientoRead]
 
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from datetime import date, timedelta
 from decimal import Decimal, ROUND_HALF_UP
+from itertools import accumulate
 from uuid import UUID
 
 from sqlalchemy import func
@@ -15,6 +16,12 @@ from osiris.modules.inventario.movimientos.models import (
     MovimientoInventarioDetalle,
     TipoMovimientoInventario,
 )
+from osiris.modules.inventario.movimientos.services.cierre_kardex_service import CierreKardexService
+from osiris.modules.inventario.movimientos.services.recalculo_kardex_service import columna_punto_fijo
+from osiris.modules.inventario.movimientos.strategies.kardex_punto_fijo import (
+    a_punto_fijo,
+    desde_punto_fijo,
+)
 from osiris.modules.reportes.schemas import (
     ReporteInventarioKardexMovimientoRead,
     ReporteInventarioKardexRead,
@@ -39,6 +46,9 @@ def q2(value: Decimal | int | str) -> Decimal:
 
 
 class ReporteInventarioService:
+    def __init__(self, cierre_kardex_service: CierreKardexService | None = None) -> None:
+        self.cierre_kardex_service = cierre_kardex_service or CierreKardexService()
+
     @staticmethod
     def _empresa_scope() -> UUID | None:
         return resolve_company_scope()
@@ -129,8 +139,8 @@ class ReporteInventarioService:
                 MovimientoInventario.fecha,
                 MovimientoInventario.tipo_movimiento,
                 MovimientoInventario.referencia_documento,
-                MovimientoInventarioDetalle.cantidad,
-                MovimientoInventarioDetalle.costo_unitario,
+                columna_punto_fijo(MovimientoInventarioDetalle.cantidad),
+                columna_punto_fijo(MovimientoInventarioDetalle.costo_unitario),
             )
             .select_from(MovimientoInventarioDetalle)
             .join(MovimientoInventario, MovimientoInventario.id == MovimientoInventarioDetalle.movimiento_inventario_id)
@@ -148,35 +158,53 @@ class ReporteInventarioService:
                 MovimientoInventarioDetalle.id.asc(),
             )
         )
+        bodega_ids: list[UUID] | None = None
         if sucursal_id is not None or empresa_scope is not None:
             stmt = stmt.join(Bodega, Bodega.id == MovimientoInventario.bodega_id).where(Bodega.activo.is_(True))
+            stmt_bodegas = select(Bodega.id).where(Bodega.activo.is_(True))
             if empresa_scope is not None:
                 stmt = stmt.where(Bodega.empresa_id == empresa_scope)
+                stmt_bodegas = stmt_bodegas.where(Bodega.empresa_id == empresa_scope)
             if sucursal_id is not None:
                 stmt = stmt.where(Bodega.sucursal_id == sucursal_id)
+                stmt_bodegas = stmt_bodegas.where(Bodega.sucursal_id == sucursal_id)
+            bodega_ids = list(session.exec(stmt_bodegas).all())
+
+        # Saldo de apertura desde el cierre mensual más cercano + delta hasta `inicio`.
+        saldo_inicial, _ = self.cierre_kardex_service.saldo_a_fecha(
+            session,
+            producto_id=producto_id,
+            antes_de=inicio,
+            bodega_ids=bodega_ids,
+        )
 
         rows = session.exec(stmt).all()
-        saldo = Decimal("0.0000")
+        # Saldo corrido en punto fijo (enteros en 0.0001): una suma acumulada en
+        # lugar de cuantizar Decimal en cada fila.
+        egresos = {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}
+        deltas = [a_punto_fijo(q4(saldo_inicial))]
+        deltas.extend(
+            -int(cantidad) if tipo_movimiento in egresos else int(cantidad)
+            for _, tipo_movimiento, _, cantidad, _ in rows
+        )
+        saldos = list(accumulate(deltas))[1:]
+
         movimientos: list[ReporteInventarioKardexMovimientoRead] = []
-        for mov_fecha, tipo_movimiento, referencia_documento, cantidad, costo_unitario in rows:
-            cantidad_d = q4(self._d(cantidad))
-            costo_d = q4(self._d(costo_unitario))
-            if tipo_movimiento in {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}:
-                saldo = q4(saldo - cantidad_d)
+        for (mov_fecha, tipo_movimiento, referencia_documento, cantidad, costo_unitario), saldo in zip(rows, saldos):
+            if tipo_movimiento in egresos:
                 tipo_kardex = TipoMovimientoKardex.EGRESO
                 if (referencia_documento or "").startswith("VENTA:"):
                     tipo_kardex = TipoMovimientoKardex.VENTA
             else:
-                saldo = q4(saldo + cantidad_d)
                 tipo_kardex = TipoMovimientoKardex.INGRESO
 
             movimientos.append(
                 ReporteInventarioKardexMovimientoRead(
                     fecha=mov_fecha,
                     tipo_movimiento=tipo_kardex,
-                    cantidad=cantidad_d,
-                    costo_unitario=costo_d,
-                    saldo_cantidad=saldo,
+                    cantidad=desde_punto_fijo(int(cantidad)),
+                    costo_unitario=desde_punto_fijo(int(costo_unitario)),
+                    saldo_cantidad=desde_punto_fijo(saldo),
                 )
             )
 
@@ -184,5 +212,6 @@ class ReporteInventarioService:
             producto_id=producto_id,
             fecha_inicio=inicio,
             fecha_fin=fin,
+            saldo_inicial=q4(saldo_inicial),
             movimientos=movimientos,
         )
@@ -45,6 +45,7 @@ from osiris.modules.compras.models import (
     RetencionEstadoHistorial,
 )
 from osiris.modules.sri.facturacion_electronica.models import (
+    BlobComprimido,
     DocumentoElectronico,
     DocumentoElectronicoHistorial,
     DocumentoSriCola,
@@ -92,4 +93,5 @@ __all__ = [
     "DocumentoElectronico",
     "DocumentoElectronicoHistorial",
     "DocumentoSriCola",
+    "BlobComprimido",
 ]
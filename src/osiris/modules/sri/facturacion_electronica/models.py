@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import Column, Text
+from sqlalchemy import Column, Index, LargeBinary, Text
 from sqlmodel import Field
 
 from osiris.domain.base_models import AuditMixin, BaseTable, SoftDeleteMixin
@@ -16,6 +16,10 @@ from osiris.modules.sri.core_sri.types import (
 
 class DocumentoElectronico(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
     __tablename__ = "tbl_documento_electronico"
+    __table_args__ = (
+        # Profundidad y antigüedad de la cola FE por estado (métricas) sin leer filas.
+        Index("ix_tbl_documento_electronico_activo_estado_sri_creado", "activo", "estado_sri", "creado_en"),
+    )
 
     tipo_documento: TipoDocumentoElectronico = Field(
         default=TipoDocumentoElectronico.FACTURA,
@@ -37,10 +41,15 @@ class DocumentoElectronico(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
         max_length=20,
     )
     mensajes_sri: str | None = Field(default=None, sa_column=Column(Text, nullable=True))
+    # Legado: el XML autorizado nuevo vive en el almacén de blobs (`xml_autorizado_ref`).
     xml_autorizado: str | None = Field(default=None, sa_column=Column(Text, nullable=True))
+    xml_autorizado_ref: str | None = Field(default=None, max_length=80, nullable=True)
     intentos: int = Field(default=0, nullable=False)
     next_retry_at: datetime | None = Field(default=None, nullable=True, index=True)
     cantidad_impresiones: int = Field(default=0, nullable=False)
+    # Lease del worker de cola: qué réplica procesa el documento y hasta cuándo.
+    reclamado_por: str | None = Field(default=None, max_length=80, nullable=True)
+    reclamado_hasta: datetime | None = Field(default=None, nullable=True, index=True)
 
 
 class DocumentoElectronicoHistorial(BaseTable, table=True):
@@ -56,6 +65,7 @@ class DocumentoElectronicoHistorial(BaseTable, table=True):
 
 class DocumentoSriCola(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
     __tablename__ = "tbl_documento_sri_cola"
+    __table_args__ = (Index("ix_tbl_documento_sri_cola_activo_estado", "activo", "estado"),)
 
     entidad_id: UUID = Field(nullable=False, index=True)
     tipo_documento: str = Field(nullable=False, max_length=30, index=True)
@@ -64,4 +74,18 @@ class DocumentoSriCola(BaseTable, AuditMixin, SoftDeleteMixin, table=True):
     max_intentos: int = Field(default=3, nullable=False)
     proximo_intento_en: datetime | None = Field(default=None, nullable=True, index=True)
     ultimo_error: str | None = Field(default=None, max_length=1000)
-    payload_json: str = Field(sa_column=Column(Text, nullable=False))
+    # Legado: el payload nuevo vive en el almacén de blobs (`payload_ref`).
+    payload_json: str | None = Field(default=None, sa_column=Column(Text, nullable=True))
+    payload_ref: str | None = Field(default=None, max_length=80, nullable=True)
+
+
+class BlobComprimido(BaseTable, table=True):
+    """Contenido comprimido direccionado por SHA-256, fuera de las filas calientes de la cola FE."""
+
+    __tablename__ = "tbl_blob_comprimido"
+
+    sha256: str = Field(nullable=False, max_length=64, unique=True, index=True)
+    codec: str = Field(nullable=False, max_length=10)
+    tamano: int = Field(nullable=False)
+    contenido: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    creado_en: datetime = Field(default_factory=datetime.utcnow, nullable=False)
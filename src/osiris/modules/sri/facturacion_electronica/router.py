@@ -2,8 +2,8 @@ from __future__ import annotations
 
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import HTMLResponse, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from sqlmodel import Session
 
 from osiris.core.audit_context import get_current_user_id
@@ -100,11 +100,59 @@ def procesar_documentos_manual(payload: FEProcesarDocumentosRequest, session: Se
     return {"procesados": procesados, "ids_procesados": ids_procesados, "errores": errores}
 
 
+def _rango_solicitado(rango: str | None, tamano: int) -> tuple[int, int] | None:
+    """Primer rango de un encabezado `Range: bytes=...`; None si se sirve completo."""
+    if not rango or not rango.startswith("bytes=") or "," in rango:
+        return None
+    inicio_texto, _, fin_texto = rango[len("bytes="):].strip().partition("-")
+    try:
+        if inicio_texto:
+            inicio = int(inicio_texto)
+            fin = int(fin_texto) if fin_texto else tamano - 1
+        else:
+            # bytes=-N: los últimos N bytes.
+            inicio, fin = max(tamano - int(fin_texto), 0), tamano - 1
+    except ValueError:
+        return None
+    if inicio >= tamano or fin < inicio:
+        raise HTTPException(
+            status_code=416,
+            detail="Rango solicitado no satisfacible.",
+            headers={"Content-Range": f"bytes */{tamano}"},
+        )
+    return inicio, min(fin, tamano - 1)
+
+
 @documentos_router.get("/{documento_id}/xml", summary="Descargar XML autorizado", responses=COMMON_RESPONSES, response_class=Response)
-def descargar_xml_documento(documento_id: UUID, session: Session = Depends(get_session)):
-    """Devuelve el XML autorizado de un documento electrónico si ya fue aceptado por el SRI."""
-    xml = documento_service.obtener_xml_autorizado(session, documento_id=documento_id, user_id=get_current_user_id())
-    return Response(content=xml, media_type="application/xml")
+def descargar_xml_documento(
+    documento_id: UUID,
+    session: Session = Depends(get_session),
+    rango: str | None = Header(default=None, alias="Range"),
+):
+    """Devuelve el XML autorizado por bloques desde el almacén de blobs; admite `Range` de un solo tramo."""
+    contenido = documento_service.obtener_xml_autorizado(session, documento_id=documento_id, user_id=get_current_user_id())
+    try:
+        seleccion = _rango_solicitado(rango, contenido.tamano)
+    except HTTPException:
+        contenido.cerrar()
+        raise
+    if seleccion is None:
+        return StreamingResponse(
+            contenido.iterar(),
+            media_type="application/xml",
+            headers={"Content-Length": str(contenido.tamano), "Accept-Ranges": "bytes"},
+        )
+    inicio, fin = seleccion
+    return StreamingResponse(
+        contenido.iterar(inicio, fin),
+        status_code=206,
+        media_type="application/xml",
+        headers={
+            "Content-Length": str(fin - inicio + 1),
+            "Content-Range": f"bytes {inicio}-{fin}/{contenido.tamano}",
+            "Accept-Ranges": "bytes",
+        },
+    )
 
 
 @documentos_router.get("/{documento_id}/ride", summary="Descargar RIDE", responses=COMMON_RESPONSES, response_class=HTMLResponse)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Protocol
+
+from sqlmodel import Session, select
+
+from osiris.core.settings import get_settings
+from osiris.modules.sri.facturacion_electronica.models import (
+    BlobComprimido,
+    DocumentoElectronico,
+    DocumentoSriCola,
+)
+
+
+ESQUEMA_BD = "bd"
+ESQUEMA_ARCHIVOS = "fs"
+_BLOQUE_LECTURA = 64 * 1024
+
+
+class ContenidoBlob:
+    """
+    Contenido de un blob listo para servirse por bloques o por rangos de bytes.
+
+    Envuelve un buffer (bytes o un mmap de solo lectura); `iterar` lo recorre sin
+    copiarlo entero y libera el mmap al terminar.
+    """
+
+    def __init__(self, buffer, *, cerrar: Callable[[], None] | None = None) -> None:
+        self._buffer = buffer
+        self._cerrar = cerrar
+        self.tamano = len(buffer)
+
+    def iterar(self, inicio: int = 0, fin: int | None = None, *, bloque: int = _BLOQUE_LECTURA) -> Iterator[bytes]:
+        """Bloques del rango [inicio, fin] (inclusivo, como HTTP Range)."""
+        ultimo = self.tamano - 1 if fin is None else min(fin, self.tamano - 1)
+        try:
+            posicion = inicio
+            while posicion <= ultimo:
+                hasta = min(posicion + bloque, ultimo + 1)
+                yield bytes(self._buffer[posicion:hasta])
+                posicion = hasta
+        finally:
+            self.cerrar()
+
+    def leer(self) -> bytes:
+        return b"".join(self.iterar())
+
+    def cerrar(self) -> None:
+        if self._cerrar is not None:
+            self._cerrar()
+            self._cerrar = None
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ModuleNotFoundError:
+        return None
+    return zstandard
+
+
+def _comprimir(contenido: bytes) -> tuple[str, bytes]:
+    zstd = _zstd()
+    if zstd is not None:
+        return "zstd", zstd.ZstdCompressor(level=10).compress(contenido)
+    return "gzip", gzip.compress(contenido, compresslevel=6, mtime=0)
+
+
+def _descomprimir(codec: str, datos: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(datos)
+    if codec == "zstd":
+        zstd = _zstd()
+        if zstd is None:
+            raise ValueError("El blob está comprimido con zstd y el paquete zstandard no está instalado.")
+        return zstd.ZstdDecompressor().decompress(datos)
+    raise ValueError(f"Codec de blob no soportado: {codec}")
+
+
+class AlmacenBlobs(Protocol):
+    esquema: str
+
+    def guardar(self, session: Session, contenido: bytes) -> str:
+        ...
+
+    def abrir(self, session: Session, sha256: str) -> ContenidoBlob:
+        ...
+
+
+class AlmacenBlobsBD:
+    """Blobs comprimidos (zstd si está instalado, si no gzip) en `tbl_blob_comprimido`."""
+
+    esquema = ESQUEMA_BD
+
+    def guardar(self, session: Session, contenido: bytes) -> str:
+        sha256 = hashlib.sha256(contenido).hexdigest()
+        existente = session.exec(select(BlobComprimido.id).where(BlobComprimido.sha256 == sha256)).first()
+        if existente is None:
+            codec, datos = _comprimir(contenido)
+            session.add(BlobComprimido(sha256=sha256, codec=codec, tamano=len(contenido), contenido=datos))
+        return f"{self.esquema}:{sha256}"
+
+    def abrir(self, session: Session, sha256: str) -> ContenidoBlob:
+        blob = session.exec(select(BlobComprimido).where(BlobComprimido.sha256 == sha256)).first()
+        if blob is None:
+            raise FileNotFoundError(f"Blob {sha256} no encontrado en base de datos.")
+        return ContenidoBlob(memoryview(_descomprimir(blob.codec, blob.contenido)))
+
+
+class AlmacenBlobsArchivos:
+    """
+    Blobs sin comprimir en disco, direccionados por SHA-256 (`ab/cd/abcd...`).
+
+    La escritura es atómica (temporal + rename) e idempotente; la lectura usa mmap,
+    así un rango de bytes no carga el archivo completo en memoria.
+    """
+
+    esquema = ESQUEMA_ARCHIVOS
+
+    def __init__(self, raiz: Path | str) -> None:
+        self.raiz = Path(raiz)
+
+    def _ruta(self, sha256: str) -> Path:
+        return self.raiz / sha256[:2] / sha256[2:4] / sha256
+
+    def guardar(self, session: Session, contenido: bytes) -> str:
+        _ = session
+        sha256 = hashlib.sha256(contenido).hexdigest()
+        ruta = self._ruta(sha256)
+        if not ruta.exists():
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(descriptor, "wb") as archivo:
+                    archivo.write(contenido)
+                    archivo.flush()
+                    os.fsync(archivo.fileno())
+                os.replace(temporal, ruta)
+            except BaseException:
+                Path(temporal).unlink(missing_ok=True)
+                raise
+        return f"{self.esquema}:{sha256}"
+
+    def abrir(self, session: Session, sha256: str) -> ContenidoBlob:
+        _ = session
+        with open(self._ruta(sha256), "rb") as archivo:
+            if os.fstat(archivo.fileno()).st_size == 0:
+                return ContenidoBlob(b"")
+            mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        return ContenidoBlob(mapa, cerrar=mapa.close)
+
+
+def obtener_almacen(esquema: str | None = None) -> AlmacenBlobs:
+    """Almacén del esquema indicado, o el de escritura configurado en FE_BLOB_BACKEND."""
+    settings = get_settings()
+    if esquema is None:
+        esquema = ESQUEMA_ARCHIVOS if settings.FE_BLOB_BACKEND == "ARCHIVOS" else ESQUEMA_BD
+    if esquema == ESQUEMA_BD:
+        return AlmacenBlobsBD()
+    if esquema == ESQUEMA_ARCHIVOS:
+        if settings.FE_BLOB_DIRECTORIO is None:
+            raise ValueError("Blob en archivos sin FE_BLOB_DIRECTORIO configurado.")
+        return AlmacenBlobsArchivos(settings.FE_BLOB_DIRECTORIO)
+    raise ValueError(f"Esquema de blob no soportado: {esquema}")
+
+
+def guardar_blob(session: Session, contenido: bytes | str) -> str:
+    """Guarda el contenido en el almacén configurado y retorna su referencia `esquema:sha256`."""
+    datos = contenido.encode("utf-8") if isinstance(contenido, str) else contenido
+    return obtener_almacen().guardar(session, datos)
+
+
+def abrir_blob(session: Session, referencia: str) -> ContenidoBlob:
+    # La referencia lleva su esquema: tras cambiar FE_BLOB_BACKEND se siguen leyendo los blobs previos.
+    esquema, _, sha256 = referencia.partition(":")
+    return obtener_almacen(esquema).abrir(session, sha256)
+
+
+def guardar_payload_tarea(session: Session, tarea: DocumentoSriCola, payload: dict) -> None:
+    tarea.payload_ref = guardar_blob(session, json.dumps(payload, ensure_ascii=False))
+    tarea.payload_json = None
+
+
+def leer_payload_tarea(session: Session, tarea: DocumentoSriCola) -> dict:
+    if tarea.payload_ref:
+        return json.loads(abrir_blob(session, tarea.payload_ref).leer())
+    return json.loads(tarea.payload_json or "{}")
+
+
+def guardar_xml_autorizado(session: Session, documento: DocumentoElectronico, xml: str | bytes) -> None:
+    documento.xml_autorizado_ref = guardar_blob(session, xml)
+    documento.xml_autorizado = None
+
+
+def abrir_xml_autorizado(session: Session, documento: DocumentoElectronico) -> ContenidoBlob | None:
+    if documento.xml_autorizado_ref:
+        return abrir_blob(session, documento.xml_autorizado_ref)
+    if documento.xml_autorizado:
+        return ContenidoBlob(documento.xml_autorizado.encode("utf-8"))
+    return None
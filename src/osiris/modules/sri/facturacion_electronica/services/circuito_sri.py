@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from enum import Enum
+
+from osiris.core.observability import record_sri_circuito_apertura, record_sri_circuito_estado
+from osiris.core.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class EstadoCircuitoSri(str, Enum):
+    CERRADO = "CERRADO"
+    ABIERTO = "ABIERTO"
+    SEMIABIERTO = "SEMIABIERTO"
+
+
+class ModoColaSri(str, Enum):
+    NORMAL = "NORMAL"
+    PAUSA = "PAUSA"
+    SONDEO = "SONDEO"
+
+
+class CircuitoSriAbiertoError(ConnectionError):
+    """El SRI se considera caído: el envío se omite sin abrir conexión."""
+
+
+class CircuitoSri:
+    """
+    Circuit breaker de los web services del SRI, compartido por el proceso.
+
+    Tras `umbral_fallos` errores de transporte consecutivos se abre: los envíos
+    fallan de inmediato y la cola FE se pausa. Pasado el enfriamiento se deja
+    pasar un único documento de sondeo; si el SRI responde el circuito se
+    cierra y la cola vuelve a su concurrencia normal, si no se abre otra vez.
+    """
+
+    def __init__(
+        self,
+        *,
+        umbral_fallos: int | None = None,
+        enfriamiento_segundos: float | None = None,
+        reloj=time.monotonic,
+    ) -> None:
+        settings = get_settings()
+        self.umbral_fallos = umbral_fallos or settings.FE_SRI_CIRCUITO_UMBRAL_FALLOS
+        self.enfriamiento_segundos = (
+            settings.FE_SRI_CIRCUITO_ENFRIAMIENTO_SECONDS if enfriamiento_segundos is None else enfriamiento_segundos
+        )
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._estado = EstadoCircuitoSri.CERRADO
+        self._fallos_consecutivos = 0
+        self._abierto_desde = 0.0
+        self._sondeo_en_vuelo = False
+
+    @property
+    def estado(self) -> EstadoCircuitoSri:
+        with self._lock:
+            return self._estado
+
+    def _enfriado(self) -> bool:
+        return self._reloj() - self._abierto_desde >= self.enfriamiento_segundos
+
+    def _cambiar_estado(self, estado: EstadoCircuitoSri) -> None:
+        if estado == self._estado:
+            return
+        self._estado = estado
+        record_sri_circuito_estado(estado.value)
+        if estado == EstadoCircuitoSri.ABIERTO:
+            record_sri_circuito_apertura()
+            logger.warning(
+                "Circuito SRI abierto tras %s fallos de transporte; cola FE en pausa %ss.",
+                self._fallos_consecutivos,
+                self.enfriamiento_segundos,
+            )
+        elif estado == EstadoCircuitoSri.CERRADO:
+            logger.info("Circuito SRI cerrado: el SRI vuelve a responder.")
+
+    def modo_cola(self) -> ModoColaSri:
+        """Cómo debe reclamar la cola FE en esta pasada, sin consumir el sondeo."""
+        with self._lock:
+            if self._estado == EstadoCircuitoSri.CERRADO:
+                return ModoColaSri.NORMAL
+            if self._sondeo_en_vuelo:
+                return ModoColaSri.PAUSA
+            if self._estado == EstadoCircuitoSri.SEMIABIERTO or self._enfriado():
+                return ModoColaSri.SONDEO
+            return ModoColaSri.PAUSA
+
+    def segundos_hasta_sondeo(self) -> int:
+        """Segundos hasta que el circuito deje pasar el sondeo (al menos 1), para reprogramar sin enviar."""
+        with self._lock:
+            restante = self.enfriamiento_segundos - (self._reloj() - self._abierto_desde)
+            if self._estado == EstadoCircuitoSri.CERRADO or self._sondeo_en_vuelo:
+                restante = 0.0
+            return max(math.ceil(restante), 1)
+
+    def adquirir(self) -> bool:
+        """Autoriza un envío al SRI; con el circuito abierto solo pasa un sondeo a la vez."""
+        with self._lock:
+            if self._estado == EstadoCircuitoSri.CERRADO:
+                return True
+            if self._sondeo_en_vuelo:
+                return False
+            if self._estado == EstadoCircuitoSri.ABIERTO:
+                if not self._enfriado():
+                    return False
+                self._cambiar_estado(EstadoCircuitoSri.SEMIABIERTO)
+            self._sondeo_en_vuelo = True
+            return True
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self._fallos_consecutivos = 0
+            self._sondeo_en_vuelo = False
+            self._cambiar_estado(EstadoCircuitoSri.CERRADO)
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self._fallos_consecutivos += 1
+            self._sondeo_en_vuelo = False
+            if self._estado == EstadoCircuitoSri.SEMIABIERTO or self._fallos_consecutivos >= self.umbral_fallos:
+                self._abierto_desde = self._reloj()
+                self._cambiar_estado(EstadoCircuitoSri.ABIERTO)
+
+    def liberar(self) -> None:
+        """El envío terminó sin veredicto sobre el SRI (p. ej. error local): libera el sondeo."""
+        with self._lock:
+            self._sondeo_en_vuelo = False
+
+
+circuito_sri = CircuitoSri()
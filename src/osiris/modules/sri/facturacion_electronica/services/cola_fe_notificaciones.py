@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+
+from sqlmodel import Session
+
+from osiris.core.canal_notificaciones import CanalNotificaciones, registrar_canal
+from osiris.core.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class DespertadorColaFE(CanalNotificaciones):
+    """
+    Despierta al worker FE cuando se encola un documento.
+
+    Los encolados marcan el session; al confirmarse la transacción se avisa a los
+    suscriptores locales y, en Postgres, los workers de otras réplicas reciben el
+    NOTIFY con ``escuchar``. El polling por intervalo queda como respaldo.
+    """
+
+    clave_sesion = "osiris_fe_cola_notificar"
+    descripcion = "la cola FE"
+
+    def __init__(self, *, habilitado: bool | None = None, canal: str | None = None) -> None:
+        settings = get_settings()
+        super().__init__(
+            habilitado=settings.FE_QUEUE_NOTIFY_ENABLED if habilitado is None else habilitado,
+            canal=canal or settings.FE_QUEUE_CANAL_NOTIFICACION,
+        )
+        self._suscriptores: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def suscribir(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Registra un callback de despertar; retorna la función que lo da de baja."""
+        with self._lock:
+            self._suscriptores.append(callback)
+
+        def cancelar() -> None:
+            with self._lock:
+                if callback in self._suscriptores:
+                    self._suscriptores.remove(callback)
+
+        return cancelar
+
+    def notificar(self) -> None:
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for callback in suscriptores:
+            try:
+                callback()
+            except Exception as exc:  # pragma: no cover - p. ej. event loop ya cerrado
+                logger.debug("Suscriptor de la cola FE no disponible: %s", exc)
+
+    def marcar_encolado(self, session: Session) -> None:
+        """Registra en el session que la transacción encoló documentos FE."""
+        self.marcar(session)
+
+    def al_confirmar(self, pendientes: set) -> None:
+        if self.habilitado:
+            self.notificar()
+
+    def al_conectar(self) -> None:
+        # Lo encolado mientras no se escuchaba se recoge con una pasada inmediata.
+        self.notificar()
+
+    def aplicar_notificacion(self, payload: str) -> None:
+        if payload == self.origen:
+            return
+        self.notificar()
+
+
+despertador_cola_fe = registrar_canal(DespertadorColaFE())
@@ -1,8 +1,19 @@
 from __future__ import annotations
 
-import threading
+import logging
 from uuid import UUID
 
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from osiris.core.db import engine as default_engine
+from osiris.modules.impresion.services.impresion_service import ImpresionService
+from osiris.modules.sri.core_sri.models import DocumentoElectronico
+from osiris.modules.sri.facturacion_electronica.services.programador_tareas import programador_tareas
+
+
+logger = logging.getLogger(__name__)
+
 
 class CorreoFacturaService:
     """Worker simple de correo para adjuntar XML/RIDE (mock en MVP)."""
@@ -20,13 +31,25 @@ class CorreoFacturaService:
             scheduler(venta_id)
             return
 
-        timer = threading.Timer(
-            0,
-            self.enviar_correo_factura,
-            kwargs={"venta_id": venta_id},
-        )
-        timer.daemon = True
-        timer.start()
+        programador_tareas.programar(f"correo-factura:{venta_id}", 0, self.enviar_correo_factura, venta_id=venta_id)
+
+    def _obtener_ride_a4(self, venta_id: UUID) -> bytes | None:
+        # Solo del cache de impresión (lo llena el pre-render): mientras el envío sea
+        # simulado no se renderiza un RIDE por cada factura autorizada.
+        with Session(self.db_engine or default_engine) as session:
+            documento_id = session.exec(
+                select(DocumentoElectronico.id).where(
+                    DocumentoElectronico.venta_id == venta_id,
+                    DocumentoElectronico.activo.is_(True),
+                )
+            ).first()
+            if documento_id is None:
+                return None
+            try:
+                return ImpresionService().obtener_ride_a4_cacheado(session, documento_id=documento_id)
+            except HTTPException as exc:
+                logger.warning("Correo de la venta %s sin RIDE adjunto: %s", venta_id, exc.detail)
+                return None
 
     def enviar_correo_factura(self, venta_id: UUID) -> dict:
         # MVP: envío mockeado. En etapas futuras se integra SMTP/provider real.
@@ -34,4 +57,5 @@ class CorreoFacturaService:
             "venta_id": str(venta_id),
             "enviado": True,
             "adjuntos": ["ride.pdf", "factura.xml"],
+            "ride_pdf": self._obtener_ride_a4(venta_id),
         }
@@ -15,6 +15,7 @@ from osiris.modules.sri.core_sri.models import (
     TipoDocumentoElectronico,
     Venta,
 )
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import ContenidoBlob, abrir_xml_autorizado
 
 
 class DocumentoElectronicoService:
@@ -73,15 +74,20 @@ class DocumentoElectronicoService:
         if empresa_documento not in empresas_usuario:
             raise HTTPException(status_code=403, detail="No autorizado para acceder a este documento.")
 
-    def obtener_xml_autorizado(self, session: Session, documento_id: UUID, user_id: str | None) -> str:
+    def obtener_xml_autorizado(self, session: Session, documento_id: UUID, user_id: str | None) -> ContenidoBlob:
+        """XML autorizado desde el almacén de blobs, para servirse por bloques o por rangos."""
         documento = self._obtener_documento(session, documento_id)
         self._validar_acceso_documento(session, documento, user_id)
 
         if documento.estado_sri != EstadoDocumentoElectronico.AUTORIZADO:
             raise HTTPException(status_code=400, detail="El documento electrónico aún no está AUTORIZADO.")
-        if not documento.xml_autorizado:
+        try:
+            contenido = abrir_xml_autorizado(session, documento)
+        except FileNotFoundError:
+            contenido = None
+        if contenido is None:
             raise HTTPException(status_code=404, detail="XML autorizado no disponible.")
-        return documento.xml_autorizado
+        return contenido
 
     def obtener_ride_html(self, session: Session, documento_id: UUID, user_id: str | None) -> str:
         documento = self._obtener_documento(session, documento_id)
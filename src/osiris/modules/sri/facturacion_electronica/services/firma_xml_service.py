@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from osiris.core.observability import record_fe_etapa
+from osiris.core.settings import get_settings
+
+
+logger = logging.getLogger(__name__)
+
+NS_DS = "http://www.w3.org/2000/09/xmldsig#"
+NS_ETSI = "http://uri.etsi.org/01903/v1.3.2#"
+_ALG_C14N = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+_ALG_SHA1 = "http://www.w3.org/2000/09/xmldsig#sha1"
+_ALG_RSA_SHA1 = "http://www.w3.org/2000/09/xmldsig#rsa-sha1"
+_ALG_ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+# Ecuador continental no aplica horario de verano.
+_ZONA_ECUADOR = timezone(timedelta(hours=-5))
+
+# Listas del payload FE-EC que en el XML van dentro de un contenedor con hijos en singular.
+_CONTENEDORES = {"detalles": "detalle", "impuestos": "impuesto", "pagos": "pago"}
+
+
+class ComprobanteInvalidoError(ValueError):
+    """El comprobante no cumple el XSD del SRI (`FEEC_XSD_PATH`)."""
+
+
+@dataclass(frozen=True)
+class CertificadoFirma:
+    clave_privada: object
+    certificado: object
+    certificado_der: bytes
+
+
+_certificados: dict[tuple[str, int, str], CertificadoFirma] = {}
+_certificados_lock = threading.Lock()
+
+
+def cargar_certificado(ruta: Path | str, password: str | None) -> CertificadoFirma:
+    """
+    Descifra el PKCS#12 una sola vez por proceso. La caché se invalida si el
+    archivo cambia (mtime), así un certificado renovado se toma sin reiniciar.
+    """
+    from cryptography.hazmat.primitives.serialization import Encoding, pkcs12
+
+    ruta_resuelta = Path(ruta).resolve()
+    clave_cache = (
+        str(ruta_resuelta),
+        ruta_resuelta.stat().st_mtime_ns,
+        hashlib.sha256((password or "").encode("utf-8")).hexdigest(),
+    )
+    with _certificados_lock:
+        certificado = _certificados.get(clave_cache)
+        if certificado is not None:
+            return certificado
+        clave_privada, x509, _cadena = pkcs12.load_key_and_certificates(
+            ruta_resuelta.read_bytes(),
+            password.encode("utf-8") if password else None,
+        )
+        if clave_privada is None or x509 is None:
+            raise ValueError(f"El archivo PKCS#12 {ruta_resuelta.name} no contiene clave privada y certificado.")
+        certificado = CertificadoFirma(
+            clave_privada=clave_privada,
+            certificado=x509,
+            certificado_der=x509.public_bytes(Encoding.DER),
+        )
+        for clave in [clave for clave in _certificados if clave[0] == clave_cache[0]]:
+            del _certificados[clave]
+        _certificados[clave_cache] = certificado
+        return certificado
+
+
+def _agregar(padre: ElementTree.Element, nombre: str, valor) -> None:
+    if valor is None:
+        return
+    if isinstance(valor, dict):
+        elemento = ElementTree.SubElement(padre, nombre)
+        for hijo, valor_hijo in valor.items():
+            _agregar(elemento, hijo, valor_hijo)
+        return
+    if isinstance(valor, list):
+        if nombre in _CONTENEDORES:
+            contenedor = ElementTree.SubElement(padre, nombre)
+            for item in valor:
+                _agregar(contenedor, _CONTENEDORES[nombre], item)
+        elif nombre == "campoAdicional":
+            for item in valor:
+                campo = ElementTree.SubElement(padre, "campoAdicional", nombre=str(item["nombre"]))
+                campo.text = str(item["valor"])
+        else:
+            for item in valor:
+                _agregar(padre, nombre, item)
+        return
+    ElementTree.SubElement(padre, nombre).text = str(valor)
+
+
+def factura_a_xml(payload: dict) -> bytes:
+    """Serializa el payload FE-EC de factura (fe_mapper_service) al XML 1.1.0 del SRI."""
+    raiz = ElementTree.Element("factura", id="comprobante", version="1.1.0")
+    for nombre, valor in payload.items():
+        if nombre == "infoAdicional" and not (valor or {}).get("campoAdicional"):
+            continue
+        _agregar(raiz, nombre, valor)
+    return ElementTree.tostring(raiz, encoding="utf-8", xml_declaration=False)
+
+
+def _lxml_etree():
+    try:
+        from lxml import etree
+    except ModuleNotFoundError:
+        return None
+    return etree
+
+
+_esquemas: dict[tuple[str, int], object] = {}
+_esquemas_lock = threading.Lock()
+_aviso_sin_lxml = threading.Event()
+
+
+def _esquema_xsd(etree, ruta: Path):
+    """XSD compilado una vez por proceso; se recompila si el archivo cambia (mtime)."""
+    clave = (str(ruta), ruta.stat().st_mtime_ns)
+    with _esquemas_lock:
+        esquema = _esquemas.get(clave)
+        if esquema is None:
+            # Los XSD del SRI importan xmldsig-core-schema.xsd por ruta relativa: se parsea desde el archivo.
+            esquema = etree.XMLSchema(etree.parse(str(ruta)))
+            for anterior in [anterior for anterior in _esquemas if anterior[0] == clave[0]]:
+                del _esquemas[anterior]
+            _esquemas[clave] = esquema
+        return esquema
+
+
+def validar_xsd(xml: bytes, ruta_xsd: Path | str | None = None) -> None:
+    """
+    Valida el comprobante sin firmar contra el XSD del SRI (`FEEC_XSD_PATH` si no
+    se indica otro). Lanza ComprobanteInvalidoError con los primeros errores.
+
+    Sin XSD configurado no valida; sin lxml instalado tampoco, y lo avisa una vez
+    por proceso: el SRI devolvería el comprobante con el mensaje 35.
+    """
+    ruta = ruta_xsd or get_settings().FEEC_XSD_PATH
+    if ruta is None:
+        return
+    etree = _lxml_etree()
+    if etree is None:
+        if not _aviso_sin_lxml.is_set():
+            _aviso_sin_lxml.set()
+            logger.error("lxml no disponible: los comprobantes no se validan contra %s antes de firmarlos.", ruta)
+        return
+    esquema = _esquema_xsd(etree, Path(ruta))
+    try:
+        esquema.assertValid(etree.fromstring(xml))
+    except etree.DocumentInvalid as exc:
+        errores = "; ".join(f"línea {error.line}: {error.message}" for error in list(exc.error_log)[:5])
+        raise ComprobanteInvalidoError(f"El comprobante no cumple el XSD del SRI: {errores or exc}") from exc
+
+
+def _digest(contenido: str | bytes) -> str:
+    datos = contenido.encode("utf-8") if isinstance(contenido, str) else contenido
+    return base64.b64encode(hashlib.sha1(datos).digest()).decode("ascii")
+
+
+def _c14n(fragmento: str, *namespaces: tuple[str, str]) -> str:
+    """
+    C14N de un elemento firmado con los namespaces que hereda de sus ancestros.
+    Cada fragmento usa todos los prefijos que tiene en alcance, así que la salida
+    coincide con C14N 1.0 inclusivo del mismo nodo dentro del documento.
+    """
+    if namespaces:
+        cierre = fragmento.index(">")
+        if fragmento[cierre - 1] == "/":
+            cierre -= 1
+        declaraciones = "".join(f' xmlns:{prefijo}="{uri}"' for prefijo, uri in namespaces)
+        fragmento = fragmento[:cierre] + declaraciones + fragmento[cierre:]
+    return ElementTree.canonicalize(xml_data=fragmento)
+
+
+def _entero_b64(valor: int) -> str:
+    return base64.b64encode(valor.to_bytes((valor.bit_length() + 7) // 8, "big")).decode("ascii")
+
+
+class FirmaXadesService:
+    """
+    Firma XAdES-BES (enveloped, RSA-SHA1) de comprobantes SRI en memoria.
+
+    La clave se descifra una vez (``cargar_certificado``) y cada firma trabaja
+    sobre bytes: no se escriben archivos intermedios, por lo que firmas
+    concurrentes desde varios hilos no interfieren entre sí.
+    """
+
+    def __init__(self, certificado: CertificadoFirma) -> None:
+        self.certificado = certificado
+
+    @classmethod
+    def desde_archivo(cls, ruta: Path | str, password: str | None) -> FirmaXadesService:
+        return cls(cargar_certificado(ruta, password))
+
+    def firmar(self, xml: bytes, *, momento: datetime | None = None) -> bytes:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        documento = ElementTree.canonicalize(xml_data=xml.decode("utf-8"))
+        x509 = self.certificado.certificado
+        numeros_publicos = x509.public_key().public_numbers()
+
+        n_firma = secrets.randbelow(900000) + 100000
+        n_propiedades = secrets.randbelow(900000) + 100000
+        n_referencia = secrets.randbelow(900000) + 100000
+        n_objeto = secrets.randbelow(900000) + 100000
+        id_firma = f"Signature{n_firma}"
+        id_propiedades = f"{id_firma}-SignedProperties{n_propiedades}"
+        id_certificado = f"Certificate{n_firma}"
+        id_referencia = f"Reference-ID-{n_referencia}"
+        momento_firma = (momento or datetime.now(_ZONA_ECUADOR)).isoformat(timespec="seconds")
+
+        propiedades = (
+            f'<etsi:SignedProperties Id="{id_propiedades}">'
+            "<etsi:SignedSignatureProperties>"
+            f"<etsi:SigningTime>{momento_firma}</etsi:SigningTime>"
+            "<etsi:SigningCertificate><etsi:Cert><etsi:CertDigest>"
+            f'<ds:DigestMethod Algorithm="{_ALG_SHA1}"></ds:DigestMethod>'
+            f"<ds:DigestValue>{_digest(self.certificado.certificado_der)}</ds:DigestValue>"
+            "</etsi:CertDigest><etsi:IssuerSerial>"
+            f"<ds:X509IssuerName>{escape(x509.issuer.rfc4514_string())}</ds:X509IssuerName>"
+            f"<ds:X509SerialNumber>{x509.serial_number}</ds:X509SerialNumber>"
+            "</etsi:IssuerSerial></etsi:Cert></etsi:SigningCertificate>"
+            "</etsi:SignedSignatureProperties>"
+            "<etsi:SignedDataObjectProperties>"
+            f'<etsi:DataObjectFormat ObjectReference="#{id_referencia}">'
+            "<etsi:Description>contenido comprobante</etsi:Description>"
+            "<etsi:MimeType>text/xml</etsi:MimeType>"
+            "</etsi:DataObjectFormat></etsi:SignedDataObjectProperties>"
+            "</etsi:SignedProperties>"
+        )
+        key_info = (
+            f'<ds:KeyInfo Id="{id_certificado}">'
+            "<ds:X509Data><ds:X509Certificate>"
+            f"{base64.b64encode(self.certificado.certificado_der).decode('ascii')}"
+            "</ds:X509Certificate></ds:X509Data>"
+            "<ds:KeyValue><ds:RSAKeyValue>"
+            f"<ds:Modulus>{_entero_b64(numeros_publicos.n)}</ds:Modulus>"
+            f"<ds:Exponent>{_entero_b64(numeros_publicos.e)}</ds:Exponent>"
+            "</ds:RSAKeyValue></ds:KeyValue></ds:KeyInfo>"
+        )
+        signed_info = (
+            f'<ds:SignedInfo Id="Signature-SignedInfo{n_firma}">'
+            f'<ds:CanonicalizationMethod Algorithm="{_ALG_C14N}"></ds:CanonicalizationMethod>'
+            f'<ds:SignatureMethod Algorithm="{_ALG_RSA_SHA1}"></ds:SignatureMethod>'
+            f'<ds:Reference Id="SignedPropertiesID{n_propiedades}" '
+            f'Type="http://uri.etsi.org/01903#SignedProperties" URI="#{id_propiedades}">'
+            f'<ds:DigestMethod Algorithm="{_ALG_SHA1}"></ds:DigestMethod>'
+            f"<ds:DigestValue>{_digest(_c14n(propiedades, ('ds', NS_DS), ('etsi', NS_ETSI)))}</ds:DigestValue>"
+            "</ds:Reference>"
+            f'<ds:Reference URI="#{id_certificado}">'
+            f'<ds:DigestMethod Algorithm="{_ALG_SHA1}"></ds:DigestMethod>'
+            f"<ds:DigestValue>{_digest(_c14n(key_info, ('ds', NS_DS)))}</ds:DigestValue>"
+            "</ds:Reference>"
+            f'<ds:Reference Id="{id_referencia}" URI="#comprobante">'
+            f'<ds:Transforms><ds:Transform Algorithm="{_ALG_ENVELOPED}"></ds:Transform></ds:Transforms>'
+            f'<ds:DigestMethod Algorithm="{_ALG_SHA1}"></ds:DigestMethod>'
+            f"<ds:DigestValue>{_digest(documento)}</ds:DigestValue>"
+            "</ds:Reference>"
+            "</ds:SignedInfo>"
+        )
+        valor_firma = self.certificado.clave_privada.sign(
+            _c14n(signed_info, ("ds", NS_DS)).encode("utf-8"),
+            padding.PKCS1v15(),
+            hashes.SHA1(),
+        )
+        firma = (
+            f'<ds:Signature xmlns:ds="{NS_DS}" Id="{id_firma}">'
+            f"{signed_info}"
+            f'<ds:SignatureValue Id="SignatureValue{n_firma}">'
+            f"{base64.b64encode(valor_firma).decode('ascii')}"
+            "</ds:SignatureValue>"
+            f"{key_info}"
+            f'<ds:Object Id="{id_firma}-Object{n_objeto}">'
+            f"<etsi:QualifyingProperties xmlns:etsi={quoteattr(NS_ETSI)} Target=\"#{id_firma}\">"
+            f"{propiedades}"
+            "</etsi:QualifyingProperties></ds:Object>"
+            "</ds:Signature>"
+        )
+        # La firma va como último hijo de la raíz; el resto del documento queda en su forma canónica.
+        cierre = documento.rindex("</")
+        firmado = documento[:cierre] + firma + documento[cierre:]
+        return b'<?xml version="1.0" encoding="UTF-8"?>\n' + firmado.encode("utf-8")
+
+
+class FirmadorComprobantes:
+    """Genera y firma comprobantes en memoria con un certificado ya descifrado."""
+
+    def __init__(self, firma: FirmaXadesService) -> None:
+        self.firma = firma
+
+    def firmar_factura(self, payload: dict) -> bytes:
+        xml = factura_a_xml(payload)
+        validar_xsd(xml)
+        inicio = time.perf_counter()
+        firmado = self.firma.firmar(xml)
+        record_fe_etapa(etapa="firma", duracion_segundos=time.perf_counter() - inicio)
+        return firmado
+
+
+_firmador: FirmadorComprobantes | None = None
+_firmador_lock = threading.Lock()
+
+
+def obtener_firmador() -> FirmadorComprobantes | None:
+    """Firmador del proceso con FEEC_P12_PATH; None si no hay certificado configurado."""
+    global _firmador
+    settings = get_settings()
+    if not settings.FEEC_P12_PATH:
+        return None
+    with _firmador_lock:
+        certificado = cargar_certificado(settings.FEEC_P12_PATH, settings.FEEC_P12_PASSWORD)
+        if _firmador is None or _firmador.firma.certificado is not certificado:
+            _firmador = FirmadorComprobantes(FirmaXadesService(certificado))
+        return _firmador
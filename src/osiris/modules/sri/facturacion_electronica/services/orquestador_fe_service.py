@@ -1,26 +1,62 @@
 from __future__ import annotations
 
+import logging
+import os
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from uuid import UUID
 
 from fastapi import BackgroundTasks, HTTPException
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, update
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
 from sqlmodel import Session, select
 
 from osiris.core.db import engine as default_engine
+from osiris.core.observability import (
+    record_fe_cola_pasada_pausada,
+    record_fe_cola_profundidad,
+    record_fe_documento_resultado,
+    record_fe_etapa,
+    record_sri_lote_enviado,
+)
+from osiris.core.settings import get_settings
+from osiris.modules.impresion.services.prerender_service import programar_prerender_ride_a4
 from osiris.modules.sri.core_sri.models import (
     DocumentoElectronico,
     DocumentoSriCola,
+    EstadoColaSri,
     EstadoSriDocumento,
     EstadoDocumentoElectronico,
     Retencion,
     TipoDocumentoElectronico,
     Venta,
 )
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import (
+    guardar_xml_autorizado,
+    leer_payload_tarea,
+)
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import CircuitoSri, ModoColaSri, circuito_sri
+from osiris.modules.sri.facturacion_electronica.services.cola_fe_notificaciones import despertador_cola_fe
+from osiris.modules.sri.facturacion_electronica.services.firma_xml_service import (
+    FirmadorComprobantes,
+    obtener_firmador,
+)
 from osiris.modules.sri.facturacion_electronica.services.sri_async_service import FEECOrquestadorGateway, SriAsyncService
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import (
+    RespuestaSriInvalidaError,
+    TransmisorSri,
+    construir_lote,
+    generar_clave_acceso_lote,
+)
 from osiris.modules.sri.facturacion_electronica.services.venta_sri_async_service import FEECVentaGateway, VentaSriAsyncService
 
 
+logger = logging.getLogger(__name__)
+
 def _sync_estado_documento(
     documento: DocumentoElectronico,
     estado: EstadoDocumentoElectronico,
@@ -33,6 +69,34 @@ def _sync_estado_documento(
         documento.mensajes_sri = mensaje
 
 
+class _GatewayResultadoLote:
+    """Gateway de venta que entrega a cada comprobante el resultado ya obtenido para su lote masivo."""
+
+    def __init__(self, resultados: dict[str, dict] | None = None, *, error: Exception | None = None) -> None:
+        self.resultados = resultados or {}
+        self.error = error
+
+    def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+        _ = tipo_documento
+        if self.error is not None:
+            raise self.error
+        clave = payload.get("infoTributaria", {}).get("claveAcceso", "")
+        return self.resultados.get(
+            clave,
+            {"estado": "RECIBIDO", "mensaje": "Comprobante sin resultado en la respuesta del lote SRI."},
+        )
+
+
+@dataclass
+class _FacturaReclamada:
+    """Factura de un lote masivo ya reclamada: filas desligadas de la sesión del reclamo y su payload."""
+
+    documento: DocumentoElectronico
+    tarea: DocumentoSriCola
+    reclamo: tuple[Venta, DocumentoElectronico]
+    payload: dict
+
+
 class OrquestadorFEService:
     def __init__(
         self,
@@ -40,16 +104,33 @@ class OrquestadorFEService:
         db_engine=None,
         venta_sri_service: VentaSriAsyncService | None = None,
         retencion_sri_service: SriAsyncService | None = None,
+        circuito: CircuitoSri | None = None,
+        transmisor: TransmisorSri | None = None,
     ) -> None:
         self.db_engine = db_engine or default_engine
-        self.venta_sri_service = venta_sri_service or VentaSriAsyncService(db_engine=self.db_engine)
-        self.retencion_sri_service = retencion_sri_service or SriAsyncService(db_engine=self.db_engine)
+        self.circuito = circuito or circuito_sri
+        self.transmisor = transmisor or TransmisorSri(circuito=self.circuito)
+        self.venta_sri_service = venta_sri_service or VentaSriAsyncService(
+            db_engine=self.db_engine, circuito=self.circuito
+        )
+        self.retencion_sri_service = retencion_sri_service or SriAsyncService(
+            db_engine=self.db_engine, circuito=self.circuito
+        )
+        # Identidad de esta réplica en los leases de la cola.
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"[:80]
 
     @staticmethod
     def _backoff_minutes(intentos: int) -> int:
         # 1er retry: 2min, luego 4, 8, 16...
         return 2 ** max(intentos, 1)
 
+    @classmethod
+    def _retraso_reintento(cls, intentos: int) -> timedelta:
+        # Jitter sobre la mitad superior del backoff: los documentos que fallaron
+        # juntos durante una caída del SRI no vuelven a vencer todos a la vez.
+        minutos = cls._backoff_minutes(intentos)
+        return timedelta(minutes=minutos / 2 + random.uniform(0, minutos / 2))
+
     @staticmethod
     def _obtener_documento_activo(
         session: Session,
@@ -160,6 +241,7 @@ class OrquestadorFEService:
         else:
             raise HTTPException(status_code=400, detail="Tipo de documento no soportado para orquestación FE-EC.")
 
+        despertador_cola_fe.marcar_encolado(session)
         if commit:
             session.commit()
             session.refresh(documento)
@@ -167,137 +249,548 @@ class OrquestadorFEService:
             session.flush()
         return documento
 
+    def _aplicar_estado_final(
+        self,
+        documento: DocumentoElectronico,
+        estado_sri: EstadoSriDocumento,
+        mensaje: str | None,
+    ) -> None:
+        if estado_sri == EstadoSriDocumento.AUTORIZADO:
+            _sync_estado_documento(documento, EstadoDocumentoElectronico.AUTORIZADO, mensaje=None)
+            documento.next_retry_at = None
+        elif estado_sri == EstadoSriDocumento.RECHAZADO:
+            _sync_estado_documento(documento, EstadoDocumentoElectronico.RECHAZADO, mensaje=mensaje)
+            documento.next_retry_at = None
+        else:
+            _sync_estado_documento(documento, EstadoDocumentoElectronico.RECIBIDO, mensaje=mensaje)
+            documento.intentos += 1
+            if documento.intentos < 5:
+                documento.next_retry_at = datetime.utcnow() + self._retraso_reintento(documento.intentos)
+            else:
+                documento.next_retry_at = None
+
+    def _servicio_documento(self, documento: DocumentoElectronico):
+        """(servicio SRI, tipo de cola, modelo de la entidad, etiqueta) según el tipo de documento."""
+        if documento.tipo_documento == TipoDocumentoElectronico.FACTURA:
+            return self.venta_sri_service, "VENTA", Venta, "factura"
+        if documento.tipo_documento == TipoDocumentoElectronico.RETENCION:
+            return self.retencion_sri_service, "RETENCION", Retencion, "retención"
+        raise HTTPException(status_code=400, detail="Tipo de documento no soportado para procesamiento FE-EC.")
+
     def procesar_documento(
         self,
         doc_id: UUID,
         *,
         venta_gateway: FEECVentaGateway | None = None,
         retencion_gateway: FEECOrquestadorGateway | None = None,
-    ) -> None:
-        with Session(self.db_engine) as session:
+        worker_id: str | None = None,
+    ) -> bool:
+        """
+        Procesa un documento FE con dos escrituras en base de datos.
+
+        La primera es el reclamo previo al envío (documento FIRMADO y tarea
+        PROCESANDO con su intento); se confirma antes de contactar al SRI para no
+        retener una transacción durante la red. La segunda, tras la respuesta,
+        escribe en una sola transacción la tarea, la venta o retención, el
+        historial, el documento y la liberación del lease de `worker_id`.
+
+        Retorna True si esa escritura final liberó el lease.
+        """
+        with Session(self.db_engine, expire_on_commit=False) as session:
             documento = session.get(DocumentoElectronico, doc_id)
             if not documento or not documento.activo:
-                return
+                return False
+
+            servicio, tipo_cola, _entidad_model, etiqueta = self._servicio_documento(documento)
+            if tipo_cola == "VENTA":
+                gateway = venta_gateway or servicio.gateway
+            else:
+                gateway = retencion_gateway or servicio.gateway
+
+            if documento.referencia_id is None:
+                raise HTTPException(status_code=400, detail=f"Documento de {etiqueta} sin referencia_id.")
+            tarea = self._obtener_tarea(
+                session,
+                referencia_id=documento.referencia_id,
+                tipo_documento_cola=tipo_cola,
+            )
+            if tarea is None:
+                raise HTTPException(status_code=404, detail=f"No existe tarea SRI para la {etiqueta}.")
 
-            if documento.tipo_documento == TipoDocumentoElectronico.FACTURA:
-                if documento.referencia_id is None:
-                    raise HTTPException(status_code=400, detail="Documento de factura sin referencia_id.")
-                tarea = self._obtener_tarea(
+            reclamo = None
+            if servicio.tarea_procesable(tarea):
+                reclamo = servicio.reclamar_envio(session, tarea)
+                if reclamo is None and tarea.estado != EstadoColaSri.FALLIDO:
+                    # Otro proceso la está enviando: su escritura final deja el documento al día.
+                    session.rollback()
+                    return False
+            _sync_estado_documento(documento, EstadoDocumentoElectronico.FIRMADO)
+            session.add(documento)
+            payload = leer_payload_tarea(session, tarea) if reclamo is not None else None
+            session.commit()
+
+            return self._completar_envio(
+                session,
+                documento=documento,
+                tarea=tarea,
+                reclamo=reclamo,
+                payload=payload,
+                gateway=gateway,
+                worker_id=worker_id,
+            )
+
+    def _completar_envio(
+        self,
+        session: Session,
+        *,
+        documento: DocumentoElectronico,
+        tarea: DocumentoSriCola,
+        reclamo,
+        payload: dict | None,
+        gateway,
+        worker_id: str | None,
+    ) -> bool:
+        """Envía la tarea ya reclamada (si `reclamo`) y escribe la respuesta y el estado final en una transacción."""
+        servicio, tipo_cola, entidad_model, _etiqueta = self._servicio_documento(documento)
+        error = None
+        if reclamo is not None:
+            respuesta, error = servicio.enviar(gateway, tarea, payload)
+            inicio_persistencia = time.perf_counter()
+            if tipo_cola == "VENTA":
+                venta, documento_venta = reclamo
+                servicio.aplicar_resultado(
                     session,
-                    referencia_id=documento.referencia_id,
-                    tipo_documento_cola="VENTA",
+                    tarea=tarea,
+                    venta=venta,
+                    documento=documento_venta,
+                    respuesta=respuesta,
+                    error=error,
                 )
-                if tarea is None:
-                    raise HTTPException(status_code=404, detail="No existe tarea SRI para la factura.")
-                _sync_estado_documento(documento, EstadoDocumentoElectronico.FIRMADO)
-                session.add(documento)
-                session.commit()
+            else:
+                servicio.aplicar_resultado(
+                    session,
+                    tarea=tarea,
+                    retencion=reclamo,
+                    respuesta=respuesta,
+                    error=error,
+                )
+                if reclamo.estado_sri == EstadoSriDocumento.AUTORIZADO and (respuesta or {}).get("xml_autorizado"):
+                    guardar_xml_autorizado(session, documento, respuesta["xml_autorizado"])
+
+        entidad = session.get(entidad_model, documento.referencia_id)
+        if entidad is not None:
+            self._aplicar_estado_final(documento, entidad.estado_sri, entidad.sri_ultimo_error)
+        liberado = worker_id is not None and documento.reclamado_por == worker_id
+        if liberado:
+            documento.reclamado_por = None
+            documento.reclamado_hasta = None
+        session.add(documento)
+        session.commit()
+
+        if reclamo is not None:
+            record_fe_etapa(etapa="persistencia", duracion_segundos=time.perf_counter() - inicio_persistencia)
+            record_fe_documento_resultado(
+                tipo=documento.tipo_documento.value,
+                resultado="ERROR_RED" if error is not None else documento.estado_sri.value,
+            )
+        if tipo_cola == "VENTA" and reclamo is not None and entidad is not None:
+            if entidad.estado_sri == EstadoSriDocumento.AUTORIZADO:
+                programar_prerender_ride_a4(documento.id, db_engine=self.db_engine)
+                self.venta_sri_service.correo_service.encolar_envio_factura(entidad.id)
+        return liberado
+
+    def reclamar_lote(
+        self,
+        session: Session,
+        *,
+        limite: int,
+        lease_seconds: int,
+        worker_id: str | None = None,
+        now: datetime | None = None,
+    ) -> list[UUID]:
+        """
+        Reclama hasta `limite` documentos vencidos sin lease vigente.
+
+        En Postgres el SELECT ... FOR UPDATE SKIP LOCKED reparte filas distintas
+        entre réplicas concurrentes; el UPDATE condicionado al lease libre hace
+        el reclamo atómico también en motores sin SKIP LOCKED.
+        """
+        now_dt = now or datetime.utcnow()
+        lease_libre = self._lease_libre(now_dt)
+        candidatos = [
+            documento.id
+            for documento in session.exec(
+                self._stmt_documentos_pendientes(now=now_dt, incluir_no_vencidos=False, tipo_documento=None)
+                .where(lease_libre)
+                .order_by(DocumentoElectronico.creado_en.asc())
+                .limit(limite)
+                .with_for_update(skip_locked=True)
+            ).all()
+        ]
+        if not candidatos:
+            session.rollback()
+            return []
+        reclamados = self._reclamar_ids(
+            session,
+            candidatos,
+            lease_seconds=lease_seconds,
+            worker_id=worker_id or self.worker_id,
+            now=now_dt,
+        )
+        session.commit()
+        return [doc_id for doc_id in candidatos if doc_id in reclamados]
+
+    @staticmethod
+    def _lease_libre(now: datetime):
+        return or_(
+            DocumentoElectronico.reclamado_hasta.is_(None),
+            DocumentoElectronico.reclamado_hasta <= now,
+        )
 
-                self.venta_sri_service.procesar_documento_sri(
-                    tarea.id,
-                    gateway=venta_gateway,
-                    scheduler=lambda _task_id, _delay: None,
+    def _reclamar_ids(
+        self,
+        session: Session,
+        doc_ids: list[UUID],
+        *,
+        lease_seconds: int,
+        worker_id: str,
+        now: datetime,
+    ) -> set[UUID]:
+        """UPDATE condicionado al lease libre: retorna los ids que quedaron a nombre de `worker_id`."""
+        return set(
+            session.execute(
+                update(DocumentoElectronico)
+                .where(DocumentoElectronico.id.in_(doc_ids), self._lease_libre(now))
+                .values(
+                    reclamado_por=worker_id,
+                    reclamado_hasta=now + timedelta(seconds=lease_seconds),
+                )
+                .returning(DocumentoElectronico.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+        )
+
+    def liberar_reclamo(self, doc_id: UUID, *, worker_id: str | None = None) -> None:
+        with Session(self.db_engine) as session:
+            session.execute(
+                update(DocumentoElectronico)
+                .where(
+                    DocumentoElectronico.id == doc_id,
+                    DocumentoElectronico.reclamado_por == (worker_id or self.worker_id),
                 )
+                .values(reclamado_por=None, reclamado_hasta=None)
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
 
-                session.refresh(documento)
-                venta = session.get(Venta, documento.referencia_id)
-                if venta is None:
-                    return
-                if venta.estado_sri == EstadoSriDocumento.AUTORIZADO:
-                    _sync_estado_documento(documento, EstadoDocumentoElectronico.AUTORIZADO, mensaje=None)
-                    documento.next_retry_at = None
-                elif venta.estado_sri == EstadoSriDocumento.RECHAZADO:
-                    _sync_estado_documento(
-                        documento,
-                        EstadoDocumentoElectronico.RECHAZADO,
-                        mensaje=venta.sri_ultimo_error,
+    def _procesar_reclamado(
+        self,
+        doc_id: UUID,
+        worker_id: str,
+        *,
+        venta_gateway: FEECVentaGateway | None = None,
+    ) -> bool:
+        if self.circuito.modo_cola() == ModoColaSri.PAUSA:
+            # El circuito se abrió a mitad del lote: el documento vuelve a la cola sin gastar un intento.
+            self.liberar_reclamo(doc_id, worker_id=worker_id)
+            return False
+        try:
+            if venta_gateway is None:
+                liberado = self.procesar_documento(doc_id, worker_id=worker_id)
+            else:
+                liberado = self.procesar_documento(doc_id, venta_gateway=venta_gateway, worker_id=worker_id)
+        except Exception as exc:
+            # Un documento fallido no detiene el lote. Conserva el lease hasta que
+            # expire: así no se vuelve a reclamar de inmediato en el mismo drenado.
+            logger.exception("Error procesando documento FE %s: %s", doc_id, exc)
+            return False
+        if not liberado:
+            self.liberar_reclamo(doc_id, worker_id=worker_id)
+        return True
+
+    def _preparar_lotes_factura(
+        self,
+        ids: list[UUID],
+        *,
+        tamano: int,
+        espera_seconds: int,
+        now: datetime,
+    ) -> tuple[list[tuple[str, list[tuple[UUID, UUID, dict]]]], list[UUID], list[UUID]]:
+        """
+        Agrupa por RUC emisor las facturas reclamadas en lotes de hasta `tamano`.
+
+        Retorna (lotes de (documento, tarea, payload) a enviar, documentos a
+        procesar uno a uno, documentos diferidos). Un lote incompleto solo sale
+        cuando su documento más antiguo lleva `espera_seconds` en cola; si no, se
+        difiere a una pasada posterior.
+        """
+        por_ruc: dict[str, list[tuple[UUID, datetime, UUID, dict]]] = {}
+        individuales: list[UUID] = []
+        with Session(self.db_engine) as session:
+            documentos = session.exec(
+                select(DocumentoElectronico)
+                .where(DocumentoElectronico.id.in_(ids))
+                .order_by(DocumentoElectronico.creado_en.asc())
+            ).all()
+            referencias = [
+                documento.referencia_id
+                for documento in documentos
+                if documento.tipo_documento == TipoDocumentoElectronico.FACTURA and documento.referencia_id
+            ]
+            # Una consulta para todas las tareas; la más reciente por venta, como `_obtener_tarea`.
+            tareas: dict[UUID, DocumentoSriCola] = {}
+            if referencias:
+                for tarea in session.exec(
+                    select(DocumentoSriCola)
+                    .where(
+                        DocumentoSriCola.entidad_id.in_(referencias),
+                        DocumentoSriCola.tipo_documento == "VENTA",
+                        DocumentoSriCola.activo.is_(True),
+                    )
+                    .order_by(DocumentoSriCola.creado_en.asc())
+                ).all():
+                    tareas[tarea.entidad_id] = tarea
+            for documento in documentos:
+                tarea = (
+                    tareas.get(documento.referencia_id)
+                    if documento.tipo_documento == TipoDocumentoElectronico.FACTURA
+                    else None
+                )
+                payload = leer_payload_tarea(session, tarea) if tarea is not None else {}
+                ruc = payload.get("infoTributaria", {}).get("ruc")
+                if not ruc:
+                    individuales.append(documento.id)
+                    continue
+                por_ruc.setdefault(ruc, []).append((documento.id, documento.creado_en, tarea.id, payload))
+
+        lotes: list[tuple[str, list[tuple[UUID, UUID, dict]]]] = []
+        diferidos: list[UUID] = []
+        for ruc, pendientes in por_ruc.items():
+            for inicio in range(0, len(pendientes), tamano):
+                grupo = pendientes[inicio : inicio + tamano]
+                if len(grupo) < tamano and now - grupo[0][1] < timedelta(seconds=espera_seconds):
+                    diferidos.extend(doc_id for doc_id, _creado_en, _tarea_id, _payload in grupo)
+                    continue
+                lotes.append(
+                    (ruc, [(doc_id, tarea_id, payload) for doc_id, _creado_en, tarea_id, payload in grupo])
+                )
+        return lotes, individuales, diferidos
+
+    def _reclamar_lote_factura(
+        self,
+        grupo: list[tuple[UUID, UUID, dict]],
+    ) -> tuple[list[_FacturaReclamada], list[UUID]]:
+        """
+        Reclama las tareas de un lote en una transacción corta, antes de firmar y enviar.
+
+        Cada tarea pasa a PROCESANDO con su intento contado y su documento a FIRMADO.
+        Retorna (facturas reclamadas, documentos que siguen el camino individual
+        porque su tarea ya no es procesable u otro proceso la reclamó primero).
+        """
+        servicio = self.venta_sri_service
+        reclamadas: list[_FacturaReclamada] = []
+        descartados: list[UUID] = []
+        with Session(self.db_engine, expire_on_commit=False) as session:
+            documentos = {
+                documento.id: documento
+                for documento in session.exec(
+                    select(DocumentoElectronico).where(
+                        DocumentoElectronico.id.in_([doc_id for doc_id, _tarea_id, _payload in grupo])
                     )
-                    documento.next_retry_at = None
-                else:
-                    _sync_estado_documento(
-                        documento,
-                        EstadoDocumentoElectronico.RECIBIDO,
-                        mensaje=venta.sri_ultimo_error,
+                ).all()
+            }
+            tareas = {
+                tarea.id: tarea
+                for tarea in session.exec(
+                    select(DocumentoSriCola).where(
+                        DocumentoSriCola.id.in_([tarea_id for _doc_id, tarea_id, _payload in grupo])
                     )
-                    documento.intentos += 1
-                    if documento.intentos < 5:
-                        documento.next_retry_at = datetime.utcnow() + timedelta(
-                            minutes=self._backoff_minutes(documento.intentos)
-                        )
-                    else:
-                        documento.next_retry_at = None
+                ).all()
+            }
+            # Deja las ventas en el identity map: el reclamo de cada tarea no vuelve a consultarlas.
+            session.exec(
+                select(Venta).where(Venta.id.in_([tarea.entidad_id for tarea in tareas.values()]))
+            ).all()
+            for doc_id, tarea_id, payload in grupo:
+                documento, tarea = documentos.get(doc_id), tareas.get(tarea_id)
+                reclamo = (
+                    servicio.reclamar_envio(session, tarea)
+                    if documento is not None and documento.activo and servicio.tarea_procesable(tarea)
+                    else None
+                )
+                if reclamo is None:
+                    descartados.append(doc_id)
+                    continue
+                _sync_estado_documento(documento, EstadoDocumentoElectronico.FIRMADO)
                 session.add(documento)
-                session.commit()
-                return
+                reclamadas.append(_FacturaReclamada(documento=documento, tarea=tarea, reclamo=reclamo, payload=payload))
+            session.commit()
+        return reclamadas, descartados
 
-            if documento.tipo_documento == TipoDocumentoElectronico.RETENCION:
-                if documento.referencia_id is None:
-                    raise HTTPException(status_code=400, detail="Documento de retención sin referencia_id.")
-                tarea = self._obtener_tarea(
+    def _completar_reclamada(self, factura: _FacturaReclamada, gateway, worker_id: str) -> None:
+        """Escribe la respuesta del SRI de una factura reclamada en lote, sin volver a leer ni reclamar su tarea."""
+        doc_id = factura.documento.id
+        try:
+            with Session(self.db_engine, expire_on_commit=False) as session:
+                venta, documento_venta = factura.reclamo
+                liberado = self._completar_envio(
                     session,
-                    referencia_id=documento.referencia_id,
-                    tipo_documento_cola="RETENCION",
+                    documento=session.merge(factura.documento, load=False),
+                    tarea=session.merge(factura.tarea, load=False),
+                    reclamo=(session.merge(venta, load=False), session.merge(documento_venta, load=False)),
+                    payload=factura.payload,
+                    gateway=gateway,
+                    worker_id=worker_id,
                 )
-                if tarea is None:
-                    raise HTTPException(status_code=404, detail="No existe tarea SRI para la retención.")
-                _sync_estado_documento(documento, EstadoDocumentoElectronico.FIRMADO)
-                session.add(documento)
-                session.commit()
+        except Exception as exc:
+            # Igual que en `_procesar_reclamado`: conserva el lease hasta que expire.
+            logger.exception("Error procesando documento FE %s: %s", doc_id, exc)
+            return
+        if not liberado:
+            self.liberar_reclamo(doc_id, worker_id=worker_id)
 
-                self.retencion_sri_service.procesar_documento_sri(
-                    tarea.id,
-                    gateway=retencion_gateway,
-                    scheduler=lambda _task_id, _delay: None,
+    def _transmitir_lote_factura(
+        self,
+        ruc: str,
+        grupo: list[tuple[UUID, UUID, dict]],
+        firmador: FirmadorComprobantes,
+        worker_id: str,
+    ) -> None:
+        if self.circuito.modo_cola() == ModoColaSri.PAUSA:
+            # El circuito se abrió a mitad de la pasada: el lote vuelve a la cola sin gastar intentos.
+            for doc_id, _tarea_id, _payload in grupo:
+                self.liberar_reclamo(doc_id, worker_id=worker_id)
+            return
+
+        reclamadas, descartados = self._reclamar_lote_factura(grupo)
+        for doc_id in descartados:
+            self._procesar_reclamado(doc_id, worker_id)
+
+        firmadas: list[tuple[_FacturaReclamada, str, bytes]] = []
+        for factura in reclamadas:
+            try:
+                firmadas.append(
+                    (factura, factura.payload["infoTributaria"]["claveAcceso"], firmador.firmar_factura(factura.payload))
                 )
+            except Exception as exc:
+                # Fuera del lote: se envía sola con el intento ya contado en el reclamo.
+                logger.exception("No se pudo firmar la factura %s para el lote SRI: %s", factura.documento.id, exc)
+                self._completar_reclamada(factura, self.venta_sri_service.gateway, worker_id)
+        if not firmadas:
+            return
 
-                session.refresh(documento)
-                retencion = session.get(Retencion, documento.referencia_id)
-                if retencion is None:
-                    return
-                if retencion.estado_sri == EstadoSriDocumento.AUTORIZADO:
-                    _sync_estado_documento(documento, EstadoDocumentoElectronico.AUTORIZADO, mensaje=None)
-                    documento.next_retry_at = None
-                elif retencion.estado_sri == EstadoSriDocumento.RECHAZADO:
-                    _sync_estado_documento(
-                        documento,
-                        EstadoDocumentoElectronico.RECHAZADO,
-                        mensaje=retencion.sri_ultimo_error,
-                    )
-                    documento.next_retry_at = None
-                else:
-                    _sync_estado_documento(
-                        documento,
-                        EstadoDocumentoElectronico.RECIBIDO,
-                        mensaje=retencion.sri_ultimo_error,
-                    )
-                    documento.intentos += 1
-                    if documento.intentos < 5:
-                        documento.next_retry_at = datetime.utcnow() + timedelta(
-                            minutes=self._backoff_minutes(documento.intentos)
-                        )
-                    else:
-                        documento.next_retry_at = None
-                session.add(documento)
-                session.commit()
-                return
+        payload_base = firmadas[0][0].payload
+        info = payload_base["infoTributaria"]
+        clave_lote = generar_clave_acceso_lote(
+            fecha=datetime.strptime(payload_base["infoFactura"]["fechaEmision"], "%d/%m/%Y").date(),
+            ruc=ruc,
+            ambiente=info["ambiente"],
+            serie=f"{info['estab']}{info['ptoEmi']}",
+            secuencial=info["secuencial"],
+            tipo_emision=info["tipoEmision"],
+        )
+        xml_lote = construir_lote(
+            clave_acceso_lote=clave_lote,
+            ruc=ruc,
+            comprobantes=[xml for _factura, _clave, xml in firmadas],
+        )
+        try:
+            gateway = _GatewayResultadoLote(
+                self.transmisor.transmitir_lote_masivo(xml_lote, clave_lote, [clave for _factura, clave, _xml in firmadas])
+            )
+            record_sri_lote_enviado(comprobantes=len(firmadas))
+        except (TimeoutError, ConnectionError, OSError, RespuestaSriInvalidaError) as exc:
+            # El error de transporte del lote es el de cada comprobante: siguen las reglas de reintento.
+            gateway = _GatewayResultadoLote(error=exc)
+        for factura, _clave, _xml in firmadas:
+            self._completar_reclamada(factura, gateway, worker_id)
 
-            raise HTTPException(status_code=400, detail="Tipo de documento no soportado para procesamiento FE-EC.")
+    def _procesar_lotes_factura(self, ids: list[UUID], worker_id: str, *, now: datetime) -> tuple[list[UUID], int]:
+        """Envía en lotes masivos las facturas reclamadas; retorna (ids restantes, facturas enviadas)."""
+        firmador = obtener_firmador()
+        if firmador is None:
+            return ids, 0
+        settings = get_settings()
+        lotes, individuales, diferidos = self._preparar_lotes_factura(
+            ids,
+            tamano=settings.FE_SRI_LOTE_TAMANO,
+            espera_seconds=settings.FE_SRI_LOTE_ESPERA_SECONDS,
+            now=now,
+        )
+        for doc_id in diferidos:
+            self.liberar_reclamo(doc_id, worker_id=worker_id)
+        for ruc, grupo in lotes:
+            self._transmitir_lote_factura(ruc, grupo, firmador, worker_id)
+        return individuales, sum(len(grupo) for _ruc, grupo in lotes)
 
-    def procesar_cola(self, session: Session, *, now: datetime | None = None) -> int:
-        now_dt = now or datetime.utcnow()
-        documentos = list(
-            session.exec(
-                self._stmt_documentos_pendientes(
-                    now=now_dt,
-                    incluir_no_vencidos=False,
-                    tipo_documento=None,
-                ).order_by(DocumentoElectronico.creado_en.asc())
-            ).all()
+    def procesar_cola(
+        self,
+        session: Session,
+        *,
+        now: datetime | None = None,
+        limite: int | None = None,
+        concurrencia: int | None = None,
+        lease_seconds: int | None = None,
+        worker_id: str | None = None,
+        lote_masivo: bool | None = None,
+    ) -> int:
+        """
+        Reclama un lote de la cola y lo procesa en un pool de hilos acotado.
+
+        Con el circuito SRI abierto la pasada no reclama nada; al vencer el
+        enfriamiento se procesa un único documento de sondeo y, si el SRI
+        respondió, se sigue con un lote completo en la misma pasada.
+
+        Con `FE_SRI_LOTE_ENABLED` las facturas se transmiten en lotes masivos
+        por RUC (una recepción y una consulta de autorización por lote) y el
+        resto de documentos sigue el camino individual.
+        """
+        settings = get_settings()
+        worker = worker_id or self.worker_id
+        modo = self.circuito.modo_cola()
+        if modo == ModoColaSri.PAUSA:
+            record_fe_cola_pasada_pausada()
+            return 0
+        usar_lotes = (settings.FE_SRI_LOTE_ENABLED if lote_masivo is None else lote_masivo) and modo == ModoColaSri.NORMAL
+        tamano_reclamo = limite or settings.FE_QUEUE_BATCH_SIZE
+        if usar_lotes:
+            tamano_reclamo = max(tamano_reclamo, settings.FE_SRI_LOTE_TAMANO)
+        ids = self.reclamar_lote(
+            session,
+            limite=1 if modo == ModoColaSri.SONDEO else tamano_reclamo,
+            lease_seconds=lease_seconds or settings.FE_QUEUE_LEASE_SECONDS,
+            worker_id=worker,
+            now=now,
         )
-        ids = [doc.id for doc in documentos]
-        for doc_id in ids:
-            self.procesar_documento(doc_id)
-        return len(ids)
+        if not ids:
+            return 0
+        enviados_en_lote = 0
+        if usar_lotes:
+            ids, enviados_en_lote = self._procesar_lotes_factura(ids, worker, now=now or datetime.utcnow())
+            if not ids:
+                return enviados_en_lote
+        hilos = min(concurrencia or settings.FE_QUEUE_CONCURRENCY, len(ids))
+        # Con una sola conexión compartida (SQLite en memoria) los hilos se pisarían
+        # las transacciones: el lote se procesa en serie.
+        if isinstance(self.db_engine.pool, (StaticPool, SingletonThreadPool)):
+            hilos = 1
+        if hilos <= 1:
+            for doc_id in ids:
+                self._procesar_reclamado(doc_id, worker)
+        else:
+            with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="fe-cola") as pool:
+                list(pool.map(self._procesar_reclamado, ids, [worker] * len(ids)))
+        if modo == ModoColaSri.SONDEO and self.circuito.modo_cola() == ModoColaSri.NORMAL:
+            return len(ids) + self.procesar_cola(
+                session,
+                now=now,
+                limite=limite,
+                concurrencia=concurrencia,
+                lease_seconds=lease_seconds,
+                worker_id=worker_id,
+                lote_masivo=lote_masivo,
+            )
+        return enviados_en_lote + len(ids)
 
     @staticmethod
     def _stmt_documentos_pendientes(
@@ -307,10 +800,16 @@ class OrquestadorFEService:
         tipo_documento: TipoDocumentoElectronico | None = None,
     ):
         now_dt = now or datetime.utcnow()
+        # FIRMADO solo dura mientras un worker tiene el lease: si vuelve a la cola (lease
+        # vencido) es porque el proceso murió o falló entre el reclamo y la escritura final.
         stmt = select(DocumentoElectronico).where(
             DocumentoElectronico.activo.is_(True),
             DocumentoElectronico.estado_sri.in_(
-                [EstadoDocumentoElectronico.EN_COLA, EstadoDocumentoElectronico.RECIBIDO]
+                [
+                    EstadoDocumentoElectronico.EN_COLA,
+                    EstadoDocumentoElectronico.FIRMADO,
+                    EstadoDocumentoElectronico.RECIBIDO,
+                ]
             ),
             DocumentoElectronico.intentos < 5,
         )
@@ -322,6 +821,62 @@ class OrquestadorFEService:
             stmt = stmt.where(DocumentoElectronico.tipo_documento == tipo_documento)
         return stmt
 
+    def medir_cola(self, session: Session, *, now: datetime | None = None) -> None:
+        """
+        Publica la profundidad de la cola FE por estado y la antigüedad del documento
+        pendiente más antiguo. Son dos agregaciones agrupadas que resuelven los índices
+        (activo, estado_sri, creado_en) y (activo, estado), sin leer las filas.
+
+        Solo cuenta los estados no terminales: los documentos autorizados o
+        rechazados y las tareas cerradas crecen sin límite y no son cola.
+        """
+        now_dt = now or datetime.utcnow()
+        estados_pendientes = (
+            EstadoDocumentoElectronico.EN_COLA,
+            EstadoDocumentoElectronico.FIRMADO,
+            EstadoDocumentoElectronico.RECIBIDO,
+        )
+        estados_tarea_pendientes = (
+            EstadoColaSri.PENDIENTE,
+            EstadoColaSri.PROCESANDO,
+            EstadoColaSri.REINTENTO_PROGRAMADO,
+        )
+        documentos = {estado.value: 0 for estado in estados_pendientes}
+        antiguedad = {estado.value: 0.0 for estado in estados_pendientes}
+        for estado, cantidad, mas_antiguo in session.exec(
+            select(
+                DocumentoElectronico.estado_sri,
+                func.count(),
+                func.min(DocumentoElectronico.creado_en),
+            )
+            .where(
+                DocumentoElectronico.activo.is_(True),
+                DocumentoElectronico.estado_sri.in_(estados_pendientes),
+            )
+            .group_by(DocumentoElectronico.estado_sri)
+        ).all():
+            clave = EstadoDocumentoElectronico(estado).value
+            documentos[clave] = cantidad
+            if mas_antiguo is not None:
+                antiguedad[clave] = (now_dt - mas_antiguo).total_seconds()
+
+        tareas = {estado.value: 0 for estado in estados_tarea_pendientes}
+        for estado, cantidad in session.exec(
+            select(DocumentoSriCola.estado, func.count())
+            .where(
+                DocumentoSriCola.activo.is_(True),
+                DocumentoSriCola.estado.in_(estados_tarea_pendientes),
+            )
+            .group_by(DocumentoSriCola.estado)
+        ).all():
+            tareas[EstadoColaSri(estado).value] = cantidad
+
+        record_fe_cola_profundidad(
+            documentos_por_estado=documentos,
+            tareas_por_estado=tareas,
+            antiguedad_por_estado=antiguedad,
+        )
+
     def listar_documentos_pendientes(
         self,
         session: Session,
@@ -346,19 +901,60 @@ class OrquestadorFEService:
         return items, int(total)
 
     def procesar_documentos_ids(self, documento_ids: list[UUID]) -> tuple[int, list[UUID], list[str]]:
+        """
+        Procesa a demanda los documentos indicados bajo el mismo lease que el worker de cola.
+
+        Los ids se reclaman con el UPDATE condicionado de `reclamar_lote`; los que
+        tienen un lease vigente (otro worker los está enviando) se reportan como
+        error en lugar de enviarse dos veces al SRI.
+        """
         procesados = 0
         ids_procesados: list[UUID] = []
         errores: list[str] = []
+        ids = list(dict.fromkeys(documento_ids))
+        if not ids:
+            return procesados, ids_procesados, errores
+
+        now_dt = datetime.utcnow()
+        with Session(self.db_engine) as session:
+            reclamados = self._reclamar_ids(
+                session,
+                ids,
+                lease_seconds=get_settings().FE_QUEUE_LEASE_SECONDS,
+                worker_id=self.worker_id,
+                now=now_dt,
+            )
+            existentes = set(
+                session.exec(
+                    select(DocumentoElectronico.id).where(
+                        DocumentoElectronico.id.in_([doc_id for doc_id in ids if doc_id not in reclamados]),
+                        DocumentoElectronico.activo.is_(True),
+                    )
+                ).all()
+            )
+            session.commit()
 
-        for doc_id in documento_ids:
+        for doc_id in ids:
+            if doc_id not in reclamados:
+                detalle = (
+                    "Documento en proceso por otro worker; reintente cuando termine."
+                    if doc_id in existentes
+                    else "Documento electrónico no encontrado."
+                )
+                errores.append(f"{doc_id}: {detalle}")
+                continue
+            liberado = False
             try:
-                self.procesar_documento(doc_id)
+                liberado = self.procesar_documento(doc_id, worker_id=self.worker_id)
                 procesados += 1
                 ids_procesados.append(doc_id)
             except HTTPException as exc:
                 errores.append(f"{doc_id}: {exc.detail}")
             except Exception as exc:  # pragma: no cover - respaldo operativo
                 errores.append(f"{doc_id}: {exc}")
+            finally:
+                if not liberado:
+                    self.liberar_reclamo(doc_id, worker_id=self.worker_id)
 
         return procesados, ids_procesados, errores
 
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
+
+from osiris.core.observability import (
+    record_programador_tarea_ejecutada,
+    record_programador_tareas_pendientes,
+)
+from osiris.core.settings import get_settings
+from osiris.modules.sri.core_sri.models import DocumentoSriCola, EstadoColaSri
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProgramadorTareas:
+    """
+    Programador de tareas diferidas del proceso: reintentos SRI y envíos de correo.
+
+    Un único hilo despachador duerme hasta el vencimiento más próximo de un heap y
+    entrega las tareas vencidas a un pool de hilos acotado, en lugar de un
+    ``threading.Timer`` (un hilo dormido) por tarea. Programar de nuevo una clave
+    reemplaza la ejecución pendiente anterior.
+
+    El heap vive en memoria; la fuente de verdad de los reintentos es
+    ``DocumentoSriCola.proximo_intento_en`` y ``rehidratar`` los recupera al arrancar.
+    Cada réplica rehidrata todos los reintentos; ``reclamar_tarea_sri`` hace que
+    solo una de ellas envíe cada uno.
+    """
+
+    def __init__(self, *, max_workers: int | None = None) -> None:
+        self.max_workers = max_workers or get_settings().FE_PROGRAMADOR_WORKERS
+        self._heap: list[tuple[float, int, str]] = []
+        # clave -> (secuencia vigente, callback, kwargs); las entradas del heap con
+        # otra secuencia quedaron reemplazadas o canceladas y se descartan al salir.
+        self._tareas: dict[str, tuple[int, Callable[..., object], dict]] = {}
+        self._secuencia = itertools.count()
+        self._condicion = threading.Condition()
+        self._despachador: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._pid: int | None = None
+        self._detenido = False
+
+    def programar(self, clave: str, delay_seconds: float, callback: Callable[..., object], **kwargs) -> None:
+        vence = time.monotonic() + max(float(delay_seconds), 0.0)
+        with self._condicion:
+            self._asegurar_hilos()
+            secuencia = next(self._secuencia)
+            self._tareas[clave] = (secuencia, callback, kwargs)
+            heapq.heappush(self._heap, (vence, secuencia, clave))
+            record_programador_tareas_pendientes(len(self._tareas))
+            self._condicion.notify()
+
+    def cancelar(self, clave: str) -> bool:
+        with self._condicion:
+            cancelada = self._tareas.pop(clave, None) is not None
+            record_programador_tareas_pendientes(len(self._tareas))
+            return cancelada
+
+    def pendientes(self) -> int:
+        with self._condicion:
+            return len(self._tareas)
+
+    def detener(self, *, esperar: bool = False) -> None:
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+            despachador, executor = self._despachador, self._executor
+            self._despachador = None
+            self._executor = None
+        if despachador is not None and esperar:
+            despachador.join()
+        if executor is not None:
+            executor.shutdown(wait=esperar, cancel_futures=not esperar)
+
+    def _asegurar_hilos(self) -> None:
+        # Tras un fork (workers de gunicorn) los hilos del padre no existen en el hijo.
+        if self._pid == os.getpid() and self._despachador is not None and not self._detenido:
+            return
+        self._pid = os.getpid()
+        self._detenido = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="programador")
+        self._despachador = threading.Thread(target=self._despachar, name="programador-despachador", daemon=True)
+        self._despachador.start()
+
+    def _vigente(self) -> bool:
+        return not self._detenido and self._despachador is threading.current_thread()
+
+    def _despachar(self) -> None:
+        while True:
+            with self._condicion:
+                while self._vigente():
+                    if self._heap:
+                        espera = self._heap[0][0] - time.monotonic()
+                        if espera <= 0:
+                            break
+                        self._condicion.wait(espera)
+                    else:
+                        self._condicion.wait()
+                if not self._vigente():
+                    return
+                vence, secuencia, clave = heapq.heappop(self._heap)
+                tarea = self._tareas.get(clave)
+                if tarea is None or tarea[0] != secuencia:
+                    continue
+                del self._tareas[clave]
+                record_programador_tareas_pendientes(len(self._tareas))
+                executor = self._executor
+            _secuencia, callback, kwargs = tarea
+            executor.submit(self._ejecutar, clave, callback, kwargs, time.monotonic() - vence)
+
+    @staticmethod
+    def _ejecutar(clave: str, callback: Callable[..., object], kwargs: dict, retraso_segundos: float) -> None:
+        try:
+            callback(**kwargs)
+        except Exception as exc:
+            record_programador_tarea_ejecutada(resultado="error", retraso_segundos=retraso_segundos)
+            logger.exception("Error en tarea programada %s: %s", clave, exc)
+            return
+        record_programador_tarea_ejecutada(resultado="ok", retraso_segundos=retraso_segundos)
+
+    def rehidratar(
+        self,
+        db_engine,
+        callbacks: Mapping[str, Callable[..., object]],
+        *,
+        now: datetime | None = None,
+    ) -> int:
+        """Reprograma los reintentos SRI persistidos que quedaron pendientes antes de un reinicio."""
+        now_dt = now or datetime.utcnow()
+        with Session(db_engine) as session:
+            tareas = session.exec(
+                select(DocumentoSriCola.id, DocumentoSriCola.tipo_documento, DocumentoSriCola.proximo_intento_en).where(
+                    DocumentoSriCola.activo.is_(True),
+                    DocumentoSriCola.estado == EstadoColaSri.REINTENTO_PROGRAMADO,
+                    DocumentoSriCola.tipo_documento.in_(list(callbacks)),
+                )
+            ).all()
+        for tarea_id, tipo_documento, proximo_intento_en in tareas:
+            delay = (proximo_intento_en - now_dt).total_seconds() if proximo_intento_en else 0.0
+            self.programar(clave_reintento_sri(tarea_id), delay, callbacks[tipo_documento], tarea_id=tarea_id)
+        return len(tareas)
+
+
+def clave_reintento_sri(tarea_id: UUID) -> str:
+    return f"sri-cola:{tarea_id}"
+
+
+ESTADOS_RECLAMABLES_SRI = (EstadoColaSri.PENDIENTE, EstadoColaSri.REINTENTO_PROGRAMADO)
+
+
+def reclamar_tarea_sri(session: Session, tarea: DocumentoSriCola, *, now: datetime | None = None) -> bool:
+    """
+    Pasa la tarea a PROCESANDO y cuenta el intento con un UPDATE condicionado, sin confirmar.
+
+    El UPDATE solo procede si la tarea sigue reclamable con los intentos leídos:
+    de varios procesos que reclaman la misma tarea (el reintento rehidratado en
+    cada réplica, el worker de cola, un envío manual) solo uno obtiene la fila y
+    la envía. Una tarea en PROCESANDO la está enviando otro proceso; solo se
+    recupera si lleva más de `FE_QUEUE_LEASE_SECONDS` sin actualizarse, es decir,
+    si ese proceso murió a mitad del envío.
+    """
+    now_dt = now or datetime.utcnow()
+    procesando_vencida = now_dt - timedelta(seconds=get_settings().FE_QUEUE_LEASE_SECONDS)
+    intentos = tarea.intentos_realizados
+    resultado = session.execute(
+        update(DocumentoSriCola)
+        .where(
+            DocumentoSriCola.id == tarea.id,
+            DocumentoSriCola.intentos_realizados == intentos,
+            or_(
+                DocumentoSriCola.estado.in_(list(ESTADOS_RECLAMABLES_SRI)),
+                and_(
+                    DocumentoSriCola.estado == EstadoColaSri.PROCESANDO,
+                    DocumentoSriCola.actualizado_en <= procesando_vencida,
+                ),
+            ),
+        )
+        .values(estado=EstadoColaSri.PROCESANDO, intentos_realizados=intentos + 1, actualizado_en=now_dt)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != 1:
+        return False
+    set_committed_value(tarea, "estado", EstadoColaSri.PROCESANDO)
+    set_committed_value(tarea, "intentos_realizados", intentos + 1)
+    set_committed_value(tarea, "actualizado_en", now_dt)
+    return True
+
+
+def reintento_vencido(tarea: DocumentoSriCola, *, now: datetime | None = None) -> bool:
+    """False si la tarea tiene un reintento programado que aún no vence."""
+    return tarea.proximo_intento_en is None or tarea.proximo_intento_en <= (now or datetime.utcnow())
+
+
+programador_tareas = ProgramadorTareas()
@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-import json
-import threading
 from datetime import datetime, timedelta
 from typing import Callable, Protocol
 from uuid import UUID
@@ -19,7 +17,16 @@ from osiris.modules.sri.core_sri.models import (
     RetencionDetalle,
     RetencionEstadoHistorial,
 )
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import guardar_payload_tarea, leer_payload_tarea
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import CircuitoSri, ModoColaSri, circuito_sri
 from osiris.modules.sri.facturacion_electronica.services.fe_mapper_service import FEMapperService
+from osiris.modules.sri.facturacion_electronica.services.programador_tareas import (
+    clave_reintento_sri,
+    programador_tareas,
+    reclamar_tarea_sri,
+    reintento_vencido,
+)
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import RespuestaSriInvalidaError
 from osiris.modules.sri.core_sri.all_schemas import RetencionDetalleRead, RetencionRead
 
 
@@ -35,10 +42,17 @@ class FEECOrquestadorGatewayDefault:
 
 
 class SriAsyncService:
-    def __init__(self, gateway: FEECOrquestadorGateway | None = None, db_engine=None) -> None:
+    def __init__(
+        self,
+        gateway: FEECOrquestadorGateway | None = None,
+        db_engine=None,
+        *,
+        circuito: CircuitoSri | None = None,
+    ) -> None:
         self.gateway = gateway or FEECOrquestadorGatewayDefault()
         self.fe_mapper = FEMapperService()
         self.db_engine = db_engine or default_engine
+        self.circuito = circuito or circuito_sri
 
     def _retencion_read(self, session: Session, retencion_id: UUID) -> RetencionRead:
         retencion = session.get(Retencion, retencion_id)
@@ -125,10 +139,10 @@ class SriAsyncService:
             estado=EstadoColaSri.PENDIENTE,
             intentos_realizados=0,
             max_intentos=3,
-            payload_json=json.dumps(payload, ensure_ascii=False),
             usuario_auditoria=usuario_id,
             activo=True,
         )
+        guardar_payload_tarea(session, tarea, payload)
         session.add(tarea)
 
         estado_anterior = retencion.estado_sri.value
@@ -155,76 +169,81 @@ class SriAsyncService:
         return tarea
 
     def _default_scheduler(self, tarea_id: UUID, delay_seconds: int) -> None:
-        timer = threading.Timer(delay_seconds, self.procesar_documento_sri, kwargs={"tarea_id": tarea_id})
-        timer.daemon = True
-        timer.start()
+        programador_tareas.programar(
+            clave_reintento_sri(tarea_id),
+            delay_seconds,
+            self.procesar_documento_sri,
+            tarea_id=tarea_id,
+        )
 
-    def procesar_documento_sri(
+    @staticmethod
+    def tarea_procesable(tarea: DocumentoSriCola | None) -> bool:
+        return (
+            tarea is not None
+            and tarea.activo
+            and tarea.estado not in {EstadoColaSri.COMPLETADO, EstadoColaSri.FALLIDO}
+        )
+
+    def reclamar_envio(
         self,
-        tarea_id: UUID,
-        *,
-        gateway: FEECOrquestadorGateway | None = None,
-        scheduler: Callable[[UUID, int], None] | None = None,
-    ) -> None:
-        gateway_impl = gateway or self.gateway
-        scheduler_impl = scheduler or self._default_scheduler
+        session: Session,
+        tarea: DocumentoSriCola,
+    ) -> Retencion | None:
+        """Marca la tarea en PROCESANDO y cuenta el intento, sin confirmar; None si otro proceso la reclamó."""
+        retencion = session.get(Retencion, tarea.entidad_id)
+        if not retencion or not retencion.activo:
+            tarea.estado = EstadoColaSri.FALLIDO
+            tarea.ultimo_error = "Entidad asociada no encontrada."
+            session.add(tarea)
+            return None
 
-        with Session(self.db_engine) as session:
-            tarea = session.get(DocumentoSriCola, tarea_id)
-            if not tarea or not tarea.activo:
-                return
-            if tarea.estado in {EstadoColaSri.COMPLETADO, EstadoColaSri.FALLIDO}:
-                return
+        if not reclamar_tarea_sri(session, tarea):
+            return None
+        retencion.sri_intentos = tarea.intentos_realizados
+        session.add(retencion)
+        return retencion
 
-            retencion = session.get(Retencion, tarea.entidad_id)
-            if not retencion or not retencion.activo:
-                tarea.estado = EstadoColaSri.FALLIDO
-                tarea.ultimo_error = "Entidad asociada no encontrada."
-                session.add(tarea)
-                session.commit()
-                return
+    @staticmethod
+    def enviar(
+        gateway: FEECOrquestadorGateway,
+        tarea: DocumentoSriCola,
+        payload: dict,
+    ) -> tuple[dict | None, str | None]:
+        """
+        Transmite el payload de la tarea; devuelve (respuesta, error de transmisión).
 
-            tarea.estado = EstadoColaSri.PROCESANDO
-            tarea.intentos_realizados += 1
-            retencion.sri_intentos = tarea.intentos_realizados
-            session.add(tarea)
-            session.add(retencion)
-            session.commit()
+        Un HTTP 4xx o una respuesta que no es XML siguen las reglas de reintento
+        de un error de red: la tarea queda en ERROR al agotar `max_intentos`.
+        """
+        try:
+            respuesta = gateway.enviar_documento(tipo_documento=tarea.tipo_documento, payload=payload)
+        except (TimeoutError, ConnectionError, OSError, RespuestaSriInvalidaError) as exc:
+            return None, str(exc) or "Timeout de red con SRI"
+        return respuesta, None
 
-            payload = json.loads(tarea.payload_json)
-            try:
-                respuesta = gateway_impl.enviar_documento(
-                    tipo_documento=tarea.tipo_documento,
-                    payload=payload,
-                )
-            except (TimeoutError, ConnectionError, OSError) as exc:
-                error = str(exc) or "Timeout de red con SRI"
-                estado_anterior = retencion.estado_sri.value
-                if tarea.intentos_realizados < tarea.max_intentos:
-                    delay = 2 ** (tarea.intentos_realizados - 1)
-                    tarea.estado = EstadoColaSri.REINTENTO_PROGRAMADO
-                    tarea.proximo_intento_en = datetime.utcnow() + timedelta(seconds=delay)
-                    tarea.ultimo_error = error
-
-                    retencion.estado_sri = EstadoSriDocumento.REINTENTO
-                    retencion.sri_ultimo_error = error
-                    session.add(tarea)
-                    session.add(retencion)
-                    self._historial(
-                        session,
-                        retencion=retencion,
-                        estado_anterior=estado_anterior,
-                        estado_nuevo=EstadoSriDocumento.REINTENTO.value,
-                        motivo=f"Error de red SRI. Reintento programado en {delay}s. {error}",
-                        usuario_id=retencion.usuario_auditoria,
-                    )
-                    session.commit()
-                    scheduler_impl(tarea.id, delay)
-                    return
-
-                tarea.estado = EstadoColaSri.FALLIDO
+    def aplicar_resultado(
+        self,
+        session: Session,
+        *,
+        tarea: DocumentoSriCola,
+        retencion: Retencion,
+        respuesta: dict | None,
+        error: str | None = None,
+    ) -> int | None:
+        """
+        Aplica la respuesta del SRI a tarea, retención e historial, sin confirmar.
+
+        Retorna el delay en segundos del reintento a programar, o None si no aplica.
+        """
+        estado_anterior = retencion.estado_sri.value
+        if error is not None:
+            if tarea.intentos_realizados < tarea.max_intentos:
+                delay = 2 ** (tarea.intentos_realizados - 1)
+                tarea.estado = EstadoColaSri.REINTENTO_PROGRAMADO
+                tarea.proximo_intento_en = datetime.utcnow() + timedelta(seconds=delay)
                 tarea.ultimo_error = error
-                retencion.estado_sri = EstadoSriDocumento.ERROR
+
+                retencion.estado_sri = EstadoSriDocumento.REINTENTO
                 retencion.sri_ultimo_error = error
                 session.add(tarea)
                 session.add(retencion)
@@ -232,58 +251,55 @@ class SriAsyncService:
                     session,
                     retencion=retencion,
                     estado_anterior=estado_anterior,
-                    estado_nuevo=EstadoSriDocumento.ERROR.value,
-                    motivo=f"Maximo de reintentos agotado. {error}",
+                    estado_nuevo=EstadoSriDocumento.REINTENTO.value,
+                    motivo=f"Error de red SRI. Reintento programado en {delay}s. {error}",
                     usuario_id=retencion.usuario_auditoria,
                 )
-                session.commit()
-                return
+                return delay
 
-            estado = str(respuesta.get("estado", "")).upper()
-            mensaje = str(respuesta.get("mensaje") or "").strip()
-            estado_anterior = retencion.estado_sri.value
-
-            if estado == EstadoSriDocumento.AUTORIZADO.value:
-                tarea.estado = EstadoColaSri.COMPLETADO
-                tarea.ultimo_error = None
-                retencion.estado_sri = EstadoSriDocumento.AUTORIZADO
-                retencion.sri_ultimo_error = None
-                if retencion.estado == EstadoRetencion.ENCOLADA:
-                    retencion.estado = EstadoRetencion.EMITIDA
-                session.add(tarea)
-                session.add(retencion)
-                self._historial(
-                    session,
-                    retencion=retencion,
-                    estado_anterior=estado_anterior,
-                    estado_nuevo=EstadoSriDocumento.AUTORIZADO.value,
-                    motivo=mensaje or "Documento autorizado por SRI.",
-                    usuario_id=retencion.usuario_auditoria,
-                )
-                session.commit()
-                return
+            tarea.estado = EstadoColaSri.FALLIDO
+            tarea.ultimo_error = error
+            retencion.estado_sri = EstadoSriDocumento.ERROR
+            retencion.sri_ultimo_error = error
+            session.add(tarea)
+            session.add(retencion)
+            self._historial(
+                session,
+                retencion=retencion,
+                estado_anterior=estado_anterior,
+                estado_nuevo=EstadoSriDocumento.ERROR.value,
+                motivo=f"Maximo de reintentos agotado. {error}",
+                usuario_id=retencion.usuario_auditoria,
+            )
+            return None
 
-            if estado == EstadoSriDocumento.RECHAZADO.value:
-                tarea.estado = EstadoColaSri.FALLIDO
-                tarea.ultimo_error = mensaje or "Documento rechazado por SRI."
-                retencion.estado_sri = EstadoSriDocumento.RECHAZADO
-                retencion.sri_ultimo_error = tarea.ultimo_error
-                session.add(tarea)
-                session.add(retencion)
-                self._historial(
-                    session,
-                    retencion=retencion,
-                    estado_anterior=estado_anterior,
-                    estado_nuevo=EstadoSriDocumento.RECHAZADO.value,
-                    motivo=tarea.ultimo_error,
-                    usuario_id=retencion.usuario_auditoria,
-                )
-                session.commit()
-                return
+        respuesta = respuesta or {}
+        estado = str(respuesta.get("estado", "")).upper()
+        mensaje = str(respuesta.get("mensaje") or "").strip()
 
+        if estado == EstadoSriDocumento.AUTORIZADO.value:
+            tarea.estado = EstadoColaSri.COMPLETADO
+            tarea.ultimo_error = None
+            retencion.estado_sri = EstadoSriDocumento.AUTORIZADO
+            retencion.sri_ultimo_error = None
+            if retencion.estado == EstadoRetencion.ENCOLADA:
+                retencion.estado = EstadoRetencion.EMITIDA
+            session.add(tarea)
+            session.add(retencion)
+            self._historial(
+                session,
+                retencion=retencion,
+                estado_anterior=estado_anterior,
+                estado_nuevo=EstadoSriDocumento.AUTORIZADO.value,
+                motivo=mensaje or "Documento autorizado por SRI.",
+                usuario_id=retencion.usuario_auditoria,
+            )
+            return None
+
+        if estado == EstadoSriDocumento.RECHAZADO.value:
             tarea.estado = EstadoColaSri.FALLIDO
-            tarea.ultimo_error = mensaje or f"Respuesta SRI desconocida: {estado or 'VACIO'}"
-            retencion.estado_sri = EstadoSriDocumento.ERROR
+            tarea.ultimo_error = mensaje or "Documento rechazado por SRI."
+            retencion.estado_sri = EstadoSriDocumento.RECHAZADO
             retencion.sri_ultimo_error = tarea.ultimo_error
             session.add(tarea)
             session.add(retencion)
@@ -291,8 +307,62 @@ class SriAsyncService:
                 session,
                 retencion=retencion,
                 estado_anterior=estado_anterior,
-                estado_nuevo=EstadoSriDocumento.ERROR.value,
+                estado_nuevo=EstadoSriDocumento.RECHAZADO.value,
                 motivo=tarea.ultimo_error,
                 usuario_id=retencion.usuario_auditoria,
             )
+            return None
+
+        tarea.estado = EstadoColaSri.FALLIDO
+        tarea.ultimo_error = mensaje or f"Respuesta SRI desconocida: {estado or 'VACIO'}"
+        retencion.estado_sri = EstadoSriDocumento.ERROR
+        retencion.sri_ultimo_error = tarea.ultimo_error
+        session.add(tarea)
+        session.add(retencion)
+        self._historial(
+            session,
+            retencion=retencion,
+            estado_anterior=estado_anterior,
+            estado_nuevo=EstadoSriDocumento.ERROR.value,
+            motivo=tarea.ultimo_error,
+            usuario_id=retencion.usuario_auditoria,
+        )
+        return None
+
+    def procesar_documento_sri(
+        self,
+        tarea_id: UUID,
+        *,
+        gateway: FEECOrquestadorGateway | None = None,
+        scheduler: Callable[[UUID, int], None] | None = None,
+    ) -> None:
+        gateway_impl = gateway or self.gateway
+        scheduler_impl = scheduler or self._default_scheduler
+
+        with Session(self.db_engine, expire_on_commit=False) as session:
+            tarea = session.get(DocumentoSriCola, tarea_id)
+            if not self.tarea_procesable(tarea) or not reintento_vencido(tarea):
+                return
+            if self.circuito.modo_cola() == ModoColaSri.PAUSA:
+                # Circuito SRI abierto: se reprograma para el sondeo sin reclamar ni gastar un intento.
+                scheduler_impl(tarea_id, self.circuito.segundos_hasta_sondeo())
+                return
+
+            retencion = self.reclamar_envio(session, tarea)
+            payload = leer_payload_tarea(session, tarea) if retencion is not None else None
             session.commit()
+            if retencion is None:
+                return
+
+            respuesta, error = self.enviar(gateway_impl, tarea, payload)
+            delay = self.aplicar_resultado(
+                session,
+                tarea=tarea,
+                retencion=retencion,
+                respuesta=respuesta,
+                error=error,
+            )
+            session.commit()
+
+        if delay is not None:
+            scheduler_impl(tarea.id, delay)
@@ -0,0 +1,462 @@
+from __future__ import annotations
+
+import base64
+import re
+import secrets
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import date
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from osiris.core.observability import record_fe_etapa
+from osiris.core.settings import get_settings
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import (
+    CircuitoSri,
+    CircuitoSriAbiertoError,
+    circuito_sri,
+)
+
+
+ENDPOINTS_SRI: dict[str, dict[str, str]] = {
+    "pruebas": {
+        "recepcion": "https://celcer.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline",
+        "autorizacion": "https://celcer.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline",
+    },
+    "produccion": {
+        "recepcion": "https://cel.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline",
+        "autorizacion": "https://cel.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline",
+    },
+}
+
+_HEADERS_SOAP = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": ""}
+# Mensaje 43 "CLAVE ACCESO REGISTRADA": el comprobante ya fue recibido en un intento previo.
+_IDENTIFICADOR_CLAVE_REGISTRADA = "43"
+
+
+class RespuestaSriInvalidaError(ValueError):
+    """El SRI rechazó la solicitud (HTTP 4xx) o respondió algo que no es un sobre SOAP."""
+
+
+@dataclass(frozen=True)
+class MensajeSri:
+    identificador: str
+    mensaje: str
+    informacion_adicional: str = ""
+    tipo: str = ""
+
+    def texto(self) -> str:
+        partes = [f"[{self.identificador}]" if self.identificador else "", self.mensaje, self.informacion_adicional]
+        return " ".join(parte for parte in partes if parte)
+
+
+@dataclass(frozen=True)
+class RespuestaRecepcion:
+    estado: str
+    mensajes: list[MensajeSri] = field(default_factory=list)
+    # En lotes, los mensajes de cada comprobante observado por clave de acceso.
+    mensajes_por_clave: dict[str, list[MensajeSri]] = field(default_factory=dict)
+
+    @property
+    def mensaje(self) -> str:
+        return "; ".join(mensaje.texto() for mensaje in self.mensajes)
+
+    @property
+    def recibida(self) -> bool:
+        if self.estado == "RECIBIDA":
+            return True
+        return any(mensaje.identificador == _IDENTIFICADOR_CLAVE_REGISTRADA for mensaje in self.mensajes)
+
+
+@dataclass(frozen=True)
+class RespuestaAutorizacion:
+    # Vacío cuando el SRI aún no registra autorizaciones para la clave consultada.
+    estado: str
+    numero_autorizacion: str | None = None
+    fecha_autorizacion: str | None = None
+    comprobante: str | None = None
+    mensajes: list[MensajeSri] = field(default_factory=list)
+    clave_acceso: str | None = None
+
+    @property
+    def mensaje(self) -> str:
+        return "; ".join(mensaje.texto() for mensaje in self.mensajes)
+
+
+def _digito_modulo_11(digitos: str) -> str:
+    total = sum(int(digito) * (2 + indice % 6) for indice, digito in enumerate(reversed(digitos)))
+    verificador = 11 - total % 11
+    return {11: "0", 10: "1"}.get(verificador, str(verificador))
+
+
+def generar_clave_acceso_lote(
+    *,
+    fecha: date,
+    ruc: str,
+    ambiente: str,
+    serie: str,
+    secuencial: str,
+    tipo_emision: str = "1",
+    tipo_comprobante: str = "01",
+) -> str:
+    """Clave de acceso (49 dígitos, módulo 11) que identifica un lote masivo ante el SRI."""
+    codigo_numerico = f"{secrets.randbelow(10**8):08d}"
+    base = f"{fecha.strftime('%d%m%Y')}{tipo_comprobante}{ruc}{ambiente}{serie}{secuencial}{codigo_numerico}{tipo_emision}"
+    return base + _digito_modulo_11(base)
+
+
+def construir_lote(*, clave_acceso_lote: str, ruc: str, comprobantes: Iterable[bytes]) -> bytes:
+    """XML de lote masivo: los comprobantes firmados van íntegros como CDATA."""
+    contenido = "".join(
+        f"<comprobante><![CDATA[{comprobante.decode('utf-8')}]]></comprobante>" for comprobante in comprobantes
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<lote version="1.0.0"><claveAcceso>{escape(clave_acceso_lote)}</claveAcceso><ruc>{escape(ruc)}</ruc>'
+        f"<comprobantes>{contenido}</comprobantes></lote>"
+    ).encode("utf-8")
+
+
+def _sobre_recepcion(xml_firmado: bytes) -> bytes:
+    contenido = base64.b64encode(xml_firmado).decode("ascii")
+    return (
+        '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:ec="http://ec.gob.sri.ws.recepcion"><soapenv:Header/><soapenv:Body>'
+        f"<ec:validarComprobante><xml>{contenido}</xml></ec:validarComprobante>"
+        "</soapenv:Body></soapenv:Envelope>"
+    ).encode("utf-8")
+
+
+def _sobre_autorizacion(clave_acceso: str) -> bytes:
+    return (
+        '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:ec="http://ec.gob.sri.ws.autorizacion"><soapenv:Header/><soapenv:Body>'
+        f"<ec:autorizacionComprobante><claveAccesoComprobante>{escape(clave_acceso)}</claveAccesoComprobante>"
+        "</ec:autorizacionComprobante></soapenv:Body></soapenv:Envelope>"
+    ).encode("utf-8")
+
+
+def _sobre_autorizacion_lote(clave_acceso_lote: str) -> bytes:
+    return (
+        '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:ec="http://ec.gob.sri.ws.autorizacion"><soapenv:Header/><soapenv:Body>'
+        f"<ec:autorizacionComprobanteLote><claveAccesoLote>{escape(clave_acceso_lote)}</claveAccesoLote>"
+        "</ec:autorizacionComprobanteLote></soapenv:Body></soapenv:Envelope>"
+    ).encode("utf-8")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _hijo(elemento: ElementTree.Element | None, nombre: str) -> ElementTree.Element | None:
+    if elemento is None:
+        return None
+    return next((hijo for hijo in elemento if _local(hijo.tag) == nombre), None)
+
+
+def _texto(elemento: ElementTree.Element | None, nombre: str) -> str:
+    hijo = _hijo(elemento, nombre)
+    return (hijo.text or "").strip() if hijo is not None else ""
+
+
+def _buscar(raiz: ElementTree.Element, nombre: str) -> ElementTree.Element | None:
+    return next((elemento for elemento in raiz.iter() if _local(elemento.tag) == nombre), None)
+
+
+def _mensajes(contenedor: ElementTree.Element | None) -> list[MensajeSri]:
+    mensajes = _hijo(contenedor, "mensajes")
+    if mensajes is None:
+        return []
+    return [
+        MensajeSri(
+            identificador=_texto(mensaje, "identificador"),
+            mensaje=_texto(mensaje, "mensaje"),
+            informacion_adicional=_texto(mensaje, "informacionAdicional"),
+            tipo=_texto(mensaje, "tipo"),
+        )
+        for mensaje in mensajes
+        if _local(mensaje.tag) == "mensaje"
+    ]
+
+
+def _fault(raiz: ElementTree.Element) -> str | None:
+    fault = _buscar(raiz, "Fault")
+    if fault is None:
+        return None
+    return _texto(fault, "faultstring") or "SOAP Fault sin detalle."
+
+
+def _parsear_sobre(contenido: bytes, servicio: str) -> ElementTree.Element:
+    # Un proxy o una página de mantenimiento pueden responder 200 con HTML.
+    try:
+        return ElementTree.fromstring(contenido)
+    except ElementTree.ParseError as exc:
+        raise RespuestaSriInvalidaError(f"SRI {servicio} respondió un contenido que no es XML: {exc}") from exc
+
+
+def parsear_recepcion(contenido: bytes) -> RespuestaRecepcion:
+    raiz = _parsear_sobre(contenido, "recepción")
+    fault = _fault(raiz)
+    if fault:
+        raise ConnectionError(f"SRI recepción respondió con error SOAP: {fault}")
+    respuesta = _buscar(raiz, "RespuestaRecepcionComprobante")
+    mensajes: list[MensajeSri] = []
+    mensajes_por_clave: dict[str, list[MensajeSri]] = {}
+    comprobantes = _hijo(respuesta, "comprobantes")
+    for comprobante in comprobantes if comprobantes is not None else []:
+        mensajes_comprobante = _mensajes(comprobante)
+        mensajes.extend(mensajes_comprobante)
+        clave = _texto(comprobante, "claveAcceso")
+        if clave:
+            mensajes_por_clave.setdefault(clave, []).extend(mensajes_comprobante)
+    return RespuestaRecepcion(
+        estado=_texto(respuesta, "estado").upper(),
+        mensajes=mensajes,
+        mensajes_por_clave=mensajes_por_clave,
+    )
+
+
+_CLAVE_EN_COMPROBANTE = re.compile(r"<claveAcceso>\s*(\d{49})\s*</claveAcceso>")
+
+
+def _respuesta_autorizacion(autorizacion: ElementTree.Element) -> RespuestaAutorizacion:
+    comprobante = _hijo(autorizacion, "comprobante")
+    texto_comprobante = comprobante.text if comprobante is not None else None
+    numero = _texto(autorizacion, "numeroAutorizacion") or None
+    coincidencia = _CLAVE_EN_COMPROBANTE.search(texto_comprobante or "")
+    return RespuestaAutorizacion(
+        estado=_texto(autorizacion, "estado").upper(),
+        numero_autorizacion=numero,
+        fecha_autorizacion=_texto(autorizacion, "fechaAutorizacion") or None,
+        comprobante=texto_comprobante,
+        mensajes=_mensajes(autorizacion),
+        clave_acceso=coincidencia.group(1) if coincidencia else numero,
+    )
+
+
+def xml_autorizacion(autorizacion: RespuestaAutorizacion) -> str:
+    """XML autorizado que se entrega al receptor: el comprobante firmado dentro de su autorización."""
+    comprobante = (autorizacion.comprobante or "").replace("]]>", "]]]]><![CDATA[>")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        "<autorizacion>"
+        f"<estado>{escape(autorizacion.estado)}</estado>"
+        f"<numeroAutorizacion>{escape(autorizacion.numero_autorizacion or '')}</numeroAutorizacion>"
+        f"<fechaAutorizacion>{escape(autorizacion.fecha_autorizacion or '')}</fechaAutorizacion>"
+        f"<comprobante><![CDATA[{comprobante}]]></comprobante>"
+        "</autorizacion>"
+    )
+
+
+def parsear_autorizacion(contenido: bytes) -> RespuestaAutorizacion:
+    raiz = _parsear_sobre(contenido, "autorización")
+    fault = _fault(raiz)
+    if fault:
+        raise ConnectionError(f"SRI autorización respondió con error SOAP: {fault}")
+    autorizacion = _buscar(raiz, "autorizacion")
+    if autorizacion is None:
+        return RespuestaAutorizacion(estado="")
+    return _respuesta_autorizacion(autorizacion)
+
+
+def parsear_autorizacion_lote(contenido: bytes) -> list[RespuestaAutorizacion]:
+    raiz = _parsear_sobre(contenido, "autorización de lote")
+    fault = _fault(raiz)
+    if fault:
+        raise ConnectionError(f"SRI autorización de lote respondió con error SOAP: {fault}")
+    return [_respuesta_autorizacion(elemento) for elemento in raiz.iter() if _local(elemento.tag) == "autorizacion"]
+
+
+def _verificar_status(status: int, servicio: str) -> None:
+    # 5xx y throttling son transitorios: se reportan como error de red para reintentar.
+    if status >= 500 or status == 429:
+        raise ConnectionError(f"SRI {servicio} no disponible (HTTP {status}).")
+    if status >= 400:
+        raise RespuestaSriInvalidaError(f"SRI {servicio} rechazó la solicitud (HTTP {status}).")
+
+
+class SriSoapClient:
+    """
+    Cliente SOAP de larga vida para los web services offline del SRI.
+
+    Los sobres de validarComprobante y autorizacionComprobante son fijos, así que
+    no se descarga ni interpreta el WSDL. Las conexiones HTTPS se mantienen
+    abiertas (keep-alive) en un pool por host y se comparten entre hilos; los
+    errores de red se traducen a ConnectionError/TimeoutError para que las
+    reglas de reintento existentes los traten como transitorios.
+    """
+
+    def __init__(
+        self,
+        *,
+        ambiente: str | None = None,
+        endpoints: dict[str, str] | None = None,
+        timeout_seconds: float | None = None,
+        pool_maxsize: int | None = None,
+    ) -> None:
+        import urllib3
+
+        settings = get_settings()
+        self.ambiente = ambiente or settings.FEEC_AMBIENTE
+        self.endpoints = endpoints or ENDPOINTS_SRI[self.ambiente]
+        self.timeout_seconds = timeout_seconds or settings.FEEC_SRI_TIMEOUT_SECONDS
+        self._pool = urllib3.PoolManager(
+            num_pools=len(self.endpoints),
+            maxsize=pool_maxsize or settings.FEEC_SRI_POOL_MAXSIZE,
+            block=True,
+            retries=False,
+            timeout=urllib3.Timeout(connect=min(self.timeout_seconds, 10.0), read=self.timeout_seconds),
+            headers=_HEADERS_SOAP,
+        )
+
+    def _post(self, servicio: str, cuerpo: bytes) -> bytes:
+        from urllib3.exceptions import HTTPError, TimeoutError as Urllib3TimeoutError
+
+        try:
+            respuesta = self._pool.request("POST", self.endpoints[servicio], body=cuerpo)
+        except Urllib3TimeoutError as exc:
+            raise TimeoutError(f"Timeout con SRI {servicio}: {exc}") from exc
+        except HTTPError as exc:
+            raise ConnectionError(f"Error de red con SRI {servicio}: {exc}") from exc
+        _verificar_status(respuesta.status, servicio)
+        return respuesta.data
+
+    def enviar_recepcion(self, xml_firmado: bytes) -> RespuestaRecepcion:
+        return parsear_recepcion(self._post("recepcion", _sobre_recepcion(xml_firmado)))
+
+    def consultar_autorizacion(self, clave_acceso: str) -> RespuestaAutorizacion:
+        return parsear_autorizacion(self._post("autorizacion", _sobre_autorizacion(clave_acceso)))
+
+    def consultar_autorizacion_lote(self, clave_acceso_lote: str) -> list[RespuestaAutorizacion]:
+        return parsear_autorizacion_lote(self._post("autorizacion", _sobre_autorizacion_lote(clave_acceso_lote)))
+
+    def close(self) -> None:
+        self._pool.clear()
+
+
+_clientes: dict[str, SriSoapClient] = {}
+_clientes_lock = threading.Lock()
+
+
+def obtener_cliente_sri(ambiente: str | None = None) -> SriSoapClient:
+    """Cliente compartido por proceso para el ambiente indicado (o el configurado)."""
+    clave = ambiente or get_settings().FEEC_AMBIENTE
+    with _clientes_lock:
+        cliente = _clientes.get(clave)
+        if cliente is None:
+            cliente = _clientes[clave] = SriSoapClient(ambiente=clave)
+        return cliente
+
+
+class TransmisorSri:
+    """
+    Recepción + autorización de un comprobante firmado, común a ventas y
+    retenciones. Devuelve el dict {"estado", "mensaje"} que consumen los
+    servicios de cola: AUTORIZADO, RECHAZADO o RECIBIDO (aún sin autorización).
+
+    Cada envío pasa por el circuit breaker del SRI: con el circuito abierto
+    falla de inmediato con `CircuitoSriAbiertoError` sin abrir conexión.
+    """
+
+    def __init__(self, cliente: SriSoapClient | None = None, circuito: CircuitoSri | None = None) -> None:
+        self._cliente = cliente
+        self.circuito = circuito or circuito_sri
+
+    @property
+    def cliente(self) -> SriSoapClient:
+        return self._cliente or obtener_cliente_sri()
+
+    @staticmethod
+    def _resultado_recepcion(recepcion: RespuestaRecepcion) -> dict | None:
+        if recepcion.recibida:
+            return None
+        return {"estado": "RECHAZADO", "mensaje": recepcion.mensaje or "Comprobante no recibido por el SRI."}
+
+    @staticmethod
+    def _resultado_autorizacion(autorizacion: RespuestaAutorizacion) -> dict:
+        if autorizacion.estado == "AUTORIZADO":
+            resultado = {"estado": "AUTORIZADO", "mensaje": autorizacion.mensaje or "Documento autorizado."}
+            if autorizacion.comprobante:
+                resultado["xml_autorizado"] = xml_autorizacion(autorizacion)
+            return resultado
+        if autorizacion.estado in {"", "EN PROCESO", "EN PROCESAMIENTO"}:
+            return {
+                "estado": "RECIBIDO",
+                "mensaje": autorizacion.mensaje or "Documento recibido por SRI, pendiente de autorización.",
+            }
+        return {"estado": "RECHAZADO", "mensaje": autorizacion.mensaje or "Documento rechazado por SRI."}
+
+    def _adquirir_circuito(self) -> None:
+        if not self.circuito.adquirir():
+            raise CircuitoSriAbiertoError("Circuito SRI abierto: envío omitido hasta que el SRI responda.")
+
+    def transmitir(self, xml_firmado: bytes, clave_acceso: str) -> dict:
+        self._adquirir_circuito()
+        try:
+            cliente = self.cliente
+            inicio = time.perf_counter()
+            rechazo = self._resultado_recepcion(cliente.enviar_recepcion(xml_firmado))
+            record_fe_etapa(etapa="recepcion", duracion_segundos=time.perf_counter() - inicio)
+            if rechazo is None:
+                inicio = time.perf_counter()
+                resultado = self._resultado_autorizacion(cliente.consultar_autorizacion(clave_acceso))
+                record_fe_etapa(etapa="autorizacion", duracion_segundos=time.perf_counter() - inicio)
+            else:
+                resultado = rechazo
+        except (TimeoutError, ConnectionError, OSError):
+            self.circuito.registrar_fallo()
+            raise
+        except BaseException:
+            self.circuito.liberar()
+            raise
+        self.circuito.registrar_exito()
+        return resultado
+
+    def transmitir_lote_masivo(self, xml_lote: bytes, clave_acceso_lote: str, claves_acceso: Iterable[str]) -> dict[str, dict]:
+        """
+        Recepción de un lote masivo y autorización por clave de lote, en dos
+        llamadas SOAP. Devuelve el resultado {"estado", "mensaje"} por clave de
+        acceso de cada comprobante del lote.
+        """
+        claves = list(claves_acceso)
+        self._adquirir_circuito()
+        try:
+            cliente = self.cliente
+            inicio = time.perf_counter()
+            recepcion = cliente.enviar_recepcion(xml_lote)
+            record_fe_etapa(etapa="recepcion", duracion_segundos=time.perf_counter() - inicio)
+            autorizaciones: dict[str, RespuestaAutorizacion] = {}
+            if recepcion.recibida:
+                inicio = time.perf_counter()
+                autorizaciones = {
+                    autorizacion.clave_acceso: autorizacion
+                    for autorizacion in cliente.consultar_autorizacion_lote(clave_acceso_lote)
+                    if autorizacion.clave_acceso
+                }
+                record_fe_etapa(etapa="autorizacion", duracion_segundos=time.perf_counter() - inicio)
+        except (TimeoutError, ConnectionError, OSError):
+            self.circuito.registrar_fallo()
+            raise
+        except BaseException:
+            self.circuito.liberar()
+            raise
+        self.circuito.registrar_exito()
+
+        resultados: dict[str, dict] = {}
+        for clave in claves:
+            observaciones = recepcion.mensajes_por_clave.get(clave)
+            if not recepcion.recibida and observaciones:
+                mensaje = "; ".join(observacion.texto() for observacion in observaciones)
+                resultados[clave] = {"estado": "RECHAZADO", "mensaje": mensaje}
+            elif clave in autorizaciones:
+                resultados[clave] = self._resultado_autorizacion(autorizaciones[clave])
+            else:
+                # Lote devuelto por otro comprobante o autorización aún no registrada: se reintenta.
+                resultados[clave] = {
+                    "estado": "RECIBIDO",
+                    "mensaje": recepcion.mensaje or "Lote recibido por SRI, pendiente de autorización.",
+                }
+        return resultados
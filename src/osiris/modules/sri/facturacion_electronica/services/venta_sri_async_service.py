@@ -1,9 +1,7 @@
 from __future__ import annotations
 
-import json
-import threading
+import logging
 from datetime import datetime, timedelta
-from pathlib import Path
 from typing import Callable, Protocol
 from uuid import UUID
 
@@ -11,10 +9,19 @@ from fastapi import BackgroundTasks, HTTPException
 from sqlmodel import Session, select
 
 from osiris.core.db import engine as default_engine
+from osiris.core.settings import get_settings
 from osiris.modules.common.empresa.entity import Empresa
 from osiris.modules.common.punto_emision.entity import PuntoEmision
 from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.impresion.services.prerender_service import programar_prerender_ride_a4
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import (
+    guardar_payload_tarea,
+    guardar_xml_autorizado,
+    leer_payload_tarea,
+)
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import CircuitoSri, ModoColaSri, circuito_sri
 from osiris.modules.sri.facturacion_electronica.services.correo_service import CorreoFacturaService
+from osiris.modules.sri.facturacion_electronica.services.cola_fe_notificaciones import despertador_cola_fe
 from osiris.modules.sri.core_sri.models import (
     DocumentoElectronico,
     DocumentoElectronicoHistorial,
@@ -29,18 +36,29 @@ from osiris.modules.sri.core_sri.models import (
     VentaDetalleImpuesto,
 )
 from osiris.modules.sri.facturacion_electronica.services.fe_mapper_service import FEMapperService
+from osiris.modules.sri.facturacion_electronica.services.firma_xml_service import (
+    ComprobanteInvalidoError,
+    FirmadorComprobantes,
+    obtener_firmador,
+)
+from osiris.modules.sri.facturacion_electronica.services.programador_tareas import (
+    clave_reintento_sri,
+    programador_tareas,
+    reclamar_tarea_sri,
+    reintento_vencido,
+)
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import (
+    RespuestaSriInvalidaError,
+    TransmisorSri,
+)
 from osiris.modules.sri.core_sri.all_schemas import (
     VentaDetalleImpuestoRead,
     VentaDetalleRead,
     VentaRead,
 )
 
-try:
-    from src.fe_ec.utils.manejador_xml import ManejadorXML
-    from src.fe_ec.utils.sri import SRIService
-except Exception:  # pragma: no cover - fallback cuando la librería no está instalada.
-    ManejadorXML = None
-    SRIService = None
+
+logger = logging.getLogger(__name__)
 
 
 class FEECVentaGateway(Protocol):
@@ -48,79 +66,43 @@ class FEECVentaGateway(Protocol):
         ...
 
 
+# Únicos entornos donde, sin FEEC_P12_PATH, la factura se da por autorizada sin enviarla.
+ENTORNOS_MOCK_FE = {"development", "dev", "test", "testing", "local", "ci"}
+
+
 class FEECVentaGatewayDefault:
-    @staticmethod
-    def _extract_estado_mensaje(value) -> tuple[str, str]:
-        if value is None:
-            return "", ""
-        if isinstance(value, dict):
-            return str(value.get("estado", "")).upper(), str(value.get("mensaje", "")).strip()
-        estado = str(getattr(value, "estado", "")).upper()
-        mensaje = str(getattr(value, "mensaje", "")).strip()
-        return estado, mensaje
+    """Firma en memoria con el certificado cacheado y transmite por el cliente SOAP compartido."""
 
-    @staticmethod
-    def _extraer_estado_autorizacion(respuesta_autorizacion) -> tuple[str, str]:
-        # Compatibilidad con estructura real de FE-EC y diccionarios mock.
-        if isinstance(respuesta_autorizacion, dict):
-            estado = str(respuesta_autorizacion.get("estado", "")).upper()
-            mensaje = str(respuesta_autorizacion.get("mensaje", "")).strip()
-            return estado, mensaje
-
-        autorizaciones = getattr(respuesta_autorizacion, "autorizaciones", None)
-        autorizacion_list = getattr(autorizaciones, "autorizacion", None)
-        if autorizacion_list:
-            autorizacion = autorizacion_list[0]
-            estado = str(getattr(autorizacion, "estado", "")).upper()
-            mensajes = getattr(autorizacion, "mensajes", None)
-            mensaje = ""
-            if mensajes and getattr(mensajes, "mensaje", None):
-                msg = mensajes.mensaje[0]
-                mensaje = str(getattr(msg, "mensaje", "")).strip()
-            return estado, mensaje
-        return "", ""
+    def __init__(
+        self,
+        transmisor: TransmisorSri | None = None,
+        firmador: FirmadorComprobantes | None = None,
+    ) -> None:
+        self.transmisor = transmisor or TransmisorSri()
+        self.firmador = firmador
 
     def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
         if tipo_documento != "VENTA":
             return {"estado": "RECHAZADO", "mensaje": "Tipo de documento no soportado por gateway de venta."}
 
-        if ManejadorXML is None or SRIService is None:
-            # Fallback local para tests/entornos sin librería FE-EC.
+        firmador = self.firmador or obtener_firmador()
+        if firmador is None:
+            entorno = get_settings().ENVIRONMENT.strip().lower()
+            if entorno not in ENTORNOS_MOCK_FE:
+                # Sin certificado no hay envío posible: la tarea queda en PROCESANDO y se
+                # recupera al vencer el lease, una vez configurado FEEC_P12_PATH.
+                logger.error("FEEC_P12_PATH no configurado en %s: factura no firmada ni enviada al SRI.", entorno)
+                raise RuntimeError(f"FEEC_P12_PATH no configurado en {entorno}: no se puede firmar la factura.")
+            # Fallback local para tests/entornos de desarrollo sin certificado de firma configurado.
             return {"estado": "AUTORIZADO", "mensaje": "Autorizado (modo mock FE-EC)."}
 
-        manejador = ManejadorXML()
-        signed_output = manejador.firmar_y_guardar_xml(payload)
-        if not signed_output:
-            return {"estado": "RECHAZADO", "mensaje": "No se pudo generar/firmar el XML."}
-
-        xml_bytes: bytes
-        if isinstance(signed_output, (bytes, bytearray)):
-            xml_bytes = bytes(signed_output)
-        elif isinstance(signed_output, str) and Path(signed_output).exists():
-            xml_bytes = Path(signed_output).read_bytes()
-        elif Path("fact_firmado.xml").exists():
-            xml_bytes = Path("fact_firmado.xml").read_bytes()
-        else:
-            return {"estado": "RECHAZADO", "mensaje": "No se encontró XML firmado para transmisión."}
-
-        sri = SRIService()
-        recepcion = sri.enviar_recepcion(xml_bytes)
-        estado_recepcion, mensaje_recepcion = self._extract_estado_mensaje(recepcion)
-        if estado_recepcion != "RECIBIDA":
-            return {
-                "estado": "RECHAZADO",
-                "mensaje": mensaje_recepcion or "Comprobante no recibido por el SRI.",
-            }
-
+        try:
+            xml_bytes = firmador.firmar_factura(payload)
+        except ComprobanteInvalidoError as exc:
+            # Rechazo local con el mismo efecto que el mensaje 35 del SRI: reenviarlo no lo corrige.
+            return {"estado": "RECHAZADO", "mensaje": str(exc)}
         clave = payload.get("infoTributaria", {}).get("claveAcceso", "")
-        autorizacion = sri.consultar_autorizacion(clave)
-        estado_autorizacion, mensaje_autorizacion = self._extraer_estado_autorizacion(autorizacion)
-        if estado_autorizacion == "AUTORIZADO":
-            return {"estado": "AUTORIZADO", "mensaje": mensaje_autorizacion or "Documento autorizado."}
-        return {
-            "estado": "RECHAZADO",
-            "mensaje": mensaje_autorizacion or "Documento rechazado por SRI.",
-        }
+        return self.transmisor.transmitir(xml_bytes, clave)
 
 
 class VentaSriAsyncService:
@@ -130,17 +112,17 @@ class VentaSriAsyncService:
         *,
         db_engine=None,
         correo_service: CorreoFacturaService | None = None,
+        circuito: CircuitoSri | None = None,
     ) -> None:
         self.gateway = gateway or FEECVentaGatewayDefault()
         self.fe_mapper = FEMapperService()
         self.db_engine = db_engine or default_engine
         self.correo_service = correo_service or CorreoFacturaService(self.db_engine)
+        self.circuito = circuito or circuito_sri
 
     @staticmethod
     def _default_scheduler(tarea_id: UUID, delay_seconds: int, callback: Callable[[UUID], None]) -> None:
-        timer = threading.Timer(delay_seconds, callback, kwargs={"tarea_id": tarea_id})
-        timer.daemon = True
-        timer.start()
+        programador_tareas.programar(clave_reintento_sri(tarea_id), delay_seconds, callback, tarea_id=tarea_id)
 
     @staticmethod
     def _sync_estado_documento(
@@ -347,10 +329,10 @@ class VentaSriAsyncService:
             estado=EstadoColaSri.PENDIENTE,
             intentos_realizados=0,
             max_intentos=3,
-            payload_json=json.dumps(payload, ensure_ascii=False),
             usuario_auditoria=usuario_id,
             activo=True,
         )
+        guardar_payload_tarea(session, tarea, payload)
         session.add(tarea)
 
         venta.estado_sri = EstadoSriDocumento.ENVIADO
@@ -366,6 +348,7 @@ class VentaSriAsyncService:
             motivo="Factura encolada para transmisión al SRI.",
             usuario_id=usuario_id,
         )
+        despertador_cola_fe.marcar_encolado(session)
 
         if commit:
             session.commit()
@@ -377,159 +360,93 @@ class VentaSriAsyncService:
             background_tasks.add_task(self.procesar_documento_sri, tarea.id)
         return tarea
 
-    def procesar_documento_sri(
-        self,
-        tarea_id: UUID,
-        *,
-        gateway: FEECVentaGateway | None = None,
-        scheduler: Callable[[UUID, int], None] | None = None,
-        email_dispatcher: Callable[[UUID], None] | None = None,
-    ) -> None:
-        gateway_impl = gateway or self.gateway
-        scheduler_impl = scheduler or (lambda task_id, delay: self._default_scheduler(task_id, delay, self.procesar_documento_sri))
-        email_dispatcher_impl = email_dispatcher or (lambda venta_id: self.correo_service.encolar_envio_factura(venta_id))
-
-        with Session(self.db_engine) as session:
-            tarea = session.get(DocumentoSriCola, tarea_id)
-            if not tarea or not tarea.activo:
-                return
-            if tarea.tipo_documento != "VENTA":
-                return
-            if tarea.estado in {EstadoColaSri.COMPLETADO, EstadoColaSri.FALLIDO}:
-                return
-
-            venta = session.get(Venta, tarea.entidad_id)
-            if not venta or not venta.activo:
-                tarea.estado = EstadoColaSri.FALLIDO
-                tarea.ultimo_error = "Venta asociada no encontrada."
-                session.add(tarea)
-                session.commit()
-                return
-
-            documento = session.exec(
-                select(DocumentoElectronico).where(
-                    DocumentoElectronico.venta_id == venta.id,
-                    DocumentoElectronico.activo.is_(True),
-                )
-            ).first()
-            if not documento:
-                tarea.estado = EstadoColaSri.FALLIDO
-                tarea.ultimo_error = "Documento electrónico de venta no encontrado."
-                session.add(tarea)
-                session.commit()
-                return
+    @staticmethod
+    def tarea_procesable(tarea: DocumentoSriCola | None) -> bool:
+        return (
+            tarea is not None
+            and tarea.activo
+            and tarea.tipo_documento == "VENTA"
+            and tarea.estado not in {EstadoColaSri.COMPLETADO, EstadoColaSri.FALLIDO}
+        )
 
-            tarea.estado = EstadoColaSri.PROCESANDO
-            tarea.intentos_realizados += 1
-            venta.sri_intentos = tarea.intentos_realizados
+    def reclamar_envio(
+        self,
+        session: Session,
+        tarea: DocumentoSriCola,
+    ) -> tuple[Venta, DocumentoElectronico] | None:
+        """
+        Marca la tarea en PROCESANDO y cuenta el intento, sin confirmar.
+
+        Es la única escritura previa al envío: el llamador la confirma antes de
+        contactar al SRI para no retener una transacción abierta durante la red.
+        Retorna None también si otro proceso reclamó la tarea primero.
+        """
+        venta = session.get(Venta, tarea.entidad_id)
+        if not venta or not venta.activo:
+            tarea.estado = EstadoColaSri.FALLIDO
+            tarea.ultimo_error = "Venta asociada no encontrada."
             session.add(tarea)
-            session.add(venta)
-            session.commit()
-
-            payload = json.loads(tarea.payload_json)
-            try:
-                respuesta = gateway_impl.enviar_documento(
-                    tipo_documento="VENTA",
-                    payload=payload,
-                )
-            except (TimeoutError, ConnectionError, OSError) as exc:
-                error = str(exc) or "Timeout de red con SRI"
-                estado_anterior = documento.estado
-                if tarea.intentos_realizados < tarea.max_intentos:
-                    delay = 2 ** (tarea.intentos_realizados - 1)
-                    tarea.estado = EstadoColaSri.REINTENTO_PROGRAMADO
-                    tarea.proximo_intento_en = datetime.utcnow() + timedelta(seconds=delay)
-                    tarea.ultimo_error = error
-
-                    venta.estado_sri = EstadoSriDocumento.ENVIADO
-                    venta.sri_ultimo_error = error
-                    self._sync_estado_documento(documento, EstadoDocumentoElectronico.EN_COLA, mensaje=error)
-
-                    session.add(tarea)
-                    session.add(venta)
-                    session.add(documento)
-                    self._crear_historial_documento(
-                        session,
-                        documento=documento,
-                        estado_anterior=estado_anterior,
-                        estado_nuevo=EstadoDocumentoElectronico.EN_COLA,
-                        motivo=f"Error de red SRI. Reintento en {delay}s. {error}",
-                        usuario_id=venta.usuario_auditoria,
-                    )
-                    session.commit()
-                    scheduler_impl(tarea.id, delay)
-                    return
-
-                tarea.estado = EstadoColaSri.FALLIDO
-                tarea.ultimo_error = error
-                venta.estado_sri = EstadoSriDocumento.ERROR
-                venta.sri_ultimo_error = error
-                session.add(tarea)
-                session.add(venta)
-                session.commit()
-                return
-
-            estado = str(respuesta.get("estado", "")).upper()
-            mensaje = str(respuesta.get("mensaje") or "").strip()
-            estado_anterior = documento.estado
+            return None
 
-            if estado == "AUTORIZADO":
-                tarea.estado = EstadoColaSri.COMPLETADO
-                tarea.ultimo_error = None
-                venta.estado_sri = EstadoSriDocumento.AUTORIZADO
-                venta.sri_ultimo_error = None
-                self._sync_estado_documento(documento, EstadoDocumentoElectronico.AUTORIZADO, mensaje=None)
-                session.add(tarea)
-                session.add(venta)
-                session.add(documento)
-                self._crear_historial_documento(
-                    session,
-                    documento=documento,
-                    estado_anterior=estado_anterior,
-                    estado_nuevo=EstadoDocumentoElectronico.AUTORIZADO,
-                    motivo=mensaje or "Documento autorizado por SRI.",
-                    usuario_id=venta.usuario_auditoria,
-                )
-                session.commit()
-                email_dispatcher_impl(venta.id)
-                return
+        documento = session.exec(
+            select(DocumentoElectronico).where(
+                DocumentoElectronico.venta_id == venta.id,
+                DocumentoElectronico.activo.is_(True),
+            )
+        ).first()
+        if not documento:
+            tarea.estado = EstadoColaSri.FALLIDO
+            tarea.ultimo_error = "Documento electrónico de venta no encontrado."
+            session.add(tarea)
+            return None
 
-            if estado == "RECHAZADO":
-                tarea.estado = EstadoColaSri.FALLIDO
-                tarea.ultimo_error = mensaje or "Documento rechazado por SRI."
-                venta.estado_sri = EstadoSriDocumento.RECHAZADO
-                venta.sri_ultimo_error = tarea.ultimo_error
-                self._sync_estado_documento(
-                    documento,
-                    EstadoDocumentoElectronico.RECHAZADO,
-                    mensaje=tarea.ultimo_error,
-                )
-                session.add(tarea)
-                session.add(venta)
-                session.add(documento)
-                self._crear_historial_documento(
-                    session,
-                    documento=documento,
-                    estado_anterior=estado_anterior,
-                    estado_nuevo=EstadoDocumentoElectronico.RECHAZADO,
-                    motivo=tarea.ultimo_error,
-                    usuario_id=venta.usuario_auditoria,
-                )
-                session.commit()
-                return
+        if not reclamar_tarea_sri(session, tarea):
+            return None
+        venta.sri_intentos = tarea.intentos_realizados
+        session.add(venta)
+        return venta, documento
 
-            if estado == "RECIBIDO":
-                delay = 2 ** max(tarea.intentos_realizados - 1, 1)
+    @staticmethod
+    def enviar(gateway: FEECVentaGateway, tarea: DocumentoSriCola, payload: dict) -> tuple[dict | None, str | None]:
+        """
+        Transmite el payload de la tarea; devuelve (respuesta, error de transmisión).
+
+        Un HTTP 4xx o una respuesta que no es XML siguen las reglas de reintento
+        de un error de red: la tarea queda en ERROR al agotar `max_intentos`.
+        """
+        _ = tarea
+        try:
+            return gateway.enviar_documento(tipo_documento="VENTA", payload=payload), None
+        except (TimeoutError, ConnectionError, OSError, RespuestaSriInvalidaError) as exc:
+            return None, str(exc) or "Timeout de red con SRI"
+
+    def aplicar_resultado(
+        self,
+        session: Session,
+        *,
+        tarea: DocumentoSriCola,
+        venta: Venta,
+        documento: DocumentoElectronico,
+        respuesta: dict | None,
+        error: str | None = None,
+    ) -> int | None:
+        """
+        Aplica la respuesta del SRI a tarea, venta, documento e historial, sin confirmar.
+
+        Retorna el delay en segundos del reintento a programar, o None si no aplica.
+        """
+        estado_anterior = documento.estado
+        if error is not None:
+            if tarea.intentos_realizados < tarea.max_intentos:
+                delay = 2 ** (tarea.intentos_realizados - 1)
                 tarea.estado = EstadoColaSri.REINTENTO_PROGRAMADO
                 tarea.proximo_intento_en = datetime.utcnow() + timedelta(seconds=delay)
-                tarea.ultimo_error = mensaje or "Documento recibido por SRI, pendiente de autorización."
+                tarea.ultimo_error = error
+
                 venta.estado_sri = EstadoSriDocumento.ENVIADO
-                venta.sri_ultimo_error = tarea.ultimo_error
-                self._sync_estado_documento(
-                    documento,
-                    EstadoDocumentoElectronico.RECIBIDO,
-                    mensaje=tarea.ultimo_error,
-                )
+                venta.sri_ultimo_error = error
+                self._sync_estado_documento(documento, EstadoDocumentoElectronico.EN_COLA, mensaje=error)
+
                 session.add(tarea)
                 session.add(venta)
                 session.add(documento)
@@ -537,18 +454,143 @@ class VentaSriAsyncService:
                     session,
                     documento=documento,
                     estado_anterior=estado_anterior,
-                    estado_nuevo=EstadoDocumentoElectronico.RECIBIDO,
-                    motivo=tarea.ultimo_error,
+                    estado_nuevo=EstadoDocumentoElectronico.EN_COLA,
+                    motivo=f"Error de red SRI. Reintento en {delay}s. {error}",
                     usuario_id=venta.usuario_auditoria,
                 )
-                session.commit()
-                scheduler_impl(tarea.id, delay)
-                return
+                return delay
 
             tarea.estado = EstadoColaSri.FALLIDO
-            tarea.ultimo_error = mensaje or f"Respuesta SRI desconocida: {estado or 'VACIO'}"
+            tarea.ultimo_error = error
             venta.estado_sri = EstadoSriDocumento.ERROR
+            venta.sri_ultimo_error = error
+            session.add(tarea)
+            session.add(venta)
+            return None
+
+        respuesta = respuesta or {}
+        estado = str(respuesta.get("estado", "")).upper()
+        mensaje = str(respuesta.get("mensaje") or "").strip()
+
+        if estado == "AUTORIZADO":
+            tarea.estado = EstadoColaSri.COMPLETADO
+            tarea.ultimo_error = None
+            venta.estado_sri = EstadoSriDocumento.AUTORIZADO
+            venta.sri_ultimo_error = None
+            self._sync_estado_documento(documento, EstadoDocumentoElectronico.AUTORIZADO, mensaje=None)
+            if respuesta.get("xml_autorizado"):
+                guardar_xml_autorizado(session, documento, respuesta["xml_autorizado"])
+            session.add(tarea)
+            session.add(venta)
+            session.add(documento)
+            self._crear_historial_documento(
+                session,
+                documento=documento,
+                estado_anterior=estado_anterior,
+                estado_nuevo=EstadoDocumentoElectronico.AUTORIZADO,
+                motivo=mensaje or "Documento autorizado por SRI.",
+                usuario_id=venta.usuario_auditoria,
+            )
+            return None
+
+        if estado == "RECHAZADO":
+            tarea.estado = EstadoColaSri.FALLIDO
+            tarea.ultimo_error = mensaje or "Documento rechazado por SRI."
+            venta.estado_sri = EstadoSriDocumento.RECHAZADO
             venta.sri_ultimo_error = tarea.ultimo_error
+            self._sync_estado_documento(
+                documento,
+                EstadoDocumentoElectronico.RECHAZADO,
+                mensaje=tarea.ultimo_error,
+            )
             session.add(tarea)
             session.add(venta)
+            session.add(documento)
+            self._crear_historial_documento(
+                session,
+                documento=documento,
+                estado_anterior=estado_anterior,
+                estado_nuevo=EstadoDocumentoElectronico.RECHAZADO,
+                motivo=tarea.ultimo_error,
+                usuario_id=venta.usuario_auditoria,
+            )
+            return None
+
+        if estado == "RECIBIDO":
+            delay = 2 ** max(tarea.intentos_realizados - 1, 1)
+            tarea.estado = EstadoColaSri.REINTENTO_PROGRAMADO
+            tarea.proximo_intento_en = datetime.utcnow() + timedelta(seconds=delay)
+            tarea.ultimo_error = mensaje or "Documento recibido por SRI, pendiente de autorización."
+            venta.estado_sri = EstadoSriDocumento.ENVIADO
+            venta.sri_ultimo_error = tarea.ultimo_error
+            self._sync_estado_documento(
+                documento,
+                EstadoDocumentoElectronico.RECIBIDO,
+                mensaje=tarea.ultimo_error,
+            )
+            session.add(tarea)
+            session.add(venta)
+            session.add(documento)
+            self._crear_historial_documento(
+                session,
+                documento=documento,
+                estado_anterior=estado_anterior,
+                estado_nuevo=EstadoDocumentoElectronico.RECIBIDO,
+                motivo=tarea.ultimo_error,
+                usuario_id=venta.usuario_auditoria,
+            )
+            return delay
+
+        tarea.estado = EstadoColaSri.FALLIDO
+        tarea.ultimo_error = mensaje or f"Respuesta SRI desconocida: {estado or 'VACIO'}"
+        venta.estado_sri = EstadoSriDocumento.ERROR
+        venta.sri_ultimo_error = tarea.ultimo_error
+        session.add(tarea)
+        session.add(venta)
+        return None
+
+    def procesar_documento_sri(
+        self,
+        tarea_id: UUID,
+        *,
+        gateway: FEECVentaGateway | None = None,
+        scheduler: Callable[[UUID, int], None] | None = None,
+        email_dispatcher: Callable[[UUID], None] | None = None,
+    ) -> None:
+        gateway_impl = gateway or self.gateway
+        scheduler_impl = scheduler or (lambda task_id, delay: self._default_scheduler(task_id, delay, self.procesar_documento_sri))
+        email_dispatcher_impl = email_dispatcher or (lambda venta_id: self.correo_service.encolar_envio_factura(venta_id))
+
+        # Sin expirar al confirmar: tras el reclamo no se relee nada antes ni después del envío.
+        with Session(self.db_engine, expire_on_commit=False) as session:
+            tarea = session.get(DocumentoSriCola, tarea_id)
+            if not self.tarea_procesable(tarea) or not reintento_vencido(tarea):
+                return
+            if self.circuito.modo_cola() == ModoColaSri.PAUSA:
+                # Circuito SRI abierto: se reprograma para el sondeo sin reclamar ni gastar un intento.
+                scheduler_impl(tarea_id, self.circuito.segundos_hasta_sondeo())
+                return
+
+            reclamo = self.reclamar_envio(session, tarea)
+            payload = leer_payload_tarea(session, tarea) if reclamo is not None else None
             session.commit()
+            if reclamo is None:
+                return
+            venta, documento = reclamo
+
+            respuesta, error = self.enviar(gateway_impl, tarea, payload)
+            delay = self.aplicar_resultado(
+                session,
+                tarea=tarea,
+                venta=venta,
+                documento=documento,
+                respuesta=respuesta,
+                error=error,
+            )
+            session.commit()
+
+        if delay is not None:
+            scheduler_impl(tarea.id, delay)
+        elif venta.estado_sri == EstadoSriDocumento.AUTORIZADO:
+            programar_prerender_ride_a4(documento.id, db_engine=self.db_engine)
+            email_dispatcher_impl(venta.id)
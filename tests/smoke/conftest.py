@@ -23,6 +23,7 @@ from osiris.modules.common.sucursal.entity import Sucursal
 from osiris.modules.common.tipo_cliente.entity import TipoCliente
 from osiris.modules.common.usuario.entity import Usuario
 from osiris.modules.sri.core_sri.models import (
+    BlobComprimido,
     Compra,
     CompraDetalle,
     CompraDetalleImpuesto,
@@ -120,6 +121,7 @@ def test_engine():
         DocumentoElectronico.__table__,
         DocumentoElectronicoHistorial.__table__,
         DocumentoSriCola.__table__,
+        BlobComprimido.__table__,
     ]
     _restore_metadata_tables(required_tables)
     SQLModel.metadata.create_all(engine, tables=required_tables)
@@ -14,6 +14,10 @@ from osiris.modules.sri.core_sri.models import (
     EstadoDocumentoElectronico,
     TipoDocumentoElectronico,
 )
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import (
+    RespuestaAutorizacion,
+    RespuestaRecepcion,
+)
 from osiris.modules.sri.facturacion_electronica.router import (
     orquestador_fe_service as fe_orquestador_router_service,
 )
@@ -105,20 +109,20 @@ def test_smoke_flujo_ventas(client, db_session):
         ],
     }
 
-    with patch("osiris.modules.sri.facturacion_electronica.services.venta_sri_async_service.ManejadorXML") as mock_xml, patch(
-        "osiris.modules.sri.facturacion_electronica.services.venta_sri_async_service.SRIService"
+    with patch("osiris.modules.sri.facturacion_electronica.services.venta_sri_async_service.obtener_firmador") as mock_firmador, patch(
+        "osiris.modules.sri.facturacion_electronica.services.sri_soap_service.obtener_cliente_sri"
     ) as mock_sri, patch("starlette.background.BackgroundTasks.add_task", return_value=None):
         venta_router_service.venta_sri_async_service.db_engine = db_session.get_bind()
         venta_router_service.orquestador_fe_service.db_engine = db_session.get_bind()
         venta_router_service.orquestador_fe_service.venta_sri_service.db_engine = db_session.get_bind()
         fe_orquestador_router_service.db_engine = db_session.get_bind()
         fe_orquestador_router_service.venta_sri_service.db_engine = db_session.get_bind()
-        mock_xml.return_value.firmar_y_guardar_xml.return_value = b"<factura/>"
-        mock_sri.return_value.enviar_recepcion.return_value = {"estado": "RECIBIDA", "mensaje": "OK"}
-        mock_sri.return_value.consultar_autorizacion.return_value = {
-            "estado": "AUTORIZADO",
-            "mensaje": "AUTORIZADO",
-        }
+        mock_firmador.return_value.firmar_factura.return_value = b"<factura/>"
+        mock_sri.return_value.enviar_recepcion.return_value = RespuestaRecepcion(estado="RECIBIDA")
+        mock_sri.return_value.consultar_autorizacion.return_value = RespuestaAutorizacion(
+            estado="AUTORIZADO",
+            numero_autorizacion="0000000000",
+        )
 
         crear_venta = client.post("/api/v1/ventas", json=venta_payload)
         assert crear_venta.status_code == 201, crear_venta.text
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import gzip
+from uuid import uuid4
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from osiris.modules.sri.core_sri.models import BlobComprimido, DocumentoSriCola
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import (
+    AlmacenBlobsArchivos,
+    AlmacenBlobsBD,
+    guardar_payload_tarea,
+    leer_payload_tarea,
+)
+
+
+def _engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[BlobComprimido.__table__, DocumentoSriCola.__table__])
+    return engine
+
+
+def test_almacen_bd_comprime_y_deduplica_por_contenido():
+    engine = _engine()
+    contenido = ("<detalle>Producto</detalle>" * 500).encode("utf-8")
+    almacen = AlmacenBlobsBD()
+    with Session(engine) as session:
+        referencia = almacen.guardar(session, contenido)
+        assert almacen.guardar(session, contenido) == referencia
+        session.commit()
+
+        blob = session.exec(select(BlobComprimido)).one()
+        assert referencia == f"bd:{blob.sha256}"
+        assert blob.tamano == len(contenido)
+        assert len(blob.contenido) < len(contenido) // 10
+        if blob.codec == "gzip":
+            assert gzip.decompress(blob.contenido) == contenido
+        assert almacen.abrir(session, blob.sha256).leer() == contenido
+
+
+def test_payload_de_tarea_sale_de_la_fila_y_se_lee_con_legado():
+    engine = _engine()
+    payload = {"infoTributaria": {"claveAcceso": "1" * 49, "razonSocial": "Café Ñandú"}}
+    with Session(engine) as session:
+        nueva = DocumentoSriCola(entidad_id=uuid4(), tipo_documento="VENTA")
+        guardar_payload_tarea(session, nueva, payload)
+        legado = DocumentoSriCola(entidad_id=uuid4(), tipo_documento="VENTA", payload_json='{"legado": true}')
+        session.add_all([nueva, legado])
+        session.commit()
+
+        assert nueva.payload_json is None and nueva.payload_ref.startswith("bd:")
+        assert leer_payload_tarea(session, nueva) == payload
+        assert leer_payload_tarea(session, legado) == {"legado": True}
+
+
+def test_almacen_archivos_direccionado_por_contenido_lee_rangos_con_mmap(tmp_path):
+    almacen = AlmacenBlobsArchivos(tmp_path)
+    contenido = bytes(range(256)) * 1024
+
+    referencia = almacen.guardar(None, contenido)
+    assert almacen.guardar(None, contenido) == referencia
+    sha256 = referencia.split(":", 1)[1]
+    assert (tmp_path / sha256[:2] / sha256[2:4] / sha256).read_bytes() == contenido
+    assert not list(tmp_path.rglob(".tmp-*"))
+
+    blob = almacen.abrir(None, sha256)
+    assert blob.tamano == len(contenido)
+    assert b"".join(blob.iterar(1000, 70_000, bloque=4096)) == contenido[1000:70_001]
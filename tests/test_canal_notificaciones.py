@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import pytest
+
+from osiris.core.canal_notificaciones import CanalNotificaciones
+
+
+def test_canal_sin_al_confirmar_ni_aplicar_notificacion_no_se_instancia():
+    class CanalIncompleto(CanalNotificaciones):
+        clave_sesion = "canal_incompleto"
+        descripcion = "canal incompleto"
+
+        def al_confirmar(self, pendientes: set) -> None:
+            return None
+
+    with pytest.raises(TypeError, match="aplicar_notificacion"):
+        CanalIncompleto(habilitado=True, canal="canal_incompleto")
+
+    class CanalCompleto(CanalIncompleto):
+        def aplicar_notificacion(self, payload: str) -> None:
+            return None
+
+    canal = CanalCompleto(habilitado=True, canal="canal_completo")
+    assert canal.payloads(set()) == [canal.origen]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from osiris.core.observability import METRICS
+from osiris.modules.sri.core_sri.models import (
+    DocumentoElectronico,
+    EstadoDocumentoElectronico,
+    TipoDocumentoElectronico,
+)
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import (
+    CircuitoSri,
+    CircuitoSriAbiertoError,
+    EstadoCircuitoSri,
+    ModoColaSri,
+)
+from osiris.modules.sri.facturacion_electronica.services.orquestador_fe_service import OrquestadorFEService
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import RespuestaRecepcion, TransmisorSri
+
+
+class _Reloj:
+    def __init__(self) -> None:
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+class _ClienteCaido:
+    def __init__(self) -> None:
+        self.llamadas = 0
+
+    def enviar_recepcion(self, _xml: bytes) -> RespuestaRecepcion:
+        self.llamadas += 1
+        raise TimeoutError("SRI no responde")
+
+
+def test_circuito_se_abre_sondea_con_un_envio_y_se_cierra():
+    reloj = _Reloj()
+    circuito = CircuitoSri(umbral_fallos=3, enfriamiento_segundos=30, reloj=reloj)
+    for _ in range(3):
+        assert circuito.adquirir()
+        circuito.registrar_fallo()
+
+    assert circuito.estado == EstadoCircuitoSri.ABIERTO
+    assert circuito.modo_cola() == ModoColaSri.PAUSA
+    assert not circuito.adquirir()
+    assert METRICS.get_gauge("osiris_sri_circuito_estado", labels={"estado": "ABIERTO"}) == 1
+
+    reloj.ahora += 30
+    assert circuito.modo_cola() == ModoColaSri.SONDEO
+    assert circuito.adquirir()
+    # Solo un sondeo en vuelo: el resto sigue en pausa.
+    assert not circuito.adquirir()
+    assert circuito.modo_cola() == ModoColaSri.PAUSA
+
+    circuito.registrar_fallo()
+    assert circuito.estado == EstadoCircuitoSri.ABIERTO
+    reloj.ahora += 30
+    assert circuito.adquirir()
+    circuito.registrar_exito()
+    assert circuito.estado == EstadoCircuitoSri.CERRADO
+    assert circuito.modo_cola() == ModoColaSri.NORMAL
+
+
+def test_transmisor_no_contacta_al_sri_con_el_circuito_abierto():
+    circuito = CircuitoSri(umbral_fallos=2, enfriamiento_segundos=30, reloj=_Reloj())
+    cliente = _ClienteCaido()
+    transmisor = TransmisorSri(cliente, circuito=circuito)
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            transmisor.transmitir(b"<factura/>", "123")
+
+    with pytest.raises(CircuitoSriAbiertoError):
+        transmisor.transmitir(b"<factura/>", "123")
+    assert cliente.llamadas == 2
+
+
+def _encolar(engine, cantidad: int) -> list:
+    base = datetime.utcnow() - timedelta(minutes=10)
+    with Session(engine) as session:
+        documentos = [
+            DocumentoElectronico(
+                tipo_documento=TipoDocumentoElectronico.FACTURA,
+                referencia_id=uuid4(),
+                estado_sri=EstadoDocumentoElectronico.EN_COLA,
+                estado=EstadoDocumentoElectronico.EN_COLA,
+                next_retry_at=base,
+                creado_en=base + timedelta(seconds=indice),
+                activo=True,
+            )
+            for indice in range(cantidad)
+        ]
+        session.add_all(documentos)
+        session.commit()
+        return [documento.id for documento in documentos]
+
+
+def test_cola_se_pausa_con_el_circuito_abierto_y_reanuda_tras_el_sondeo():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[DocumentoElectronico.__table__])
+    ids = _encolar(engine, 4)
+    reloj = _Reloj()
+    circuito = CircuitoSri(umbral_fallos=1, enfriamiento_segundos=30, reloj=reloj)
+    service = OrquestadorFEService(db_engine=engine, circuito=circuito)
+    procesados: list = []
+
+    def _procesar(doc_id, **_kwargs):
+        # Simula la transmisión: el SRI ya responde.
+        assert circuito.adquirir()
+        circuito.registrar_exito()
+        procesados.append(doc_id)
+        with Session(engine) as session_doc:
+            documento = session_doc.get(DocumentoElectronico, doc_id)
+            documento.estado = documento.estado_sri = EstadoDocumentoElectronico.AUTORIZADO
+            documento.next_retry_at = None
+            session_doc.add(documento)
+            session_doc.commit()
+
+    service.procesar_documento = _procesar
+    circuito.registrar_fallo()
+
+    with Session(engine) as session:
+        assert service.procesar_cola(session, limite=10, lease_seconds=60, worker_id="w1") == 0
+        assert procesados == []
+
+        reloj.ahora += 30
+        # Un documento de sondeo y, con el SRI de vuelta, el resto en la misma pasada.
+        assert service.procesar_cola(session, limite=10, lease_seconds=60, worker_id="w1") == 4
+    assert procesados[0] == ids[0]
+    assert sorted(procesados) == sorted(ids)
+
+
+def test_backoff_de_cola_tiene_jitter_acotado():
+    retrasos = {OrquestadorFEService._retraso_reintento(3) for _ in range(20)}
+    assert len(retrasos) > 1
+    assert all(timedelta(minutes=4) <= retraso <= timedelta(minutes=8) for retraso in retrasos)
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from osiris.core.observability import METRICS
+from osiris.modules.common.audit_log.entity import AuditLog
+from osiris.modules.common.empresa.entity import Empresa
+from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.inventario.bodega.entity import Bodega
+from osiris.modules.inventario.casa_comercial.entity import CasaComercial
+from osiris.modules.inventario.movimientos.models import (
+    InventarioConciliacionCursor,
+    InventarioConciliacionPendiente,
+    InventarioDiscrepancia,
+    InventarioStock,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoDiscrepanciaInventario,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.schemas import MovimientoInventarioCreate
+from osiris.modules.inventario.movimientos.services.conciliacion_inventario_service import (
+    ConciliacionInventarioService,
+)
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.producto.entity import Producto
+from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
+
+
+def _build_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            TipoContribuyente.__table__,
+            Empresa.__table__,
+            Sucursal.__table__,
+            Bodega.__table__,
+            CasaComercial.__table__,
+            Producto.__table__,
+            AuditLog.__table__,
+            MovimientoInventario.__table__,
+            MovimientoInventarioDetalle.__table__,
+            InventarioStock.__table__,
+            InventarioDiscrepancia.__table__,
+            InventarioConciliacionPendiente.__table__,
+            InventarioConciliacionCursor.__table__,
+        ],
+    )
+    return engine
+
+
+def _seed(session: Session, *, productos: int = 1):
+    session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+    empresa = Empresa(
+        razon_social="Empresa Conciliacion",
+        nombre_comercial="Empresa Conciliacion",
+        ruc="1790012345001",
+        direccion_matriz="Av. Quito",
+        telefono="022345678",
+        obligado_contabilidad=True,
+        regimen="GENERAL",
+        modo_emision="ELECTRONICO",
+        tipo_contribuyente_id="01",
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(empresa)
+    session.flush()
+    bodega = Bodega(
+        codigo_bodega="BOD-CONC",
+        nombre_bodega="Bodega Conciliacion",
+        empresa_id=empresa.id,
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(bodega)
+    items = [
+        Producto(
+            nombre=f"Producto Conciliacion {i}",
+            tipo="BIEN",
+            pvp=Decimal("10.00"),
+            cantidad=Decimal("0.0000"),
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        for i in range(productos)
+    ]
+    session.add_all(items)
+    session.commit()
+    return bodega.id, [producto.id for producto in items]
+
+
+def _ingreso(service, session, *, bodega_id, producto_ids, cantidad=Decimal("5.0000")):
+    movimiento = service.crear_movimiento_borrador(
+        session,
+        MovimientoInventarioCreate(
+            bodega_id=bodega_id,
+            tipo_movimiento=TipoMovimientoInventario.INGRESO,
+            referencia_documento="ING-CONC",
+            usuario_auditoria="tester",
+            detalles=[
+                {"producto_id": producto_id, "cantidad": cantidad, "costo_unitario": Decimal("2.0000")}
+                for producto_id in producto_ids
+            ],
+        ),
+    )
+    return service.confirmar_movimiento(session, movimiento.id)
+
+
+@pytest.mark.parametrize(
+    ("modo", "ratio", "inline"),
+    [("COMPLETA", None, True), ("MUESTREO", 1.0, True), ("MUESTREO", 0.0, False), ("DIFERIDA", None, False)],
+)
+def test_modo_verificacion_decide_chequeo_inline_o_diferido(monkeypatch, modo, ratio, inline):
+    engine = _build_test_engine()
+    service = MovimientoInventarioService(modo_verificacion=modo, ratio_muestreo=ratio)
+    llamadas = []
+    original = service._validar_integridad_operacion_kardex_stock
+
+    def _espiar(*args, **kwargs):
+        llamadas.append(kwargs["movimiento"].id)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(service, "_validar_integridad_operacion_kardex_stock", _espiar)
+
+    with Session(engine) as session:
+        bodega_id, producto_ids = _seed(session, productos=2)
+        _ingreso(service, session, bodega_id=bodega_id, producto_ids=producto_ids)
+        pendientes = ConciliacionInventarioService().contar_pendientes(session)
+
+    assert bool(llamadas) is inline
+    assert pendientes == (0 if inline else 2)
+
+
+def test_conciliacion_registra_y_resuelve_discrepancias():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService(modo_verificacion="DIFERIDA")
+    conciliacion = ConciliacionInventarioService(tamano_lote=2)
+
+    with Session(engine) as session:
+        bodega_id, producto_ids = _seed(session, productos=3)
+        _ingreso(service, session, bodega_id=bodega_id, producto_ids=producto_ids)
+
+        resumen = conciliacion.ejecutar(session)
+        assert resumen == {"verificados": 6, "discrepancias_nuevas": 0, "discrepancias_abiertas": 0}
+        assert conciliacion.contar_pendientes(session) == 0
+
+        # Descuadre manual: stock y producto fuera de línea con el kardex.
+        stock = session.exec(
+            select(InventarioStock).where(
+                InventarioStock.bodega_id == bodega_id,
+                InventarioStock.producto_id == producto_ids[0],
+            )
+        ).one()
+        stock.cantidad_actual = Decimal("7.0000")
+        session.add(stock)
+        session.commit()
+
+        resumen = conciliacion.ejecutar(session)
+        assert resumen["discrepancias_nuevas"] == 2
+        abiertas = {d.tipo: d for d in conciliacion.listar_abiertas(session)}
+        assert set(abiertas) == {
+            TipoDiscrepanciaInventario.STOCK_VS_LEDGER,
+            TipoDiscrepanciaInventario.PRODUCTO_VS_STOCK,
+        }
+        assert abiertas[TipoDiscrepanciaInventario.STOCK_VS_LEDGER].diferencia == Decimal("2.0000")
+        assert abiertas[TipoDiscrepanciaInventario.PRODUCTO_VS_STOCK].bodega_id is None
+        assert METRICS.get_gauge(
+            "osiris_inventario_discrepancias_abiertas",
+            labels={"tipo": "STOCK_VS_LEDGER"},
+        ) == 1
+
+        # Una nueva corrida no duplica descuadres ya abiertos.
+        assert conciliacion.ejecutar(session)["discrepancias_nuevas"] == 0
+
+        stock.cantidad_actual = Decimal("5.0000")
+        session.add(stock)
+        session.commit()
+
+        resumen = conciliacion.ejecutar(session)
+        assert resumen["discrepancias_abiertas"] == 0
+        resueltas = session.exec(select(InventarioDiscrepancia)).all()
+        assert len(resueltas) == 2
+        assert all(d.resuelta and d.resuelta_en is not None for d in resueltas)
+
+
+def test_pendientes_persisten_y_el_barrido_avanza_por_corridas():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService(modo_verificacion="DIFERIDA")
+
+    with Session(engine) as session:
+        bodega_id, producto_ids = _seed(session, productos=5)
+        _ingreso(service, session, bodega_id=bodega_id, producto_ids=producto_ids[:2])
+        _ingreso(service, session, bodega_id=bodega_id, producto_ids=producto_ids[2:])
+        # Se re-encola un par ya pendiente: sigue siendo una sola fila.
+        _ingreso(service, session, bodega_id=bodega_id, producto_ids=producto_ids[:1])
+
+    # Otra instancia (otro proceso o réplica) ve la cola.
+    with Session(engine) as session:
+        conciliacion = ConciliacionInventarioService(tamano_lote=2, lotes_por_corrida=1)
+        assert conciliacion.contar_pendientes(session) == 5
+
+        # Cada corrida verifica los pendientes y un solo lote del barrido.
+        assert conciliacion.ejecutar(session)["verificados"] == 5 + 2
+        assert conciliacion.contar_pendientes(session) == 0
+        cursor = session.exec(select(InventarioConciliacionCursor)).one()
+        assert cursor.producto_id == sorted(producto_ids)[1]
+
+        assert conciliacion.ejecutar(session)["verificados"] == 2
+        assert conciliacion.ejecutar(session)["verificados"] == 1
+        session.refresh(cursor)
+        assert cursor.bodega_id is None
+        assert cursor.vuelta_completada_en is not None
+
+        # La vuelta siguiente empieza de nuevo por el primer par.
+        assert conciliacion.ejecutar(session)["verificados"] == 2
@@ -23,6 +23,7 @@ from osiris.modules.sri.core_sri.models import (
     TipoIdentificacionSRI,
     Venta,
 )
+from osiris.modules.sri.facturacion_electronica.services import almacen_blobs
 from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
 
 
@@ -183,3 +184,46 @@ def test_descargar_xml_en_cola_falla():
         assert response.status_code == 400
     finally:
         app.dependency_overrides.pop(get_session, None)
+
+
+def test_descargar_xml_desde_almacen_por_rangos(tmp_path, monkeypatch):
+    class FakeSettings:
+        FE_BLOB_BACKEND = "ARCHIVOS"
+        FE_BLOB_DIRECTORIO = tmp_path
+
+    monkeypatch.setattr(almacen_blobs, "get_settings", lambda: FakeSettings)
+    engine = _build_test_engine()
+    xml = "<autorizacion>" + "x" * 200_000 + "</autorizacion>"
+
+    with Session(engine) as session:
+        usuario, documento = _seed_documento(session, estado=EstadoDocumentoElectronico.AUTORIZADO, xml=None)
+        almacen_blobs.guardar_xml_autorizado(session, documento, xml)
+        session.add(documento)
+        session.commit()
+        documento_id, usuario_id = documento.id, usuario.id
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    try:
+        with TestClient(app) as client:
+            url = f"/api/v1/documentos/{documento_id}/xml"
+            headers = {"Authorization": f"Bearer {usuario_id}"}
+            completo = client.get(url, headers=headers)
+            parcial = client.get(url, headers={**headers, "Range": "bytes=0-13"})
+            cola = client.get(url, headers={**headers, "Range": "bytes=-15"})
+            fuera = client.get(url, headers={**headers, "Range": f"bytes={len(xml)}-"})
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+    assert completo.status_code == 200
+    assert completo.headers["content-length"] == str(len(xml))
+    assert completo.headers["accept-ranges"] == "bytes"
+    assert completo.text == xml
+    assert parcial.status_code == 206
+    assert parcial.text == "<autorizacion>"
+    assert parcial.headers["content-range"] == f"bytes 0-13/{len(xml)}"
+    assert cola.status_code == 206 and cola.text == "</autorizacion>"
+    assert fuera.status_code == 416
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextlib import suppress
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from osiris.core.observability import METRICS
+from osiris.modules.sri.core_sri.models import (
+    DocumentoElectronico,
+    DocumentoSriCola,
+    EstadoColaSri,
+    EstadoDocumentoElectronico,
+    TipoDocumentoElectronico,
+)
+from osiris import main as app_main
+from osiris.modules.sri.facturacion_electronica.services.cola_fe_notificaciones import despertador_cola_fe
+from osiris.modules.sri.facturacion_electronica.services.orquestador_fe_service import OrquestadorFEService
+
+
+def _build_engine(url: str = "sqlite://"):
+    kwargs = {"connect_args": {"check_same_thread": False}}
+    if url == "sqlite://":
+        kwargs["poolclass"] = StaticPool
+    engine = create_engine(url, **kwargs)
+    SQLModel.metadata.create_all(engine, tables=[DocumentoElectronico.__table__])
+    return engine
+
+
+def _encolar(engine, cantidad: int) -> list:
+    base = datetime.utcnow() - timedelta(minutes=10)
+    with Session(engine) as session:
+        documentos = [
+            DocumentoElectronico(
+                tipo_documento=TipoDocumentoElectronico.RETENCION,
+                referencia_id=uuid4(),
+                estado_sri=EstadoDocumentoElectronico.EN_COLA,
+                estado=EstadoDocumentoElectronico.EN_COLA,
+                next_retry_at=base,
+                creado_en=base + timedelta(seconds=indice),
+                activo=True,
+            )
+            for indice in range(cantidad)
+        ]
+        session.add_all(documentos)
+        session.commit()
+        return [documento.id for documento in documentos]
+
+
+def test_replicas_reclaman_lotes_disjuntos_y_el_lease_expira():
+    engine = _build_engine()
+    ids = _encolar(engine, 5)
+    replica_a = OrquestadorFEService(db_engine=engine)
+    replica_b = OrquestadorFEService(db_engine=engine)
+
+    with Session(engine) as session:
+        lote_a = replica_a.reclamar_lote(session, limite=3, lease_seconds=60, worker_id="replica-a")
+        lote_b = replica_b.reclamar_lote(session, limite=3, lease_seconds=60, worker_id="replica-b")
+        assert lote_a == ids[:3]
+        assert lote_b == ids[3:]
+        assert replica_a.reclamar_lote(session, limite=3, lease_seconds=60, worker_id="replica-a") == []
+
+        # Una réplica caída no retiene documentos más allá de su lease.
+        despues = datetime.utcnow() + timedelta(seconds=61)
+        assert replica_b.reclamar_lote(session, limite=5, lease_seconds=60, worker_id="replica-b", now=despues) == ids
+
+    replica_a.liberar_reclamo(ids[0], worker_id="replica-a")
+    with Session(engine) as session:
+        documento = session.get(DocumentoElectronico, ids[0])
+        # El lease ya pertenece a replica-b: replica-a no puede liberarlo.
+        assert documento.reclamado_por == "replica-b"
+
+
+def test_procesar_cola_usa_pool_concurrente_y_libera_reclamos(tmp_path):
+    engine = _build_engine(f"sqlite:///{tmp_path / 'fe_cola.db'}")
+    ids = _encolar(engine, 4)
+    service = OrquestadorFEService(db_engine=engine)
+    barrera = threading.Barrier(3, timeout=5)
+    procesados: list = []
+    lock = threading.Lock()
+
+    def _procesar(doc_id, **_kwargs):
+        if doc_id == ids[3]:
+            raise RuntimeError("fallo puntual")
+        # Solo se supera si tres documentos se procesan a la vez.
+        barrera.wait()
+        with lock:
+            procesados.append(doc_id)
+
+    service.procesar_documento = _procesar
+    with Session(engine) as session:
+        assert service.procesar_cola(session, limite=10, concurrencia=3, lease_seconds=60, worker_id="w1") == 4
+
+    assert sorted(procesados) == sorted(ids[:3])
+    with Session(engine) as session:
+        documentos = {
+            documento.id: documento
+            for documento in session.exec(select(DocumentoElectronico)).all()
+        }
+    assert all(documentos[doc_id].reclamado_por is None for doc_id in ids[:3])
+    # El fallido conserva su lease: no se reclama de nuevo hasta que expire.
+    assert documentos[ids[3]].reclamado_por == "w1"
+    engine.dispose()
+
+
+def test_procesamiento_manual_respeta_el_lease_del_worker_de_cola():
+    engine = _build_engine()
+    ids = _encolar(engine, 3)
+    worker = OrquestadorFEService(db_engine=engine)
+    manual = OrquestadorFEService(db_engine=engine)
+    manual.worker_id = "api-manual"
+    procesados: list = []
+
+    def _procesar(doc_id, *, worker_id=None, **_kwargs):
+        with Session(engine) as session:
+            assert session.get(DocumentoElectronico, doc_id).reclamado_por == worker_id == "api-manual"
+        procesados.append(doc_id)
+        return False
+
+    manual.procesar_documento = _procesar
+    with Session(engine) as session:
+        assert worker.reclamar_lote(session, limite=1, lease_seconds=60, worker_id="replica-a") == ids[:1]
+
+    faltante = uuid4()
+    procesados_total, ids_procesados, errores = manual.procesar_documentos_ids([ids[0], ids[1], ids[2], faltante])
+
+    assert procesados == ids[1:]
+    assert (procesados_total, ids_procesados) == (2, ids[1:])
+    assert len(errores) == 2
+    assert str(ids[0]) in errores[0] and "otro worker" in errores[0]
+    assert str(faltante) in errores[1] and "no encontrado" in errores[1]
+    with Session(engine) as session:
+        documentos = {documento.id: documento for documento in session.exec(select(DocumentoElectronico)).all()}
+    assert documentos[ids[0]].reclamado_por == "replica-a"
+    assert all(documentos[doc_id].reclamado_por is None for doc_id in ids[1:])
+
+
+def test_encolado_confirmado_despierta_al_worker_y_el_revertido_no():
+    engine = _build_engine()
+    avisos: list[int] = []
+    cancelar = despertador_cola_fe.suscribir(lambda: avisos.append(1))
+    try:
+        with Session(engine) as session:
+            despertador_cola_fe.marcar_encolado(session)
+            session.rollback()
+        assert avisos == []
+
+        with Session(engine) as session:
+            despertador_cola_fe.marcar_encolado(session)
+            session.commit()
+            session.commit()
+        assert avisos == [1]
+
+        # Los NOTIFY propios ya se avisaron en local al confirmar.
+        despertador_cola_fe.aplicar_notificacion(despertador_cola_fe.origen)
+        despertador_cola_fe.aplicar_notificacion("otra-replica")
+        assert avisos == [1, 1]
+    finally:
+        cancelar()
+
+
+def test_worker_fe_procesa_al_notificar_sin_esperar_el_intervalo(monkeypatch):
+    pasadas: list[int] = []
+
+    async def _pasada():
+        pasadas.append(1)
+
+    monkeypatch.setattr(app_main, "_procesar_cola_fe_pasada", _pasada)
+
+    async def _escenario():
+        worker = asyncio.create_task(app_main._run_fe_queue_worker(3600))
+        try:
+            await asyncio.sleep(0.05)
+            despertador_cola_fe.notificar()
+            for _ in range(100):
+                if pasadas:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await worker
+
+    asyncio.run(_escenario())
+    # Con un intervalo de una hora, solo el aviso puede haber disparado la pasada.
+    assert pasadas
+
+
+def test_medir_cola_publica_profundidad_y_antiguedad_por_estado():
+    engine = _build_engine()
+    SQLModel.metadata.create_all(engine, tables=[DocumentoSriCola.__table__])
+    _encolar(engine, 3)
+    with Session(engine) as session:
+        session.add(
+            DocumentoSriCola(
+                entidad_id=uuid4(),
+                tipo_documento="RETENCION",
+                estado=EstadoColaSri.REINTENTO_PROGRAMADO,
+                payload_json="{}",
+            )
+        )
+        # Las filas terminales no son cola: no se cuentan.
+        session.add(
+            DocumentoSriCola(
+                entidad_id=uuid4(),
+                tipo_documento="RETENCION",
+                estado=EstadoColaSri.COMPLETADO,
+                payload_json="{}",
+            )
+        )
+        session.add(
+            DocumentoElectronico(
+                tipo_documento=TipoDocumentoElectronico.FACTURA,
+                referencia_id=uuid4(),
+                estado_sri=EstadoDocumentoElectronico.AUTORIZADO,
+                estado=EstadoDocumentoElectronico.AUTORIZADO,
+                creado_en=datetime.utcnow() - timedelta(days=30),
+                activo=True,
+            )
+        )
+        session.commit()
+        sentencias: list[str] = []
+        event.listen(engine, "before_cursor_execute", lambda *args: sentencias.append(args[2]))
+        OrquestadorFEService(db_engine=engine).medir_cola(session)
+
+    assert METRICS.get_gauge("osiris_fe_documentos", labels={"estado": "EN_COLA"}) == 3
+    assert METRICS.get_gauge("osiris_fe_documentos", labels={"estado": "FIRMADO"}) == 0
+    assert METRICS.get_gauge("osiris_fe_cola_sri_tareas", labels={"estado": "REINTENTO_PROGRAMADO"}) == 1
+    assert METRICS.get_gauge("osiris_fe_cola_sri_tareas", labels={"estado": "PENDIENTE"}) == 0
+    assert len(sentencias) == 2 and all(" IN (" in sentencia for sentencia in sentencias)
+    # El más antiguo se encoló hace diez minutos.
+    antiguedad = METRICS.get_gauge("osiris_fe_documentos_pendiente_mas_antiguo_seconds", labels={"estado": "EN_COLA"})
+    assert 590 <= antiguedad <= 660
+    engine.dispose()
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import base64
+import copy
+import hashlib
+import re
+from datetime import datetime, timedelta, timezone
+from xml.etree import ElementTree
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import pkcs12
+from cryptography.x509.oid import NameOID
+
+from osiris.modules.sri.facturacion_electronica.services.firma_xml_service import (
+    NS_DS,
+    NS_ETSI,
+    ComprobanteInvalidoError,
+    FirmaXadesService,
+    FirmadorComprobantes,
+    cargar_certificado,
+    factura_a_xml,
+    validar_xsd,
+)
+
+
+PAYLOAD_FACTURA = {
+    "infoTributaria": {"ambiente": "1", "tipoEmision": "1", "claveAcceso": "0101202401179001234500110010010000000011234567818"},
+    "infoFactura": {"fechaEmision": "01/01/2024", "totalSinImpuestos": "10.00", "importeTotal": "11.50"},
+    "detalles": [
+        {
+            "codigoPrincipal": "P-1",
+            "descripcion": "Café & té",
+            "impuestos": [{"codigo": "2", "codigoPorcentaje": "4", "tarifa": "15", "valor": "1.50"}],
+        }
+    ],
+    "infoAdicional": {"campoAdicional": [{"nombre": "Email", "valor": "cliente@example.com"}]},
+}
+
+
+@pytest.fixture
+def archivo_p12(tmp_path):
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Firma Prueba")])
+    ahora = datetime.now(timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(nombre)
+        .issuer_name(nombre)
+        .public_key(clave.public_key())
+        .serial_number(20240101)
+        .not_valid_before(ahora)
+        .not_valid_after(ahora + timedelta(days=1))
+        .sign(clave, hashes.SHA256())
+    )
+    ruta = tmp_path / "firma.p12"
+    ruta.write_bytes(
+        pkcs12.serialize_key_and_certificates(
+            b"firma", clave, certificado, None, serialization.BestAvailableEncryption(b"secreto")
+        )
+    )
+    return ruta
+
+
+def test_factura_a_xml_respeta_estructura_sri():
+    raiz = ElementTree.fromstring(factura_a_xml(PAYLOAD_FACTURA))
+    assert raiz.tag == "factura" and raiz.get("id") == "comprobante"
+    assert raiz.find("detalles/detalle/impuestos/impuesto/tarifa").text == "15"
+    assert raiz.find("infoAdicional/campoAdicional").get("nombre") == "Email"
+
+
+def test_firma_xades_es_verificable_y_no_escribe_archivos(archivo_p12, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    firmador = FirmadorComprobantes(FirmaXadesService.desde_archivo(archivo_p12, "secreto"))
+
+    firmado = firmador.firmar_factura(PAYLOAD_FACTURA).decode("utf-8")
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["firma.p12"]
+    raiz = ElementTree.fromstring(firmado)
+    firma = raiz.find(f"{{{NS_DS}}}Signature")
+    referencias = {
+        ref.get("URI"): ref.find(f"{{{NS_DS}}}DigestValue").text
+        for ref in firma.iter(f"{{{NS_DS}}}Reference")
+    }
+
+    # Referencia enveloped: el comprobante sin la firma.
+    documento = re.sub(r"<ds:Signature .*</ds:Signature>", "", firmado.split("\n", 1)[1], flags=re.S)
+    assert referencias["#comprobante"] == base64.b64encode(hashlib.sha1(documento.encode("utf-8")).digest()).decode()
+
+    signed_info = re.search(r"<ds:SignedInfo .*?</ds:SignedInfo>", firmado, flags=re.S).group(0)
+    signed_info = signed_info.replace("<ds:SignedInfo ", f'<ds:SignedInfo xmlns:ds="{NS_DS}" ', 1)
+    certificado = x509.load_der_x509_certificate(
+        base64.b64decode(firma.find(f"{{{NS_DS}}}KeyInfo/{{{NS_DS}}}X509Data/{{{NS_DS}}}X509Certificate").text)
+    )
+    certificado.public_key().verify(
+        base64.b64decode(firma.find(f"{{{NS_DS}}}SignatureValue").text),
+        ElementTree.canonicalize(xml_data=signed_info).encode("utf-8"),
+        padding.PKCS1v15(),
+        hashes.SHA1(),
+    )
+
+
+def test_certificado_se_descifra_una_vez_por_archivo(archivo_p12):
+    primero = cargar_certificado(archivo_p12, "secreto")
+    assert cargar_certificado(archivo_p12, "secreto") is primero
+    with pytest.raises(ValueError):
+        cargar_certificado(archivo_p12, "otra")
+
+
+_DIGESTS = {"http://www.w3.org/2000/09/xmldsig#sha1": hashlib.sha1}
+
+
+def _verificar_xmldsig(firmado: bytes) -> None:
+    """
+    Verificador XMLDSig escrito aparte del servicio: trabaja sobre el árbol del
+    documento firmado (no sobre los fragmentos con que se construyó), resuelve cada
+    Reference por su Id, aplica la transformación enveloped y la C14N inclusiva,
+    y comprueba la firma RSA con el certificado embebido.
+    """
+    ElementTree.register_namespace("ds", NS_DS)
+    ElementTree.register_namespace("etsi", NS_ETSI)
+    raiz = ElementTree.fromstring(firmado)
+    por_id = {elemento.get("Id") or elemento.get("id"): elemento for elemento in raiz.iter()}
+    firma = raiz.find(f"{{{NS_DS}}}Signature")
+    assert firma is not None, "Sin ds:Signature como hijo de la raíz"
+
+    def c14n(elemento: ElementTree.Element) -> bytes:
+        return ElementTree.canonicalize(ElementTree.tostring(elemento, encoding="unicode")).encode("utf-8")
+
+    signed_info = firma.find(f"{{{NS_DS}}}SignedInfo")
+    uris = []
+    for referencia in signed_info.findall(f"{{{NS_DS}}}Reference"):
+        uri = referencia.get("URI")
+        uris.append(uri)
+        objetivo = copy.deepcopy(por_id[uri.removeprefix("#")])
+        transformaciones = [t.get("Algorithm") for t in referencia.iter(f"{{{NS_DS}}}Transform")]
+        if "http://www.w3.org/2000/09/xmldsig#enveloped-signature" in transformaciones:
+            for contenida in objetivo.findall(f"{{{NS_DS}}}Signature"):
+                objetivo.remove(contenida)
+        algoritmo = _DIGESTS[referencia.find(f"{{{NS_DS}}}DigestMethod").get("Algorithm")]
+        esperado = base64.b64encode(algoritmo(c14n(objetivo)).digest()).decode("ascii")
+        assert referencia.findtext(f"{{{NS_DS}}}DigestValue") == esperado, f"Digest inválido para {uri}"
+
+    certificado_der = base64.b64decode(firma.findtext(f".//{{{NS_DS}}}X509Certificate"))
+    certificado = x509.load_der_x509_certificate(certificado_der)
+    certificado.public_key().verify(
+        base64.b64decode(firma.findtext(f"{{{NS_DS}}}SignatureValue")),
+        c14n(signed_info),
+        padding.PKCS1v15(),
+        hashes.SHA1(),
+    )
+
+    # XAdES-BES: las propiedades firmadas identifican el mismo certificado.
+    propiedades = firma.find(f".//{{{NS_ETSI}}}SignedProperties")
+    assert "#" + propiedades.get("Id") in uris
+    assert propiedades.findtext(f".//{{{NS_ETSI}}}CertDigest/{{{NS_DS}}}DigestValue") == base64.b64encode(
+        hashlib.sha1(certificado_der).digest()
+    ).decode("ascii")
+    assert propiedades.findtext(f".//{{{NS_DS}}}X509SerialNumber") == str(certificado.serial_number)
+
+
+def test_firma_xades_pasa_un_verificador_xmldsig_independiente(archivo_p12):
+    firmador = FirmadorComprobantes(FirmaXadesService.desde_archivo(archivo_p12, "secreto"))
+    firmado = firmador.firmar_factura(PAYLOAD_FACTURA)
+
+    _verificar_xmldsig(firmado)
+
+    # Alterar el comprobante firmado invalida el digest del documento.
+    alterado = firmado.replace(b"<importeTotal>11.50</importeTotal>", b"<importeTotal>1.50</importeTotal>")
+    assert alterado != firmado
+    with pytest.raises(AssertionError, match="#comprobante"):
+        _verificar_xmldsig(alterado)
+
+
+_XSD_FACTURA = """<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+  <xsd:element name="factura">
+    <xsd:complexType>
+      <xsd:sequence>
+        <xsd:element name="infoTributaria">
+          <xsd:complexType>
+            <xsd:sequence>
+              <xsd:element name="ambiente" type="xsd:string"/>
+              <xsd:element name="tipoEmision" type="xsd:string"/>
+              <xsd:element name="claveAcceso">
+                <xsd:simpleType>
+                  <xsd:restriction base="xsd:string"><xsd:pattern value="[0-9]{49}"/></xsd:restriction>
+                </xsd:simpleType>
+              </xsd:element>
+            </xsd:sequence>
+          </xsd:complexType>
+        </xsd:element>
+        <xsd:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/>
+      </xsd:sequence>
+      <xsd:attribute name="id" type="xsd:string"/>
+      <xsd:attribute name="version" type="xsd:string"/>
+    </xsd:complexType>
+  </xsd:element>
+</xsd:schema>
+"""
+
+
+def test_firmador_valida_contra_el_xsd_antes_de_firmar(archivo_p12, tmp_path, monkeypatch):
+    pytest.importorskip("lxml")
+    ruta_xsd = tmp_path / "factura.xsd"
+    ruta_xsd.write_text(_XSD_FACTURA, encoding="utf-8")
+
+    validar_xsd(factura_a_xml(PAYLOAD_FACTURA), ruta_xsd)
+
+    invalido = {**PAYLOAD_FACTURA, "infoTributaria": {**PAYLOAD_FACTURA["infoTributaria"], "claveAcceso": "123"}}
+    with pytest.raises(ComprobanteInvalidoError, match="claveAcceso"):
+        validar_xsd(factura_a_xml(invalido), ruta_xsd)
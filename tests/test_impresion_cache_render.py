@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+from decimal import Decimal
+from uuid import uuid4
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from osiris.core.observability import METRICS
+from osiris.modules.common.audit_log.entity import AuditLog
+from osiris.modules.common.empresa.entity import Empresa
+from osiris.modules.common.punto_emision.entity import PuntoEmision
+from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.impresion.services import prerender_service
+from osiris.modules.impresion.services.cache_render import CacheRender
+from osiris.modules.impresion.services.impresion_service import ImpresionService
+from osiris.modules.impresion.services.pool_render import PoolRender
+from osiris.modules.impresion.strategies.render_strategy import RenderStrategy
+from osiris.modules.sri.core_sri.types import (
+    EstadoDocumentoElectronico,
+    EstadoVenta,
+    FormaPagoSRI,
+    TipoDocumentoElectronico,
+    TipoIdentificacionSRI,
+)
+from osiris.modules.sri.facturacion_electronica.models import DocumentoElectronico
+from osiris.modules.sri.facturacion_electronica.services import correo_service
+from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
+from osiris.modules.ventas.models import Venta
+
+
+class _StrategyContador(RenderStrategy):
+    def __init__(self) -> None:
+        self.renders: list[str] = []
+
+    def render_pdf(self, html_content: str) -> bytes:
+        self.renders.append(html_content)
+        return b"%PDF-" + str(len(self.renders)).encode()
+
+
+def test_lru_en_memoria_acotado_por_bytes():
+    cache = CacheRender(habilitado=True, max_bytes_memoria=10, directorio=None, max_bytes_disco=0)
+    cache.guardar("a", b"1234")
+    cache.guardar("b", b"5678")
+    assert cache.obtener("a") == b"1234"
+    cache.guardar("c", b"9012")
+
+    # "b" era el menos usado y se desaloja para quedar bajo 10 bytes.
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") == b"1234"
+    assert cache.obtener("c") == b"9012"
+    cache.guardar("grande", b"x" * 11)
+    assert cache.obtener("grande") is None
+
+
+def test_renders_concurrentes_de_la_misma_clave_generan_una_sola_vez():
+    cache = CacheRender(habilitado=True, max_bytes_memoria=1024, directorio=None, max_bytes_disco=0)
+    generados: list[int] = []
+
+    def _generar() -> bytes:
+        generados.append(1)
+        time.sleep(0.05)
+        return b"%PDF-unico"
+
+    resultados: list[bytes] = []
+    hilos = [
+        threading.Thread(target=lambda: resultados.append(cache.obtener_o_generar("ride", _generar)))
+        for _ in range(4)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert resultados == [b"%PDF-unico"] * 4
+    assert len(generados) == 1
+
+
+def test_nivel_en_disco_sobrevive_al_proceso_y_poda_por_tamano(tmp_path):
+    cache = CacheRender(habilitado=True, max_bytes_memoria=1024, directorio=tmp_path, max_bytes_disco=25)
+    claves = [CacheRender.clave(documento_id=uuid4(), formato="A4", version="v1") for _ in range(3)]
+    for indice, clave in enumerate(claves):
+        cache.guardar(clave, b"%PDF-" + bytes([48 + indice]) * 5)
+        ruta = cache._ruta(clave)
+        os.utime(ruta, (1000 + indice, 1000 + indice))
+
+    otro_proceso = CacheRender(habilitado=True, max_bytes_memoria=1024, directorio=tmp_path, max_bytes_disco=25)
+    assert otro_proceso.obtener(claves[1]) == b"%PDF-11111"
+    assert 'osiris_impresion_cache_lookups_total{resultado="disco"}' in METRICS.render_prometheus()
+
+    cache.guardar(CacheRender.clave(documento_id=uuid4(), formato="A4", version="v1"), b"%PDF-3333")
+    restantes = {ruta.stem for ruta in tmp_path.glob("*/*.pdf")}
+    assert sum(ruta.stat().st_size for ruta in tmp_path.glob("*/*.pdf")) <= 25
+    # Se desalojan los menos leídos: la clave leída por el otro proceso se conserva.
+    assert claves[0] not in restantes
+    assert claves[1] in restantes
+
+
+def _factura_autorizada(engine) -> tuple:
+    with Session(engine) as session:
+        empresa = Empresa(
+            razon_social="Empresa Cache",
+            ruc="1790012345001",
+            direccion_matriz="Av. Matriz",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="test",
+        )
+        session.add(empresa)
+        session.flush()
+        venta = Venta(
+            empresa_id=empresa.id,
+            fecha_emision=date.today(),
+            tipo_identificacion_comprador=TipoIdentificacionSRI.RUC,
+            identificacion_comprador="1790012345001",
+            forma_pago=FormaPagoSRI.EFECTIVO,
+            subtotal_sin_impuestos=Decimal("10.00"),
+            subtotal_0=Decimal("10.00"),
+            valor_total=Decimal("10.00"),
+            estado=EstadoVenta.EMITIDA,
+            usuario_auditoria="test",
+        )
+        session.add(venta)
+        session.flush()
+        documento = DocumentoElectronico(
+            tipo_documento=TipoDocumentoElectronico.FACTURA,
+            referencia_id=venta.id,
+            venta_id=venta.id,
+            clave_acceso="1" * 49,
+            estado_sri=EstadoDocumentoElectronico.AUTORIZADO,
+            estado=EstadoDocumentoElectronico.AUTORIZADO,
+            usuario_auditoria="test",
+        )
+        session.add(documento)
+        session.commit()
+        return empresa.id, venta.id, documento.id
+
+
+def _engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            TipoContribuyente.__table__,
+            AuditLog.__table__,
+            Empresa.__table__,
+            Sucursal.__table__,
+            PuntoEmision.__table__,
+            Venta.__table__,
+            DocumentoElectronico.__table__,
+        ],
+    )
+    return engine
+
+
+def test_ride_a4_autorizado_se_renderiza_una_vez_hasta_cambiar_la_marca(tmp_path):
+    engine = _engine()
+    empresa_id, _venta_id, documento_id = _factura_autorizada(engine)
+    strategy = _StrategyContador()
+    cache = CacheRender(habilitado=True, max_bytes_memoria=1024, directorio=tmp_path, max_bytes_disco=1024)
+    service = ImpresionService(strategy=strategy, cache=cache, pool=PoolRender(procesos=False))
+
+    with Session(engine) as session:
+        primero = service.generar_ride_a4(session, documento_id=documento_id)
+        assert service.generar_ride_a4(session, documento_id=documento_id) == primero
+        cache.limpiar_memoria()
+        assert service.generar_ride_a4(session, documento_id=documento_id) == primero
+        assert len(strategy.renders) == 1
+
+        empresa = session.get(Empresa, empresa_id)
+        empresa.logo = "https://cdn.example.com/logo-nuevo.png"
+        session.add(empresa)
+        session.commit()
+        assert service.generar_ride_a4(session, documento_id=documento_id) != primero
+        assert len(strategy.renders) == 2
+        assert "logo-nuevo.png" in strategy.renders[-1]
+
+
+def test_prerender_al_autorizar_deja_el_ride_listo_para_el_correo(tmp_path, monkeypatch):
+    engine = _engine()
+    _empresa_id, venta_id, documento_id = _factura_autorizada(engine)
+    strategy = _StrategyContador()
+    cache = CacheRender(habilitado=True, max_bytes_memoria=1024, directorio=tmp_path, max_bytes_disco=1024)
+    pool = PoolRender(procesos=False)
+
+    def _servicio() -> ImpresionService:
+        return ImpresionService(strategy=strategy, cache=cache, pool=pool)
+
+    monkeypatch.setattr(prerender_service, "ImpresionService", _servicio)
+    monkeypatch.setattr(correo_service, "ImpresionService", _servicio)
+    programadas: list[tuple] = []
+    monkeypatch.setattr(
+        prerender_service.programador_tareas,
+        "programar",
+        lambda clave, delay, callback, **kwargs: programadas.append((clave, callback, kwargs)),
+    )
+
+    monkeypatch.setattr(
+        prerender_service,
+        "get_settings",
+        lambda: SimpleNamespace(IMPRESION_PRERENDER_AUTORIZADO_ENABLED=False),
+    )
+    prerender_service.programar_prerender_ride_a4(documento_id, db_engine=engine)
+    assert programadas == []
+    # Sin pre-render el correo sale sin RIDE adjunto: no se renderiza por cada factura.
+    resultado = correo_service.CorreoFacturaService(engine).enviar_correo_factura(venta_id)
+    assert resultado["ride_pdf"] is None
+    assert strategy.renders == []
+
+    monkeypatch.setattr(
+        prerender_service,
+        "get_settings",
+        lambda: SimpleNamespace(IMPRESION_PRERENDER_AUTORIZADO_ENABLED=True),
+    )
+    prerender_service.programar_prerender_ride_a4(documento_id, db_engine=engine)
+    clave, callback, kwargs = programadas[0]
+    assert clave == f"prerender-ride:{documento_id}"
+    callback(**kwargs)
+    assert len(strategy.renders) == 1
+
+    resultado = correo_service.CorreoFacturaService(engine).enviar_correo_factura(venta_id)
+    assert resultado["ride_pdf"] == b"%PDF-1"
+    assert len(strategy.renders) == 1
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import io
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from osiris.core.db import get_session
+from osiris.main import app
+from osiris.modules.common.audit_log.entity import AuditLog
+from osiris.modules.common.empresa.entity import Empresa
+from osiris.modules.common.punto_emision.entity import PuntoEmision
+from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.impresion import router as impresion_router
+from osiris.modules.impresion.services.cache_render import CacheRender
+from osiris.modules.impresion.services.impresion_lote_service import ImpresionLoteService
+from osiris.modules.impresion.services.impresion_service import ImpresionService
+from osiris.modules.impresion.services.pool_render import PoolRender
+from osiris.modules.impresion.strategies.render_strategy import RenderStrategy
+from osiris.modules.sri.core_sri.types import (
+    EstadoDocumentoElectronico,
+    EstadoVenta,
+    FormaPagoSRI,
+    TipoDocumentoElectronico,
+    TipoIdentificacionSRI,
+)
+from osiris.modules.sri.facturacion_electronica.models import DocumentoElectronico
+from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
+from osiris.modules.ventas.models import Venta
+
+
+class _StrategyFallaCon(RenderStrategy):
+    def __init__(self, falla_con: str | None = None) -> None:
+        self.falla_con = falla_con
+
+    def render_pdf(self, html_content: str) -> bytes:
+        if self.falla_con and self.falla_con in html_content:
+            raise RuntimeError("render roto")
+        return b"%PDF-1.4 " + str(len(html_content)).encode()
+
+
+def _build_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            TipoContribuyente.__table__,
+            AuditLog.__table__,
+            Empresa.__table__,
+            Sucursal.__table__,
+            PuntoEmision.__table__,
+            Venta.__table__,
+            DocumentoElectronico.__table__,
+        ],
+    )
+    return engine
+
+
+def _crear_facturas(engine, emisiones: list[tuple[date, str, EstadoDocumentoElectronico]]) -> list:
+    with Session(engine) as session:
+        session.add(TipoContribuyente(codigo="01", nombre="Sociedad", activo=True))
+        empresa = Empresa(
+            razon_social="Empresa Lote",
+            ruc="1790012345001",
+            direccion_matriz="Av. Matriz",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="test",
+        )
+        session.add(empresa)
+        session.flush()
+
+        documentos = []
+        for fecha_emision, identificacion, estado in emisiones:
+            venta = Venta(
+                empresa_id=empresa.id,
+                fecha_emision=fecha_emision,
+                tipo_identificacion_comprador=TipoIdentificacionSRI.CEDULA,
+                identificacion_comprador=identificacion,
+                forma_pago=FormaPagoSRI.EFECTIVO,
+                subtotal_sin_impuestos=Decimal("10.00"),
+                subtotal_0=Decimal("10.00"),
+                valor_total=Decimal("10.00"),
+                estado=EstadoVenta.EMITIDA,
+                usuario_auditoria="test",
+            )
+            session.add(venta)
+            session.flush()
+            documento = DocumentoElectronico(
+                tipo_documento=TipoDocumentoElectronico.FACTURA,
+                referencia_id=venta.id,
+                venta_id=venta.id,
+                clave_acceso=identificacion.rjust(49, "0"),
+                estado_sri=estado,
+                estado=estado,
+                usuario_auditoria="test",
+            )
+            session.add(documento)
+            documentos.append(documento)
+        session.commit()
+        return [documento.id for documento in documentos]
+
+
+def _cliente(engine, monkeypatch, strategy: RenderStrategy) -> TestClient:
+    servicio = ImpresionService(
+        strategy=strategy,
+        cache=CacheRender(habilitado=False),
+        pool=PoolRender(procesos=False, workers=2, max_cola=0),
+    )
+    monkeypatch.setattr(impresion_router, "impresion_lote_service", ImpresionLoteService(servicio))
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    return TestClient(app)
+
+
+def test_lote_zip_por_fechas_incluye_cada_ride_y_reporta_fallidos(monkeypatch):
+    engine = _build_test_engine()
+    hoy = date.today()
+    _crear_facturas(
+        engine,
+        [
+            (hoy, "0102030401", EstadoDocumentoElectronico.AUTORIZADO),
+            (hoy, "0102030402", EstadoDocumentoElectronico.AUTORIZADO),
+            (hoy, "0102030403", EstadoDocumentoElectronico.AUTORIZADO),
+            (hoy, "0102030404", EstadoDocumentoElectronico.RECIBIDO),
+            (hoy - timedelta(days=3), "0102030405", EstadoDocumentoElectronico.AUTORIZADO),
+        ],
+    )
+    try:
+        # Cinco documentos contra un pool sin cola: el lote espera cupo en lugar de recibir 503.
+        with _cliente(engine, monkeypatch, _StrategyFallaCon("0102030403")) as client:
+            response = client.post(
+                "/api/v1/impresion/lote",
+                json={"fecha_desde": hoy.isoformat(), "fecha_hasta": hoy.isoformat()},
+            )
+
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/zip"
+        assert "attachment" in response.headers["content-disposition"]
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archivo_zip:
+            nombres = sorted(archivo_zip.namelist())
+            assert nombres == [
+                "errores.txt",
+                f"ride-{'0102030401'.rjust(49, '0')}.pdf",
+                f"ride-{'0102030402'.rjust(49, '0')}.pdf",
+            ]
+            for nombre in nombres[1:]:
+                assert archivo_zip.read(nombre).startswith(b"%PDF-")
+            assert "0102030403" in archivo_zip.read("errores.txt").decode()
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+
+def test_lote_por_ids_valida_estado_y_existencia(monkeypatch):
+    engine = _build_test_engine()
+    autorizado, recibido = _crear_facturas(
+        engine,
+        [
+            (date.today(), "0102030401", EstadoDocumentoElectronico.AUTORIZADO),
+            (date.today(), "0102030402", EstadoDocumentoElectronico.RECIBIDO),
+        ],
+    )
+    try:
+        with _cliente(engine, monkeypatch, _StrategyFallaCon()) as client:
+            no_autorizado = client.post(
+                "/api/v1/impresion/lote",
+                json={"documento_ids": [str(autorizado), str(recibido)]},
+            )
+            ambos_criterios = client.post(
+                "/api/v1/impresion/lote",
+                json={"documento_ids": [str(autorizado)], "fecha_desde": date.today().isoformat()},
+            )
+            duplicado = client.post(
+                "/api/v1/impresion/lote",
+                json={"documento_ids": [str(autorizado), str(autorizado)]},
+            )
+
+        assert no_autorizado.status_code == 400
+        assert str(recibido) in no_autorizado.json()["detail"]
+        assert ambos_criterios.status_code == 422
+        assert duplicado.status_code == 200, duplicado.text
+        with zipfile.ZipFile(io.BytesIO(duplicado.content)) as archivo_zip:
+            assert len(archivo_zip.namelist()) == 1
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+
+def test_lote_rechaza_formato_pdf(monkeypatch):
+    engine = _build_test_engine()
+    (documento_id,) = _crear_facturas(engine, [(date.today(), "0102030401", EstadoDocumentoElectronico.AUTORIZADO)])
+    try:
+        with _cliente(engine, monkeypatch, _StrategyFallaCon()) as client:
+            response = client.post(
+                "/api/v1/impresion/lote",
+                json={"documento_ids": [str(documento_id)], "formato": "PDF"},
+            )
+
+        assert response.status_code == 422
+    finally:
+        app.dependency_overrides.pop(get_session, None)
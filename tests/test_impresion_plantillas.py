@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from osiris.modules.impresion import plantillas
+from osiris.modules.impresion.strategies.ticket_termico_strategy import TicketTermicoStrategy
+
+
+@pytest.fixture(autouse=True)
+def _cache_limpia():
+    plantillas.limpiar_cache_plantillas()
+    yield
+    plantillas.limpiar_cache_plantillas()
+
+
+def _settings(tmp_path, *, environment: str = "production", bytecode: bool = False):
+    return SimpleNamespace(
+        ENVIRONMENT=environment,
+        IMPRESION_PLANTILLAS_BYTECODE_DIR=tmp_path / "bytecode" if bytecode else None,
+    )
+
+
+def test_entorno_compartido_compila_la_plantilla_una_sola_vez(tmp_path, monkeypatch):
+    monkeypatch.setattr(plantillas, "get_settings", lambda: _settings(tmp_path, bytecode=True))
+    templates_dir = tmp_path / "templates"
+    templates_dir.mkdir()
+    (templates_dir / "ticket_termico_80mm.html").write_text("<p>{{ total }}</p>", encoding="utf-8")
+
+    entorno = plantillas.obtener_entorno(templates_dir)
+    assert plantillas.obtener_entorno(templates_dir / ".") is entorno
+    assert entorno.auto_reload is False
+
+    lecturas = []
+    get_source = entorno.loader.get_source
+    entorno.loader.get_source = lambda env, nombre: lecturas.append(nombre) or get_source(env, nombre)
+
+    strategy = TicketTermicoStrategy(templates_dir)
+    assert strategy.render_ticket_html({"total": "1.00"}) == "<p>1.00</p>"
+    assert TicketTermicoStrategy(templates_dir).render_ticket_html({"total": "<b>"}) == "<p>&lt;b&gt;</p>"
+    assert lecturas == ["ticket_termico_80mm.html"]
+    assert list((tmp_path / "bytecode").iterdir())
+
+    with pytest.raises(FileNotFoundError, match="plantilla térmica"):
+        strategy.render_ticket_html({}, ancho="58mm")
+
+
+def test_development_recarga_plantillas_modificadas(tmp_path, monkeypatch):
+    monkeypatch.setattr(plantillas, "get_settings", lambda: _settings(tmp_path, environment="development"))
+    (tmp_path / "ride.html").write_text("v1", encoding="utf-8")
+
+    assert plantillas.renderizar_plantilla(tmp_path, "ride.html", {}) == "v1"
+    assert plantillas.obtener_entorno(tmp_path).auto_reload is True
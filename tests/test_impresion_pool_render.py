@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from osiris.core.observability import METRICS
+from osiris.modules.impresion.services.pool_render import PoolRender
+from osiris.modules.impresion.strategies.render_strategy import RenderStrategy
+from osiris.modules.impresion.strategies.ride_a4_strategy import RideA4Strategy
+
+
+class _StrategyBloqueada(RenderStrategy):
+    def __init__(self) -> None:
+        self.iniciado = threading.Event()
+        self.liberar = threading.Event()
+
+    def render_pdf(self, html_content: str) -> bytes:
+        self.iniciado.set()
+        self.liberar.wait(5)
+        return b"%PDF-" + html_content.encode()
+
+
+def test_pool_rechaza_con_503_al_saturarse_y_libera_el_cupo_tras_el_timeout():
+    pool = PoolRender(workers=1, max_cola=0, timeout_segundos=0.05, procesos=False)
+    strategy = _StrategyBloqueada()
+    try:
+        with pytest.raises(HTTPException) as timeout:
+            pool.render_pdf(strategy, "lento")
+        assert timeout.value.status_code == 503
+        assert strategy.iniciado.is_set()
+        # El render que excedió el tiempo sigue ocupando su cupo hasta terminar.
+        assert pool.pendientes() == 1
+
+        with pytest.raises(HTTPException) as saturado:
+            pool.render_pdf(strategy, "rechazado")
+        assert saturado.value.status_code == 503
+        assert saturado.value.headers == {"Retry-After": "5"}
+
+        strategy.liberar.set()
+        limite = time.monotonic() + 5
+        while pool.pendientes():
+            assert time.monotonic() < limite
+            time.sleep(0.01)
+        assert pool.render_pdf(strategy, "ok") == b"%PDF-ok"
+    finally:
+        strategy.liberar.set()
+        pool.detener()
+
+    metricas = METRICS.render_prometheus()
+    assert 'osiris_impresion_render_total{resultado="saturado"}' in metricas
+    assert "osiris_impresion_render_duracion_seconds_count" in metricas
+
+
+def test_pool_de_procesos_renderiza_fuera_del_proceso_de_la_api():
+    pool = PoolRender(workers=1, max_cola=1, timeout_segundos=60, procesos=True)
+    try:
+        pdf = pool.render_pdf(RideA4Strategy(), "<html><body>RIDE en pool</body></html>")
+    finally:
+        pool.detener()
+    assert pdf.startswith(b"%PDF-")
+    assert pool.pendientes() == 0
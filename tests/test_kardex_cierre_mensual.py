@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from osiris.modules.common.audit_log.entity import AuditLog
+from osiris.modules.common.empresa.entity import Empresa
+from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.inventario.bodega.entity import Bodega
+from osiris.modules.inventario.casa_comercial.entity import CasaComercial
+from osiris.modules.inventario.movimientos.models import (
+    EstadoMovimientoInventario,
+    InventarioStock,
+    KardexCierreMensual,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.schemas import MovimientoInventarioCreate
+from osiris.modules.inventario.movimientos.services.cierre_kardex_service import CierreKardexService
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.producto.entity import Producto
+from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
+
+
+def _build_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            TipoContribuyente.__table__,
+            Empresa.__table__,
+            Sucursal.__table__,
+            Bodega.__table__,
+            CasaComercial.__table__,
+            Producto.__table__,
+            AuditLog.__table__,
+            MovimientoInventario.__table__,
+            MovimientoInventarioDetalle.__table__,
+            InventarioStock.__table__,
+            KardexCierreMensual.__table__,
+        ],
+    )
+    return engine
+
+
+def _seed(session: Session):
+    session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+    empresa = Empresa(
+        razon_social="Empresa Cierre",
+        nombre_comercial="Empresa Cierre",
+        ruc="1790012345001",
+        direccion_matriz="Av. Quito",
+        telefono="022345678",
+        obligado_contabilidad=True,
+        regimen="GENERAL",
+        modo_emision="ELECTRONICO",
+        tipo_contribuyente_id="01",
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(empresa)
+    session.flush()
+    bodega = Bodega(
+        codigo_bodega="BOD-CIERRE",
+        nombre_bodega="Bodega Cierre",
+        empresa_id=empresa.id,
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    producto = Producto(
+        nombre="Producto Cierre",
+        tipo="BIEN",
+        pvp=Decimal("10.00"),
+        cantidad=Decimal("0.0000"),
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(bodega)
+    session.add(producto)
+    session.commit()
+    return bodega.id, producto.id
+
+
+def _confirmar(service, session, *, bodega_id, producto_id, fecha, tipo, cantidad, costo):
+    movimiento = service.crear_movimiento_borrador(
+        session,
+        MovimientoInventarioCreate(
+            fecha=fecha,
+            bodega_id=bodega_id,
+            tipo_movimiento=tipo,
+            referencia_documento=f"{tipo.value}-{fecha.isoformat()}",
+            usuario_auditoria="tester",
+            detalles=[{"producto_id": producto_id, "cantidad": cantidad, "costo_unitario": costo}],
+        ),
+    )
+    return service.confirmar_movimiento(session, movimiento.id)
+
+
+def _cierre(session, *, bodega_id, producto_id, fecha_corte):
+    return session.exec(
+        select(KardexCierreMensual).where(
+            KardexCierreMensual.bodega_id == bodega_id,
+            KardexCierreMensual.producto_id == producto_id,
+            KardexCierreMensual.fecha_corte == fecha_corte,
+        )
+    ).one()
+
+
+def _saldo_historial(session, *, bodega_id, producto_id, hasta):
+    saldo = Decimal("0.0000")
+    filas = session.exec(
+        select(MovimientoInventario.tipo_movimiento, MovimientoInventarioDetalle.cantidad)
+        .join(MovimientoInventarioDetalle, MovimientoInventarioDetalle.movimiento_inventario_id == MovimientoInventario.id)
+        .where(
+            MovimientoInventario.bodega_id == bodega_id,
+            MovimientoInventario.estado == EstadoMovimientoInventario.CONFIRMADO,
+            MovimientoInventarioDetalle.producto_id == producto_id,
+            MovimientoInventario.fecha <= hasta,
+        )
+    ).all()
+    for tipo, cantidad in filas:
+        if tipo in {TipoMovimientoInventario.EGRESO, TipoMovimientoInventario.TRANSFERENCIA}:
+            saldo -= Decimal(str(cantidad))
+        else:
+            saldo += Decimal(str(cantidad))
+    return saldo.quantize(Decimal("0.0001"))
+
+
+def test_cierre_mensual_materializa_saldo_y_kardex_parte_del_cierre():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+    cierre_service = CierreKardexService()
+
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed(session)
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 10),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("10.0000"), costo=Decimal("5.0000"),
+        )
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 20),
+            tipo=TipoMovimientoInventario.EGRESO, cantidad=Decimal("3.0000"), costo=Decimal("0"),
+        )
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 2, 5),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("5.0000"), costo=Decimal("8.0000"),
+        )
+
+        cortes = cierre_service.cerrar_periodo(session, anio=2025, mes=1)
+        assert cortes == [date(2025, 1, 31)]
+
+        cierre_enero = _cierre(session, bodega_id=bodega_id, producto_id=producto_id, fecha_corte=date(2025, 1, 31))
+        assert cierre_enero.saldo_cantidad == Decimal("7.0000")
+        assert cierre_enero.saldo_valor == Decimal("35.0000")
+        assert cierre_enero.costo_promedio == Decimal("5.0000")
+
+        kardex = service.obtener_kardex(
+            session, producto_id=producto_id, bodega_id=bodega_id, fecha_inicio=date(2025, 2, 1)
+        )
+        assert kardex["saldo_inicial"] == Decimal("7.0000")
+        assert kardex["movimientos"][0]["saldo_cantidad"] == Decimal("12.0000")
+
+        # El saldo inicial parte del cierre: no vuelve a recorrer enero.
+        cierre_enero.saldo_cantidad = Decimal("100.0000")
+        session.add(cierre_enero)
+        session.commit()
+        kardex = service.obtener_kardex(
+            session, producto_id=producto_id, bodega_id=bodega_id, fecha_inicio=date(2025, 2, 10)
+        )
+        assert kardex["saldo_inicial"] == Decimal("105.0000")
+
+
+def test_movimientos_en_periodo_cerrado_recalculan_el_cierre():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+    cierre_service = CierreKardexService()
+
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed(session)
+        ingreso = _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 10),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("10.0000"), costo=Decimal("5.0000"),
+        )
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 2, 3),
+            tipo=TipoMovimientoInventario.EGRESO, cantidad=Decimal("1.0000"), costo=Decimal("0"),
+        )
+        cortes = cierre_service.cerrar_periodos_pendientes(session)
+        assert cortes[:2] == [date(2025, 1, 31), date(2025, 2, 28)]
+
+        # Confirmación con fecha retroactiva dentro de enero ya cerrado.
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 25),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("4.0000"), costo=Decimal("5.0000"),
+        )
+        assert _cierre(
+            session, bodega_id=bodega_id, producto_id=producto_id, fecha_corte=date(2025, 1, 31)
+        ).saldo_cantidad == Decimal("14.0000")
+        assert _cierre(
+            session, bodega_id=bodega_id, producto_id=producto_id, fecha_corte=date(2025, 2, 28)
+        ).saldo_cantidad == Decimal("13.0000")
+
+        service.anular_movimiento(session, ingreso.id, motivo="Ingreso duplicado", usuario_autorizador="tester")
+
+        for fecha_corte in (date(2025, 1, 31), date(2025, 2, 28)):
+            cierre = _cierre(session, bodega_id=bodega_id, producto_id=producto_id, fecha_corte=fecha_corte)
+            assert cierre.saldo_cantidad == _saldo_historial(
+                session, bodega_id=bodega_id, producto_id=producto_id, hasta=fecha_corte
+            )
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from osiris.core.db import get_session
+from osiris.main import app
+from osiris.modules.common.audit_log.entity import AuditLog
+from osiris.modules.common.empresa.entity import Empresa
+from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.inventario.bodega.entity import Bodega
+from osiris.modules.inventario.casa_comercial.entity import CasaComercial
+from osiris.modules.inventario.movimientos.models import (
+    InventarioStock,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.schemas import MovimientoInventarioCreate
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.producto.entity import Producto
+from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
+
+
+def _build_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            TipoContribuyente.__table__,
+            Empresa.__table__,
+            Sucursal.__table__,
+            Bodega.__table__,
+            CasaComercial.__table__,
+            Producto.__table__,
+            AuditLog.__table__,
+            MovimientoInventario.__table__,
+            MovimientoInventarioDetalle.__table__,
+            InventarioStock.__table__,
+        ],
+    )
+    return engine
+
+
+def _seed_kardex(session: Session):
+    session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+    empresa = Empresa(
+        razon_social="Empresa Kardex Stream",
+        nombre_comercial="Empresa Kardex Stream",
+        ruc="1790012345001",
+        direccion_matriz="Av. Quito",
+        telefono="022345678",
+        obligado_contabilidad=True,
+        regimen="GENERAL",
+        modo_emision="ELECTRONICO",
+        tipo_contribuyente_id="01",
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(empresa)
+    session.flush()
+    bodega = Bodega(
+        codigo_bodega="BOD-STREAM",
+        nombre_bodega="Bodega Stream",
+        empresa_id=empresa.id,
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    producto = Producto(
+        nombre="Producto Stream",
+        tipo="BIEN",
+        pvp=Decimal("10.00"),
+        cantidad=Decimal("0.0000"),
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(bodega)
+    session.add(producto)
+    session.commit()
+
+    service = MovimientoInventarioService()
+    for fecha, tipo, cantidad, costo in (
+        (date(2025, 3, 1), TipoMovimientoInventario.INGRESO, Decimal("10.0000"), Decimal("2.5000")),
+        (date(2025, 3, 2), TipoMovimientoInventario.EGRESO, Decimal("4.0000"), Decimal("0")),
+        (date(2025, 3, 3), TipoMovimientoInventario.INGRESO, Decimal("3.0000"), Decimal("3.3333")),
+    ):
+        movimiento = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                fecha=fecha,
+                bodega_id=bodega.id,
+                tipo_movimiento=tipo,
+                referencia_documento=f"{tipo.value}-{fecha.isoformat()}",
+                usuario_auditoria="tester",
+                detalles=[{"producto_id": producto.id, "cantidad": cantidad, "costo_unitario": costo}],
+            ),
+        )
+        service.confirmar_movimiento(session, movimiento.id)
+    return bodega.id, producto.id
+
+
+def _client_con_session(engine):
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    return TestClient(app)
+
+
+def test_kardex_calcula_saldos_en_base_de_datos():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed_kardex(session)
+        kardex = service.obtener_kardex(
+            session,
+            producto_id=producto_id,
+            bodega_id=bodega_id,
+            fecha_inicio=date(2025, 3, 2),
+        )
+
+    assert kardex["saldo_inicial"] == Decimal("10.0000")
+    assert [fila["saldo_cantidad"] for fila in kardex["movimientos"]] == [Decimal("6.0000"), Decimal("9.0000")]
+    assert kardex["movimientos"][0]["cantidad_salida"] == Decimal("4.0000")
+    assert kardex["movimientos"][0]["costo_unitario_aplicado"] == Decimal("2.5000")
+    assert kardex["movimientos"][0]["valor_movimiento"] == Decimal("10.0000")
+    assert kardex["movimientos"][1]["valor_movimiento"] == Decimal("9.9999")
+
+
+def test_kardex_se_transmite_como_ndjson_y_csv():
+    engine = _build_test_engine()
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed_kardex(session)
+
+    params = {"producto_id": str(producto_id), "bodega_id": str(bodega_id)}
+    try:
+        with _client_con_session(engine) as client:
+            ndjson = client.get("/api/v1/inventarios/kardex", params={**params, "formato": "ndjson"})
+            csv_response = client.get("/api/v1/inventarios/kardex", params={**params, "formato": "csv"})
+            json_response = client.get("/api/v1/inventarios/kardex", params=params)
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+    assert ndjson.status_code == 200, ndjson.text
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    filas = [json.loads(linea) for linea in ndjson.text.splitlines()]
+    assert [fila["saldo_cantidad"] for fila in filas] == ["10.0000", "6.0000", "9.0000"]
+    assert [fila["tipo_movimiento"] for fila in filas] == ["INGRESO", "EGRESO", "INGRESO"]
+
+    assert csv_response.status_code == 200, csv_response.text
+    assert "attachment" in csv_response.headers["content-disposition"]
+    filas_csv = list(csv.DictReader(io.StringIO(csv_response.text)))
+    assert [fila["saldo_cantidad"] for fila in filas_csv] == ["10.0000", "6.0000", "9.0000"]
+    assert filas_csv[1]["cantidad_salida"] == "4.0000"
+
+    assert json_response.status_code == 200, json_response.text
+    assert len(json_response.json()["movimientos"]) == 3
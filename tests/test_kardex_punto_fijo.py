@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import random
+from datetime import date
+from decimal import Decimal
+
+from sqlmodel import Session, select
+
+from osiris.modules.inventario.movimientos.models import (
+    InventarioStock,
+    MovimientoInventarioDetalle,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.movimientos.services.recalculo_kardex_service import RecalculoKardexService
+from osiris.modules.inventario.movimientos.strategies.calculo_kardex_strategy import CalculoKardexStrategy, q4
+from osiris.modules.inventario.movimientos.strategies.kardex_punto_fijo import (
+    LineaKardexPuntoFijo,
+    RecalculoKardexPuntoFijo,
+    a_punto_fijo,
+    desde_punto_fijo,
+    dividir_half_up,
+    multiplicar,
+)
+from tests.test_kardex_cierre_mensual import _build_test_engine, _confirmar, _seed
+
+
+def _kardex_decimal(lineas):
+    """Referencia: la misma recurrencia que _aplicar_detalles_en_lote, fila por fila en Decimal."""
+    estrategia = CalculoKardexStrategy()
+    saldos = {}
+    filas = []
+    for grupo, es_egreso, cantidad, costo in lineas:
+        cantidad_actual, costo_actual, valor_actual = saldos.get(
+            grupo, (Decimal("0.0000"), Decimal("0.0000"), Decimal("0.0000"))
+        )
+        if es_egreso:
+            costo_linea = estrategia.congelar_costo_egreso(costo_actual)
+            cantidad_nueva, costo_nuevo = q4(cantidad_actual - cantidad), costo_actual
+            valor_nuevo = q4(valor_actual - q4(cantidad * costo_linea))
+        else:
+            costo_nuevo = estrategia.calcular_nuevo_costo_promedio(
+                cantidad_actual=cantidad_actual,
+                costo_promedio_actual=costo_actual,
+                cantidad_ingresada=cantidad,
+                costo_nuevo=costo,
+            )
+            cantidad_nueva = q4(cantidad_actual + cantidad)
+            valor_nuevo = q4(valor_actual + q4(cantidad * costo))
+        saldos[grupo] = (cantidad_nueva, costo_nuevo, valor_nuevo)
+        filas.append((cantidad_nueva, valor_nuevo, costo_nuevo))
+    return filas
+
+
+def test_division_half_up_igual_a_decimal():
+    for numerador, denominador in [(5, 10), (15, 10), (-5, 10), (-15, 10), (25, -10), (1, 3), (2, 3), (-2, 3)]:
+        esperado = (Decimal(numerador) / Decimal(denominador)).quantize(Decimal("1"), rounding="ROUND_HALF_UP")
+        assert dividir_half_up(numerador, denominador) == int(esperado)
+    # 0.00005 * 1 -> 0.0001 con ROUND_HALF_UP.
+    assert multiplicar(a_punto_fijo("0.0001"), a_punto_fijo("0.5000")) == 1
+    assert desde_punto_fijo(a_punto_fijo("12.34565")) == Decimal("12.3457")
+
+
+def test_recalculo_punto_fijo_equivale_a_decimal_en_historial_aleatorio():
+    aleatorio = random.Random(20250101)
+    lineas = []
+    existencias = {"A": Decimal("0"), "B": Decimal("0")}
+    for _ in range(2000):
+        grupo = aleatorio.choice(["A", "B"])
+        cantidad = Decimal(aleatorio.randint(1, 500_000)).scaleb(-4)
+        if existencias[grupo] >= cantidad and aleatorio.random() < 0.45:
+            lineas.append((grupo, True, cantidad, Decimal("0.0000")))
+            existencias[grupo] -= cantidad
+        else:
+            costo = Decimal(aleatorio.randint(1, 9_999_999)).scaleb(-4)
+            lineas.append((grupo, False, cantidad, costo))
+            existencias[grupo] += cantidad
+    ordenadas = sorted(lineas, key=lambda linea: linea[0])
+
+    esperado = _kardex_decimal(ordenadas)
+    resultado = RecalculoKardexPuntoFijo().recalcular(
+        [
+            LineaKardexPuntoFijo(grupo=grupo, es_egreso=es_egreso, cantidad=a_punto_fijo(cantidad), costo_unitario=a_punto_fijo(costo))
+            for grupo, es_egreso, cantidad, costo in ordenadas
+        ]
+    )
+
+    assert not resultado.grupos_inconsistentes
+    obtenido = [
+        (desde_punto_fijo(cantidad), desde_punto_fijo(valor), desde_punto_fijo(costo))
+        for cantidad, valor, costo in zip(resultado.saldo_cantidad, resultado.saldo_valor, resultado.costo_promedio)
+    ]
+    assert obtenido == esperado
+    assert desde_punto_fijo(resultado.saldos["A"].valor) == [f for f, g in zip(esperado, ordenadas) if g[0] == "A"][-1][1]
+
+
+def test_recalculo_marca_grupo_con_saldo_negativo():
+    resultado = RecalculoKardexPuntoFijo().recalcular(
+        [
+            LineaKardexPuntoFijo(grupo="A", es_egreso=False, cantidad=10_000, costo_unitario=50_000),
+            LineaKardexPuntoFijo(grupo="A", es_egreso=True, cantidad=20_000, costo_unitario=0),
+        ]
+    )
+    assert "A" in resultado.grupos_inconsistentes
+
+
+def test_reconstruccion_restaura_saldos_alterados():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed(session)
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 10),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("3.0000"), costo=Decimal("1.3333"),
+        )
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 11),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("7.0000"), costo=Decimal("2.1111"),
+        )
+        egreso = _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 12),
+            tipo=TipoMovimientoInventario.EGRESO, cantidad=Decimal("4.0000"), costo=Decimal("0"),
+        )
+        service.anular_movimiento(session, egreso.id, motivo="error")
+
+        originales = {
+            detalle.id: (detalle.saldo_cantidad, detalle.saldo_valor, detalle.costo_promedio_saldo)
+            for detalle in session.exec(select(MovimientoInventarioDetalle)).all()
+        }
+        stock = session.exec(select(InventarioStock)).one()
+        ledger_original = (stock.kardex_saldo_cantidad, stock.kardex_saldo_valor)
+
+        for detalle in session.exec(select(MovimientoInventarioDetalle)).all():
+            detalle.saldo_cantidad = Decimal("999.0000")
+            detalle.saldo_valor = Decimal("999.0000")
+            session.add(detalle)
+        stock.kardex_saldo_valor = Decimal("0.0000")
+        session.add(stock)
+        session.commit()
+
+        resumen = RecalculoKardexService().reconstruir(session, bodega_id=bodega_id)
+
+        assert resumen["lineas_recalculadas"] == 4
+        assert resumen["pares_recalculados"] == 1
+        assert resumen["egresos_con_costo_divergente"] == 0
+        assert resumen["pares_inconsistentes"] == []
+        restaurados = {
+            detalle.id: (detalle.saldo_cantidad, detalle.saldo_valor, detalle.costo_promedio_saldo)
+            for detalle in session.exec(select(MovimientoInventarioDetalle)).all()
+        }
+        assert restaurados == originales
+        stock = session.exec(select(InventarioStock)).one()
+        assert (stock.kardex_saldo_cantidad, stock.kardex_saldo_valor) == ledger_original
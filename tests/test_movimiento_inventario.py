@@ -5,6 +5,7 @@ from decimal import Decimal
 
 import pytest
 from pydantic import ValidationError
+from sqlalchemy import event
 from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, SQLModel, create_engine, select
 
@@ -20,9 +21,13 @@ from osiris.modules.inventario.movimientos.models import (
     MovimientoInventarioDetalle,
     TipoMovimientoInventario,
 )
-from osiris.modules.inventario.movimientos.schemas import MovimientoInventarioCreate, TransferenciaInventarioCreate
+from osiris.modules.inventario.movimientos.schemas import (
+    MovimientoInventarioCreate,
+    TransferenciaInventarioCreate,
+    TransferenciaInventarioLoteCreate,
+)
 from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
-from osiris.modules.inventario.producto.entity import Producto
+from osiris.modules.inventario.producto.entity import Producto, ProductoBodega
 from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
 
 
@@ -558,6 +563,145 @@ def test_transferencia_entre_bodegas_actualiza_stock_origen_destino():
         assert stock_destino_post.cantidad_actual == Decimal("10.0000")
 
 
+def test_transferencia_en_lote_bloquea_origen_una_vez_y_copia_costos_en_memoria():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+
+    with Session(engine) as session:
+        session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+        empresa = Empresa(
+            razon_social="Empresa Transferencia Lote",
+            nombre_comercial="Empresa Transferencia Lote",
+            ruc="1790012345001",
+            direccion_matriz="Av. Quito",
+            telefono="022345678",
+            obligado_contabilidad=True,
+            regimen="GENERAL",
+            modo_emision="ELECTRONICO",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(empresa)
+        session.flush()
+        bodegas = [
+            Bodega(
+                codigo_bodega=f"BOD-TL-{i}",
+                nombre_bodega=f"Bodega Transferencia Lote {i}",
+                empresa_id=empresa.id,
+                usuario_auditoria="tester",
+                activo=True,
+            )
+            for i in range(4)
+        ]
+        productos = [
+            Producto(
+                nombre=f"Producto Transferencia Lote {i}",
+                tipo="BIEN",
+                pvp=Decimal("10.00"),
+                cantidad=Decimal("0.0000"),
+                usuario_auditoria="tester",
+                activo=True,
+            )
+            for i in range(2)
+        ]
+        session.add_all(bodegas + productos)
+        session.commit()
+        origen, destinos = bodegas[0], bodegas[1:]
+
+        ingreso = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                bodega_id=origen.id,
+                tipo_movimiento=TipoMovimientoInventario.INGRESO,
+                referencia_documento="ING-TL",
+                usuario_auditoria="tester",
+                detalles=[
+                    {"producto_id": productos[0].id, "cantidad": Decimal("30.0000"), "costo_unitario": Decimal("4.5000")},
+                    {"producto_id": productos[1].id, "cantidad": Decimal("9.0000"), "costo_unitario": Decimal("2.0000")},
+                ],
+            ),
+        )
+        service.confirmar_movimiento(session, ingreso.id)
+
+        sentencias: list[str] = []
+
+        def _capturar(_conn, _cursor, statement, *_args):
+            sentencias.append(statement.lower())
+
+        event.listen(engine, "before_cursor_execute", _capturar)
+        try:
+            result = service.transferir_en_lote(
+                session,
+                TransferenciaInventarioLoteCreate(
+                    bodega_origen_id=origen.id,
+                    referencia_documento="TRF-LOTE",
+                    usuario_auditoria="tester",
+                    destinos=[
+                        {
+                            "bodega_destino_id": destino.id,
+                            "detalles": [
+                                {"producto_id": productos[0].id, "cantidad": Decimal("5.0000")},
+                                {"producto_id": productos[1].id, "cantidad": Decimal("3.0000")},
+                            ],
+                        }
+                        for destino in destinos
+                    ],
+                ),
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", _capturar)
+
+        # Todos los borradores (1 egreso + 3 ingresos) se insertan juntos y el
+        # egreso no se relee para copiar costos.
+        assert len([sql for sql in sentencias if sql.startswith("insert into tbl_movimiento_inventario ")]) == 1
+        assert len([sql for sql in sentencias if sql.startswith("insert into tbl_movimiento_inventario_detalle")]) == 1
+        assert not [
+            sql for sql in sentencias
+            if sql.startswith("select") and "from tbl_movimiento_inventario_detalle" in sql
+        ]
+
+        assert [destino.referencia_documento for destino in result.destinos] == [
+            "TRF-LOTE:DESTINO:1",
+            "TRF-LOTE:DESTINO:2",
+            "TRF-LOTE:DESTINO:3",
+        ]
+        egreso_detalles = session.exec(
+            select(MovimientoInventarioDetalle).where(
+                MovimientoInventarioDetalle.movimiento_inventario_id == result.movimiento_egreso_id
+            )
+        ).all()
+        assert sorted(detalle.cantidad for detalle in egreso_detalles) == [Decimal("9.0000"), Decimal("15.0000")]
+
+        stocks = {
+            (stock.bodega_id, stock.producto_id): stock
+            for stock in session.exec(select(InventarioStock)).all()
+        }
+        assert stocks[(origen.id, productos[0].id)].cantidad_actual == Decimal("15.0000")
+        assert stocks[(origen.id, productos[1].id)].cantidad_actual == Decimal("0.0000")
+        for destino in destinos:
+            assert stocks[(destino.id, productos[0].id)].cantidad_actual == Decimal("5.0000")
+            assert stocks[(destino.id, productos[0].id)].costo_promedio_vigente == Decimal("4.5000")
+            assert stocks[(destino.id, productos[1].id)].costo_promedio_vigente == Decimal("2.0000")
+        session.refresh(productos[0])
+        assert productos[0].cantidad == Decimal("30.0000")
+
+        with pytest.raises(ValueError, match="stock negativo"):
+            service.transferir_en_lote(
+                session,
+                TransferenciaInventarioLoteCreate(
+                    bodega_origen_id=origen.id,
+                    destinos=[
+                        {
+                            "bodega_destino_id": destino.id,
+                            "detalles": [{"producto_id": productos[0].id, "cantidad": Decimal("8.0000")}],
+                        }
+                        for destino in destinos[:2]
+                    ],
+                ),
+            )
+
+
 def test_anular_movimiento_confirmado_reversa_stock():
     engine = _build_test_engine()
     service = MovimientoInventarioService()
@@ -640,3 +784,409 @@ def test_anular_movimiento_confirmado_reversa_stock():
             )
         ).one()
         assert stock_post_anulacion.cantidad_actual == Decimal("0.0000")
+
+
+def test_confirmacion_en_lote_bloquea_y_actualiza_stock_con_sentencias_constantes():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+
+    with Session(engine) as session:
+        tipo_contribuyente = TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True)
+        session.add(tipo_contribuyente)
+        empresa = Empresa(
+            razon_social="Empresa Lote",
+            nombre_comercial="Empresa Lote",
+            ruc="1790012345001",
+            direccion_matriz="Av. Quito",
+            telefono="022345678",
+            obligado_contabilidad=True,
+            regimen="GENERAL",
+            modo_emision="ELECTRONICO",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(empresa)
+        session.flush()
+        bodega = Bodega(
+            codigo_bodega="BOD-LOTE",
+            nombre_bodega="Bodega Lote",
+            empresa_id=empresa.id,
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(bodega)
+        productos = [
+            Producto(
+                nombre=f"Producto Lote {i}",
+                tipo="BIEN",
+                pvp=Decimal("10.00"),
+                cantidad=Decimal("0.0000"),
+                usuario_auditoria="tester",
+                activo=True,
+            )
+            for i in range(12)
+        ]
+        session.add_all(productos)
+        session.commit()
+
+        ingreso = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                bodega_id=bodega.id,
+                tipo_movimiento=TipoMovimientoInventario.INGRESO,
+                referencia_documento="ING-LOTE-1",
+                usuario_auditoria="tester",
+                detalles=[
+                    {"producto_id": producto.id, "cantidad": Decimal("10.0000"), "costo_unitario": Decimal("10.0000")}
+                    for producto in productos
+                ],
+            ),
+        )
+        service.confirmar_movimiento(session, ingreso.id)
+
+        # Producto repetido: el promedio ponderado debe acumularse línea a línea.
+        segundo_ingreso = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                bodega_id=bodega.id,
+                tipo_movimiento=TipoMovimientoInventario.INGRESO,
+                referencia_documento="ING-LOTE-2",
+                usuario_auditoria="tester",
+                detalles=[
+                    {"producto_id": productos[0].id, "cantidad": Decimal("10.0000"), "costo_unitario": Decimal("20.0000")},
+                    {"producto_id": productos[0].id, "cantidad": Decimal("20.0000"), "costo_unitario": Decimal("5.0000")},
+                ]
+                + [
+                    {"producto_id": producto.id, "cantidad": Decimal("1.0000"), "costo_unitario": Decimal("10.0000")}
+                    for producto in productos[1:]
+                ],
+            ),
+        )
+
+        sentencias_stock: list[str] = []
+
+        def _capturar(_conn, _cursor, statement, *_args):
+            sql = statement.lower()
+            if "tbl_inventario_stock" in sql and (sql.startswith("update") or "for update" in sql):
+                sentencias_stock.append(sql)
+
+        event.listen(engine, "before_cursor_execute", _capturar)
+        try:
+            service.confirmar_movimiento(session, segundo_ingreso.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", _capturar)
+
+        assert len([sql for sql in sentencias_stock if sql.startswith("update tbl_inventario_stock")]) == 1
+
+        stock = session.exec(
+            select(InventarioStock).where(
+                InventarioStock.bodega_id == bodega.id,
+                InventarioStock.producto_id == productos[0].id,
+            )
+        ).one()
+        assert stock.cantidad_actual == Decimal("40.0000")
+        assert stock.costo_promedio_vigente == Decimal("10.0000")
+
+        egreso = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                bodega_id=bodega.id,
+                tipo_movimiento=TipoMovimientoInventario.EGRESO,
+                referencia_documento="EGR-LOTE-1",
+                usuario_auditoria="tester",
+                detalles=[
+                    {"producto_id": productos[0].id, "cantidad": Decimal("30.0000"), "costo_unitario": Decimal("0")},
+                    {"producto_id": productos[0].id, "cantidad": Decimal("11.0000"), "costo_unitario": Decimal("0")},
+                ],
+            ),
+        )
+        with pytest.raises(ValueError, match="stock negativo"):
+            service.confirmar_movimiento(session, egreso.id)
+
+        stock = session.exec(
+            select(InventarioStock).where(
+                InventarioStock.bodega_id == bodega.id,
+                InventarioStock.producto_id == productos[0].id,
+            )
+        ).one()
+        assert stock.cantidad_actual == Decimal("40.0000")
+
+
+def test_confirmacion_materializa_ledger_de_kardex_por_linea():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+
+    with Session(engine) as session:
+        tipo_contribuyente = TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True)
+        session.add(tipo_contribuyente)
+        empresa = Empresa(
+            razon_social="Empresa Ledger",
+            nombre_comercial="Empresa Ledger",
+            ruc="1790012345001",
+            direccion_matriz="Av. Quito",
+            telefono="022345678",
+            obligado_contabilidad=True,
+            regimen="GENERAL",
+            modo_emision="ELECTRONICO",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(empresa)
+        session.flush()
+        bodega = Bodega(
+            codigo_bodega="BOD-LEDGER",
+            nombre_bodega="Bodega Ledger",
+            empresa_id=empresa.id,
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(bodega)
+        producto = Producto(
+            nombre="Producto Ledger",
+            tipo="BIEN",
+            pvp=Decimal("10.00"),
+            cantidad=Decimal("0.0000"),
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(producto)
+        session.commit()
+
+        def _confirmar(tipo, referencia, lineas):
+            movimiento = service.crear_movimiento_borrador(
+                session,
+                MovimientoInventarioCreate(
+                    bodega_id=bodega.id,
+                    tipo_movimiento=tipo,
+                    referencia_documento=referencia,
+                    usuario_auditoria="tester",
+                    detalles=[
+                        {"producto_id": producto.id, "cantidad": cantidad, "costo_unitario": costo}
+                        for cantidad, costo in lineas
+                    ],
+                ),
+            )
+            return service.confirmar_movimiento(session, movimiento.id)
+
+        _confirmar(
+            TipoMovimientoInventario.INGRESO,
+            "ING-LEDGER-1",
+            [(Decimal("10.0000"), Decimal("10.0000")), (Decimal("10.0000"), Decimal("20.0000"))],
+        )
+
+        sentencias: list[str] = []
+
+        def _capturar(_conn, _cursor, statement, *_args):
+            sentencias.append(statement.lower())
+
+        event.listen(engine, "before_cursor_execute", _capturar)
+        try:
+            egreso = _confirmar(TipoMovimientoInventario.EGRESO, "EGR-LEDGER-1", [(Decimal("5.0000"), Decimal("0"))])
+        finally:
+            event.remove(engine, "before_cursor_execute", _capturar)
+
+        # El saldo previo sale de la cabecera del ledger; no se recorre el historial.
+        assert not any(
+            "sum(" in sql and "tbl_movimiento_inventario_detalle" in sql for sql in sentencias
+        )
+
+        read = service.obtener_movimiento_read(session, egreso.id)
+        assert read.detalles[0].saldo_cantidad == Decimal("15.0000")
+        assert read.detalles[0].saldo_valor == Decimal("225.0000")
+        assert read.detalles[0].costo_promedio_saldo == Decimal("15.0000")
+
+        service.anular_movimiento(session, egreso.id, motivo="Error de digitación", usuario_autorizador="tester")
+
+        stock = session.exec(
+            select(InventarioStock).where(
+                InventarioStock.bodega_id == bodega.id,
+                InventarioStock.producto_id == producto.id,
+            )
+        ).one()
+        assert stock.cantidad_actual == Decimal("20.0000")
+        assert stock.kardex_saldo_cantidad == Decimal("20.0000")
+        assert stock.kardex_saldo_valor == Decimal("300.0000")
+
+
+def test_confirmacion_sincroniza_producto_y_producto_bodega_en_lote():
+    engine = _build_test_engine()
+    SQLModel.metadata.create_all(engine, tables=[ProductoBodega.__table__])
+    service = MovimientoInventarioService()
+
+    with Session(engine) as session:
+        session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+        empresa = Empresa(
+            razon_social="Empresa Sync",
+            nombre_comercial="Empresa Sync",
+            ruc="1790012345001",
+            direccion_matriz="Av. Quito",
+            telefono="022345678",
+            obligado_contabilidad=True,
+            regimen="GENERAL",
+            modo_emision="ELECTRONICO",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(empresa)
+        session.flush()
+        bodega = Bodega(
+            codigo_bodega="BOD-SYNC",
+            nombre_bodega="Bodega Sync",
+            empresa_id=empresa.id,
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(bodega)
+        productos = [
+            Producto(
+                nombre=f"Producto Sync {i}",
+                tipo="BIEN",
+                pvp=Decimal("10.00"),
+                cantidad=Decimal("0.0000"),
+                usuario_auditoria="tester",
+                activo=True,
+            )
+            for i in range(5)
+        ]
+        session.add_all(productos)
+        session.flush()
+        # Relación previa inactiva y desactualizada: el upsert debe reutilizarla.
+        session.add(
+            ProductoBodega(
+                producto_id=productos[0].id,
+                bodega_id=bodega.id,
+                cantidad=Decimal("99.0000"),
+                activo=False,
+            )
+        )
+        session.commit()
+
+        ingreso = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                bodega_id=bodega.id,
+                tipo_movimiento=TipoMovimientoInventario.INGRESO,
+                referencia_documento="ING-SYNC-1",
+                usuario_auditoria="tester",
+                detalles=[
+                    {"producto_id": producto.id, "cantidad": Decimal(str(i + 1)), "costo_unitario": Decimal("2.0000")}
+                    for i, producto in enumerate(productos)
+                ],
+            ),
+        )
+
+        sentencias: list[str] = []
+
+        def _capturar(_conn, _cursor, statement, *_args):
+            sql = statement.lower()
+            if "tbl_producto" in sql:
+                sentencias.append(sql)
+
+        event.listen(engine, "before_cursor_execute", _capturar)
+        try:
+            service.confirmar_movimiento(session, ingreso.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", _capturar)
+
+        assert len([sql for sql in sentencias if sql.startswith("update tbl_producto ")]) == 1
+        assert len([sql for sql in sentencias if sql.startswith("insert into tbl_producto_bodega")]) == 1
+        assert not [sql for sql in sentencias if sql.startswith("select") and "tbl_producto_bodega" in sql]
+
+        for i, producto in enumerate(productos):
+            session.refresh(producto)
+            assert producto.cantidad == Decimal(str(i + 1)).quantize(Decimal("0.0001"))
+
+        relaciones = session.exec(
+            select(ProductoBodega)
+            .where(ProductoBodega.bodega_id == bodega.id)
+            .execution_options(include_inactive=True)
+        ).all()
+        assert len(relaciones) == len(productos)
+        por_producto = {relacion.producto_id: relacion for relacion in relaciones}
+        assert por_producto[productos[0].id].activo is True
+        assert por_producto[productos[0].id].cantidad == Decimal("1.0000")
+        assert por_producto[productos[4].id].cantidad == Decimal("5.0000")
+
+
+def test_confirmacion_sincroniza_producto_bodega_por_orm_en_otros_dialectos(monkeypatch):
+    engine = _build_test_engine()
+    SQLModel.metadata.create_all(engine, tables=[ProductoBodega.__table__])
+    service = MovimientoInventarioService()
+
+    with Session(engine) as session:
+        session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+        empresa = Empresa(
+            razon_social="Empresa Dialecto",
+            nombre_comercial="Empresa Dialecto",
+            ruc="1790012345001",
+            direccion_matriz="Av. Quito",
+            telefono="022345678",
+            obligado_contabilidad=True,
+            regimen="GENERAL",
+            modo_emision="ELECTRONICO",
+            tipo_contribuyente_id="01",
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(empresa)
+        session.flush()
+        bodega = Bodega(
+            codigo_bodega="BOD-DIA",
+            nombre_bodega="Bodega Dialecto",
+            empresa_id=empresa.id,
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        session.add(bodega)
+        productos = [
+            Producto(
+                nombre=f"Producto Dialecto {i}",
+                tipo="BIEN",
+                pvp=Decimal("10.00"),
+                cantidad=Decimal("0.0000"),
+                usuario_auditoria="tester",
+                activo=True,
+            )
+            for i in range(2)
+        ]
+        session.add_all(productos)
+        session.flush()
+        session.add(
+            ProductoBodega(
+                producto_id=productos[0].id,
+                bodega_id=bodega.id,
+                cantidad=Decimal("99.0000"),
+                activo=False,
+            )
+        )
+        session.commit()
+
+        ingreso = service.crear_movimiento_borrador(
+            session,
+            MovimientoInventarioCreate(
+                bodega_id=bodega.id,
+                tipo_movimiento=TipoMovimientoInventario.INGRESO,
+                referencia_documento="ING-DIA-1",
+                usuario_auditoria="tester",
+                detalles=[
+                    {"producto_id": producto.id, "cantidad": Decimal("3"), "costo_unitario": Decimal("2.0000")}
+                    for producto in productos
+                ],
+            ),
+        )
+        # Un dialecto sin INSERT ... ON CONFLICT no debe impedir la confirmación.
+        monkeypatch.setattr(engine.dialect, "name", "mssql")
+        service.confirmar_movimiento(session, ingreso.id)
+        monkeypatch.undo()
+
+        relaciones = session.exec(
+            select(ProductoBodega)
+            .where(ProductoBodega.bodega_id == bodega.id)
+            .execution_options(include_inactive=True)
+        ).all()
+        assert len(relaciones) == len(productos)
+        assert all(relacion.activo is True for relacion in relaciones)
+        assert all(relacion.cantidad == Decimal("3.0000") for relacion in relaciones)
@@ -1,19 +1,23 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 
+from sqlalchemy import event, update
 from sqlalchemy.pool import StaticPool
 from sqlmodel import SQLModel, Session, create_engine, select
 
+from osiris.core.observability import METRICS
 from osiris.modules.common.audit_log.entity import AuditLog
 from osiris.modules.common.empresa.entity import Empresa
 from osiris.modules.common.sucursal.entity import Sucursal
 from osiris.modules.sri.core_sri.models import (
+    BlobComprimido,
     CuentaPorCobrar,
     DocumentoElectronico,
     DocumentoElectronicoHistorial,
     DocumentoSriCola,
+    EstadoColaSri,
     EstadoDocumentoElectronico,
     EstadoSriDocumento,
     EstadoVenta,
@@ -26,6 +30,8 @@ from osiris.modules.sri.core_sri.models import (
     VentaEstadoHistorial,
 )
 from osiris.modules.sri.core_sri.all_schemas import q2
+from osiris.modules.sri.facturacion_electronica.services import orquestador_fe_service as orquestador_module
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import guardar_payload_tarea, leer_payload_tarea
 from osiris.modules.ventas.services.venta_service import VentaService
 from osiris.modules.inventario.bodega.entity import Bodega
 from osiris.modules.inventario.casa_comercial.entity import CasaComercial
@@ -64,6 +70,7 @@ def _build_test_engine():
             DocumentoElectronico.__table__,
             DocumentoElectronicoHistorial.__table__,
             DocumentoSriCola.__table__,
+            BlobComprimido.__table__,
             AuditLog.__table__,
         ],
     )
@@ -232,6 +239,119 @@ def test_procesar_documento_cambia_estado():
         assert venta.estado_sri == EstadoSriDocumento.AUTORIZADO
 
 
+def test_procesar_documento_confirma_reclamo_y_resultado_en_dos_transacciones():
+    engine = _build_test_engine()
+    service = VentaService()
+    service.venta_sri_async_service.db_engine = engine
+    service.orquestador_fe_service.db_engine = engine
+    service.orquestador_fe_service.venta_sri_service.db_engine = engine
+    commits: list[str] = []
+    event.listen(engine, "commit", lambda _conn: commits.append("commit"))
+
+    class GatewayVerificaReclamo:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            # El reclamo ya está confirmado y no hay transacción abierta durante el envío.
+            with Session(engine) as session_envio:
+                tarea = session_envio.exec(select(DocumentoSriCola)).one()
+                assert tarea.estado == EstadoColaSri.PROCESANDO
+                assert session_envio.get(DocumentoElectronico, documento_id).estado == EstadoDocumentoElectronico.FIRMADO
+            return {"estado": "AUTORIZADO", "mensaje": "Documento autorizado"}
+
+    with Session(engine) as session:
+        venta = _seed_venta_borrador(session)
+        emitida = service.emitir_venta(
+            session,
+            venta.id,
+            usuario_auditoria="qa.user",
+            encolar_sri=True,
+        )
+        documento_id = session.exec(
+            select(DocumentoElectronico.id).where(DocumentoElectronico.referencia_id == emitida.id)
+        ).one()
+
+    commits.clear()
+    service.orquestador_fe_service.venta_sri_service.correo_service.encolar_envio_factura = lambda _venta_id: None
+    service.orquestador_fe_service.procesar_documento(documento_id, venta_gateway=GatewayVerificaReclamo())
+
+    assert len(commits) == 2
+    metricas = METRICS.render_prometheus()
+    assert 'osiris_fe_etapa_duracion_seconds_count{etapa="persistencia"}' in metricas
+    assert 'osiris_fe_documentos_resultado_total{resultado="AUTORIZADO",tipo="FACTURA"}' in metricas
+    with Session(engine) as session:
+        documento = session.get(DocumentoElectronico, documento_id)
+        assert documento.estado_sri == EstadoDocumentoElectronico.AUTORIZADO
+        assert session.exec(select(DocumentoSriCola)).one().estado == EstadoColaSri.COMPLETADO
+        historial = session.exec(
+            select(DocumentoElectronicoHistorial).where(
+                DocumentoElectronicoHistorial.estado_nuevo == EstadoDocumentoElectronico.AUTORIZADO
+            )
+        ).all()
+        assert len(historial) == 1
+
+
+def test_documento_abandonado_tras_el_reclamo_se_vuelve_a_reclamar():
+    engine = _build_test_engine()
+    service = VentaService()
+    service.venta_sri_async_service.db_engine = engine
+    orquestador = service.orquestador_fe_service
+    orquestador.db_engine = engine
+    orquestador.venta_sri_service.db_engine = engine
+    orquestador.venta_sri_service.correo_service.encolar_envio_factura = lambda _venta_id: None
+
+    class GatewayProcesoTerminado:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            raise RuntimeError("proceso terminado a mitad del envío")
+
+    class GatewayAutorizado:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            return {"estado": "AUTORIZADO", "mensaje": "Documento autorizado"}
+
+    with Session(engine) as session:
+        venta = _seed_venta_borrador(session)
+        emitida = service.emitir_venta(session, venta.id, usuario_auditoria="qa.user", encolar_sri=True)
+        documento_id = session.exec(
+            select(DocumentoElectronico.id).where(DocumentoElectronico.referencia_id == emitida.id)
+        ).one()
+
+    orquestador.venta_sri_service.gateway = GatewayProcesoTerminado()
+    with Session(engine) as session:
+        orquestador.procesar_cola(session, lote_masivo=False, worker_id="w1")
+        documento = session.get(DocumentoElectronico, documento_id)
+        tarea = session.exec(select(DocumentoSriCola)).one()
+        assert documento.estado_sri == EstadoDocumentoElectronico.FIRMADO
+        assert documento.reclamado_por == "w1"
+        assert tarea.estado == EstadoColaSri.PROCESANDO
+        # Mientras el lease esté vigente nadie más lo toma.
+        assert orquestador.reclamar_lote(session, limite=10, lease_seconds=60, worker_id="w2") == []
+
+        # El worker murió hace diez minutos: venció el lease del documento y la tarea quedó sin actualizar.
+        # Core UPDATE: el listener de auditoría sellaría actualizado_en con la hora actual.
+        hace_diez_minutos = datetime.utcnow() - timedelta(minutes=10)
+        session.execute(
+            update(DocumentoElectronico)
+            .where(DocumentoElectronico.id == documento_id)
+            .values(reclamado_hasta=hace_diez_minutos)
+        )
+        session.execute(
+            update(DocumentoSriCola).where(DocumentoSriCola.id == tarea.id).values(actualizado_en=hace_diez_minutos)
+        )
+        session.commit()
+
+    orquestador.venta_sri_service.gateway = GatewayAutorizado()
+    with Session(engine) as session:
+        assert orquestador.procesar_cola(session, lote_masivo=False, worker_id="w2") == 1
+
+    with Session(engine) as session:
+        documento = session.get(DocumentoElectronico, documento_id)
+        tarea = session.exec(select(DocumentoSriCola)).one()
+        assert documento.estado_sri == EstadoDocumentoElectronico.AUTORIZADO
+        assert documento.reclamado_por is None
+        assert (tarea.estado, tarea.intentos_realizados) == (EstadoColaSri.COMPLETADO, 2)
+
+
 def test_retry_backoff_incrementa_tiempo():
     engine = _build_test_engine()
     service = VentaService()
@@ -319,3 +439,139 @@ def test_rechazo_detiene_reintentos():
         assert documento is not None
         assert documento.estado_sri == EstadoDocumentoElectronico.RECHAZADO
         assert documento.next_retry_at is None
+
+
+def _clonar_venta_borrador(session: Session, venta: Venta) -> Venta:
+    detalle = session.exec(select(VentaDetalle).where(VentaDetalle.venta_id == venta.id)).one()
+    copia = Venta(
+        **venta.model_dump(
+            include={
+                "empresa_id",
+                "fecha_emision",
+                "tipo_identificacion_comprador",
+                "identificacion_comprador",
+                "forma_pago",
+                "subtotal_sin_impuestos",
+                "subtotal_12",
+                "subtotal_15",
+                "subtotal_0",
+                "subtotal_no_objeto",
+                "monto_iva",
+                "monto_ice",
+                "valor_total",
+            }
+        ),
+        estado=EstadoVenta.BORRADOR,
+        usuario_auditoria="seed",
+        activo=True,
+    )
+    session.add(copia)
+    session.flush()
+    session.add(
+        VentaDetalle(
+            venta_id=copia.id,
+            producto_id=detalle.producto_id,
+            descripcion=detalle.descripcion,
+            cantidad=detalle.cantidad,
+            precio_unitario=detalle.precio_unitario,
+            descuento=detalle.descuento,
+            subtotal_sin_impuesto=detalle.subtotal_sin_impuesto,
+            usuario_auditoria="seed",
+            activo=True,
+        )
+    )
+    session.commit()
+    return copia
+
+
+def test_lote_masivo_agrupa_facturas_por_ruc_y_distribuye_autorizaciones(monkeypatch):
+    engine = _build_test_engine()
+    service = VentaService()
+    service.venta_sri_async_service.db_engine = engine
+    service.orquestador_fe_service.db_engine = engine
+    service.orquestador_fe_service.venta_sri_service.db_engine = engine
+
+    with Session(engine) as session:
+        venta = _seed_venta_borrador(session)
+        stock = session.exec(select(InventarioStock)).one()
+        stock.cantidad_actual = Decimal("100.0000")
+        session.add(stock)
+        session.commit()
+        ventas = [venta, _clonar_venta_borrador(session, venta), _clonar_venta_borrador(session, venta)]
+        venta_ids = [borrador.id for borrador in ventas]
+        for venta_id in venta_ids:
+            service.emitir_venta(session, venta_id, usuario_auditoria="qa.user", encolar_sri=True)
+        claves: dict = {}
+        for indice, tarea in enumerate(session.exec(select(DocumentoSriCola)).all()):
+            payload = leer_payload_tarea(session, tarea)
+            payload["infoTributaria"]["claveAcceso"] = f"{indice + 1:049d}"
+            guardar_payload_tarea(session, tarea, payload)
+            session.add(tarea)
+            claves[tarea.entidad_id] = payload["infoTributaria"]["claveAcceso"]
+        session.commit()
+
+    clave_rechazada = claves[venta_ids[-1]]
+
+    class FirmadorFalso:
+        def firmar_factura(self, payload: dict) -> bytes:
+            return f"<factura>{payload['infoTributaria']['claveAcceso']}</factura>".encode()
+
+    class TransmisorLote:
+        def __init__(self) -> None:
+            self.lotes: list[tuple[bytes, str, list[str]]] = []
+
+        def transmitir_lote_masivo(self, xml_lote: bytes, clave_lote: str, claves_acceso) -> dict:
+            claves_acceso = list(claves_acceso)
+            self.lotes.append((xml_lote, clave_lote, claves_acceso))
+            # El lote sale con todas sus tareas ya reclamadas y confirmadas.
+            with Session(engine) as session:
+                assert {
+                    (tarea.estado, tarea.intentos_realizados) for tarea in session.exec(select(DocumentoSriCola)).all()
+                } == {(EstadoColaSri.PROCESANDO, 1)}
+            return {
+                clave: (
+                    {"estado": "RECHAZADO", "mensaje": "[65] FECHA EMISION EXTEMPORANEA"}
+                    if clave == clave_rechazada
+                    else {"estado": "AUTORIZADO", "mensaje": "Autorizado en lote."}
+                )
+                for clave in claves_acceso
+            }
+
+    transmisor = TransmisorLote()
+    monkeypatch.setattr(orquestador_module, "obtener_firmador", lambda: FirmadorFalso())
+    service.orquestador_fe_service.transmisor = transmisor
+
+    with Session(engine) as session:
+        # Lote incompleto (3 de 50) aún dentro de la espera: se difiere.
+        assert service.orquestador_fe_service.procesar_cola(session, lote_masivo=True, worker_id="w1") == 0
+        assert transmisor.lotes == []
+        procesados = service.orquestador_fe_service.procesar_cola(
+            session,
+            lote_masivo=True,
+            worker_id="w1",
+            now=datetime.utcnow() + timedelta(minutes=5),
+        )
+
+    assert procesados == 3
+    assert len(transmisor.lotes) == 1
+    xml_lote, clave_lote, claves_lote = transmisor.lotes[0]
+    assert len(clave_lote) == 49 and clave_lote.isdigit()
+    assert sorted(claves_lote) == sorted(claves.values())
+    assert xml_lote.count(b"<comprobante><![CDATA[<factura>") == 3
+
+    with Session(engine) as session:
+        for venta_id, clave in claves.items():
+            venta_db = session.get(Venta, venta_id)
+            documento = session.exec(
+                select(DocumentoElectronico).where(
+                    DocumentoElectronico.tipo_documento == TipoDocumentoElectronico.FACTURA,
+                    DocumentoElectronico.referencia_id == venta_id,
+                )
+            ).one()
+            assert venta_db.sri_intentos == 1
+            if clave == clave_rechazada:
+                assert venta_db.estado_sri == EstadoSriDocumento.RECHAZADO
+                assert documento.estado_sri == EstadoDocumentoElectronico.RECHAZADO
+            else:
+                assert venta_db.estado_sri == EstadoSriDocumento.AUTORIZADO
+                assert documento.estado_sri == EstadoDocumentoElectronico.AUTORIZADO
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from osiris.core.observability import METRICS
+from osiris.modules.sri.core_sri.models import DocumentoSriCola, EstadoColaSri
+from osiris.modules.sri.facturacion_electronica.services.programador_tareas import ProgramadorTareas, reclamar_tarea_sri
+
+
+def _esperar(condicion, timeout: float = 5.0) -> None:
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite, "La tarea programada no se ejecutó a tiempo."
+        time.sleep(0.01)
+
+
+class _Registro(list):
+    def registrar(self, valor: str) -> None:
+        self.append(valor)
+
+
+def test_ejecuta_por_vencimiento_con_un_solo_despachador_y_reemplaza_por_clave():
+    programador = ProgramadorTareas(max_workers=2)
+    ejecutadas = _Registro()
+    hilos_antes = threading.active_count()
+    try:
+        for indice in range(200):
+            programador.programar(f"lejana-{indice}", 3600, ejecutadas.registrar, valor=f"lejana-{indice}")
+        programador.programar("b", 0.05, ejecutadas.registrar, valor="b")
+        programador.programar("a", 0.01, ejecutadas.registrar, valor="a")
+        programador.programar("c", 0.02, ejecutadas.registrar, valor="c-descartada")
+        programador.programar("c", 0.10, ejecutadas.registrar, valor="c")
+
+        # Doscientas tareas dormidas no son doscientos hilos: solo el despachador.
+        assert threading.active_count() - hilos_antes <= 1
+        assert METRICS.get_gauge("osiris_programador_tareas_pendientes") == 203
+
+        _esperar(lambda: len(ejecutadas) == 3)
+        assert ejecutadas == ["a", "b", "c"]
+        assert programador.cancelar("lejana-0")
+        assert programador.pendientes() == 199
+    finally:
+        programador.detener()
+
+
+def test_error_en_tarea_no_detiene_el_despachador():
+    programador = ProgramadorTareas(max_workers=1)
+    ejecutadas = _Registro()
+
+    def _falla() -> None:
+        raise RuntimeError("SMTP caído")
+
+    try:
+        programador.programar("falla", 0, _falla)
+        programador.programar("sigue", 0.02, ejecutadas.registrar, valor="sigue")
+        _esperar(lambda: ejecutadas == ["sigue"])
+    finally:
+        programador.detener()
+    assert "osiris_programador_tareas_retraso_seconds" in METRICS.render_prometheus()
+
+
+def test_rehidrata_reintentos_persistidos_tras_reinicio():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[DocumentoSriCola.__table__])
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        vencida = DocumentoSriCola(
+            entidad_id=uuid4(),
+            tipo_documento="VENTA",
+            estado=EstadoColaSri.REINTENTO_PROGRAMADO,
+            proximo_intento_en=now - timedelta(seconds=30),
+            payload_json="{}",
+        )
+        futura = DocumentoSriCola(
+            entidad_id=uuid4(),
+            tipo_documento="RETENCION",
+            estado=EstadoColaSri.REINTENTO_PROGRAMADO,
+            proximo_intento_en=now + timedelta(hours=1),
+            payload_json="{}",
+        )
+        completada = DocumentoSriCola(
+            entidad_id=uuid4(),
+            tipo_documento="VENTA",
+            estado=EstadoColaSri.COMPLETADO,
+            payload_json="{}",
+        )
+        session.add_all([vencida, futura, completada])
+        session.commit()
+        vencida_id = vencida.id
+
+    programador = ProgramadorTareas(max_workers=1)
+    ejecutadas: list = []
+    try:
+        reprogramados = programador.rehidratar(
+            engine,
+            {"VENTA": lambda tarea_id: ejecutadas.append(tarea_id), "RETENCION": lambda tarea_id: None},
+            now=now,
+        )
+        assert reprogramados == 2
+        _esperar(lambda: ejecutadas == [vencida_id])
+        assert programador.pendientes() == 1
+    finally:
+        programador.detener()
+
+
+def test_reclamo_de_tarea_no_roba_un_envio_en_curso_y_recupera_el_abandonado():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[DocumentoSriCola.__table__])
+    with Session(engine) as session:
+        tarea = DocumentoSriCola(
+            entidad_id=uuid4(),
+            tipo_documento="VENTA",
+            estado=EstadoColaSri.PENDIENTE,
+            payload_json="{}",
+        )
+        session.add(tarea)
+        session.commit()
+        tarea_id = tarea.id
+
+    with Session(engine) as session:
+        tarea = session.get(DocumentoSriCola, tarea_id)
+        assert reclamar_tarea_sri(session, tarea)
+        session.commit()
+
+    # Otro proceso (p. ej. el worker de cola tras el NOTIFY) lee la tarea en PROCESANDO: no la reclama.
+    with Session(engine) as session:
+        tarea = session.get(DocumentoSriCola, tarea_id)
+        assert tarea.estado == EstadoColaSri.PROCESANDO
+        assert not reclamar_tarea_sri(session, tarea)
+        # Pasado el lease sin actualizarse, el envío se considera abandonado y se recupera.
+        assert reclamar_tarea_sri(session, tarea, now=datetime.utcnow() + timedelta(hours=1))
+        session.commit()
+
+    with Session(engine) as session:
+        tarea = session.get(DocumentoSriCola, tarea_id)
+        assert (tarea.estado, tarea.intentos_realizados) == (EstadoColaSri.PROCESANDO, 2)
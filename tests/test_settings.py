@@ -267,6 +267,32 @@ def test_load_settings_allows_non_electronic_mode_without_cert_files(
     assert loaded.FEEC_XSD_PATH is None
 
 
+def test_load_settings_keeps_runtime_directories_out_of_the_source_tree(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    env_file = tmp_path / ".env.e0_blob_dirs"
+    lines = _base_env_lines("e0_blob_dirs") + ["SRI_MODO_EMISION=NO_ELECTRONICO"]
+    _write_env_file(env_file, "\n".join(lines))
+
+    monkeypatch.setattr(core_settings, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setenv("ENVIRONMENT", "e0_blob_dirs")
+    monkeypatch.setenv("SRI_MODO_EMISION", "NO_ELECTRONICO")
+    for variable in ("FE_BLOB_BACKEND", "FE_BLOB_DIRECTORIO", "IMPRESION_CACHE_DIRECTORIO"):
+        monkeypatch.delenv(variable, raising=False)
+
+    loaded = core_settings.load_settings()
+    assert loaded.FE_BLOB_DIRECTORIO is None
+    assert loaded.IMPRESION_CACHE_DIRECTORIO is None
+
+    monkeypatch.setenv("FE_BLOB_BACKEND", "ARCHIVOS")
+    with pytest.raises(ValueError, match="FE_BLOB_DIRECTORIO"):
+        core_settings.load_settings()
+
+    monkeypatch.setenv("FE_BLOB_DIRECTORIO", str(tmp_path / "fe_blobs"))
+    assert core_settings.load_settings().FE_BLOB_DIRECTORIO == tmp_path / "fe_blobs"
+
+
 def test_load_settings_allows_configurable_fe_queue_poll_interval(
     tmp_path: Path,
     monkeypatch: pytest.MonkeyPatch,
@@ -8,6 +8,7 @@ from sqlalchemy.pool import StaticPool
 from sqlmodel import SQLModel, Session, create_engine
 
 from osiris.modules.sri.core_sri.models import (
+    BlobComprimido,
     Compra,
     DocumentoSriCola,
     EstadoColaSri,
@@ -21,7 +22,9 @@ from osiris.modules.sri.core_sri.models import (
     TipoIdentificacionSRI,
     TipoRetencionSRI,
 )
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import CircuitoSri
 from osiris.modules.sri.facturacion_electronica.services.sri_async_service import SriAsyncService
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import parsear_recepcion
 
 
 def _build_test_engine():
@@ -37,6 +40,7 @@ def _build_test_engine():
             Retencion.__table__,
             RetencionDetalle.__table__,
             DocumentoSriCola.__table__,
+            BlobComprimido.__table__,
             RetencionEstadoHistorial.__table__,
         ],
     )
@@ -164,3 +168,132 @@ def test_reintentos_sri_timeout():
         assert len(reencolados) == 1
         assert reencolados[0][0] == str(tarea_id)
         assert reencolados[0][1] == 1
+
+
+def test_respuesta_sri_no_xml_programa_reintento_y_agota_en_error():
+    engine = _build_test_engine()
+
+    class GatewayPaginaMantenimiento:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            parsear_recepcion(b"<html><body>Servicio en mantenimiento<br></body></html>")
+            raise AssertionError("parsear_recepcion debió fallar")
+
+    sri_service = SriAsyncService(gateway=GatewayPaginaMantenimiento(), db_engine=engine)
+    with Session(engine) as session:
+        retencion = _crear_compra_retencion(session)
+        retencion_id = retencion.id
+        tarea = sri_service.encolar_retencion(session, retencion_id=retencion_id, usuario_id="sri-bot", commit=True)
+        tarea_id = tarea.id
+
+    reencolados: list[int] = []
+    sri_service.procesar_documento_sri(tarea_id, scheduler=lambda _task_id, delay: reencolados.append(delay))
+
+    with Session(engine) as session:
+        tarea_db = session.get(DocumentoSriCola, tarea_id)
+        assert tarea_db.estado == EstadoColaSri.REINTENTO_PROGRAMADO
+        assert "no es XML" in tarea_db.ultimo_error
+        assert session.get(Retencion, retencion_id).estado_sri == EstadoSriDocumento.REINTENTO
+        assert reencolados == [1]
+        # Último intento disponible: la tarea termina en ERROR en vez de quedar en PROCESANDO.
+        tarea_db.intentos_realizados = tarea_db.max_intentos - 1
+        tarea_db.proximo_intento_en = None
+        session.add(tarea_db)
+        session.commit()
+
+    sri_service.procesar_documento_sri(tarea_id, scheduler=lambda _task_id, delay: reencolados.append(delay))
+
+    with Session(engine) as session:
+        assert session.get(DocumentoSriCola, tarea_id).estado == EstadoColaSri.FALLIDO
+        assert session.get(Retencion, retencion_id).estado_sri == EstadoSriDocumento.ERROR
+        assert reencolados == [1]
+
+
+def test_reintento_con_circuito_abierto_se_reprograma_sin_gastar_intento():
+    engine = _build_test_engine()
+    reloj = [1000.0]
+    circuito = CircuitoSri(umbral_fallos=1, enfriamiento_segundos=45, reloj=lambda: reloj[0])
+    circuito.registrar_fallo()
+    envios: list[str] = []
+
+    class GatewayAutorizado:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            envios.append(tipo_documento)
+            return {"estado": "AUTORIZADO", "mensaje": "Autorizado"}
+
+    sri_service = SriAsyncService(gateway=GatewayAutorizado(), db_engine=engine, circuito=circuito)
+    with Session(engine) as session:
+        retencion = _crear_compra_retencion(session)
+        tarea = sri_service.encolar_retencion(session, retencion_id=retencion.id, usuario_id="sri-bot", commit=True)
+        tarea_id = tarea.id
+
+    reprogramados: list[int] = []
+    reloj[0] += 15
+    sri_service.procesar_documento_sri(tarea_id, scheduler=lambda _task_id, delay: reprogramados.append(delay))
+
+    with Session(engine) as session:
+        tarea_db = session.get(DocumentoSriCola, tarea_id)
+        assert (tarea_db.estado, tarea_db.intentos_realizados) == (EstadoColaSri.PENDIENTE, 0)
+    assert reprogramados == [30]
+    assert envios == []
+
+    # Vencido el enfriamiento el reintento es el sondeo: se envía y cierra el circuito.
+    reloj[0] += 30
+    sri_service.procesar_documento_sri(tarea_id, scheduler=lambda _task_id, delay: reprogramados.append(delay))
+
+    with Session(engine) as session:
+        tarea_db = session.get(DocumentoSriCola, tarea_id)
+        assert (tarea_db.estado, tarea_db.intentos_realizados) == (EstadoColaSri.COMPLETADO, 1)
+    assert envios == ["RETENCION"]
+    assert reprogramados == [30]
+
+
+def test_reintento_rehidratado_en_varias_replicas_se_envia_una_vez():
+    engine = _build_test_engine()
+    envios: list[str] = []
+
+    class GatewayTimeout:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            raise TimeoutError("SRI timeout")
+
+    replica_b = SriAsyncService(db_engine=engine)
+
+    class GatewayConReplicaConcurrente:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            envios.append("a")
+            # La otra réplica dispara el mismo reintento mientras este envío está en vuelo.
+            replica_b.procesar_documento_sri(tarea_id, gateway=GatewayRegistra(), scheduler=lambda *_args: None)
+            return {"estado": "AUTORIZADO", "mensaje": "Documento autorizado"}
+
+    class GatewayRegistra:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            envios.append("b")
+            return {"estado": "AUTORIZADO", "mensaje": "Documento autorizado"}
+
+    replica_a = SriAsyncService(gateway=GatewayTimeout(), db_engine=engine)
+    with Session(engine) as session:
+        retencion = _crear_compra_retencion(session)
+        tarea = replica_a.encolar_retencion(session, retencion_id=retencion.id, usuario_id="sri-bot", commit=True)
+        tarea_id = tarea.id
+
+    replica_a.procesar_documento_sri(tarea_id, scheduler=lambda *_args: None)
+    # El reintento aún no vence: un disparo adelantado no envía.
+    replica_a.procesar_documento_sri(tarea_id, gateway=GatewayRegistra(), scheduler=lambda *_args: None)
+    assert envios == []
+
+    with Session(engine) as session:
+        tarea_db = session.get(DocumentoSriCola, tarea_id)
+        tarea_db.proximo_intento_en = None
+        session.add(tarea_db)
+        session.commit()
+
+    replica_a.procesar_documento_sri(tarea_id, gateway=GatewayConReplicaConcurrente(), scheduler=lambda *_args: None)
+
+    assert envios == ["a"]
+    with Session(engine) as session:
+        tarea_db = session.get(DocumentoSriCola, tarea_id)
+        assert tarea_db.estado == EstadoColaSri.COMPLETADO
+        assert tarea_db.intentos_realizados == 2
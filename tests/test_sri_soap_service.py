@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.etree import ElementTree
+
+import pytest
+
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import CircuitoSri, EstadoCircuitoSri
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import (
+    MensajeSri,
+    RespuestaAutorizacion,
+    RespuestaRecepcion,
+    RespuestaSriInvalidaError,
+    SriSoapClient,
+    TransmisorSri,
+    construir_lote,
+    generar_clave_acceso_lote,
+    parsear_autorizacion,
+    parsear_autorizacion_lote,
+    parsear_recepcion,
+)
+
+
+RECEPCION_RECIBIDA = b"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns2:validarComprobanteResponse xmlns:ns2="http://ec.gob.sri.ws.recepcion"><RespuestaRecepcionComprobante>
+<estado>RECIBIDA</estado><comprobantes/></RespuestaRecepcionComprobante></ns2:validarComprobanteResponse>
+</soap:Body></soap:Envelope>"""
+
+RECEPCION_DEVUELTA = b"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns2:validarComprobanteResponse xmlns:ns2="http://ec.gob.sri.ws.recepcion"><RespuestaRecepcionComprobante>
+<estado>DEVUELTA</estado><comprobantes><comprobante><claveAcceso>123</claveAcceso><mensajes><mensaje>
+<identificador>35</identificador><mensaje>ARCHIVO NO CUMPLE ESTRUCTURA XML</mensaje><tipo>ERROR</tipo>
+</mensaje></mensajes></comprobante></comprobantes></RespuestaRecepcionComprobante>
+</ns2:validarComprobanteResponse></soap:Body></soap:Envelope>"""
+
+AUTORIZACION_AUTORIZADO = b"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns2:autorizacionComprobanteResponse xmlns:ns2="http://ec.gob.sri.ws.autorizacion"><RespuestaAutorizacionComprobante>
+<claveAccesoConsultada>123</claveAccesoConsultada><numeroComprobantes>1</numeroComprobantes><autorizaciones>
+<autorizacion><estado>AUTORIZADO</estado><numeroAutorizacion>123</numeroAutorizacion>
+<fechaAutorizacion>2024-01-01T10:00:00-05:00</fechaAutorizacion><comprobante><![CDATA[<factura/>]]></comprobante>
+<mensajes/></autorizacion></autorizaciones></RespuestaAutorizacionComprobante>
+</ns2:autorizacionComprobanteResponse></soap:Body></soap:Envelope>"""
+
+
+def test_parsea_respuestas_de_recepcion_y_autorizacion():
+    devuelta = parsear_recepcion(RECEPCION_DEVUELTA)
+    assert devuelta.estado == "DEVUELTA"
+    assert not devuelta.recibida
+    assert devuelta.mensaje == "[35] ARCHIVO NO CUMPLE ESTRUCTURA XML"
+
+    autorizacion = parsear_autorizacion(AUTORIZACION_AUTORIZADO)
+    assert autorizacion.estado == "AUTORIZADO"
+    assert autorizacion.numero_autorizacion == "123"
+    assert autorizacion.comprobante == "<factura/>"
+
+
+CLAVE_A = "1" * 49
+CLAVE_B = "2" * 49
+AUTORIZACION_LOTE = f"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<ns2:autorizacionComprobanteLoteResponse xmlns:ns2="http://ec.gob.sri.ws.autorizacion"><RespuestaAutorizacionLote>
+<claveAccesoLoteConsultada>9</claveAccesoLoteConsultada><numeroComprobantesLote>2</numeroComprobantesLote><autorizaciones>
+<autorizacion><estado>AUTORIZADO</estado><numeroAutorizacion>{CLAVE_A}</numeroAutorizacion><mensajes/></autorizacion>
+<autorizacion><estado>NO AUTORIZADO</estado><comprobante><![CDATA[<factura><infoTributaria><claveAcceso>{CLAVE_B}</claveAcceso>
+</infoTributaria></factura>]]></comprobante><mensajes><mensaje><identificador>65</identificador>
+<mensaje>FECHA EMISION EXTEMPORANEA</mensaje></mensaje></mensajes></autorizacion>
+</autorizaciones></RespuestaAutorizacionLote></ns2:autorizacionComprobanteLoteResponse></soap:Body></soap:Envelope>""".encode()
+
+
+def test_lote_masivo_reparte_autorizaciones_por_clave_de_acceso():
+    autorizaciones = parsear_autorizacion_lote(AUTORIZACION_LOTE)
+    assert [autorizacion.clave_acceso for autorizacion in autorizaciones] == [CLAVE_A, CLAVE_B]
+
+    clave_lote = generar_clave_acceso_lote(
+        fecha=date(2024, 1, 1), ruc="1790012345001", ambiente="1", serie="001001", secuencial="000000001"
+    )
+    assert len(clave_lote) == 49
+    xml_lote = construir_lote(clave_acceso_lote=clave_lote, ruc="1790012345001", comprobantes=[b"<factura/>"] * 2)
+    assert ElementTree.fromstring(xml_lote).findtext("claveAcceso") == clave_lote
+
+    class _ClienteLote:
+        def enviar_recepcion(self, _xml: bytes) -> RespuestaRecepcion:
+            return RespuestaRecepcion("RECIBIDA")
+
+        def consultar_autorizacion_lote(self, clave: str) -> list[RespuestaAutorizacion]:
+            assert clave == clave_lote
+            return autorizaciones
+
+    resultados = TransmisorSri(_ClienteLote()).transmitir_lote_masivo(xml_lote, clave_lote, [CLAVE_A, CLAVE_B, "3" * 49])
+    assert resultados[CLAVE_A]["estado"] == "AUTORIZADO"
+    assert resultados[CLAVE_B] == {"estado": "RECHAZADO", "mensaje": "[65] FECHA EMISION EXTEMPORANEA"}
+    assert resultados["3" * 49]["estado"] == "RECIBIDO"
+
+
+class _ClienteFalso:
+    def __init__(self, recepcion: RespuestaRecepcion, autorizacion: RespuestaAutorizacion):
+        self.recepcion = recepcion
+        self.autorizacion = autorizacion
+        self.consultas: list[str] = []
+
+    def enviar_recepcion(self, _xml: bytes) -> RespuestaRecepcion:
+        return self.recepcion
+
+    def consultar_autorizacion(self, clave: str) -> RespuestaAutorizacion:
+        self.consultas.append(clave)
+        return self.autorizacion
+
+
+@pytest.mark.parametrize(
+    ("recepcion", "autorizacion", "estado", "consulta"),
+    [
+        (RespuestaRecepcion("RECIBIDA"), RespuestaAutorizacion("AUTORIZADO"), "AUTORIZADO", True),
+        (RespuestaRecepcion("RECIBIDA"), RespuestaAutorizacion(""), "RECIBIDO", True),
+        (RespuestaRecepcion("RECIBIDA"), RespuestaAutorizacion("NO AUTORIZADO"), "RECHAZADO", True),
+        # Reenvío de un comprobante ya recibido: se consulta la autorización igual.
+        (
+            RespuestaRecepcion("DEVUELTA", [MensajeSri("43", "CLAVE ACCESO REGISTRADA")]),
+            RespuestaAutorizacion("AUTORIZADO"),
+            "AUTORIZADO",
+            True,
+        ),
+        (
+            RespuestaRecepcion("DEVUELTA", [MensajeSri("35", "ARCHIVO NO CUMPLE ESTRUCTURA XML")]),
+            RespuestaAutorizacion("AUTORIZADO"),
+            "RECHAZADO",
+            False,
+        ),
+    ],
+)
+def test_transmisor_resuelve_estado_de_cola(recepcion, autorizacion, estado, consulta):
+    cliente = _ClienteFalso(recepcion, autorizacion)
+    resultado = TransmisorSri(cliente).transmitir(b"<factura/>", "123")
+    assert resultado["estado"] == estado
+    assert bool(cliente.consultas) is consulta
+
+
+class _ServidorSri(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    puertos_cliente: set[int] = set()
+    lock = threading.Lock()
+
+    def do_POST(self):  # noqa: N802 - API de BaseHTTPRequestHandler
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.lock:
+            self.puertos_cliente.add(self.client_address[1])
+        cuerpo = RECEPCION_RECIBIDA if self.path == "/recepcion" else AUTORIZACION_AUTORIZADO
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture
+def servidor_sri():
+    _ServidorSri.puertos_cliente = set()
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _ServidorSri)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    yield {"recepcion": f"{base}/recepcion", "autorizacion": f"{base}/autorizacion"}
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_cliente_sincrono_reutiliza_la_conexion_keep_alive(servidor_sri):
+    cliente = SriSoapClient(endpoints=servidor_sri, timeout_seconds=5, pool_maxsize=2)
+    transmisor = TransmisorSri(cliente)
+    for indice in range(5):
+        assert transmisor.transmitir(b"<factura/>", str(indice))["estado"] == "AUTORIZADO"
+    cliente.close()
+    # Diez llamadas SOAP (recepción + autorización) sobre una sola conexión TCP.
+    assert len(_ServidorSri.puertos_cliente) == 1
+
+
+class _ServidorSriInvalido(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    status = 200
+    cuerpo = b""
+
+    def do_POST(self):  # noqa: N802 - API de BaseHTTPRequestHandler
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(self.status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.cuerpo)))
+        self.end_headers()
+        self.wfile.write(self.cuerpo)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.mark.parametrize(
+    ("status", "cuerpo", "detalle"),
+    [
+        (403, b"<html><body>Forbidden</body></html>", "HTTP 403"),
+        # Página de mantenimiento servida con 200 por un proxy delante del SRI.
+        (200, b"<html><body>Servicio en mantenimiento<br></body></html>", "no es XML"),
+    ],
+)
+def test_respuesta_4xx_o_no_xml_es_respuesta_invalida_sin_abrir_el_circuito(status, cuerpo, detalle):
+    _ServidorSriInvalido.status = status
+    _ServidorSriInvalido.cuerpo = cuerpo
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _ServidorSriInvalido)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    cliente = SriSoapClient(endpoints={"recepcion": base, "autorizacion": base}, timeout_seconds=5)
+    circuito = CircuitoSri(umbral_fallos=1, enfriamiento_segundos=60)
+    try:
+        with pytest.raises(RespuestaSriInvalidaError, match=detalle):
+            TransmisorSri(cliente, circuito=circuito).transmitir(b"<factura/>", "123")
+    finally:
+        cliente.close()
+        servidor.shutdown()
+        servidor.server_close()
+    # El SRI respondió: no es una caída de red y el circuito sigue cerrado.
+    assert circuito.estado == EstadoCircuitoSri.CERRADO
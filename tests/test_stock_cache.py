@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+from uuid import uuid4
+
+from sqlmodel import Session, select
+
+from osiris.main import app
+from osiris.modules.inventario.movimientos.models import InventarioStock, TipoMovimientoInventario
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.movimientos.services.stock_cache_service import StockCache, stock_cache
+from tests.test_kardex_cierre_mensual import _build_test_engine, _confirmar, _seed
+from tests.test_kardex_exportacion_api import _client_con_session
+
+
+def test_cache_se_invalida_al_confirmar_movimiento():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed(session)
+        assert stock_cache.obtener(session, bodega_id=bodega_id, producto_ids=[producto_id]) == {}
+
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 10),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("10.0000"), costo=Decimal("5.0000"),
+        )
+        stocks = stock_cache.obtener(session, bodega_id=bodega_id, producto_ids=[producto_id])
+        assert stocks[producto_id].cantidad_actual == Decimal("10.0000")
+
+        # Una escritura fuera de los servicios no se ve: la lectura sale del cache.
+        stock = session.exec(select(InventarioStock)).one()
+        stock.cantidad_actual = Decimal("99.0000")
+        session.add(stock)
+        session.commit()
+        stocks = stock_cache.obtener(session, bodega_id=bodega_id, producto_ids=[producto_id])
+        assert stocks[producto_id].cantidad_actual == Decimal("10.0000")
+        stock.cantidad_actual = Decimal("10.0000")
+        session.add(stock)
+        session.commit()
+
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 11),
+            tipo=TipoMovimientoInventario.EGRESO, cantidad=Decimal("4.0000"), costo=Decimal("0"),
+        )
+        stocks = stock_cache.obtener(session, bodega_id=bodega_id, producto_ids=[producto_id])
+        assert stocks[producto_id].cantidad_actual == Decimal("6.0000")
+        assert stocks[producto_id].costo_promedio_vigente == Decimal("5.0000")
+
+
+def test_cache_lru_y_notificaciones_de_otros_workers():
+    engine = _build_test_engine()
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed(session)
+        otros = [uuid4() for _ in range(3)]
+        cache = StockCache(max_entradas=2, ttl_segundos=0, habilitado=True, canal="test")
+
+        cache.obtener(session, bodega_id=bodega_id, producto_ids=[producto_id])
+        cache.obtener(session, bodega_id=bodega_id, producto_ids=otros[:2])
+        assert len(cache) == 2
+        assert (bodega_id, producto_id) not in cache._entradas
+
+        otro_worker = StockCache(max_entradas=2, ttl_segundos=0, habilitado=True, canal="test")
+        (payload,) = otro_worker.payloads({(bodega_id, otros[0])})
+        cache.aplicar_notificacion(payload)
+        assert (bodega_id, otros[0]) not in cache._entradas
+        assert (bodega_id, otros[1]) in cache._entradas
+
+        # Las notificaciones propias se ignoran.
+        (propio,) = cache.payloads({(bodega_id, otros[1])})
+        cache.aplicar_notificacion(propio)
+        assert (bodega_id, otros[1]) in cache._entradas
+
+
+def test_stock_disponible_lote_api():
+    engine = _build_test_engine()
+    service = MovimientoInventarioService()
+    with Session(engine) as session:
+        bodega_id, producto_id = _seed(session)
+        _confirmar(
+            service, session, bodega_id=bodega_id, producto_id=producto_id, fecha=date(2025, 1, 10),
+            tipo=TipoMovimientoInventario.INGRESO, cantidad=Decimal("3.0000"), costo=Decimal("2.5000"),
+        )
+
+    sin_stock = uuid4()
+    client = _client_con_session(engine)
+    try:
+        response = client.post(
+            "/api/v1/inventarios/stock-disponible/lote",
+            json={"bodega_id": str(bodega_id), "producto_ids": [str(producto_id), str(sin_stock)]},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    filas = {fila["producto_id"]: fila for fila in response.json()}
+    assert Decimal(filas[str(producto_id)]["cantidad_disponible"]) == Decimal("3.0000")
+    assert Decimal(filas[str(producto_id)]["costo_promedio_vigente"]) == Decimal("2.5000")
+    assert Decimal(filas[str(sin_stock)]["cantidad_disponible"]) == Decimal("0")
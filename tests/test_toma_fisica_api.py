@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import json
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from osiris.core.db import get_session
+from osiris.main import app
+from osiris.modules.common.audit_log.entity import AuditLog
+from osiris.modules.common.empresa.entity import Empresa
+from osiris.modules.common.sucursal.entity import Sucursal
+from osiris.modules.inventario.bodega.entity import Bodega
+from osiris.modules.inventario.casa_comercial.entity import CasaComercial
+from osiris.modules.inventario.movimientos.models import (
+    InventarioStock,
+    MovimientoInventario,
+    MovimientoInventarioDetalle,
+    TipoMovimientoInventario,
+)
+from osiris.modules.inventario.movimientos.schemas import MovimientoInventarioCreate
+from osiris.modules.inventario.movimientos.services.movimiento_inventario_service import MovimientoInventarioService
+from osiris.modules.inventario.producto.entity import Producto
+from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
+
+
+def _build_test_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[
+            TipoContribuyente.__table__,
+            Empresa.__table__,
+            Sucursal.__table__,
+            Bodega.__table__,
+            CasaComercial.__table__,
+            Producto.__table__,
+            AuditLog.__table__,
+            MovimientoInventario.__table__,
+            MovimientoInventarioDetalle.__table__,
+            InventarioStock.__table__,
+        ],
+    )
+    return engine
+
+
+def _seed(session: Session):
+    session.add(TipoContribuyente(codigo="01", nombre="SOCIEDAD", activo=True))
+    empresa = Empresa(
+        razon_social="Empresa Toma",
+        nombre_comercial="Empresa Toma",
+        ruc="1790012345001",
+        direccion_matriz="Av. Quito",
+        telefono="022345678",
+        obligado_contabilidad=True,
+        regimen="GENERAL",
+        modo_emision="ELECTRONICO",
+        tipo_contribuyente_id="01",
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(empresa)
+    session.flush()
+    bodega = Bodega(
+        codigo_bodega="BOD-TOMA",
+        nombre_bodega="Bodega Toma",
+        empresa_id=empresa.id,
+        usuario_auditoria="tester",
+        activo=True,
+    )
+    session.add(bodega)
+    productos = [
+        Producto(
+            nombre=f"Producto Toma {i}",
+            codigo_barras=f"789000{i}",
+            tipo="BIEN",
+            pvp=Decimal("10.00"),
+            cantidad=Decimal("0.0000"),
+            usuario_auditoria="tester",
+            activo=True,
+        )
+        for i in range(4)
+    ]
+    session.add_all(productos)
+    session.commit()
+
+    service = MovimientoInventarioService()
+    ingreso = service.crear_movimiento_borrador(
+        session,
+        MovimientoInventarioCreate(
+            bodega_id=bodega.id,
+            tipo_movimiento=TipoMovimientoInventario.INGRESO,
+            referencia_documento="ING-TOMA",
+            usuario_auditoria="tester",
+            detalles=[
+                {"producto_id": productos[0].id, "cantidad": Decimal("10.0000"), "costo_unitario": Decimal("4.0000")},
+                {"producto_id": productos[1].id, "cantidad": Decimal("5.0000"), "costo_unitario": Decimal("3.0000")},
+            ],
+        ),
+    )
+    service.confirmar_movimiento(session, ingreso.id)
+    return bodega.id, [producto.id for producto in productos]
+
+
+def _stock(session: Session, bodega_id, producto_id):
+    return session.exec(
+        select(InventarioStock).where(
+            InventarioStock.bodega_id == bodega_id,
+            InventarioStock.producto_id == producto_id,
+        )
+    ).one_or_none()
+
+
+def test_toma_fisica_csv_aplica_ajustes_por_lotes_y_reporta_por_linea():
+    engine = _build_test_engine()
+    with Session(engine) as session:
+        bodega_id, producto_ids = _seed(session)
+
+    archivo = "\n".join(
+        [
+            "producto_id,codigo_barras,cantidad_contada,costo_unitario",
+            f"{producto_ids[0]},,7,",
+            ",7890001,8,",
+            f"{producto_ids[2]},,0,",
+            f"{producto_ids[3]},,2.5,",
+            f"{producto_ids[0]},,9,",
+            "no-es-uuid,,1,",
+        ]
+    )
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                f"/api/v1/inventarios/bodegas/{bodega_id}/tomas-fisicas",
+                params={"motivo": "Conteo anual", "tamano_lote": 1, "usuario_auditoria": "tester"},
+                content=archivo.encode("utf-8"),
+                headers={"Content-Type": "text/csv"},
+            )
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+    assert response.status_code == 200, response.text
+    eventos = [json.loads(linea) for linea in response.text.splitlines()]
+    progreso = [evento for evento in eventos if evento["evento"] == "progreso"]
+    lineas = {evento["linea"]: evento for evento in eventos if evento["evento"] == "linea"}
+    resumen = eventos[-1]
+
+    assert [evento["lote"] for evento in progreso] == [1, 2, 3]
+    assert progreso[-1]["lineas_procesadas"] == 6
+    assert resumen["evento"] == "resumen"
+    assert resumen["ajustadas"] == 2
+    assert resumen["sin_cambio"] == 1
+    assert resumen["errores"] == 3
+    assert len(resumen["movimientos"]) == 2
+
+    assert lineas[2]["estado"] == "AJUSTADO"
+    assert lineas[2]["diferencia"] == "-3.0000"
+    assert lineas[3]["estado"] == "AJUSTADO"
+    assert lineas[3]["diferencia"] == "3.0000"
+    assert lineas[4]["estado"] == "SIN_CAMBIO"
+    assert lineas[5]["mensaje"] == "El producto no permite cantidades fraccionarias."
+    assert lineas[6]["mensaje"] == "Producto repetido en la toma física."
+    assert lineas[7]["mensaje"] == "producto_id inválido."
+
+    with Session(engine) as session:
+        assert _stock(session, bodega_id, producto_ids[0]).cantidad_actual == Decimal("7.0000")
+        stock_b = _stock(session, bodega_id, producto_ids[1])
+        assert stock_b.cantidad_actual == Decimal("8.0000")
+        assert stock_b.costo_promedio_vigente == Decimal("3.0000")
+        movimientos = session.exec(
+            select(MovimientoInventario).where(MovimientoInventario.referencia_documento.like("TOMA_FISICA:%"))
+        ).all()
+        assert {movimiento.tipo_movimiento for movimiento in movimientos} == {
+            TipoMovimientoInventario.AJUSTE,
+            TipoMovimientoInventario.EGRESO,
+        }
+
+
+def test_toma_fisica_rechaza_formato_no_soportado():
+    engine = _build_test_engine()
+    with Session(engine) as session:
+        bodega_id, _ = _seed(session)
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                f"/api/v1/inventarios/bodegas/{bodega_id}/tomas-fisicas",
+                params={"motivo": "Conteo"},
+                content=b"{}",
+                headers={"Content-Type": "application/json"},
+            )
+            sin_columnas = client.post(
+                f"/api/v1/inventarios/bodegas/{bodega_id}/tomas-fisicas",
+                params={"motivo": "Conteo"},
+                content=b"sku,conteo\n1,2\n",
+                headers={"Content-Type": "text/csv"},
+            )
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+
+    assert response.status_code == 415
+    assert sin_columnas.status_code == 400
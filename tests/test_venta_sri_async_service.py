@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import json
 from datetime import date
 from decimal import Decimal
+from types import SimpleNamespace
 from uuid import uuid4
 
+import pytest
 from sqlalchemy.pool import StaticPool
 from sqlmodel import SQLModel, Session, create_engine, select
 
@@ -13,6 +14,7 @@ from osiris.modules.common.empresa.entity import Empresa, RegimenTributario
 from osiris.modules.common.punto_emision.entity import PuntoEmision
 from osiris.modules.common.sucursal.entity import Sucursal
 from osiris.modules.sri.core_sri.models import (
+    BlobComprimido,
     DocumentoElectronico,
     DocumentoElectronicoHistorial,
     DocumentoSriCola,
@@ -28,7 +30,15 @@ from osiris.modules.sri.core_sri.models import (
     VentaDetalle,
     VentaDetalleImpuesto,
 )
-from osiris.modules.sri.facturacion_electronica.services.venta_sri_async_service import VentaSriAsyncService
+from osiris.modules.sri.facturacion_electronica.services.almacen_blobs import leer_payload_tarea
+from osiris.modules.sri.facturacion_electronica.services.circuito_sri import CircuitoSri
+from osiris.modules.sri.facturacion_electronica.services.sri_soap_service import RespuestaSriInvalidaError
+from osiris.modules.sri.facturacion_electronica.services import venta_sri_async_service as venta_sri_module
+from osiris.modules.sri.facturacion_electronica.services.firma_xml_service import ComprobanteInvalidoError
+from osiris.modules.sri.facturacion_electronica.services.venta_sri_async_service import (
+    FEECVentaGatewayDefault,
+    VentaSriAsyncService,
+)
 from osiris.modules.inventario.casa_comercial.entity import CasaComercial
 from osiris.modules.inventario.producto.entity import Producto, TipoProducto
 from osiris.modules.sri.tipo_contribuyente.entity import TipoContribuyente
@@ -55,6 +65,7 @@ def _build_test_engine():
             DocumentoElectronico.__table__,
             DocumentoElectronicoHistorial.__table__,
             DocumentoSriCola.__table__,
+            BlobComprimido.__table__,
             AuditLog.__table__,
         ],
     )
@@ -202,6 +213,100 @@ def test_worker_sri_rechazo_definitivo():
         assert correos == []
 
 
+def test_worker_sri_http_4xx_programa_reintento():
+    engine = _build_test_engine()
+
+    class GatewaySolicitudRechazada:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            _ = (tipo_documento, payload)
+            raise RespuestaSriInvalidaError("SRI recepción rechazó la solicitud (HTTP 400).")
+
+    service = VentaSriAsyncService(gateway=GatewaySolicitudRechazada(), db_engine=engine)
+
+    with Session(engine) as session:
+        venta = _crear_venta_electronica(session)
+        tarea = service.encolar_venta(session, venta_id=venta.id, usuario_id="sri-bot", commit=True)
+        tarea_id = tarea.id
+        venta_id = venta.id
+
+    reintentos: list[int] = []
+    service.procesar_documento_sri(
+        tarea_id,
+        scheduler=lambda _task_id, delay: reintentos.append(delay),
+        email_dispatcher=lambda _venta_id: None,
+    )
+
+    with Session(engine) as session:
+        venta = session.get(Venta, venta_id)
+        tarea = session.get(DocumentoSriCola, tarea_id)
+        documento = session.exec(
+            select(DocumentoElectronico).where(DocumentoElectronico.venta_id == venta_id)
+        ).first()
+
+        assert tarea.estado == EstadoColaSri.REINTENTO_PROGRAMADO
+        assert tarea.ultimo_error == "SRI recepción rechazó la solicitud (HTTP 400)."
+        assert venta.estado_sri == EstadoSriDocumento.ENVIADO
+        assert documento.estado == EstadoDocumentoElectronico.EN_COLA
+        assert reintentos == [1]
+
+
+def test_worker_sri_con_circuito_abierto_reprograma_sin_gastar_intento():
+    engine = _build_test_engine()
+    circuito = CircuitoSri(umbral_fallos=1, enfriamiento_segundos=60, reloj=lambda: 1000.0)
+    circuito.registrar_fallo()
+
+    class GatewayNoLlamado:
+        def enviar_documento(self, *, tipo_documento: str, payload: dict) -> dict:
+            raise AssertionError("con el circuito abierto no se transmite")
+
+    service = VentaSriAsyncService(gateway=GatewayNoLlamado(), db_engine=engine, circuito=circuito)
+
+    with Session(engine) as session:
+        venta = _crear_venta_electronica(session)
+        tarea = service.encolar_venta(session, venta_id=venta.id, usuario_id="sri-bot", commit=True)
+        tarea_id = tarea.id
+
+    reprogramados: list[tuple[str, int]] = []
+    for _ in range(5):
+        service.procesar_documento_sri(
+            tarea_id,
+            scheduler=lambda task_id, delay: reprogramados.append((str(task_id), delay)),
+            email_dispatcher=lambda _venta_id: None,
+        )
+
+    with Session(engine) as session:
+        tarea = session.get(DocumentoSriCola, tarea_id)
+        assert (tarea.estado, tarea.intentos_realizados) == (EstadoColaSri.PENDIENTE, 0)
+    assert reprogramados == [(str(tarea_id), 60)] * 5
+
+
+def test_gateway_default_sin_certificado_solo_simula_en_desarrollo(monkeypatch):
+    gateway = FEECVentaGatewayDefault()
+    monkeypatch.setattr(venta_sri_module, "obtener_firmador", lambda: None)
+
+    monkeypatch.setattr(venta_sri_module, "get_settings", lambda: SimpleNamespace(ENVIRONMENT="development"))
+    assert gateway.enviar_documento(tipo_documento="VENTA", payload={})["estado"] == "AUTORIZADO"
+
+    monkeypatch.setattr(venta_sri_module, "get_settings", lambda: SimpleNamespace(ENVIRONMENT="production"))
+    with pytest.raises(RuntimeError, match="FEEC_P12_PATH"):
+        gateway.enviar_documento(tipo_documento="VENTA", payload={})
+
+
+def test_gateway_default_rechaza_comprobante_que_no_cumple_el_xsd():
+    class FirmadorXsdInvalido:
+        def firmar_factura(self, payload: dict) -> bytes:
+            raise ComprobanteInvalidoError("El comprobante no cumple el XSD del SRI: línea 1: claveAcceso")
+
+    class TransmisorNoLlamado:
+        def transmitir(self, xml_firmado: bytes, clave_acceso: str) -> dict:
+            raise AssertionError("un comprobante inválido no se transmite")
+
+    gateway = FEECVentaGatewayDefault(transmisor=TransmisorNoLlamado(), firmador=FirmadorXsdInvalido())
+    resultado = gateway.enviar_documento(tipo_documento="VENTA", payload={})
+    assert resultado["estado"] == "RECHAZADO"
+    assert "XSD" in resultado["mensaje"]
+
+
 def test_worker_sri_autorizado_gatilla_correo():
     engine = _build_test_engine()
 
@@ -263,5 +368,5 @@ def test_encolar_venta_permite_produccion_y_mapea_ambiente(monkeypatch):
             commit=True,
         )
 
-        payload = json.loads(tarea.payload_json)
+        payload = leer_payload_tarea(session, tarea)
         assert payload["infoTributaria"]["ambiente"] == "2"